@@ -0,0 +1,117 @@
+"""
+Benchmark - Codec do Cache
+
+Compara, por requisição servida do cache, o caminho anterior (json.dumps na
+escrita, json.loads na leitura e jsonify na resposta) com o codec atual
+(serialização única com orjson, compressão acima de CACHE_COMPRESS_MIN_BYTES
+e bytes enviados direto na resposta), para respostas de tamanhos típicos da
+API: produto, busca paginada e lojas próximas.
+
+Uso:
+    python benchmarks/bench_cache_codec.py
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import Flask, jsonify  # noqa: E402
+
+from src.services import cache_codec  # noqa: E402
+from src.utils.http import payload_response  # noqa: E402
+
+REQUESTS = 2000
+
+
+def make_offer(rng, i):
+    """Oferta como devolvida por Offer.to_dict(include_store=True)."""
+    return {
+        'id': i,
+        'price': round(rng.uniform(2, 50), 2),
+        'original_price': round(rng.uniform(50, 60), 2),
+        'discount_percentage': round(rng.uniform(0, 40), 1),
+        'in_stock': True,
+        'scraped_at': '2024-05-01T10:00:00',
+        'store': {'id': i % 40, 'name': f'Supermercado {i % 40}', 'address': 'Av. Central, 123 - Brasília'}
+    }
+
+
+def make_payloads(rng):
+    """Respostas representativas dos endpoints cacheados."""
+    product = {
+        'success': True,
+        'message': 'Produto encontrado',
+        'data': {'id': 1, 'name': 'Arroz Tipo 1 5kg', 'category': 'Mercearia',
+                 'offers': [make_offer(rng, i) for i in range(8)]}
+    }
+    search = {
+        'success': True,
+        'message': 'Produtos encontrados',
+        'data': {
+            'products': [
+                {'id': i, 'name': f'Produto {i}', 'brand': 'Marca', 'category': 'Mercearia',
+                 'min_price': round(rng.uniform(2, 50), 2), 'offers_count': rng.randint(1, 30)}
+                for i in range(20)
+            ],
+            'pagination': {'page': 1, 'per_page': 20, 'total': 400, 'pages': 20}
+        }
+    }
+    nearby = {
+        'success': True,
+        'message': 'Lojas encontradas',
+        'data': {'stores': [
+            {'id': i, 'name': f'Supermercado {i}', 'address': 'Av. Central, 123 - Brasília',
+             'latitude': rng.uniform(-16, -15), 'longitude': rng.uniform(-48, -47),
+             'distance': round(rng.uniform(0, 10), 2), 'offers_count': rng.randint(100, 3000)}
+            for i in range(50)
+        ]}
+    }
+    return {'produto': product, 'busca': search, 'proximas': nearby}
+
+
+def timed_us(fn):
+    """Tempo médio por requisição em microssegundos."""
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        fn()
+    return (time.perf_counter() - start) / REQUESTS * 1e6
+
+
+def main():
+    rng = random.Random(42)
+    app = Flask(__name__)
+    
+    print(f"codec: {'orjson' if cache_codec.orjson else 'json'} + "
+          f"{'zstd' if cache_codec.zstandard else 'zlib'} "
+          f"(acima de {cache_codec.settings.CACHE_COMPRESS_MIN_BYTES} bytes)")
+    print(f"{'resposta':>10} {'json B':>8} {'codec B':>8} {'json us':>9} {'codec us':>9} {'codec enc us':>12}")
+    
+    for name, value in make_payloads(rng).items():
+        stored_json = json.dumps(value, default=str)
+        stored_codec = cache_codec.encode(value)
+        
+        def json_path():
+            return jsonify(json.loads(stored_json)).get_data()
+        
+        def codec_path():
+            payload, _ = cache_codec.decode_payload(stored_codec)
+            return payload_response(payload).get_data()
+        
+        # Sem Accept-Encoding (corpo descomprimido) e com a compressão aceita
+        with app.test_request_context():
+            json_us = timed_us(json_path)
+            codec_us = timed_us(codec_path)
+        with app.test_request_context(headers={'Accept-Encoding': 'gzip, deflate, zstd'}):
+            encoded_us = timed_us(codec_path)
+        
+        print(f"{name:>10} {len(stored_json):>8} {len(stored_codec):>8} "
+              f"{json_us:>9.1f} {codec_us:>9.1f} {encoded_us:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
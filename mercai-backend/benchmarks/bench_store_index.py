@@ -0,0 +1,72 @@
+"""
+Benchmark - Índice Espacial de Lojas
+
+Compara a latência de /api/stores/nearby (raio de 5 km, 10 resultados) e dos
+k vizinhos mais próximos usando a KD-tree com a varredura linear anterior
+(Haversine para todas as lojas), de 50 a 50.000 lojas espalhadas pelo Brasil.
+
+Uso:
+    python benchmarks/bench_store_index.py
+"""
+
+import os
+import random
+import sys
+import time
+from math import radians, sin, cos, asin, sqrt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from src.services.store_index import StoreIndex  # noqa: E402
+
+SIZES = (50, 500, 5000, 50000)
+QUERIES = 500
+
+
+def linear_scan(stores, lat, lon, radius, limit):
+    """Busca anterior: distância para todas as lojas, filtro, ordenação e corte."""
+    lat1, lon1 = radians(lat), radians(lon)
+    nearby = []
+    for store in stores:
+        lat2, lon2 = radians(store['latitude']), radians(store['longitude'])
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        distance = 2 * 6371 * asin(sqrt(a))
+        if distance <= radius:
+            nearby.append((store, distance))
+    nearby.sort(key=lambda x: x[1])
+    return nearby[:limit]
+
+
+def timed_us(fn, queries):
+    """Tempo médio por consulta em microssegundos."""
+    start = time.perf_counter()
+    for lat, lon in queries:
+        fn(lat, lon)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    rng = random.Random(42)
+    queries = [(rng.uniform(-33, 5), rng.uniform(-73, -35)) for _ in range(QUERIES)]
+    
+    print(f"{'lojas':>8} {'build ms':>9} {'raio us':>9} {'knn us':>9} {'linear us':>10}")
+    for size in SIZES:
+        stores = [
+            {'id': i, 'latitude': rng.uniform(-33, 5), 'longitude': rng.uniform(-73, -35)}
+            for i in range(size)
+        ]
+        
+        start = time.perf_counter()
+        index = StoreIndex(stores)
+        build_ms = (time.perf_counter() - start) * 1000
+        
+        radius_us = timed_us(lambda lat, lon: index.within_radius(lat, lon, 5, 10), queries)
+        knn_us = timed_us(lambda lat, lon: index.nearest(lat, lon, 10), queries)
+        linear_us = timed_us(lambda lat, lon: linear_scan(stores, lat, lon, 5, 10), queries[:50])
+        
+        print(f"{size:>8} {build_ms:>9.1f} {radius_us:>9.1f} {knn_us:>9.1f} {linear_us:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
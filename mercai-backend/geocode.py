@@ -0,0 +1,52 @@
+"""
+Script para geocodificar lojas em lote.
+
+Preenche latitude/longitude das lojas com endereço e sem coordenadas,
+respeitando o limite global de requisições ao provedor (compartilhado com
+os workers quando REDIS_URL está configurado).
+
+Execute: python geocode.py --missing [--limit N] [--nominatim-url URL]
+"""
+
+import argparse
+import os
+import sys
+
+# Configurar variáveis de ambiente
+os.environ.setdefault('FLASK_ENV', 'development')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///test.db')
+
+# Adicionar diretório ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.config.database import get_db, init_db
+from src.services.geocoding import Geocoder, NominatimProvider, geocode_missing_stores
+
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(description='Geocodifica lojas em lote.')
+    parser.add_argument('--missing', action='store_true', help='Lojas com endereço e sem coordenadas')
+    parser.add_argument('--limit', type=int, default=None, help='Número máximo de lojas')
+    parser.add_argument('--nominatim-url', default=None, help='Servidor compatível com Nominatim')
+    args = parser.parse_args()
+    
+    if not args.missing:
+        parser.error('informe --missing')
+    
+    init_db()
+    db = next(get_db())
+    
+    try:
+        geocoder = Geocoder(NominatimProvider(base_url=args.nominatim_url))
+        stats = geocode_missing_stores(db, limit=args.limit, geocoder=geocoder)
+        
+        print(f"Lojas processadas: {stats['total']}")
+        print(f"  Geocodificadas: {stats['geocoded']}")
+        print(f"  Não encontradas/adiadas: {stats['not_found']}")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -60,6 +60,13 @@ try:
 except Exception as e:
     logger.error(f"Erro ao inicializar banco de dados: {e}")
 
+# Construir índice espacial de lojas (também reconstruído sob demanda)
+try:
+    from src.services.store_index import store_index
+    store_index.rebuild()
+except Exception as e:
+    logger.error(f"Erro ao construir índice de lojas: {e}")
+
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health():
@@ -124,12 +131,21 @@ from src.api.products import products_bp
 from src.api.lists import lists_bp
 from src.api.ranking import ranking_bp
 from src.api.stores import stores_bp
+from src.api.cache import cache_bp
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(products_bp, url_prefix='/api/products')
 app.register_blueprint(lists_bp, url_prefix='/api/lists')
 app.register_blueprint(ranking_bp, url_prefix='/api/ranking')
 app.register_blueprint(stores_bp, url_prefix='/api/stores')
+app.register_blueprint(cache_bp, url_prefix='/api/cache')
+
+# Aquecer o cache em background (chaves quentes declaradas pelos endpoints)
+try:
+    from src.services.cache_warmup import cache_warmer
+    cache_warmer.start()
+except Exception as e:
+    logger.error(f"Erro ao iniciar o aquecimento do cache: {e}")
 
 # Tratamento global de erros
 @app.errorhandler(404)
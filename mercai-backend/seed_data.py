@@ -20,6 +20,7 @@ from src.config.database import get_db, init_db
 from src.models.store import Store
 from src.models.product import Product
 from src.models.offer import Offer
+import src.services.cache_tags  # noqa: F401 - invalida o cache a cada commit
 
 
 def create_stores(db):
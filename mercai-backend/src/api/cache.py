@@ -0,0 +1,52 @@
+"""
+API de Cache - Endpoints
+
+Módulo responsável pelos endpoints de observabilidade do cache.
+"""
+
+from flask import Blueprint, jsonify
+import logging
+
+from src.services.cache import cache
+from src.utils.jwt import admin_required, token_required
+
+logger = logging.getLogger(__name__)
+
+# Criar blueprint
+cache_bp = Blueprint('cache', __name__)
+
+
+@cache_bp.route('/metrics', methods=['GET'])
+@token_required
+@admin_required
+def get_cache_metrics(current_user_id: str):
+    """
+    Retorna as métricas do cache por prefixo de chave.
+    
+    GET /api/cache/metrics (apenas administradores: ADMIN_USER_IDS)
+    
+    Returns:
+        200: Escopo ("cluster": somadas de todos os workers via Redis;
+            "process": apenas este worker), intervalo de flush e, por prefixo
+            (product, products_search, ranking, stores_nearby, geocode...),
+            hits, misses, hit_rate, sets, errors, bytes_written, redis_calls,
+            redis_ms, avg_redis_ms, refreshes, stale_served e stale_on_error
+        401: Token ausente ou inválido
+        403: Usuário não é administrador
+        500: Erro interno
+    """
+    try:
+        data = cache.metrics.snapshot()
+        
+        return jsonify({
+            "success": True,
+            "message": "Métricas do cache recuperadas com sucesso",
+            "data": data
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Erro ao recuperar métricas do cache: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Erro ao recuperar métricas do cache"
+        }), 500
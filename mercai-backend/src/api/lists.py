@@ -13,6 +13,12 @@ from src.config.database import get_db
 from src.models.shopping_list import ShoppingList
 from src.models.list_item import ListItem
 from src.models.product import Product
+from src.services.list_summary import load_list_summaries
+from src.services.ranking import (
+    ranking_item_added,
+    ranking_item_removed,
+    ranking_item_updated,
+)
 from src.utils.jwt import token_required
 
 logger = logging.getLogger(__name__)
@@ -123,7 +129,7 @@ def get_lists(current_user_id: str):
     GET /api/lists
     
     Returns:
-        200: Lista de listas do usuário
+        200: Lista de listas do usuário (com items_count e estimated_total)
         500: Erro interno
     """
     try:
@@ -131,11 +137,17 @@ def get_lists(current_user_id: str):
         
         try:
             # Buscar listas do usuário
+            user_id = uuid.UUID(current_user_id)
             shopping_lists = db.query(ShoppingList).filter(
-                ShoppingList.user_id == uuid.UUID(current_user_id)
+                ShoppingList.user_id == user_id
             ).order_by(ShoppingList.created_at.desc()).all()
             
-            lists_data = [lst.to_dict(include_items=False) for lst in shopping_lists]
+            # Número de itens e total estimado de todas as listas em uma query
+            summaries = load_list_summaries(db, user_id)
+            lists_data = [
+                lst.to_dict(include_items=False, summary=summaries.get(lst.id))
+                for lst in shopping_lists
+            ]
             
             logger.info(f"Listas recuperadas: {len(lists_data)} para usuário {current_user_id}")
             
@@ -480,6 +492,9 @@ def add_item(current_user_id: str, list_id: str):
             db.commit()
             db.refresh(list_item)
             
+            # Atualizar rankings cacheados (pontua só as ofertas do novo produto)
+            ranking_item_added(db, list_item)
+            
             logger.info(f"Item adicionado à lista: {list_id} - produto {product_id}")
             
             return jsonify({
@@ -555,6 +570,7 @@ def delete_item(current_user_id: str, list_id: str, item_id: int):
             # Deletar item
             db.delete(list_item)
             db.commit()
+            ranking_item_removed(list_id, item_id)
             
             logger.info(f"Item removido: {item_id} da lista {list_id}")
             
@@ -648,6 +664,9 @@ def update_item(current_user_id: str, list_id: str, item_id: int):
             db.commit()
             db.refresh(list_item)
             
+            # Atualizar rankings cacheados (refaz só a combinação de lojas)
+            ranking_item_updated(list_id, item_id, quantity)
+            
             logger.info(f"Item atualizado: {item_id} - quantidade {quantity}")
             
             return jsonify({
@@ -6,20 +6,98 @@ Módulo responsável pelos endpoints de busca e detalhes de produtos.
 
 from flask import Blueprint, request, jsonify
 from sqlalchemy import or_, func, desc
-from typing import Optional
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
 import logging
 
 from src.config.database import get_db
+from src.config.settings import Settings
 from src.models.product import Product
 from src.models.offer import Offer
 from src.models.store import Store
-from src.services.cache import cache
+from src.services.cache import Tagged, cache
+from src.services.cache_tags import OFFERS_TAG, PRODUCTS_TAG, product_tag, store_tag
+from src.services.cache_warmup import WarmupEntry, cache_warmer
+from src.utils.http import payload_response
 
 logger = logging.getLogger(__name__)
+settings = Settings()
 
 # Criar blueprint
 products_bp = Blueprint('products', __name__)
 
+# Cache-Control por endpoint (após o max-age, o cliente revalida com a ETag)
+PRODUCT_CACHE_CONTROL = 'public, max-age=60'
+CATEGORIES_CACHE_CONTROL = 'public, max-age=3600'
+
+
+def _load_search(query: str, category: str, page: int, per_page: int) -> Tagged:
+    """
+    Executa a busca de produtos no banco.
+    
+    Args:
+        query: Termo de busca.
+        category: Categoria (opcional).
+        page: Número da página.
+        per_page: Itens por página.
+    
+    Returns:
+        Tagged: Resposta da busca e tags (produtos exibidos e catálogo).
+    """
+    db = next(get_db())
+    
+    try:
+        # Construir query
+        db_query = db.query(Product)
+        
+        # Filtrar por nome (busca parcial, case-insensitive)
+        if query:
+            db_query = db_query.filter(
+                Product.name.ilike(f'%{query}%')
+            )
+        
+        # Filtrar por categoria
+        if category:
+            db_query = db_query.filter(
+                Product.category.ilike(f'%{category}%')
+            )
+        
+        # Contar total
+        total = db_query.count()
+        
+        # Paginar
+        offset = (page - 1) * per_page
+        products = db_query.order_by(Product.name).offset(offset).limit(per_page).all()
+        
+        # Calcular total de páginas
+        total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+        
+        # Serializar produtos
+        products_data = [product.to_dict(include_offers=False) for product in products]
+        
+        result = {
+            "success": True,
+            "message": "Busca realizada com sucesso",
+            "data": {
+                "products": products_data,
+                "pagination": {
+                    "page": page,
+                    "per_page": per_page,
+                    "total": total,
+                    "pages": total_pages
+                }
+            }
+        }
+        
+        logger.info(f"Busca realizada: '{query}' - {total} resultados")
+        
+        # Novos produtos podem entrar na busca
+        tags = [product_tag(product.id) for product in products] + [PRODUCTS_TAG]
+        return Tagged(result, tags)
+    
+    finally:
+        db.close()
+
 
 @products_bp.route('/search', methods=['GET'])
 def search_products():
@@ -53,66 +131,15 @@ def search_products():
                 "message": "Query deve ter no mínimo 3 caracteres"
             }), 400
         
-        # Verificar cache
+        # Buscar do cache (invalidado por tags no commit; valor antigo servido durante o recálculo)
         cache_key = f"products_search:{query}:{category}:{page}:{per_page}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug(f"Cache hit para busca: {query}")
-            return jsonify(cached_result), 200
-        
-        # Obter sessão do banco
-        db = next(get_db())
-        
         try:
-            # Construir query
-            db_query = db.query(Product)
-            
-            # Filtrar por nome (busca parcial, case-insensitive)
-            if query:
-                db_query = db_query.filter(
-                    Product.name.ilike(f'%{query}%')
-                )
-            
-            # Filtrar por categoria
-            if category:
-                db_query = db_query.filter(
-                    Product.category.ilike(f'%{category}%')
-                )
-            
-            # Contar total
-            total = db_query.count()
-            
-            # Paginar
-            offset = (page - 1) * per_page
-            products = db_query.order_by(Product.name).offset(offset).limit(per_page).all()
-            
-            # Calcular total de páginas
-            total_pages = (total + per_page - 1) // per_page if total > 0 else 1
-            
-            # Serializar produtos
-            products_data = [product.to_dict(include_offers=False) for product in products]
-            
-            result = {
-                "success": True,
-                "message": "Busca realizada com sucesso",
-                "data": {
-                    "products": products_data,
-                    "pagination": {
-                        "page": page,
-                        "per_page": per_page,
-                        "total": total,
-                        "pages": total_pages
-                    }
-                }
-            }
-            
-            # Cachear resultado (1 hora)
-            cache.set(cache_key, result, ttl=3600)
-            
-            logger.info(f"Busca realizada: '{query}' - {total} resultados")
-            
-            return jsonify(result), 200
-        
+            result = cache.fetch(
+                cache_key,
+                lambda: _load_search(query, category, page, per_page),
+                ttl=settings.CACHE_ENTITY_TTL,
+                payload=True
+            ).value
         except Exception as e:
             logger.error(f"Erro ao buscar produtos: {e}", exc_info=True)
             return jsonify({
@@ -120,8 +147,7 @@ def search_products():
                 "message": "Erro interno ao buscar produtos"
             }), 500
         
-        finally:
-            db.close()
+        return payload_response(result)
     
     except ValueError as e:
         return jsonify({
@@ -137,6 +163,54 @@ def search_products():
         }), 500
 
 
+def _load_product(product_id: int) -> Optional[Tagged]:
+    """
+    Carrega um produto com as ofertas em estoque.
+    
+    Args:
+        product_id: ID do produto.
+    
+    Returns:
+        Optional[Tagged]: Resposta e tags (produto e lojas das ofertas), ou
+            None se o produto não existir.
+    """
+    db = next(get_db())
+    
+    try:
+        # Buscar produto
+        product = db.query(Product).filter(Product.id == product_id).first()
+        
+        if not product:
+            return None
+        
+        # Buscar ofertas atuais (apenas em estoque)
+        offers = db.query(Offer).filter(
+            Offer.product_id == product_id,
+            Offer.in_stock == True
+        ).order_by(Offer.price).all()
+        
+        # Serializar produto com ofertas
+        product_data = product.to_dict(include_offers=False)
+        product_data['offers'] = [offer.to_dict(include_store=True) for offer in offers]
+        product_data['offers_count'] = len(offers)
+        
+        result = {
+            "success": True,
+            "message": "Produto encontrado",
+            "data": {
+                "product": product_data
+            }
+        }
+        
+        logger.info(f"Produto recuperado: {product_id}")
+        
+        tags = [product_tag(product_id)] + sorted({store_tag(offer.store_id) for offer in offers})
+        return Tagged(result, tags)
+    
+    finally:
+        db.close()
+
+
 @products_bp.route('/<int:product_id>', methods=['GET'])
 def get_product(product_id: int):
     """
@@ -150,52 +224,10 @@ def get_product(product_id: int):
         500: Erro interno
     """
     try:
-        # Verificar cache
+        # Buscar do cache (invalidado por tags no commit; valor antigo servido durante o recálculo)
         cache_key = f"product:{product_id}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug(f"Cache hit para produto: {product_id}")
-            return jsonify(cached_result), 200
-        
-        # Obter sessão do banco
-        db = next(get_db())
-        
         try:
-            # Buscar produto
-            product = db.query(Product).filter(Product.id == product_id).first()
-            
-            if not product:
-                return jsonify({
-                    "success": False,
-                    "message": "Produto não encontrado"
-                }), 404
-            
-            # Buscar ofertas atuais (apenas em estoque)
-            offers = db.query(Offer).filter(
-                Offer.product_id == product_id,
-                Offer.in_stock == True
-            ).order_by(Offer.price).all()
-            
-            # Serializar produto com ofertas
-            product_data = product.to_dict(include_offers=False)
-            product_data['offers'] = [offer.to_dict(include_store=True) for offer in offers]
-            product_data['offers_count'] = len(offers)
-            
-            result = {
-                "success": True,
-                "message": "Produto encontrado",
-                "data": {
-                    "product": product_data
-                }
-            }
-            
-            # Cachear resultado (30 minutos)
-            cache.set(cache_key, result, ttl=1800)
-            
-            logger.info(f"Produto recuperado: {product_id}")
-            
-            return jsonify(result), 200
-        
+            result = cache.fetch(cache_key, lambda: _load_product(product_id), ttl=settings.CACHE_ENTITY_TTL, payload=True).value
         except Exception as e:
             logger.error(f"Erro ao buscar produto: {e}", exc_info=True)
             return jsonify({
@@ -203,8 +235,13 @@ def get_product(product_id: int):
                 "message": "Erro interno ao buscar produto"
             }), 500
         
-        finally:
-            db.close()
+        if result is None:
+            return jsonify({
+                "success": False,
+                "message": "Produto não encontrado"
+            }), 404
+        
+        return payload_response(result, cache_control=PRODUCT_CACHE_CONTROL)
     
     except Exception as e:
         logger.error(f"Erro inesperado ao buscar produto: {e}", exc_info=True)
@@ -214,47 +251,41 @@ def get_product(product_id: int):
         }), 500
 
 
-@products_bp.route('/<int:product_id>/offers', methods=['GET'])
-def get_product_offers(product_id: int):
+def _load_product_offers(product_id: int, sort: str, in_stock_only: bool) -> Optional[Tagged]:
     """
-    Retorna todas as ofertas de um produto.
-    
-    GET /api/products/:id/offers
+    Carrega as ofertas de um produto na ordem pedida.
     
-    Query Parameters:
-        sort: Ordenação (price_asc, price_desc, score) - padrão: price_asc
-        in_stock_only: Filtrar apenas em estoque (padrão: true)
+    Args:
+        product_id: ID do produto.
+        sort: Ordenação (price_asc, price_desc, score).
+        in_stock_only: Filtrar apenas em estoque.
     
     Returns:
-        200: Lista de ofertas ordenadas
-        404: Produto não encontrado
-        500: Erro interno
+        Optional[Tagged]: Resposta e tags (produto e lojas das ofertas), ou
+            None se o produto não existir.
     """
+    db = next(get_db())
+    
     try:
-        # Obter parâmetros
-        sort = request.args.get('sort', 'price_asc')
-        in_stock_only = request.args.get('in_stock_only', 'true').lower() == 'true'
+        # Verificar se produto existe
+        product = db.query(Product).filter(Product.id == product_id).first()
         
-        # Verificar cache
-        cache_key = f"product_offers:{product_id}:{sort}:{in_stock_only}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug(f"Cache hit para ofertas do produto: {product_id}")
-            return jsonify(cached_result), 200
+        if not product:
+            return None
         
-        # Obter sessão do banco
-        db = next(get_db())
+        summary = product.best_offers
         
-        try:
-            # Verificar se produto existe
-            product = db.query(Product).filter(Product.id == product_id).first()
-            
-            if not product:
-                return jsonify({
-                    "success": False,
-                    "message": "Produto não encontrado"
-                }), 404
-            
+        if summary is not None and in_stock_only and sort in ('price_asc', 'score'):
+            # Ler o top-N materializado (não depende de quantas lojas vendem o produto)
+            offer_ids = summary.top_by_price if sort == 'price_asc' else summary.top_by_discount
+            offers_by_id = {
+                offer.id: offer
+                for offer in db.query(Offer).options(
+                    joinedload(Offer.store)
+                ).filter(Offer.id.in_(offer_ids)).all()
+            } if offer_ids else {}
+            offers = [offers_by_id[offer_id] for offer_id in offer_ids if offer_id in offers_by_id]
+        else:
             # Construir query de ofertas
             offers_query = db.query(Offer).filter(Offer.product_id == product_id)
             
@@ -275,27 +306,65 @@ def get_product_offers(product_id: int):
                 )
             
             offers = offers_query.all()
-            
-            # Serializar ofertas com dados da loja
-            offers_data = [offer.to_dict(include_store=True, include_product=False) for offer in offers]
-            
-            result = {
-                "success": True,
-                "message": "Ofertas encontradas",
-                "data": {
-                    "product": product.to_dict(include_offers=False),
-                    "offers": offers_data,
-                    "count": len(offers_data)
-                }
+        
+        # Serializar ofertas com dados da loja
+        offers_data = [offer.to_dict(include_store=True, include_product=False) for offer in offers]
+        
+        result = {
+            "success": True,
+            "message": "Ofertas encontradas",
+            "data": {
+                "product": product.to_dict(include_offers=False),
+                "offers": offers_data,
+                "count": len(offers_data),
+                "price_stats": summary.price_stats() if summary is not None else None
             }
-            
-            # Cachear resultado (30 minutos)
-            cache.set(cache_key, result, ttl=1800)
-            
-            logger.info(f"Ofertas recuperadas: {product_id} - {len(offers)} ofertas")
-            
-            return jsonify(result), 200
+        }
         
+        logger.info(f"Ofertas recuperadas: {product_id} - {len(offers)} ofertas")
+        
+        tags = [product_tag(product_id)] + sorted({store_tag(offer.store_id) for offer in offers})
+        return Tagged(result, tags)
+    
+    finally:
+        db.close()
+
+
+@products_bp.route('/<int:product_id>/offers', methods=['GET'])
+def get_product_offers(product_id: int):
+    """
+    Retorna as ofertas de um produto.
+    
+    GET /api/products/:id/offers
+    
+    Query Parameters:
+        sort: Ordenação (price_asc, price_desc, score) - padrão: price_asc
+        in_stock_only: Filtrar apenas em estoque (padrão: true)
+    
+    Com in_stock_only e sort price_asc/score, retorna apenas o top-N
+    materializado em product_best_offers (no máximo BEST_OFFERS_TOP_N ofertas);
+    o total de ofertas em estoque fica em price_stats.offers_count. As demais
+    combinações retornam todas as ofertas.
+    
+    Returns:
+        200: Lista de ofertas ordenadas
+        404: Produto não encontrado
+        500: Erro interno
+    """
+    try:
+        # Obter parâmetros
+        sort = request.args.get('sort', 'price_asc')
+        in_stock_only = request.args.get('in_stock_only', 'true').lower() == 'true'
+        
+        # Buscar do cache (invalidado por tags no commit; valor antigo servido durante o recálculo)
+        cache_key = f"product_offers:{product_id}:{sort}:{in_stock_only}"
+        try:
+            result = cache.fetch(
+                cache_key,
+                lambda: _load_product_offers(product_id, sort, in_stock_only),
+                ttl=settings.CACHE_ENTITY_TTL,
+                payload=True
+            ).value
         except Exception as e:
             logger.error(f"Erro ao buscar ofertas: {e}", exc_info=True)
             return jsonify({
@@ -303,8 +372,13 @@ def get_product_offers(product_id: int):
                 "message": "Erro interno ao buscar ofertas"
             }), 500
         
-        finally:
-            db.close()
+        if result is None:
+            return jsonify({
+                "success": False,
+                "message": "Produto não encontrado"
+            }), 404
+        
+        return payload_response(result, cache_control=PRODUCT_CACHE_CONTROL)
     
     except Exception as e:
         logger.error(f"Erro inesperado ao buscar ofertas: {e}", exc_info=True)
@@ -314,6 +388,60 @@ def get_product_offers(product_id: int):
         }), 500
 
 
+def _load_categories() -> Tagged:
+    """
+    Carrega as categorias com a contagem de produtos.
+    
+    Returns:
+        Tagged: Resposta e tag do catálogo de produtos.
+    """
+    db = next(get_db())
+    
+    try:
+        # Buscar categorias com contagem de produtos
+        categories_query = db.query(
+            Product.category,
+            func.count(Product.id).label('count')
+        ).filter(
+            Product.category.isnot(None),
+            Product.category != ''
+        ).group_by(Product.category).order_by(Product.category).all()
+        
+        categories = [
+            {
+                'name': cat[0],
+                'count': cat[1]
+            }
+            for cat in categories_query
+        ]
+        
+        result = {
+            "success": True,
+            "message": "Categorias recuperadas com sucesso",
+            "data": {
+                "categories": categories,
+                "count": len(categories)
+            }
+        }
+        
+        logger.info(f"Categorias recuperadas: {len(categories)}")
+        
+        return Tagged(result, [PRODUCTS_TAG])
+    
+    finally:
+        db.close()
+
+
+def _categories_entry() -> WarmupEntry:
+    """
+    Entrada do cache das categorias.
+    
+    Returns:
+        WarmupEntry: Chave, função de cálculo e TTL.
+    """
+    return WarmupEntry('products_categories', _load_categories, settings.CACHE_ENTITY_TTL)
+
+
 @products_bp.route('/categories', methods=['GET'])
 def get_categories():
     """
@@ -326,50 +454,10 @@ def get_categories():
         500: Erro interno
     """
     try:
-        # Verificar cache
-        cache_key = 'products_categories'
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug("Cache hit para categorias")
-            return jsonify(cached_result), 200
-        
-        # Obter sessão do banco
-        db = next(get_db())
-        
+        # Buscar do cache (invalidado por tags no commit; valor antigo servido durante o recálculo)
         try:
-            # Buscar categorias com contagem de produtos
-            categories_query = db.query(
-                Product.category,
-                func.count(Product.id).label('count')
-            ).filter(
-                Product.category.isnot(None),
-                Product.category != ''
-            ).group_by(Product.category).order_by(Product.category).all()
-            
-            categories = [
-                {
-                    'name': cat[0],
-                    'count': cat[1]
-                }
-                for cat in categories_query
-            ]
-            
-            result = {
-                "success": True,
-                "message": "Categorias recuperadas com sucesso",
-                "data": {
-                    "categories": categories,
-                    "count": len(categories)
-                }
-            }
-            
-            # Cachear resultado (1 hora)
-            cache.set(cache_key, result, ttl=3600)
-            
-            logger.info(f"Categorias recuperadas: {len(categories)}")
-            
-            return jsonify(result), 200
-        
+            entry = _categories_entry()
+            result = cache.fetch(entry.key, entry.compute, ttl=entry.ttl, payload=True).value
         except Exception as e:
             logger.error(f"Erro ao buscar categorias: {e}", exc_info=True)
             return jsonify({
@@ -377,8 +465,7 @@ def get_categories():
                 "message": "Erro interno ao buscar categorias"
             }), 500
         
-        finally:
-            db.close()
+        return payload_response(result, cache_control=CATEGORIES_CACHE_CONTROL)
     
     except Exception as e:
         logger.error(f"Erro inesperado ao buscar categorias: {e}", exc_info=True)
@@ -388,6 +475,85 @@ def get_categories():
         }), 500
 
 
+def _load_popular(limit: int) -> Tagged:
+    """
+    Carrega os produtos com mais ofertas em estoque.
+    
+    Args:
+        limit: Número de produtos.
+    
+    Returns:
+        Tagged: Resposta e tags do catálogo de produtos e de ofertas.
+    """
+    db = next(get_db())
+    
+    try:
+        # Buscar produtos com mais ofertas (produtos mais "populares")
+        # A lógica pode ser melhorada adicionando um contador de buscas no futuro
+        popular_query = db.query(
+            Product,
+            func.count(Offer.id).label('offers_count')
+        ).join(
+            Offer, Product.id == Offer.product_id
+        ).filter(
+            Offer.in_stock == True
+        ).group_by(
+            Product.id
+        ).order_by(
+            desc('offers_count'),
+            Product.name
+        ).limit(limit).all()
+        
+        products = [prod[0] for prod in popular_query]
+        products_data = [product.to_dict(include_offers=False) for product in products]
+        
+        # Adicionar contagem de ofertas
+        for i, prod in enumerate(popular_query):
+            products_data[i]['offers_count'] = prod[1]
+        
+        result = {
+            "success": True,
+            "message": "Produtos populares recuperados com sucesso",
+            "data": {
+                "products": products_data,
+                "count": len(products_data)
+            }
+        }
+        
+        logger.info(f"Produtos populares recuperados: {len(products_data)}")
+        
+        return Tagged(result, [PRODUCTS_TAG, OFFERS_TAG])
+    
+    finally:
+        db.close()
+
+
+def _popular_entry(limit: int) -> WarmupEntry:
+    """
+    Entrada do cache dos produtos populares.
+    
+    Args:
+        limit: Número de produtos.
+    
+    Returns:
+        WarmupEntry: Chave, função de cálculo e TTL.
+    """
+    return WarmupEntry(f'products_popular:{limit}', lambda: _load_popular(limit), settings.CACHE_ENTITY_TTL)
+
+
+@cache_warmer.hot_keys('products')
+def _hot_product_keys() -> List[WarmupEntry]:
+    """
+    Chaves quentes de produtos: categorias e populares (CACHE_WARMUP_POPULAR_LIMITS).
+    
+    Returns:
+        List[WarmupEntry]: Entradas a aquecer.
+    """
+    entries = [_categories_entry()]
+    entries.extend(_popular_entry(limit) for limit in settings.CACHE_WARMUP_POPULAR_LIMITS)
+    return entries
+
+
 @products_bp.route('/popular', methods=['GET'])
 def get_popular_products():
     """
@@ -406,56 +572,10 @@ def get_popular_products():
         # Obter parâmetros
         limit = min(50, max(1, int(request.args.get('limit', 10))))
         
-        # Verificar cache
-        cache_key = f'products_popular:{limit}'
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug(f"Cache hit para produtos populares: {limit}")
-            return jsonify(cached_result), 200
-        
-        # Obter sessão do banco
-        db = next(get_db())
-        
+        # Buscar do cache (invalidado por tags no commit; valor antigo servido durante o recálculo)
         try:
-            # Buscar produtos com mais ofertas (produtos mais "populares")
-            # A lógica pode ser melhorada adicionando um contador de buscas no futuro
-            popular_query = db.query(
-                Product,
-                func.count(Offer.id).label('offers_count')
-            ).join(
-                Offer, Product.id == Offer.product_id
-            ).filter(
-                Offer.in_stock == True
-            ).group_by(
-                Product.id
-            ).order_by(
-                desc('offers_count'),
-                Product.name
-            ).limit(limit).all()
-            
-            products = [prod[0] for prod in popular_query]
-            products_data = [product.to_dict(include_offers=False) for product in products]
-            
-            # Adicionar contagem de ofertas
-            for i, prod in enumerate(popular_query):
-                products_data[i]['offers_count'] = prod[1]
-            
-            result = {
-                "success": True,
-                "message": "Produtos populares recuperados com sucesso",
-                "data": {
-                    "products": products_data,
-                    "count": len(products_data)
-                }
-            }
-            
-            # Cachear resultado (30 minutos)
-            cache.set(cache_key, result, ttl=1800)
-            
-            logger.info(f"Produtos populares recuperados: {len(products_data)}")
-            
-            return jsonify(result), 200
-        
+            entry = _popular_entry(limit)
+            result = cache.fetch(entry.key, entry.compute, ttl=entry.ttl, payload=True).value
         except Exception as e:
             logger.error(f"Erro ao buscar produtos populares: {e}", exc_info=True)
             return jsonify({
@@ -463,8 +583,7 @@ def get_popular_products():
                 "message": "Erro interno ao buscar produtos populares"
             }), 500
         
-        finally:
-            db.close()
+        return payload_response(result)
     
     except ValueError as e:
         return jsonify({
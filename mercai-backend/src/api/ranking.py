@@ -4,20 +4,76 @@ API de Ranking - Endpoints
 Módulo responsável pelos endpoints de geração de ranking de ofertas.
 """
 
-from flask import Blueprint, request, jsonify
-from typing import Optional, Dict
+from flask import Blueprint, Response, current_app, make_response, request, jsonify, stream_with_context
+from functools import wraps
+from typing import Optional, Dict, List, Iterator
+import json
 import logging
+import uuid
 
-from src.services.ranking import generate_ranking
-from src.utils.jwt import token_required
+from src.services.ranking import (
+    cached_ranking_etag,
+    generate_basket_ranking,
+    generate_ranking,
+    generate_rankings_batch,
+    stream_ranking,
+)
+from src.services.distance_matrix import distance_matrix
+from src.services.ranking_loader import load_list_signature
+from src.services.route_planner import plan_shopping_route
+from src.services.location import location_cache_stats
+from src.services.timing import span, stage_histograms, trace_request
+from src.utils.http import conditional_response, not_modified_response
+from src.utils.jwt import admin_required, token_required
+from src.config.settings import Settings
 from src.config.database import get_db
 from src.models.shopping_list import ShoppingList
 
 logger = logging.getLogger(__name__)
+settings = Settings()
 
 # Criar blueprint
 ranking_bp = Blueprint('ranking', __name__)
 
+# Rankings são do usuário e mudam com as ofertas: o cliente sempre revalida
+# com a ETag (304 sem corpo quando nada mudou)
+RANKING_CACHE_CONTROL = 'private, no-cache'
+
+
+def timed(f):
+    """
+    Decorator que instrumenta um endpoint de ranking.
+    
+    Mede as etapas do pipeline (spans de `timing`), envia o header
+    Server-Timing e, com debug habilitado (app em debug ou
+    RANKING_TIMINGS_DEBUG), inclui as durações em `data._timings`.
+    
+    Args:
+        f: Função do endpoint.
+    
+    Returns:
+        Função decorada.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        with trace_request() as trace:
+            response = make_response(f(*args, **kwargs))
+        
+        if trace is None or response.is_streamed:
+            return response
+        
+        response.headers['Server-Timing'] = trace.server_timing()
+        
+        if current_app.debug or settings.RANKING_TIMINGS_DEBUG:
+            body = response.get_json(silent=True)
+            if isinstance(body, dict) and isinstance(body.get('data'), dict):
+                body['data']['_timings'] = trace.as_dict()
+                response.set_data(current_app.json.dumps(body))
+        
+        return response
+    
+    return decorated
+
 
 def _validate_list_ownership(db, list_id: str, user_id: str) -> bool:
     """
@@ -36,10 +92,11 @@ def _validate_list_ownership(db, list_id: str, user_id: str) -> bool:
         list_uuid = uuid.UUID(list_id)
         user_uuid = uuid.UUID(user_id)
         
-        shopping_list = db.query(ShoppingList).filter(
-            ShoppingList.id == list_uuid,
-            ShoppingList.user_id == user_uuid
-        ).first()
+        with span('ownership'):
+            shopping_list = db.query(ShoppingList).filter(
+                ShoppingList.id == list_uuid,
+                ShoppingList.user_id == user_uuid
+            ).first()
         
         return shopping_list is not None
     
@@ -47,8 +104,189 @@ def _validate_list_ownership(db, list_id: str, user_id: str) -> bool:
         return False
 
 
+def _ranking_etag(
+    list_id: str,
+    variant: str,
+    signature: List,
+    user_location: Optional[Dict],
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None
+) -> Optional[str]:
+    """
+    Monta a ETag de uma representação do ranking cacheado.
+    
+    Args:
+        list_id: UUID da lista.
+        variant: Representação ("basic" ou "detailed"; os corpos diferem).
+        signature: Itens da lista (load_list_signature).
+        user_location: Localização do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra (opcional).
+    
+    Returns:
+        Optional[str]: ETag, ou None se o ranking não estiver no cache.
+    """
+    etag = cached_ranking_etag(list_id, signature, user_location, max_stores, store_penalty)
+    return f"{etag}-{variant}" if etag else None
+
+
+def _parse_max_stores(value: str) -> Optional[int]:
+    """
+    Converte o parâmetro max_stores (1 a 10).
+    
+    Args:
+        value: Valor da query string.
+    
+    Returns:
+        Optional[int]: Número de lojas ou None se fora do intervalo.
+    """
+    max_stores = int(value)
+    return max_stores if 1 <= max_stores <= 10 else None
+
+
+def _parse_store_penalty(value: str) -> Optional[float]:
+    """
+    Converte o parâmetro store_penalty (>= 0).
+    
+    Args:
+        value: Valor da query string.
+    
+    Returns:
+        Optional[float]: Penalidade ou None se negativa.
+    """
+    store_penalty = float(value)
+    return store_penalty if store_penalty >= 0 else None
+
+
+def _parse_cost_per_km(value: str) -> Optional[float]:
+    """
+    Converte o parâmetro cost_per_km (>= 0).
+    
+    Args:
+        value: Valor da query string.
+    
+    Returns:
+        Optional[float]: Custo em R$/km ou None se negativo.
+    """
+    cost_per_km = float(value)
+    return cost_per_km if cost_per_km >= 0 else None
+
+
+def _add_item_to_summary(totals: Dict, item: Dict) -> None:
+    """
+    Soma o total e a economia da melhor oferta de um item.
+    
+    Args:
+        totals: Acumulador com estimated_total, total_savings e items_count.
+        item: Item do ranking.
+    """
+    totals['items_count'] += 1
+    
+    best_offer = item.get('best_offer')
+    if best_offer:
+        price = float(best_offer.get('price', 0))
+        quantity = item.get('quantity', 1)
+        totals['estimated_total'] += price * quantity
+        
+        # Calcular economia (se houver preço original)
+        original_price = best_offer.get('original_price')
+        if original_price and original_price > price:
+            savings = (float(original_price) - price) * quantity
+            totals['total_savings'] += savings
+
+
+def _build_summary(ranking: Dict) -> Dict:
+    """
+    Calcula o total estimado e a economia de um ranking (melhor oferta de cada item).
+    
+    Args:
+        ranking: Ranking gerado por generate_ranking.
+    
+    Returns:
+        Dict: estimated_total, total_savings e items_count.
+    """
+    totals = {'estimated_total': 0.0, 'total_savings': 0.0, 'items_count': 0}
+    
+    for item in ranking.get('items', []):
+        _add_item_to_summary(totals, item)
+    
+    return _round_summary(totals)
+
+
+def _round_summary(totals: Dict) -> Dict:
+    """
+    Arredonda os valores do resumo para 2 casas decimais.
+    
+    Args:
+        totals: Acumulador do resumo.
+    
+    Returns:
+        Dict: Resumo arredondado.
+    """
+    return {
+        'estimated_total': round(totals['estimated_total'], 2),
+        'total_savings': round(totals['total_savings'], 2),
+        'items_count': totals['items_count']
+    }
+
+
+def _wants_ndjson() -> bool:
+    """
+    Verifica se o cliente pediu o ranking em streaming (NDJSON).
+    
+    Returns:
+        bool: True para `Accept: application/x-ndjson` ou `?stream=1`.
+    """
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return 'application/x-ndjson' in request.headers.get('Accept', '')
+
+
+def _ndjson_ranking(
+    list_id: str,
+    user_location: Optional[Dict],
+    max_stores: Optional[int],
+    store_penalty: Optional[float],
+    signature: List
+) -> Iterator[str]:
+    """
+    Serializa o ranking em streaming: uma linha JSON por item e uma linha final.
+    
+    Linhas:
+        {"type": "item", "item": {...}}
+        {"type": "summary", "list_id", "best_combination", "optimized_combination", "summary"}
+        {"type": "error", "list_id", "message"} (em caso de erro)
+    
+    Args:
+        list_id: UUID da lista.
+        user_location: Localização do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra (opcional).
+        signature: Itens da lista (load_list_signature).
+    
+    Yields:
+        str: Linhas NDJSON.
+    """
+    totals = {'estimated_total': 0.0, 'total_savings': 0.0, 'items_count': 0}
+    
+    for kind, payload in stream_ranking(
+        list_id, user_location, max_stores, store_penalty, signature=signature
+    ):
+        if kind == 'item':
+            _add_item_to_summary(totals, payload)
+            line = {"type": "item", "item": payload}
+        elif 'error' in payload:
+            logger.error(f"Erro ao gerar ranking em streaming: {payload['error']}")
+            line = {"type": "error", "list_id": list_id, "message": payload['error']}
+        else:
+            line = {"type": "summary", **payload, "summary": _round_summary(totals)}
+        
+        yield json.dumps(line, default=str) + "\n"
+
+
 @ranking_bp.route('', methods=['GET'])
 @token_required
+@timed
 def get_ranking(current_user_id: str):
     """
     Gera ranking básico para uma lista de compras.
@@ -88,6 +326,10 @@ def get_ranking(current_user_id: str):
                     "success": False,
                     "message": "Lista não encontrada ou sem permissão"
                 }), 404
+            
+            # Itens da lista (chave do cache): consultados uma vez por requisição
+            with span('cache_lookup'):
+                signature = load_list_signature(db, uuid.UUID(list_id))
         
         finally:
             db.close()
@@ -104,8 +346,15 @@ def get_ranking(current_user_id: str):
                 logger.warning(f"Coordenadas inválidas: lat={latitude}, lon={longitude}")
                 user_location = None
         
+        # Ranking já cacheado: a ETag é o hash gravado na entrada e o 304 sai
+        # sem deserializar nem serializar o ranking
+        etag = _ranking_etag(list_id, 'basic', signature, user_location)
+        not_modified = etag and not_modified_response(etag, RANKING_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
+        
         # Gerar ranking
-        ranking = generate_ranking(list_id, user_location)
+        ranking = generate_ranking(list_id, user_location, signature=signature)
         
         if 'error' in ranking:
             logger.error(f"Erro ao gerar ranking: {ranking.get('error')}")
@@ -116,11 +365,11 @@ def get_ranking(current_user_id: str):
         
         logger.info(f"Ranking gerado para lista: {list_id}")
         
-        return jsonify({
+        return conditional_response(jsonify({
             "success": True,
             "message": "Ranking gerado com sucesso",
             "data": ranking
-        }), 200
+        }), RANKING_CACHE_CONTROL, etag or _ranking_etag(list_id, 'basic', signature, user_location))
     
     except Exception as e:
         logger.error(f"Erro inesperado ao gerar ranking: {e}", exc_info=True)
@@ -132,18 +381,23 @@ def get_ranking(current_user_id: str):
 
 @ranking_bp.route('/<string:list_id>/detailed', methods=['GET'])
 @token_required
+@timed
 def get_detailed_ranking(current_user_id: str, list_id: str):
     """
     Gera ranking detalhado para uma lista de compras.
     
-    GET /api/ranking/:list_id/detailed?latitude=xxx&longitude=xxx
+    GET /api/ranking/:list_id/detailed?latitude=xxx&longitude=xxx&max_stores=3&store_penalty=5
     
     Query Parameters:
         latitude: Latitude do usuário (opcional).
         longitude: Longitude do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional, 1 a 10).
+        store_penalty: Penalidade em R$ por loja extra na cesta otimizada (opcional).
+        stream: 1 para resposta NDJSON em streaming (ou Accept: application/x-ndjson).
     
     Returns:
         200: Ranking detalhado com todas as ofertas (top 5) por produto e economia total
+        400: Parâmetros inválidos
         404: Lista não encontrada
         403: Usuário não tem permissão
         500: Erro interno
@@ -152,6 +406,22 @@ def get_detailed_ranking(current_user_id: str, list_id: str):
         latitude = request.args.get('latitude')
         longitude = request.args.get('longitude')
         
+        # Parâmetros da cesta otimizada (valores inválidos viram None)
+        max_stores = request.args.get('max_stores', type=_parse_max_stores)
+        store_penalty = request.args.get('store_penalty', type=_parse_store_penalty)
+        
+        if request.args.get('max_stores') and max_stores is None:
+            return jsonify({
+                "success": False,
+                "message": "max_stores deve estar entre 1 e 10"
+            }), 400
+        
+        if request.args.get('store_penalty') and store_penalty is None:
+            return jsonify({
+                "success": False,
+                "message": "store_penalty deve ser maior ou igual a zero"
+            }), 400
+        
         # Validar ownership
         db = next(get_db())
         
@@ -161,6 +431,10 @@ def get_detailed_ranking(current_user_id: str, list_id: str):
                     "success": False,
                     "message": "Lista não encontrada ou sem permissão"
                 }), 404
+            
+            # Itens da lista (chave do cache): consultados uma vez por requisição
+            with span('cache_lookup'):
+                signature = load_list_signature(db, uuid.UUID(list_id))
         
         finally:
             db.close()
@@ -177,8 +451,24 @@ def get_detailed_ranking(current_user_id: str, list_id: str):
                 logger.warning(f"Coordenadas inválidas: lat={latitude}, lon={longitude}")
                 user_location = None
         
+        # Streaming opcional (NDJSON): itens emitidos conforme são pontuados
+        if _wants_ndjson():
+            return Response(
+                stream_with_context(
+                    _ndjson_ranking(list_id, user_location, max_stores, store_penalty, signature)
+                ),
+                mimetype='application/x-ndjson',
+                headers={'X-Accel-Buffering': 'no'}
+            )
+        
+        # Ranking já cacheado: 304 sem deserializar nem serializar o ranking
+        etag = _ranking_etag(list_id, 'detailed', signature, user_location, max_stores, store_penalty)
+        not_modified = etag and not_modified_response(etag, RANKING_CACHE_CONTROL)
+        if not_modified:
+            return not_modified
+        
         # Gerar ranking
-        ranking = generate_ranking(list_id, user_location)
+        ranking = generate_ranking(list_id, user_location, max_stores, store_penalty, signature)
         
         if 'error' in ranking:
             logger.error(f"Erro ao gerar ranking detalhado: {ranking.get('error')}")
@@ -187,42 +477,464 @@ def get_detailed_ranking(current_user_id: str, list_id: str):
                 "message": ranking.get('error', "Erro ao gerar ranking")
             }), 500
         
-        # Calcular economia total
-        total_savings = 0.0
-        estimated_total = 0.0
-        
-        for item in ranking.get('items', []):
-            best_offer = item.get('best_offer')
-            if best_offer:
-                price = float(best_offer.get('price', 0))
-                quantity = item.get('quantity', 1)
-                estimated_total += price * quantity
-                
-                # Calcular economia (se houver preço original)
-                original_price = best_offer.get('original_price')
-                if original_price and original_price > price:
-                    savings = (float(original_price) - price) * quantity
-                    total_savings += savings
-        
-        # Adicionar informações de economia ao ranking
-        ranking['summary'] = {
-            'estimated_total': round(estimated_total, 2),
-            'total_savings': round(total_savings, 2),
-            'items_count': len(ranking.get('items', []))
-        }
+        # Adicionar informações de economia ao ranking (em uma cópia: o ranking
+        # cacheado é compartilhado com as outras leituras do L1)
+        ranking = {**ranking, "summary": _build_summary(ranking)}
         
         logger.info(f"Ranking detalhado gerado para lista: {list_id}")
         
+        return conditional_response(
+            jsonify({
+                "success": True,
+                "message": "Ranking detalhado gerado com sucesso",
+                "data": ranking
+            }),
+            RANKING_CACHE_CONTROL,
+            etag or _ranking_etag(list_id, 'detailed', signature, user_location, max_stores, store_penalty)
+        )
+    
+    except Exception as e:
+        logger.error(f"Erro inesperado ao gerar ranking detalhado: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Erro ao processar requisição"
+        }), 500
+
+
+@ranking_bp.route('/<string:list_id>/route', methods=['GET'])
+@token_required
+@timed
+def get_shopping_route(current_user_id: str, list_id: str):
+    """
+    Gera o roteiro de visita às lojas da cesta otimizada.
+    
+    GET /api/ranking/:list_id/route?latitude=xxx&longitude=xxx&max_stores=3&cost_per_km=1.2
+    
+    Query Parameters:
+        latitude: Latitude do usuário (opcional; sem ela o roteiro não volta à origem).
+        longitude: Longitude do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional, 1 a 10).
+        store_penalty: Penalidade em R$ por loja extra na cesta otimizada (opcional).
+        cost_per_km: Custo de deslocamento em R$/km (padrão: ROUTE_COST_PER_KM).
+    
+    Returns:
+        200: Paradas em ordem, km total, custo de deslocamento e economia líquida
+            em relação à melhor loja única
+        400: Parâmetros inválidos
+        404: Lista não encontrada
+        500: Erro interno
+    """
+    try:
+        max_stores = request.args.get('max_stores', type=_parse_max_stores)
+        store_penalty = request.args.get('store_penalty', type=_parse_store_penalty)
+        cost_per_km = request.args.get('cost_per_km', type=_parse_cost_per_km)
+        
+        if request.args.get('max_stores') and max_stores is None:
+            return jsonify({
+                "success": False,
+                "message": "max_stores deve estar entre 1 e 10"
+            }), 400
+        
+        if request.args.get('store_penalty') and store_penalty is None:
+            return jsonify({
+                "success": False,
+                "message": "store_penalty deve ser maior ou igual a zero"
+            }), 400
+        
+        if request.args.get('cost_per_km') and cost_per_km is None:
+            return jsonify({
+                "success": False,
+                "message": "cost_per_km deve ser maior ou igual a zero"
+            }), 400
+        
+        # Validar ownership
+        db = next(get_db())
+        
+        try:
+            if not _validate_list_ownership(db, list_id, current_user_id):
+                return jsonify({
+                    "success": False,
+                    "message": "Lista não encontrada ou sem permissão"
+                }), 404
+        
+        finally:
+            db.close()
+        
+        user_location = _body_location(request.args)
+        
+        with span('route'):
+            route = plan_shopping_route(list_id, user_location, max_stores, store_penalty, cost_per_km)
+        
+        if 'error' in route:
+            logger.error(f"Erro ao gerar roteiro: {route.get('error')}")
+            return jsonify({
+                "success": False,
+                "message": route.get('error', "Erro ao gerar roteiro")
+            }), 500
+        
         return jsonify({
             "success": True,
-            "message": "Ranking detalhado gerado com sucesso",
-            "data": ranking
+            "message": "Roteiro gerado com sucesso",
+            "data": route
         }), 200
     
     except Exception as e:
-        logger.error(f"Erro inesperado ao gerar ranking detalhado: {e}", exc_info=True)
+        logger.error(f"Erro inesperado ao gerar roteiro: {e}", exc_info=True)
         return jsonify({
             "success": False,
             "message": "Erro ao processar requisição"
         }), 500
 
+
+def _parse_optional(value, parser) -> Optional[float]:
+    """
+    Aplica um parser a um valor opcional do corpo JSON.
+    
+    Args:
+        value: Valor recebido (ou None).
+        parser: _parse_max_stores ou _parse_store_penalty.
+    
+    Returns:
+        Optional[float]: Valor convertido ou None se ausente/inválido.
+    """
+    if value is None:
+        return None
+    
+    try:
+        return parser(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _owned_list_ids(db, list_ids: List[str], user_id: str) -> set:
+    """
+    Retorna, em uma única query, quais das listas pertencem ao usuário.
+    
+    Args:
+        db: Sessão do banco de dados.
+        list_ids: UUIDs das listas (já validados).
+        user_id: UUID do usuário.
+    
+    Returns:
+        set: UUIDs (string) das listas do usuário.
+    """
+    with span('ownership'):
+        rows = db.query(ShoppingList.id).filter(
+            ShoppingList.id.in_([uuid.UUID(list_id) for list_id in list_ids]),
+            ShoppingList.user_id == uuid.UUID(user_id)
+        ).all()
+    
+    return {str(row.id) for row in rows}
+
+
+def _parse_body_options(data: Dict):
+    """
+    Converte max_stores e store_penalty do corpo JSON.
+    
+    Args:
+        data: Corpo da requisição.
+    
+    Returns:
+        Tuple: (max_stores, store_penalty, mensagem de erro ou None).
+    """
+    max_stores = _parse_optional(data.get('max_stores'), _parse_max_stores)
+    store_penalty = _parse_optional(data.get('store_penalty'), _parse_store_penalty)
+    
+    if data.get('max_stores') is not None and max_stores is None:
+        return None, None, "max_stores deve estar entre 1 e 10"
+    
+    if data.get('store_penalty') is not None and store_penalty is None:
+        return None, None, "store_penalty deve ser maior ou igual a zero"
+    
+    return max_stores, store_penalty, None
+
+
+def _body_location(data: Dict) -> Optional[Dict]:
+    """
+    Extrai a localização do usuário (latitude/longitude) do corpo JSON.
+    
+    Args:
+        data: Corpo da requisição.
+    
+    Returns:
+        Optional[Dict]: {'lat', 'lon'} ou None se ausente ou inválida.
+    """
+    latitude = data.get('latitude')
+    longitude = data.get('longitude')
+    if latitude is None or longitude is None:
+        return None
+    
+    try:
+        return {
+            'lat': float(latitude),
+            'lon': float(longitude)
+        }
+    except (TypeError, ValueError):
+        logger.warning(f"Coordenadas inválidas: lat={latitude}, lon={longitude}")
+        return None
+
+
+def _validate_baskets(baskets) -> Optional[str]:
+    """
+    Valida as cestas avulsas do ranking em lote.
+    
+    Args:
+        baskets: Valor de "baskets" no corpo da requisição.
+    
+    Returns:
+        Optional[str]: Mensagem de erro ou None se válidas.
+    """
+    if not isinstance(baskets, list):
+        return "baskets deve ser uma lista"
+    
+    for basket in baskets:
+        if not isinstance(basket, dict) or not isinstance(basket.get('items'), list):
+            return "Cada cesta deve ter uma lista de items"
+        
+        for line in basket['items']:
+            # bool é subclasse de int: true/false no JSON não são números
+            product_id = line.get('product_id') if isinstance(line, dict) else None
+            if not isinstance(product_id, int) or isinstance(product_id, bool):
+                return "Cada item da cesta deve ter product_id inteiro"
+            
+            quantity = line.get('quantity', 1)
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                return "quantity deve ser maior que zero"
+    
+    return None
+
+
+@ranking_bp.route('/batch', methods=['POST'])
+@token_required
+@timed
+def get_batch_ranking(current_user_id: str):
+    """
+    Gera os rankings de várias listas (e cestas avulsas) em uma única requisição.
+    
+    POST /api/ranking/batch
+    Body: {list_ids: [...], baskets: [{name, items: [{product_id, quantity}]}],
+           latitude, longitude, max_stores, store_penalty}
+    
+    A posse de todas as listas é validada em uma única query; ofertas de
+    produtos comuns às listas são carregadas e pontuadas uma só vez.
+    
+    Returns:
+        200: Rankings (com resumo) na ordem das listas, seguidos das cestas
+        400: Erro de validação
+        404: Alguma lista não encontrada ou sem permissão
+        500: Erro interno
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                "success": False,
+                "message": "Dados não fornecidos"
+            }), 400
+        
+        list_ids = data.get('list_ids', [])
+        baskets = data.get('baskets', [])
+        
+        if not isinstance(list_ids, list) or not all(isinstance(x, str) for x in list_ids):
+            return jsonify({
+                "success": False,
+                "message": "list_ids deve ser uma lista de UUIDs"
+            }), 400
+        
+        baskets_error = _validate_baskets(baskets)
+        if baskets_error:
+            return jsonify({
+                "success": False,
+                "message": baskets_error
+            }), 400
+        
+        total = len(list_ids) + len(baskets)
+        if total == 0 or total > settings.RANKING_BATCH_MAX_LISTS:
+            return jsonify({
+                "success": False,
+                "message": f"Informe de 1 a {settings.RANKING_BATCH_MAX_LISTS} listas ou cestas"
+            }), 400
+        
+        try:
+            list_ids = list(dict.fromkeys(str(uuid.UUID(list_id)) for list_id in list_ids))
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "message": "ID da lista inválido"
+            }), 400
+        
+        # Parâmetros da cesta otimizada
+        max_stores, store_penalty, options_error = _parse_body_options(data)
+        if options_error:
+            return jsonify({
+                "success": False,
+                "message": options_error
+            }), 400
+        
+        # Validar ownership de todas as listas em uma única query
+        if list_ids:
+            db = next(get_db())
+            
+            try:
+                owned = _owned_list_ids(db, list_ids, current_user_id)
+            
+            finally:
+                db.close()
+            
+            missing = [list_id for list_id in list_ids if list_id not in owned]
+            if missing:
+                return jsonify({
+                    "success": False,
+                    "message": "Lista não encontrada ou sem permissão",
+                    "data": {"list_ids": missing}
+                }), 404
+        
+        # Gerar rankings
+        rankings = generate_rankings_batch(
+            list_ids,
+            baskets,
+            _body_location(data),
+            max_stores,
+            store_penalty
+        )
+        
+        rankings = [{**ranking, "summary": _build_summary(ranking)} for ranking in rankings]
+        
+        logger.info(f"Ranking em lote gerado: {len(rankings)} rankings")
+        
+        return jsonify({
+            "success": True,
+            "message": "Rankings gerados com sucesso",
+            "data": {
+                "rankings": rankings,
+                "count": len(rankings)
+            }
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Erro inesperado ao gerar ranking em lote: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Erro ao processar requisição"
+        }), 500
+
+
+@ranking_bp.route('/basket', methods=['POST'])
+@timed
+def get_basket_ranking():
+    """
+    Gera o ranking de uma cesta avulsa, sem criar lista (não exige login).
+    
+    POST /api/ranking/basket
+    Body: {items: [{product_id, quantity}], latitude, longitude, max_stores, store_penalty}
+    
+    O resultado é cacheado pelo hash do conteúdo da cesta (e pela célula da
+    localização); nada é gravado no banco.
+    
+    Returns:
+        200: Ranking (com resumo) da cesta
+        400: Erro de validação
+        500: Erro interno
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                "success": False,
+                "message": "Dados não fornecidos"
+            }), 400
+        
+        items = data.get('items')
+        items_error = _validate_baskets([{"items": items}])
+        if items_error:
+            return jsonify({
+                "success": False,
+                "message": items_error
+            }), 400
+        
+        if not items or len(items) > settings.RANKING_BASKET_MAX_ITEMS:
+            return jsonify({
+                "success": False,
+                "message": f"Informe de 1 a {settings.RANKING_BASKET_MAX_ITEMS} itens"
+            }), 400
+        
+        # Parâmetros da cesta otimizada
+        max_stores, store_penalty, options_error = _parse_body_options(data)
+        if options_error:
+            return jsonify({
+                "success": False,
+                "message": options_error
+            }), 400
+        
+        # Gerar ranking
+        ranking = generate_basket_ranking(
+            items,
+            _body_location(data),
+            max_stores,
+            store_penalty
+        )
+        ranking = {**ranking, "summary": _build_summary(ranking)}
+        
+        logger.info(f"Ranking de cesta gerado: {ranking['basket_hash']}")
+        
+        return conditional_response(jsonify({
+            "success": True,
+            "message": "Ranking gerado com sucesso",
+            "data": ranking
+        }), RANKING_CACHE_CONTROL)
+    
+    except Exception as e:
+        logger.error(f"Erro inesperado ao gerar ranking de cesta: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "message": "Erro ao processar requisição"
+        }), 500
+
+
+@ranking_bp.route('/cache-stats', methods=['GET'])
+@token_required
+@admin_required
+def get_location_cache_stats(current_user_id: str):
+    """
+    Retorna os contadores de hit/miss dos caches chaveados por localização.
+    
+    GET /api/ranking/cache-stats (apenas administradores: ADMIN_USER_IDS)
+    
+    Returns:
+        200: Precisão do geohash e, por cache, hits, misses e deslocamento médio/máximo
+            (inclui o LRU da matriz de distâncias em `distance_matrix`; as
+            métricas por prefixo de chave estão em GET /api/cache/metrics)
+        403: Usuário não é administrador
+    """
+    data = location_cache_stats.snapshot()
+    data['distance_matrix'] = distance_matrix.snapshot()
+    
+    return jsonify({
+        "success": True,
+        "message": "Estatísticas de cache recuperadas com sucesso",
+        "data": data
+    }), 200
+
+
+@ranking_bp.route('/metrics', methods=['GET'])
+@token_required
+@admin_required
+def get_ranking_metrics(current_user_id: str):
+    """
+    Retorna os histogramas de duração das etapas do ranking.
+    
+    GET /api/ranking/metrics (apenas administradores: ADMIN_USER_IDS)
+    
+    Returns:
+        200: Número de requisições instrumentadas e, por etapa (ownership,
+            cache_lookup, load_list, load_offers, scoring, serialize,
+            build_entry, greedy_combination, basket_optimizer, cache_write,
+            total), contagens por bucket, média, máximo e p50/p95; soma e
+            máximo de offers_scored
+        403: Usuário não é administrador
+    """
+    return jsonify({
+        "success": True,
+        "message": "Métricas do ranking recuperadas com sucesso",
+        "data": stage_histograms.snapshot()
+    }), 200
@@ -7,53 +7,103 @@ Módulo responsável pelos endpoints de listagem e detalhes de lojas.
 from flask import Blueprint, request, jsonify
 from sqlalchemy import func, or_
 from decimal import Decimal
-from typing import Optional
+from typing import Any, Dict, List, Optional
 import logging
-import math
 
 from src.config.database import get_db
+from src.config.settings import Settings
 from src.models.store import Store
 from src.models.offer import Offer
-from src.services.cache import cache
+from src.services.cache import Tagged, cache
+from src.services.cache_tags import STORES_TAG, store_tag, store_offers_tag
+from src.services.cache_warmup import WarmupEntry, cache_warmer
+from src.services.location import quantize_location, location_cache_stats
+from src.services.distance_matrix import distance_matrix
+from src.utils.http import conditional_response, payload_response
 
 logger = logging.getLogger(__name__)
+settings = Settings()
 
 # Criar blueprint
 stores_bp = Blueprint('stores', __name__)
 
+# Cache-Control da listagem de lojas (após o max-age, o cliente revalida com a ETag)
+STORES_CACHE_CONTROL = 'public, max-age=300'
 
-def calculate_distance(lat1: Decimal, lon1: Decimal, lat2: Decimal, lon2: Decimal) -> float:
+# Parâmetros padrão das listagens (também usados no aquecimento do cache)
+DEFAULT_PER_PAGE = 20
+DEFAULT_NEARBY_RADIUS = 5.0
+DEFAULT_NEARBY_LIMIT = 10
+
+# Tempo de vida das lojas próximas (10 minutos)
+NEARBY_CACHE_TTL = 600
+
+
+def _load_stores(page: int, per_page: int) -> Tagged:
     """
-    Calcula distância em km entre dois pontos usando fórmula de Haversine.
+    Carrega uma página de lojas.
     
     Args:
-        lat1, lon1: Coordenadas do primeiro ponto
-        lat2, lon2: Coordenadas do segundo ponto
+        page: Número da página.
+        per_page: Itens por página.
     
     Returns:
-        float: Distância em quilômetros
+        Tagged: Resposta e tag da listagem de lojas.
     """
-    # Raio da Terra em km
-    R = 6371.0
-    
-    # Converter para float
-    lat1, lon1 = float(lat1), float(lon1)
-    lat2, lon2 = float(lat2), float(lon2)
-    
-    # Converter para radianos
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    
-    # Fórmula de Haversine
-    a = (
-        math.sin(dlat / 2) ** 2 +
-        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-        math.sin(dlon / 2) ** 2
-    )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
+    db = next(get_db())
     
-    return distance
+    try:
+        # Contar total
+        total = db.query(Store).count()
+        
+        # Paginar
+        offset = (page - 1) * per_page
+        stores = db.query(Store).order_by(Store.name).offset(offset).limit(per_page).all()
+        
+        # Calcular total de páginas
+        total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+        
+        # Serializar lojas
+        stores_data = [store.to_dict(include_offers=False) for store in stores]
+        
+        result = {
+            "success": True,
+            "message": "Lojas recuperadas com sucesso",
+            "data": {
+                "stores": stores_data,
+                "pagination": {
+                    "page": page,
+                    "per_page": per_page,
+                    "total": total,
+                    "pages": total_pages
+                }
+            }
+        }
+        
+        logger.info(f"Lojas recuperadas: {total}")
+        
+        return Tagged(result, [STORES_TAG])
+    
+    finally:
+        db.close()
+
+
+def _stores_entry(page: int, per_page: int) -> WarmupEntry:
+    """
+    Entrada do cache de uma página de lojas.
+    
+    Args:
+        page: Número da página.
+        per_page: Itens por página.
+    
+    Returns:
+        WarmupEntry: Chave, função de cálculo e TTL.
+    """
+    return WarmupEntry(
+        f'stores_list:{page}:{per_page}',
+        lambda: _load_stores(page, per_page),
+        settings.CACHE_ENTITY_TTL
+    )
 
 
 @stores_bp.route('', methods=['GET'])
@@ -73,53 +123,12 @@ def get_stores():
     """
     try:
         page = max(1, int(request.args.get('page', 1)))
-        per_page = min(50, max(1, int(request.args.get('per_page', 20))))
-        
-        # Verificar cache
-        cache_key = f'stores_list:{page}:{per_page}'
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug(f"Cache hit para lista de lojas: {page}")
-            return jsonify(cached_result), 200
-        
-        # Obter sessão do banco
-        db = next(get_db())
+        per_page = min(50, max(1, int(request.args.get('per_page', DEFAULT_PER_PAGE))))
         
+        # Buscar do cache (invalidado por tags no commit; valor antigo servido durante o recálculo)
         try:
-            # Contar total
-            total = db.query(Store).count()
-            
-            # Paginar
-            offset = (page - 1) * per_page
-            stores = db.query(Store).order_by(Store.name).offset(offset).limit(per_page).all()
-            
-            # Calcular total de páginas
-            total_pages = (total + per_page - 1) // per_page if total > 0 else 1
-            
-            # Serializar lojas
-            stores_data = [store.to_dict(include_offers=False) for store in stores]
-            
-            result = {
-                "success": True,
-                "message": "Lojas recuperadas com sucesso",
-                "data": {
-                    "stores": stores_data,
-                    "pagination": {
-                        "page": page,
-                        "per_page": per_page,
-                        "total": total,
-                        "pages": total_pages
-                    }
-                }
-            }
-            
-            # Cachear resultado (1 hora)
-            cache.set(cache_key, result, ttl=3600)
-            
-            logger.info(f"Lojas recuperadas: {total}")
-            
-            return jsonify(result), 200
-        
+            entry = _stores_entry(page, per_page)
+            result = cache.fetch(entry.key, entry.compute, ttl=entry.ttl, payload=True).value
         except Exception as e:
             logger.error(f"Erro ao buscar lojas: {e}", exc_info=True)
             return jsonify({
@@ -127,8 +136,7 @@ def get_stores():
                 "message": "Erro interno ao buscar lojas"
             }), 500
         
-        finally:
-            db.close()
+        return payload_response(result, cache_control=STORES_CACHE_CONTROL)
     
     except ValueError as e:
         return jsonify({
@@ -144,6 +152,51 @@ def get_stores():
         }), 500
 
 
+def _load_store(store_id: int) -> Optional[Tagged]:
+    """
+    Carrega uma loja com a contagem de ofertas em estoque.
+    
+    Args:
+        store_id: ID da loja.
+    
+    Returns:
+        Optional[Tagged]: Resposta e tags da loja, ou None se a loja não existir.
+    """
+    db = next(get_db())
+    
+    try:
+        # Buscar loja
+        store = db.query(Store).filter(Store.id == store_id).first()
+        
+        if not store:
+            return None
+        
+        # Buscar ofertas atuais (apenas em estoque)
+        offers_count = db.query(Offer).filter(
+            Offer.store_id == store_id,
+            Offer.in_stock == True
+        ).count()
+        
+        # Serializar loja
+        store_data = store.to_dict(include_offers=False)
+        store_data['offers_count'] = offers_count
+        
+        result = {
+            "success": True,
+            "message": "Loja encontrada",
+            "data": {
+                "store": store_data
+            }
+        }
+        
+        logger.info(f"Loja recuperada: {store_id}")
+        
+        return Tagged(result, [store_tag(store_id), store_offers_tag(store_id)])
+    
+    finally:
+        db.close()
+
+
 @stores_bp.route('/<int:store_id>', methods=['GET'])
 def get_store(store_id: int):
     """
@@ -157,51 +210,9 @@ def get_store(store_id: int):
         500: Erro interno
     """
     try:
-        # Verificar cache
-        cache_key = f'store:{store_id}'
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug(f"Cache hit para loja: {store_id}")
-            return jsonify(cached_result), 200
-        
-        # Obter sessão do banco
-        db = next(get_db())
-        
+        # Buscar do cache (invalidado por tags no commit; valor antigo servido durante o recálculo)
         try:
-            # Buscar loja
-            store = db.query(Store).filter(Store.id == store_id).first()
-            
-            if not store:
-                return jsonify({
-                    "success": False,
-                    "message": "Loja não encontrada"
-                }), 404
-            
-            # Buscar ofertas atuais (apenas em estoque)
-            offers_count = db.query(Offer).filter(
-                Offer.store_id == store_id,
-                Offer.in_stock == True
-            ).count()
-            
-            # Serializar loja
-            store_data = store.to_dict(include_offers=False)
-            store_data['offers_count'] = offers_count
-            
-            result = {
-                "success": True,
-                "message": "Loja encontrada",
-                "data": {
-                    "store": store_data
-                }
-            }
-            
-            # Cachear resultado (30 minutos)
-            cache.set(cache_key, result, ttl=1800)
-            
-            logger.info(f"Loja recuperada: {store_id}")
-            
-            return jsonify(result), 200
-        
+            result = cache.fetch(f'store:{store_id}', lambda: _load_store(store_id), ttl=settings.CACHE_ENTITY_TTL, payload=True).value
         except Exception as e:
             logger.error(f"Erro ao buscar loja: {e}", exc_info=True)
             return jsonify({
@@ -209,8 +220,13 @@ def get_store(store_id: int):
                 "message": "Erro interno ao buscar loja"
             }), 500
         
-        finally:
-            db.close()
+        if result is None:
+            return jsonify({
+                "success": False,
+                "message": "Loja não encontrada"
+            }), 404
+        
+        return payload_response(result)
     
     except Exception as e:
         logger.error(f"Erro inesperado ao buscar loja: {e}", exc_info=True)
@@ -220,6 +236,92 @@ def get_store(store_id: int):
         }), 500
 
 
+def _load_nearby(location: Dict[str, Any], radius: float, limit: int) -> Tagged:
+    """
+    Monta a resposta de lojas próximas a partir da matriz de distâncias.
+    
+    A resposta é a mesma para toda a célula: a localização pedida é
+    acrescentada pelo endpoint.
+    
+    Args:
+        location: Localização quantizada (centróide e célula).
+        radius: Raio de busca em km.
+        limit: Número máximo de lojas.
+    
+    Returns:
+        Tagged: Resposta e tag da listagem de lojas.
+    """
+    # Linha da matriz de distâncias da célula (índice espacial por baixo),
+    # já ordenada por distância
+    nearby_stores = distance_matrix.nearby(location, radius, limit)
+    
+    # Serializar (lojas já serializadas no índice: copiar antes de alterar)
+    stores_data = []
+    for store_data, distance in nearby_stores:
+        store_dict = dict(store_data)
+        store_dict['distance'] = round(distance, 2)
+        stores_data.append(store_dict)
+    
+    result = {
+        "success": True,
+        "message": "Lojas próximas recuperadas com sucesso",
+        "data": {
+            "stores": stores_data,
+            "count": len(stores_data),
+            "cell": location['cell'],
+            "radius": radius
+        }
+    }
+    
+    logger.info(f"Lojas próximas encontradas: {len(stores_data)} para a célula {location['cell']}")
+    
+    return Tagged(result, [STORES_TAG])
+
+
+def _nearby_entry(location: Dict[str, Any], radius: float, limit: int) -> WarmupEntry:
+    """
+    Entrada do cache de lojas próximas (10 minutos - dados de localização mudam).
+    
+    Args:
+        location: Localização quantizada (centróide e célula).
+        radius: Raio de busca em km.
+        limit: Número máximo de lojas.
+    
+    Returns:
+        WarmupEntry: Chave, função de cálculo e TTL.
+    """
+    return WarmupEntry(
+        f"stores_nearby:{location['cell']}:{radius}:{limit}",
+        lambda: _load_nearby(location, radius, limit),
+        NEARBY_CACHE_TTL
+    )
+
+
+@cache_warmer.hot_keys('stores')
+def _hot_store_keys() -> List[WarmupEntry]:
+    """
+    Chaves quentes de lojas: primeiras páginas (CACHE_WARMUP_STORE_PAGES) e
+    lojas próximas, com os parâmetros padrão, das localizações em
+    CACHE_WARMUP_LOCATIONS ("lat,lon;lat,lon").
+    
+    Returns:
+        List[WarmupEntry]: Entradas a aquecer.
+    """
+    entries = [
+        _stores_entry(page, DEFAULT_PER_PAGE)
+        for page in range(1, settings.CACHE_WARMUP_STORE_PAGES + 1)
+    ]
+    
+    for point in settings.CACHE_WARMUP_LOCATIONS.split(';'):
+        if not point.strip():
+            continue
+        lat, lon = (float(value) for value in point.split(','))
+        location = quantize_location({'lat': lat, 'lon': lon})
+        entries.append(_nearby_entry(location, DEFAULT_NEARBY_RADIUS, DEFAULT_NEARBY_LIMIT))
+    
+    return entries
+
+
 @stores_bp.route('/nearby', methods=['GET'])
 def get_nearby_stores():
     """
@@ -242,8 +344,8 @@ def get_nearby_stores():
         # Obter parâmetros
         lat_str = request.args.get('lat', '').strip()
         lon_str = request.args.get('lon', '').strip()
-        radius = min(50, max(1, float(request.args.get('radius', 5))))
-        limit = min(50, max(1, int(request.args.get('limit', 10))))
+        radius = min(50, max(1, float(request.args.get('radius', DEFAULT_NEARBY_RADIUS))))
+        limit = min(50, max(1, int(request.args.get('limit', DEFAULT_NEARBY_LIMIT))))
         
         # Validar coordenadas
         if not lat_str or not lon_str:
@@ -268,67 +370,16 @@ def get_nearby_stores():
                 "message": "Coordenadas fora do range válido"
             }), 400
         
-        # Verificar cache
-        cache_key = f'stores_nearby:{lat}:{lon}:{radius}:{limit}'
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.debug(f"Cache hit para lojas próximas: {lat}, {lon}")
-            return jsonify(cached_result), 200
-        
-        # Obter sessão do banco
-        db = next(get_db())
+        # Quantizar localização: a chave usa a célula geohash e as distâncias
+        # são calculadas a partir do centróide da célula
+        user_location = {'lat': float(lat), 'lon': float(lon)}
+        location = quantize_location(user_location)
         
+        # Buscar do cache (10 minutos - dados de localização mudam; valor
+        # antigo servido durante o recálculo)
+        entry = _nearby_entry(location, radius, limit)
         try:
-            # Buscar todas as lojas com coordenadas
-            stores = db.query(Store).filter(
-                Store.latitude.isnot(None),
-                Store.longitude.isnot(None)
-            ).all()
-            
-            # Calcular distâncias e filtrar
-            nearby_stores = []
-            for store in stores:
-                distance = calculate_distance(lat, lon, store.latitude, store.longitude)
-                
-                if distance <= radius:
-                    store_dict = store.to_dict(include_offers=False)
-                    store_dict['distance'] = round(distance, 2)
-                    nearby_stores.append((store, distance))
-            
-            # Ordenar por distância
-            nearby_stores.sort(key=lambda x: x[1])
-            
-            # Limitar resultados
-            nearby_stores = nearby_stores[:limit]
-            
-            # Serializar
-            stores_data = []
-            for store, distance in nearby_stores:
-                store_dict = store.to_dict(include_offers=False)
-                store_dict['distance'] = round(distance, 2)
-                stores_data.append(store_dict)
-            
-            result = {
-                "success": True,
-                "message": "Lojas próximas recuperadas com sucesso",
-                "data": {
-                    "stores": stores_data,
-                    "count": len(stores_data),
-                    "location": {
-                        "latitude": float(lat),
-                        "longitude": float(lon)
-                    },
-                    "radius": radius
-                }
-            }
-            
-            # Cachear resultado (10 minutos - dados de localização mudam)
-            cache.set(cache_key, result, ttl=600)
-            
-            logger.info(f"Lojas próximas encontradas: {len(stores_data)} para ({lat}, {lon})")
-            
-            return jsonify(result), 200
-        
+            fetched = cache.fetch(entry.key, entry.compute, ttl=entry.ttl)
         except Exception as e:
             logger.error(f"Erro ao buscar lojas próximas: {e}", exc_info=True)
             return jsonify({
@@ -336,8 +387,21 @@ def get_nearby_stores():
                 "message": "Erro interno ao buscar lojas próximas"
             }), 500
         
-        finally:
-            db.close()
+        location_cache_stats.record('stores_nearby', fetched.source != 'miss', user_location, location)
+        
+        # Ecoar as coordenadas pedidas, não o centróide da célula (em uma cópia:
+        # o valor cacheado é compartilhado com as outras leituras do L1)
+        result = fetched.value
+        return conditional_response(jsonify({
+            **result,
+            "data": {
+                **result['data'],
+                "location": {
+                    "latitude": user_location['lat'],
+                    "longitude": user_location['lon']
+                }
+            }
+        }))
     
     except ValueError as e:
         return jsonify({
@@ -84,10 +84,28 @@ def init_db() -> None:
         from src.models import offer  # noqa: F401
         from src.models import shopping_list  # noqa: F401
         from src.models import list_item  # noqa: F401
+        from src.models import product_best_offers  # noqa: F401
+        from src.models import geocode_cache  # noqa: F401
         
         # Criar todas as tabelas
         Base.metadata.create_all(bind=engine)
+        
+        # Índices adicionados depois da criação das tabelas (create_all não altera tabelas existentes)
+        for index in store.Store.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
         logger.info("Tabelas do banco de dados criadas com sucesso")
+        
+        # Preencher as melhores ofertas materializadas em bancos já populados
+        db = SessionLocal()
+        try:
+            best_offers = product_best_offers.ProductBestOffers
+            has_offers = db.query(offer.Offer.id).first() is not None
+            if has_offers and db.query(best_offers.product_id).first() is None:
+                count = best_offers.refresh(db)
+                db.commit()
+                logger.info(f"Melhores ofertas materializadas para {count} produtos")
+        finally:
+            db.close()
     except Exception as e:
         logger.error(f"Erro ao inicializar banco de dados: {e}")
         raise
@@ -35,6 +35,42 @@ class Settings:
     # Redis (Upstash)
     REDIS_URL: str = os.getenv('REDIS_URL', '')
     
+    # Cache L1 em memória por processo (na frente do Redis; único nível sem Redis)
+    CACHE_L1_ENABLED: bool = os.getenv('CACHE_L1_ENABLED', 'True').lower() == 'true'
+    CACHE_L1_MAX_ENTRIES: int = int(os.getenv('CACHE_L1_MAX_ENTRIES', '5000'))
+    CACHE_L1_TTL: int = int(os.getenv('CACHE_L1_TTL', '30'))
+    
+    # Tempo de vida mínimo (segundos) dos conjuntos de chaves por tag no Redis
+    CACHE_TAG_TTL: int = int(os.getenv('CACHE_TAG_TTL', '86400'))
+    
+    # TTL (segundos) das respostas invalidadas por tags após o commit (produtos,
+    # lojas, ofertas e rankings): a expiração é só uma rede de segurança
+    CACHE_ENTITY_TTL: int = int(os.getenv('CACHE_ENTITY_TTL', '172800'))
+    
+    # Stale-while-revalidate: janela (segundos) após o TTL em que o valor antigo
+    # ainda é servido enquanto um único chamador o recalcula (lock com expiração)
+    CACHE_STALE_TTL: int = int(os.getenv('CACHE_STALE_TTL', '300'))
+    CACHE_LOCK_TIMEOUT: float = float(os.getenv('CACHE_LOCK_TIMEOUT', '10'))
+    
+    # Entradas do cache com corpo JSON a partir deste tamanho são comprimidas (zstd/zlib)
+    CACHE_COMPRESS_MIN_BYTES: int = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', '1024'))
+    
+    # Intervalo (segundos) de envio dos contadores de métricas do cache ao Redis
+    CACHE_METRICS_FLUSH_INTERVAL: float = float(os.getenv('CACHE_METRICS_FLUSH_INTERVAL', '10'))
+    
+    # Aquecimento do cache (ver `cache_warmup`): entradas mais acessadas
+    # recalculadas na inicialização e a cada CACHE_WARMUP_INTERVAL segundos,
+    # com no máximo CACHE_WARMUP_CONCURRENCY conexões do banco em uso
+    CACHE_WARMUP_ENABLED: bool = os.getenv('CACHE_WARMUP_ENABLED', 'True').lower() == 'true'
+    CACHE_WARMUP_INTERVAL: float = float(os.getenv('CACHE_WARMUP_INTERVAL', '300'))
+    CACHE_WARMUP_CONCURRENCY: int = int(os.getenv('CACHE_WARMUP_CONCURRENCY', '2'))
+    CACHE_WARMUP_POPULAR_LIMITS: List[int] = [
+        int(limit) for limit in os.getenv('CACHE_WARMUP_POPULAR_LIMITS', '10,20,50').split(',') if limit.strip()
+    ]
+    CACHE_WARMUP_STORE_PAGES: int = int(os.getenv('CACHE_WARMUP_STORE_PAGES', '3'))
+    # Localizações "lat,lon" separadas por ";" (bairros com mais acessos)
+    CACHE_WARMUP_LOCATIONS: str = os.getenv('CACHE_WARMUP_LOCATIONS', '')
+    
     # IA (Google Gemini)
     GEMINI_API_KEY: str = os.getenv('GEMINI_API_KEY', '')
     
@@ -42,11 +78,57 @@ class Settings:
     JWT_SECRET_KEY: str = os.getenv('JWT_SECRET_KEY', SECRET_KEY)
     JWT_EXPIRATION_HOURS: int = int(os.getenv('JWT_EXPIRATION_HOURS', '24'))
     
+    # Administradores (user_ids separados por vírgula) com acesso às métricas
+    # internas (cache, ranking); vazio, nenhum usuário tem acesso
+    ADMIN_USER_IDS: List[str] = [
+        user_id.strip() for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()
+    ]
+    
     # Scraping
     USER_AGENT: str = os.getenv('USER_AGENT', 'MercAI/1.0 (Educational Project)')
     SCRAPING_DELAY_MIN: int = int(os.getenv('SCRAPING_DELAY_MIN', '1'))
     SCRAPING_DELAY_MAX: int = int(os.getenv('SCRAPING_DELAY_MAX', '3'))
     
+    # Ranking
+    RANKING_MAX_STORES: int = int(os.getenv('RANKING_MAX_STORES', '3'))
+    RANKING_STORE_PENALTY: float = float(os.getenv('RANKING_STORE_PENALTY', '0'))
+    RANKING_OPTIMIZER_BUDGET_MS: float = float(os.getenv('RANKING_OPTIMIZER_BUDGET_MS', '150'))
+    RANKING_BATCH_MAX_LISTS: int = int(os.getenv('RANKING_BATCH_MAX_LISTS', '20'))
+    RANKING_BATCH_WORKERS: int = int(os.getenv('RANKING_BATCH_WORKERS', '4'))
+    RANKING_BASKET_MAX_ITEMS: int = int(os.getenv('RANKING_BASKET_MAX_ITEMS', '200'))
+    
+    # Instrumentação do ranking (Server-Timing/histogramas; _timings na resposta se debug)
+    RANKING_TIMINGS_ENABLED: bool = os.getenv('RANKING_TIMINGS_ENABLED', 'True').lower() == 'true'
+    RANKING_TIMINGS_DEBUG: bool = os.getenv('RANKING_TIMINGS_DEBUG', 'False').lower() == 'true'
+    
+    # Melhores ofertas materializadas (tamanho dos rankings por preço e por desconto)
+    BEST_OFFERS_TOP_N: int = int(os.getenv('BEST_OFFERS_TOP_N', '10'))
+    
+    # Localização (precisão do geohash usado nas chaves de cache; 7 ≈ 150 m)
+    LOCATION_GEOHASH_PRECISION: int = int(os.getenv('LOCATION_GEOHASH_PRECISION', '7'))
+    
+    # Índice espacial de lojas (reconstruído após este tempo, em segundos);
+    # desligado, as buscas usam bounding box em SQL
+    STORE_INDEX_ENABLED: bool = os.getenv('STORE_INDEX_ENABLED', 'True').lower() == 'true'
+    STORE_INDEX_TTL: int = int(os.getenv('STORE_INDEX_TTL', '300'))
+    
+    # Matriz de distâncias célula × loja (LRU por célula geohash)
+    DISTANCE_MATRIX_RADIUS_KM: float = float(os.getenv('DISTANCE_MATRIX_RADIUS_KM', '50'))
+    DISTANCE_MATRIX_MAX_CELLS: int = int(os.getenv('DISTANCE_MATRIX_MAX_CELLS', '2048'))
+    DISTANCE_MATRIX_TTL: int = int(os.getenv('DISTANCE_MATRIX_TTL', '300'))
+    
+    # Geocoding (Nominatim ou servidor compatível; limite global entre workers)
+    NOMINATIM_URL: str = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+    GEOCODING_TIMEOUT: int = int(os.getenv('GEOCODING_TIMEOUT', '10'))
+    GEOCODING_RATE_PER_SECOND: float = float(os.getenv('GEOCODING_RATE_PER_SECOND', '1'))
+    GEOCODING_MAX_WAIT: float = float(os.getenv('GEOCODING_MAX_WAIT', '30'))
+    GEOCODING_NEGATIVE_TTL_DAYS: int = int(os.getenv('GEOCODING_NEGATIVE_TTL_DAYS', '7'))
+    GEOCODING_QUEUE_ENABLED: bool = os.getenv('GEOCODING_QUEUE_ENABLED', 'True').lower() == 'true'
+    
+    # Roteiro de compras (custo de deslocamento em R$/km; Held-Karp até N paradas, 2-opt acima)
+    ROUTE_COST_PER_KM: float = float(os.getenv('ROUTE_COST_PER_KM', '1.0'))
+    ROUTE_EXACT_MAX_STOPS: int = int(os.getenv('ROUTE_EXACT_MAX_STOPS', '8'))
+    
     # CORS
     CORS_ORIGINS: List[str] = os.getenv('CORS_ORIGINS', '*').split(',')
     
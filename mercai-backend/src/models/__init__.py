@@ -10,6 +10,8 @@ from src.models.product import Product
 from src.models.offer import Offer
 from src.models.shopping_list import ShoppingList
 from src.models.list_item import ListItem
+from src.models.product_best_offers import ProductBestOffers
+from src.models.geocode_cache import GeocodeCache
 
 __all__ = [
     'User',
@@ -18,4 +20,6 @@ __all__ = [
     'Offer',
     'ShoppingList',
     'ListItem',
+    'ProductBestOffers',
+    'GeocodeCache',
 ]
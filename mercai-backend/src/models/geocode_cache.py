@@ -0,0 +1,77 @@
+"""
+Model GeocodeCache - Resultados de Geocoding
+
+Model SQLAlchemy com os resultados persistentes do geocoding, chaveados pelo
+endereço normalizado. Endereços não encontrados também são registrados (sem
+coordenadas) para não serem consultados novamente a cada requisição.
+"""
+
+from datetime import datetime
+from typing import Optional, Dict
+from sqlalchemy import Column, String, DECIMAL, DateTime
+
+from src.config.database import Base
+
+
+class GeocodeCache(Base):
+    """
+    Model de resultado de geocoding.
+    
+    Attributes:
+        address: Endereço normalizado (PK).
+        latitude: Latitude encontrada (None se o endereço não foi encontrado).
+        longitude: Longitude encontrada (None se o endereço não foi encontrado).
+        provider: Nome do provedor que respondeu.
+        updated_at: Data da última consulta ao provedor.
+    """
+    
+    __tablename__ = 'geocode_cache'
+    
+    address = Column(
+        String(500),
+        primary_key=True,
+        nullable=False
+    )
+    latitude = Column(
+        DECIMAL(10, 8),
+        nullable=True
+    )
+    longitude = Column(
+        DECIMAL(11, 8),
+        nullable=True
+    )
+    provider = Column(
+        String(50),
+        nullable=False
+    )
+    updated_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        nullable=False
+    )
+    
+    @property
+    def found(self) -> bool:
+        """Indica se o provedor encontrou o endereço."""
+        return self.latitude is not None and self.longitude is not None
+    
+    def coordinates(self) -> Optional[Dict[str, float]]:
+        """
+        Retorna as coordenadas no formato de geo.geocode_address.
+        
+        Returns:
+            Optional[Dict[str, float]]: {'lat', 'lon'} ou None se não encontrado.
+        """
+        if not self.found:
+            return None
+        return {'lat': float(self.latitude), 'lon': float(self.longitude)}
+    
+    def __repr__(self) -> str:
+        """
+        Representação string do objeto.
+        
+        Returns:
+            str: Representação do resultado.
+        """
+        return f"<GeocodeCache(address={self.address}, found={self.found})>"
@@ -69,6 +69,12 @@ class Product(Base):
         back_populates='product',
         cascade='all, delete-orphan'
     )
+    best_offers = relationship(
+        'ProductBestOffers',
+        back_populates='product',
+        uselist=False,
+        cascade='all, delete-orphan'
+    )
     
     def to_dict(self, include_offers: bool = False) -> Dict[str, Any]:
         """
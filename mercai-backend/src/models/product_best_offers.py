@@ -0,0 +1,364 @@
+"""
+Model ProductBestOffers - Melhores Ofertas Materializadas
+
+Model SQLAlchemy com o resumo pré-calculado das ofertas em estoque de cada
+produto (top-N por preço e por desconto, candidatas do ranking por score,
+menor preço por loja, preço mínimo/mediano/máximo).
+É reconstruído, apenas para os produtos afetados, sempre que ofertas mudam.
+"""
+
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import chain
+from statistics import median
+from typing import Optional, Dict, Any, List, Iterable
+import logging
+
+from sqlalchemy import Column, Integer, ForeignKey, DECIMAL, DateTime, JSON, event, inspect
+from sqlalchemy.orm import relationship, Session, joinedload
+
+from src.config.database import Base
+from src.config.settings import Settings
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Chave em session.info com os produtos cujas ofertas mudaram
+PENDING_PRODUCTS_KEY = 'best_offers_pending_products'
+
+# Tamanho máximo do IN (...) por query
+MAX_IN_CLAUSE = 900
+
+CENT = Decimal('0.01')
+
+# Folga sobre o score máximo de proximidade no corte das candidatas
+# (absorve o arredondamento em 2 casas dos scores)
+SCORE_MARGIN = 0.05
+
+
+class ProductBestOffers(Base):
+    """
+    Model do resumo materializado das ofertas de um produto.
+    
+    Attributes:
+        product_id: ID do produto (PK/FK).
+        offers_count: Número de ofertas em estoque.
+        min_price: Menor preço em estoque.
+        median_price: Preço mediano em estoque.
+        max_price: Maior preço em estoque.
+        top_by_price: IDs das N ofertas mais baratas (menor preço primeiro).
+        top_by_discount: IDs das N primeiras ofertas na ordem de score (maior
+            desconto primeiro; ofertas sem desconto em seguida, por preço).
+        score_candidates: IDs das ofertas que podem entrar no top-N do ranking
+            por score para qualquer localização do usuário.
+        store_prices: Pares [store_id, menor preço] de todas as lojas que
+            vendem o produto (entrada do otimizador de cesta).
+        updated_at: Data da última reconstrução.
+    """
+    
+    __tablename__ = 'product_best_offers'
+    
+    product_id = Column(
+        Integer,
+        ForeignKey('products.id', ondelete='CASCADE'),
+        primary_key=True,
+        nullable=False
+    )
+    offers_count = Column(
+        Integer,
+        default=0,
+        nullable=False
+    )
+    min_price = Column(
+        DECIMAL(10, 2),
+        nullable=True
+    )
+    median_price = Column(
+        DECIMAL(10, 2),
+        nullable=True
+    )
+    max_price = Column(
+        DECIMAL(10, 2),
+        nullable=True
+    )
+    top_by_price = Column(
+        JSON,
+        default=list,
+        nullable=False
+    )
+    top_by_discount = Column(
+        JSON,
+        default=list,
+        nullable=False
+    )
+    score_candidates = Column(
+        JSON,
+        default=list,
+        nullable=False
+    )
+    store_prices = Column(
+        JSON,
+        default=list,
+        nullable=False
+    )
+    updated_at = Column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        nullable=False
+    )
+    
+    # Relacionamentos
+    product = relationship(
+        'Product',
+        back_populates='best_offers'
+    )
+    
+    def update_from_offers(self, offers: List[Any], top_n: int) -> None:
+        """
+        Recalcula o resumo a partir das ofertas em estoque do produto.
+        
+        Args:
+            offers: Ofertas em estoque do produto.
+            top_n: Número de ofertas guardadas em cada ranking.
+        """
+        prices = [Decimal(offer.price) for offer in offers]
+        
+        self.offers_count = len(offers)
+        self.min_price = min(prices) if prices else None
+        self.max_price = max(prices) if prices else None
+        self.median_price = (
+            Decimal(median(prices)).quantize(CENT, rounding=ROUND_HALF_UP) if prices else None
+        )
+        
+        by_price = sorted(offers, key=lambda o: (o.price, o.id))
+        self.top_by_price = [offer.id for offer in by_price[:top_n]]
+        
+        # Todas as ofertas em estoque entram no ranking por score, para que
+        # produtos com poucas (ou nenhuma) ofertas com desconto preencham o top-N
+        by_score = sorted(offers, key=lambda o: (-_effective_discount(o), o.price, o.id))
+        self.top_by_discount = [offer.id for offer in by_score[:top_n]]
+        self.score_candidates = _score_candidates(offers, self.max_price, top_n)
+        
+        # Menor preço por loja (ordem por store_id)
+        store_prices: Dict[int, Decimal] = {}
+        for offer, price in zip(offers, prices):
+            if offer.store_id not in store_prices or price < store_prices[offer.store_id]:
+                store_prices[offer.store_id] = price
+        self.store_prices = [[store_id, float(price)] for store_id, price in sorted(store_prices.items())]
+    
+    def candidate_offer_ids(self) -> List[int]:
+        """
+        Retorna os IDs das ofertas candidatas do ranking por score.
+        
+        Returns:
+            List[int]: IDs de ofertas (maior score sem proximidade primeiro).
+        """
+        return list(self.score_candidates or [])
+    
+    def price_stats(self) -> Dict[str, Any]:
+        """
+        Serializa as estatísticas de preço.
+        
+        Returns:
+            Dict[str, Any]: offers_count, min_price, median_price e max_price.
+        """
+        return {
+            'offers_count': self.offers_count,
+            'min_price': float(self.min_price) if self.min_price is not None else None,
+            'median_price': float(self.median_price) if self.median_price is not None else None,
+            'max_price': float(self.max_price) if self.max_price is not None else None,
+        }
+    
+    @classmethod
+    def refresh(
+        cls,
+        session: Session,
+        product_ids: Optional[Iterable[int]] = None,
+        top_n: Optional[int] = None
+    ) -> int:
+        """
+        Reconstrói o resumo dos produtos informados (ou de todos).
+        
+        Não faz commit: as linhas ficam pendentes na sessão.
+        
+        Args:
+            session: Sessão do banco de dados.
+            product_ids: IDs dos produtos (None = todos os produtos).
+            top_n: Tamanho dos rankings (padrão: BEST_OFFERS_TOP_N).
+        
+        Returns:
+            int: Número de produtos reconstruídos.
+        """
+        from src.models.offer import Offer
+        from src.models.product import Product
+        
+        top_n = top_n or settings.BEST_OFFERS_TOP_N
+        
+        if product_ids is None:
+            ids = [row.id for row in session.query(Product.id).all()]
+        else:
+            ids = sorted(set(product_ids))
+        
+        offers_by_product: Dict[int, List[Offer]] = {product_id: [] for product_id in ids}
+        existing: Dict[int, 'ProductBestOffers'] = {}
+        live_products = set()
+        
+        for start in range(0, len(ids), MAX_IN_CLAUSE):
+            chunk = ids[start:start + MAX_IN_CLAUSE]
+            
+            live_products.update(
+                row.id for row in session.query(Product.id).filter(Product.id.in_(chunk)).all()
+            )
+            existing.update(
+                (row.product_id, row)
+                for row in session.query(cls).filter(cls.product_id.in_(chunk)).all()
+            )
+            
+            offers = session.query(Offer).options(
+                joinedload(Offer.store)
+            ).filter(
+                Offer.product_id.in_(chunk),
+                Offer.in_stock == True
+            ).all()
+            for offer in offers:
+                offers_by_product[offer.product_id].append(offer)
+        
+        for product_id in ids:
+            row = existing.get(product_id)
+            
+            # Produto removido: descartar o resumo
+            if product_id not in live_products:
+                if row is not None:
+                    session.delete(row)
+                continue
+            
+            if row is None:
+                row = cls(product_id=product_id)
+                session.add(row)
+            
+            row.update_from_offers(offers_by_product[product_id], top_n)
+        
+        logger.debug(f"Melhores ofertas reconstruídas para {len(ids)} produtos")
+        return len(ids)
+    
+    def __repr__(self) -> str:
+        """
+        Representação string do objeto.
+        
+        Returns:
+            str: Representação do resumo.
+        """
+        return f"<ProductBestOffers(product_id={self.product_id}, offers_count={self.offers_count}, min_price={self.min_price})>"
+
+
+def _effective_discount(offer: Any) -> float:
+    """
+    Desconto da oferta com a mesma regra de Offer.to_dict.
+    
+    Args:
+        offer: Oferta.
+    
+    Returns:
+        float: Percentual de desconto (0 se não houver).
+    """
+    if offer.discount_percentage:
+        return float(offer.discount_percentage)
+    return offer.calculate_discount_percentage() or 0.0
+
+
+def _score_candidates(offers: List[Any], max_price: Optional[Decimal], top_n: int) -> List[int]:
+    """
+    Seleciona as ofertas que podem entrar no top-N do ranking por score.
+    
+    O score sem proximidade não depende do usuário; a proximidade soma no
+    máximo PROXIMITY_MAX_SCORE pontos. Uma oferta cujo score sem proximidade
+    fique mais que isso abaixo do N-ésimo melhor é superada por N ofertas em
+    qualquer localização e pode ficar de fora.
+    
+    Args:
+        offers: Ofertas em estoque do produto (com lojas).
+        max_price: Maior preço em estoque (normalização do score de preço).
+        top_n: Tamanho do ranking.
+    
+    Returns:
+        List[int]: IDs das candidatas (maior score sem proximidade primeiro).
+    """
+    from src.services.scoring import PROXIMITY_MAX_SCORE, build_offer_columns, score_offer_columns
+    
+    if not offers:
+        return []
+    
+    scores = score_offer_columns(build_offer_columns(offers), max_price=float(max_price))
+    order = sorted(range(len(offers)), key=lambda index: (-scores[index], offers[index].id))
+    
+    if len(order) <= top_n:
+        return [offers[index].id for index in order]
+    
+    cutoff = scores[order[top_n - 1]] - PROXIMITY_MAX_SCORE - SCORE_MARGIN
+    return [offers[index].id for index in order if scores[index] >= cutoff]
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_offers(session: Session, flush_context, instances) -> None:
+    """
+    Registra os produtos cujas ofertas serão inseridas, alteradas ou removidas.
+    
+    Args:
+        session: Sessão sendo sincronizada.
+        flush_context: Contexto do flush.
+        instances: Instâncias (não usado).
+    """
+    from src.models.offer import Offer
+    
+    pending = session.info.setdefault(PENDING_PRODUCTS_KEY, set())
+    
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Offer):
+            continue
+        
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        
+        # Produto atual e, se product_id mudou, o anterior
+        pending.add(obj.product_id)
+        pending.update(
+            product_id
+            for product_id in inspect(obj).attrs.product_id.history.deleted
+            if product_id is not None
+        )
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_changed_products(session: Session) -> None:
+    """
+    Reconstrói o resumo dos produtos afetados antes do commit.
+    
+    Só faz flush se houver ofertas pendentes na sessão (o próprio commit
+    sincroniza o restante).
+    
+    Args:
+        session: Sessão sendo confirmada.
+    """
+    from src.models.offer import Offer
+    
+    if any(isinstance(obj, Offer) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.flush()
+    
+    pending = session.info.pop(PENDING_PRODUCTS_KEY, None)
+    if not pending:
+        return
+    
+    ProductBestOffers.refresh(session, pending)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_changed_products(session: Session, previous_transaction) -> None:
+    """
+    Descarta os produtos pendentes quando a transação é desfeita.
+    
+    Args:
+        session: Sessão.
+        previous_transaction: Transação desfeita.
+    """
+    session.info.pop(PENDING_PRODUCTS_KEY, None)
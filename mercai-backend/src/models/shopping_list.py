@@ -83,6 +83,10 @@ class ShoppingList(Base):
         """
         Calcula o total estimado da lista baseado nas ofertas mais baratas.
         
+        Usa o menor preço materializado em product_best_offers; produtos sem
+        resumo caem na varredura das ofertas. Carrega itens, produtos e
+        ofertas: para várias listas, usar `load_list_summaries` (1 query).
+        
         Returns:
             Optional[float]: Total estimado ou None se não houver itens/offers.
         """
@@ -93,7 +97,12 @@ class ShoppingList(Base):
         has_prices = False
         
         for item in self.items:
-            if item.product and item.product.offers:
+            summary = item.product.best_offers if item.product else None
+            if summary is not None:
+                if summary.min_price is not None:
+                    total += summary.min_price * item.quantity
+                    has_prices = True
+            elif item.product and item.product.offers:
                 # Pegar a oferta mais barata
                 cheapest_offer = min(
                     item.product.offers,
@@ -104,7 +113,8 @@ class ShoppingList(Base):
                     total += item_total
                     has_prices = True
         
-        return float(total) if has_prices else None
+        # Mesmo arredondamento do resumo agregado (load_list_summaries)
+        return round(float(total), 2) if has_prices else None
     
     def get_best_stores(self, limit: int = 5) -> List[Dict[str, Any]]:
         """
@@ -157,13 +167,20 @@ class ShoppingList(Base):
         
         return result
     
-    def to_dict(self, include_items: bool = False, include_user: bool = False) -> Dict[str, Any]:
+    def to_dict(
+        self,
+        include_items: bool = False,
+        include_user: bool = False,
+        summary: Optional[Any] = None
+    ) -> Dict[str, Any]:
         """
         Serializa a lista para dicionário.
         
         Args:
             include_items: Se deve incluir os itens da lista.
             include_user: Se deve incluir dados do usuário.
+            summary: Resumo pré-calculado (`ListSummary`, com items_count e
+                estimated_total); sem ele, o total vem de `calculate_total`.
         
         Returns:
             Dict[str, Any]: Dicionário com dados da lista.
@@ -182,13 +199,17 @@ class ShoppingList(Base):
             data['longitude'] = float(self.longitude)
         
         # Calcular total estimado
-        total = self.calculate_total()
+        if summary is not None:
+            total = summary.estimated_total
+            data['items_count'] = summary.items_count
+        else:
+            total = self.calculate_total()
+            data['items_count'] = len(self.items)
         if total is not None:
             data['estimated_total'] = total
         
         if include_items and self.items:
             data['items'] = [item.to_dict(include_product=True) for item in self.items]
-            data['items_count'] = len(self.items)
         
         if include_user and self.user:
             data['user'] = self.user.to_dict(include_email=False)
@@ -7,7 +7,7 @@ Model SQLAlchemy para representar lojas/supermercados do sistema.
 from datetime import datetime
 from typing import Optional, Dict, Any
 from decimal import Decimal
-from sqlalchemy import Column, Integer, String, Text, DECIMAL, DateTime
+from sqlalchemy import Column, Integer, String, Text, DECIMAL, DateTime, Index
 from sqlalchemy.orm import relationship
 
 from src.config.database import Base
@@ -72,6 +72,11 @@ class Store(Base):
         nullable=False
     )
     
+    # Índice composto para o pré-filtro por bounding box das buscas por raio
+    __table_args__ = (
+        Index('idx_stores_location', 'latitude', 'longitude'),
+    )
+    
     # Relacionamentos
     offers = relationship(
         'Offer',
@@ -0,0 +1,447 @@
+"""
+Basket Optimizer - Otimizador de Cesta Multi-Loja
+
+Módulo responsável por encontrar a forma mais barata de comprar a lista inteira
+usando no máximo K lojas (branch-and-bound com poda por limite inferior).
+"""
+
+from typing import Dict, List, Optional, Any, Tuple
+import heapq
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Custo atribuído a um item sem loja no conjunto escolhido.
+# Grande o bastante para que cobrir mais itens sempre seja preferível.
+MISSING_ITEM_COST = 1e9
+
+# Intervalo (em nós) entre verificações do orçamento de tempo
+TIME_CHECK_INTERVAL = 256
+
+
+class _SubsetCostCache:
+    """
+    Memoiza o vetor de custo por item de subconjuntos de lojas (bitmask).
+    
+    O vetor de um subconjunto é derivado do vetor do subconjunto sem a
+    última loja. Os totais de todos os subconjuntos visitados pela busca
+    ficam memoizados; os vetores, apenas os pedidos explicitamente (busca
+    gulosa e descrição das soluções), para limitar o uso de memória.
+    """
+    
+    def __init__(self, costs: np.ndarray, penalty: float):
+        """
+        Inicializa o cache.
+        
+        Args:
+            costs: Matriz (lojas x itens) com quantidade * preço (MISSING_ITEM_COST se indisponível).
+            penalty: Penalidade por loja extra.
+        """
+        self.costs = costs
+        self.penalty = penalty
+        n_items = costs.shape[1]
+        self._vectors: Dict[int, np.ndarray] = {0: np.full(n_items, MISSING_ITEM_COST)}
+        self._totals: Dict[int, float] = {}
+    
+    def vector(self, mask: int) -> np.ndarray:
+        """
+        Retorna o menor custo de cada item usando as lojas do bitmask.
+        
+        Args:
+            mask: Bitmask das lojas.
+        
+        Returns:
+            np.ndarray: Custo mínimo por item (MISSING_ITEM_COST se nenhuma loja vende).
+        """
+        cached = self._vectors.get(mask)
+        if cached is not None:
+            return cached
+        
+        last = mask.bit_length() - 1
+        vector = np.minimum(self.vector(mask & ~(1 << last)), self.costs[last])
+        self._vectors[mask] = vector
+        return vector
+    
+    def total(self, mask: int, vector: Optional[np.ndarray] = None) -> float:
+        """
+        Retorna o custo total (itens + penalidade) de um subconjunto.
+        
+        Args:
+            mask: Bitmask das lojas.
+            vector: Custo mínimo por item, se já calculado pela busca.
+        
+        Returns:
+            float: Custo total, com MISSING_ITEM_COST por item não coberto.
+        """
+        cached = self._totals.get(mask)
+        if cached is not None:
+            return cached
+        
+        if vector is None:
+            vector = self.vector(mask)
+        total = float(vector.sum())
+        total += self.penalty * max(bin(mask).count('1') - 1, 0)
+        self._totals[mask] = total
+        return total
+
+
+def _is_minimal(costs: np.ndarray, stores: List[int], vector: np.ndarray) -> bool:
+    """
+    Verifica se todas as lojas do conjunto vendem ao menos um item pelo menor preço.
+    
+    Args:
+        costs: Matriz (lojas x itens).
+        stores: Índices das lojas do conjunto.
+        vector: Custo mínimo por item do conjunto.
+    
+    Returns:
+        bool: True se nenhuma loja é supérflua.
+    """
+    covered = vector < MISSING_ITEM_COST
+    assigned = np.argmin(costs[stores], axis=0)[covered]
+    return len(set(assigned.tolist())) == len(stores)
+
+
+def _greedy(cache: _SubsetCostCache, n_stores: int, max_stores: int) -> int:
+    """
+    Solução gulosa: adiciona, uma a uma, a loja que mais reduz o custo.
+    
+    Args:
+        cache: Cache de custos de subconjuntos.
+        n_stores: Número de lojas candidatas.
+        max_stores: Limite de lojas.
+    
+    Returns:
+        int: Bitmask da solução.
+    """
+    mask = 0
+    best_total = np.inf
+    
+    for _ in range(min(max_stores, n_stores)):
+        candidate_mask = None
+        candidate_total = best_total
+        for store in range(n_stores):
+            if mask & (1 << store):
+                continue
+            total = cache.total(mask | (1 << store))
+            if total < candidate_total:
+                candidate_mask = mask | (1 << store)
+                candidate_total = total
+        
+        if candidate_mask is None:
+            break
+        
+        mask = candidate_mask
+        best_total = candidate_total
+    
+    return mask
+
+
+def optimize_basket(
+    items: List[Dict[str, Any]],
+    stores: Dict[Any, Dict[str, Any]],
+    max_stores: int = 3,
+    store_penalty: float = 0.0,
+    time_budget_ms: float = 150.0,
+    alternatives: int = 3
+) -> Dict[str, Any]:
+    """
+    Encontra o conjunto de até `max_stores` lojas que minimiza o custo da lista.
+    
+    Custo = soma (quantidade * menor preço entre as lojas escolhidas) +
+    `store_penalty` por loja além da primeira. Itens sem oferta em nenhuma
+    loja são ignorados e reportados em `unavailable_product_ids`.
+    
+    A busca é um branch-and-bound sobre as lojas (ordenadas pelo custo
+    isolado), podando ramos cujo limite inferior — o custo com todas as lojas
+    ainda disponíveis — não supera a k-ésima melhor solução. Se o orçamento de
+    tempo esgotar, retorna a melhor solução encontrada até então (no pior caso,
+    a gulosa) com `optimal: False`.
+    
+    Args:
+        items: Itens da lista: [{product_id, quantity, offers: {store_id: price}}].
+        stores: Dados das lojas por store_id.
+        max_stores: Número máximo de lojas (K).
+        store_penalty: Penalidade (R$) por loja extra.
+        time_budget_ms: Orçamento de tempo da busca exata.
+        alternatives: Número de soluções alternativas a retornar.
+    
+    Returns:
+        Dict[str, Any]: Conjunto ótimo de lojas, atribuição item -> loja e alternativas.
+    """
+    started = time.perf_counter()
+    max_stores = max(1, int(max_stores))
+    store_penalty = max(0.0, float(store_penalty or 0.0))
+    
+    available = [item for item in items if item.get('offers')]
+    unavailable = [item.get('product_id') for item in items if not item.get('offers')]
+    
+    store_ids = sorted({store_id for item in available for store_id in item['offers']}, key=str)
+    
+    if not available or not store_ids:
+        return _empty_result(max_stores, store_penalty, unavailable)
+    
+    # Matriz de custos (lojas x itens)
+    costs = np.full((len(store_ids), len(available)), MISSING_ITEM_COST)
+    store_position = {store_id: position for position, store_id in enumerate(store_ids)}
+    for column, item in enumerate(available):
+        quantity = item.get('quantity', 1)
+        for store_id, price in item['offers'].items():
+            costs[store_position[store_id], column] = float(price) * quantity
+    
+    # Ordenar lojas pelo custo isolado (melhores primeiro) para achar boas soluções cedo
+    standalone = costs.sum(axis=1)
+    order = np.argsort(standalone, kind='stable')
+    costs = costs[order]
+    store_ids = [store_ids[position] for position in order]
+    n_stores = len(store_ids)
+    
+    # suffix_min[j] = menor custo de cada item usando as lojas j..n-1
+    suffix_min = np.full((n_stores + 1, len(available)), MISSING_ITEM_COST)
+    for j in range(n_stores - 1, -1, -1):
+        suffix_min[j] = np.minimum(suffix_min[j + 1], costs[j])
+    
+    cache = _SubsetCostCache(costs, store_penalty)
+    keep = max(1, alternatives + 1)
+    
+    # Melhores soluções (max-heap por custo via valor negativo)
+    best: List[Tuple[float, int, int]] = []
+    seen = set()
+    
+    def record(mask: int, chosen: List[int], vector: np.ndarray, force: bool = False) -> None:
+        if mask in seen:
+            return
+        seen.add(mask)
+        if not force and not _is_minimal(costs, chosen, vector):
+            return
+        total = cache.total(mask, vector)
+        entry = (-total, -len(chosen), mask)
+        if len(best) < keep:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+    
+    def threshold() -> float:
+        return -best[0][0] if len(best) >= keep else np.inf
+    
+    # Solução inicial gulosa (também é o fallback)
+    greedy_mask = _greedy(cache, n_stores, max_stores)
+    greedy_chosen = [j for j in range(n_stores) if greedy_mask & (1 << j)]
+    record(greedy_mask, greedy_chosen, cache.vector(greedy_mask), force=True)
+    
+    nodes = 0
+    timed_out = False
+    deadline = started + time_budget_ms / 1000.0
+    
+    # Busca em profundidade: (bitmask, lojas escolhidas, vetor de custos, próxima loja)
+    stack = [(0, [], np.full(len(available), MISSING_ITEM_COST), 0)]
+    while stack:
+        mask, chosen, vector, start = stack.pop()
+        nodes += 1
+        
+        if nodes % TIME_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+            timed_out = True
+            break
+        
+        if chosen:
+            record(mask, chosen, vector)
+        
+        if len(chosen) >= max_stores:
+            continue
+        
+        if start >= n_stores:
+            continue
+        
+        # Vetores de todos os filhos de uma vez (uma linha por loja candidata)
+        child_vectors = np.minimum(vector, costs[start:])
+        
+        # Limite inferior de cada filho: custo usando também todas as lojas restantes
+        lower_bounds = np.minimum(child_vectors, suffix_min[start + 1:]).sum(axis=1)
+        lower_bounds += store_penalty * len(chosen)
+        
+        limit = threshold()
+        children = [
+            (mask | (1 << j), chosen + [j], child_vectors[j - start], j + 1)
+            for j in range(start, n_stores)
+            if lower_bounds[j - start] < limit
+        ]
+        
+        # Explorar primeiro as lojas mais baratas
+        stack.extend(reversed(children))
+    
+    ranked = sorted(best, key=lambda entry: (-entry[0], -entry[1]))
+    best_mask = ranked[0][2]
+    
+    if timed_out:
+        logger.warning(
+            f"Otimizador de cesta excedeu {time_budget_ms}ms "
+            f"({n_stores} lojas, {len(available)} itens); usando melhor solução parcial"
+        )
+    
+    result = _describe(best_mask, costs, store_ids, stores, available, cache)
+    result.update({
+        "strategy": "greedy" if best_mask == greedy_mask and timed_out else "branch_and_bound",
+        "optimal": not timed_out,
+        "max_stores": max_stores,
+        "store_penalty": round(store_penalty, 2),
+        "unavailable_product_ids": unavailable,
+        "alternatives": [
+            _describe_alternative(mask, store_ids, stores, cache, costs)
+            for _, _, mask in ranked[1:alternatives + 1]
+        ],
+        "nodes_explored": nodes,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+    return result
+
+
+def _store_summary(store_id: Any, stores: Dict[Any, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Retorna os dados da loja (ou apenas o id, se desconhecida).
+    
+    Args:
+        store_id: ID da loja.
+        stores: Dados das lojas por store_id.
+    
+    Returns:
+        Dict[str, Any]: Dados da loja.
+    """
+    return dict(stores.get(store_id) or {"id": store_id})
+
+
+def _describe(
+    mask: int,
+    costs: np.ndarray,
+    store_ids: List[Any],
+    stores: Dict[Any, Dict[str, Any]],
+    items: List[Dict[str, Any]],
+    cache: _SubsetCostCache
+) -> Dict[str, Any]:
+    """
+    Monta a descrição de uma solução (lojas, atribuição e totais).
+    
+    Args:
+        mask: Bitmask da solução.
+        costs: Matriz (lojas x itens).
+        store_ids: IDs das lojas na ordem da matriz.
+        stores: Dados das lojas por store_id.
+        items: Itens com ofertas.
+        cache: Cache de custos de subconjuntos.
+    
+    Returns:
+        Dict[str, Any]: Lojas, atribuição, total estimado e custo total.
+    """
+    chosen = [j for j in range(len(store_ids)) if mask & (1 << j)]
+    chosen_costs = costs[chosen]
+    winners = np.argmin(chosen_costs, axis=0)
+    
+    per_store = {j: {"estimated_total": 0.0, "items_count": 0} for j in chosen}
+    assignment = []
+    uncovered = []
+    estimated_total = 0.0
+    
+    for column, item in enumerate(items):
+        row = winners[column]
+        item_total = chosen_costs[row, column]
+        if item_total >= MISSING_ITEM_COST:
+            uncovered.append(item.get('product_id'))
+            continue
+        
+        j = chosen[row]
+        store_id = store_ids[j]
+        quantity = item.get('quantity', 1)
+        
+        per_store[j]["estimated_total"] += float(item_total)
+        per_store[j]["items_count"] += 1
+        estimated_total += float(item_total)
+        
+        assignment.append({
+            "product_id": item.get('product_id'),
+            "store_id": store_id,
+            "quantity": quantity,
+            "price": round(float(item['offers'][store_id]), 2),
+            "item_total": round(float(item_total), 2)
+        })
+    
+    stores_data = []
+    for j in chosen:
+        store_data = _store_summary(store_ids[j], stores)
+        store_data["estimated_total"] = round(per_store[j]["estimated_total"], 2)
+        store_data["items_count"] = per_store[j]["items_count"]
+        stores_data.append(store_data)
+    
+    return {
+        "stores": stores_data,
+        "store_ids": [store_ids[j] for j in chosen],
+        "estimated_total": round(estimated_total, 2),
+        "total_cost": round(estimated_total + cache.penalty * max(len(chosen) - 1, 0), 2),
+        "assignment": assignment,
+        "uncovered_product_ids": uncovered
+    }
+
+
+def _describe_alternative(
+    mask: int,
+    store_ids: List[Any],
+    stores: Dict[Any, Dict[str, Any]],
+    cache: _SubsetCostCache,
+    costs: np.ndarray
+) -> Dict[str, Any]:
+    """
+    Monta a descrição resumida de uma solução alternativa.
+    
+    Args:
+        mask: Bitmask da solução.
+        store_ids: IDs das lojas na ordem da matriz.
+        stores: Dados das lojas por store_id.
+        cache: Cache de custos de subconjuntos.
+        costs: Matriz (lojas x itens).
+    
+    Returns:
+        Dict[str, Any]: Lojas, total estimado e custo total.
+    """
+    chosen = [j for j in range(len(store_ids)) if mask & (1 << j)]
+    vector = cache.vector(mask)
+    covered = vector < MISSING_ITEM_COST
+    estimated_total = float(vector[covered].sum())
+    
+    return {
+        "store_ids": [store_ids[j] for j in chosen],
+        "store_names": [_store_summary(store_ids[j], stores).get('name') for j in chosen],
+        "estimated_total": round(estimated_total, 2),
+        "total_cost": round(estimated_total + cache.penalty * max(len(chosen) - 1, 0), 2),
+        "uncovered_count": int((~covered).sum())
+    }
+
+
+def _empty_result(max_stores: int, store_penalty: float, unavailable: List[Any]) -> Dict[str, Any]:
+    """
+    Resultado para listas sem nenhuma oferta disponível.
+    
+    Args:
+        max_stores: Limite de lojas.
+        store_penalty: Penalidade por loja extra.
+        unavailable: Produtos sem oferta.
+    
+    Returns:
+        Dict[str, Any]: Resultado vazio.
+    """
+    return {
+        "stores": [],
+        "store_ids": [],
+        "estimated_total": 0.0,
+        "total_cost": 0.0,
+        "assignment": [],
+        "uncovered_product_ids": [],
+        "strategy": "branch_and_bound",
+        "optimal": True,
+        "max_stores": max_stores,
+        "store_penalty": round(store_penalty, 2),
+        "unavailable_product_ids": unavailable,
+        "alternatives": [],
+        "nodes_explored": 0,
+        "elapsed_ms": 0.0
+    }
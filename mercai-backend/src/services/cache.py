@@ -2,20 +2,191 @@
 Cache Service - Redis Wrapper
 
 Módulo responsável por gerenciar cache usando Redis com padrão Singleton.
+
+O cache tem dois níveis: um LRU em memória por processo (L1, ver
+`local_cache`) na frente do Redis (L2). Escritas e invalidações são
+propagadas aos outros workers via pub/sub do Redis; sem Redis, o L1
+funciona sozinho.
+
+Entradas podem ser marcadas com tags (ex: "product:42", "store:7",
+"list:<uuid>"): cada tag é um SET no Redis com as chaves dependentes, e
+`invalidate_tags` remove exatamente essas chaves, sem varrer o keyspace.
+
+`fetch` protege chaves caras contra stampede: após o TTL, o valor antigo
+continua sendo servido por CACHE_STALE_TTL segundos enquanto um único
+chamador (lock no Redis ou no processo) o recalcula; o valor antigo também é
+servido quando o recálculo falha (ex: banco fora do ar).
+
+As entradas são gravadas no formato de `cache_codec` (JSON comprimido acima
+de CACHE_COMPRESS_MIN_BYTES); com `fetch(..., payload=True)` o corpo é
+devolvido sem deserializar, para ser enviado direto na resposta HTTP. No L1,
+o corpo e o valor deserializado ficam junto dos bytes (ver `LocalEntry`), então
+cada entrada é deserializada uma única vez por worker.
+
+Hits, misses, escritas, erros, bytes e latência do Redis são contados por
+prefixo de chave em `cache.metrics` (ver `cache_metrics`).
 """
 
 import json
 import hashlib
-from typing import Optional, Any, Callable, Dict
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple
 from functools import wraps
 import redis
 import logging
 
 from src.config.settings import Settings
+from src.services import cache_codec
+from src.services.cache_codec import Payload
+from src.services.cache_metrics import CacheMetrics
+from src.services.local_cache import L1Policy, LocalCache
 
 logger = logging.getLogger(__name__)
 settings = Settings()
 
+# Canal de pub/sub das invalidações do L1
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+# Prefixo dos SETs com as chaves de cada tag
+TAG_KEY_PREFIX = 'tag:'
+
+# Chaves por lote no SCAN/DELETE de invalidate_pattern
+SCAN_BATCH_SIZE = 500
+
+# Prefixo dos locks de recálculo
+LOCK_KEY_PREFIX = 'lock:'
+
+# Intervalo (segundos) entre as leituras de quem aguarda outro chamador recalcular
+LOCK_POLL_INTERVAL = 0.05
+
+# Libera o lock apenas se ele ainda pertencer a quem o obteve
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Política do L1 por prefixo de chave (parte antes do primeiro ':')
+L1_POLICIES: Dict[str, L1Policy] = {
+    'products_categories': L1Policy(ttl=300),
+    'stores_list': L1Policy(ttl=300),
+    'store': L1Policy(ttl=300),
+    'product': L1Policy(ttl=60),
+    'product_offers': L1Policy(ttl=30),
+    'products_popular': L1Policy(ttl=60),
+    'products_search': L1Policy(ttl=30),
+    'stores_nearby': L1Policy(ttl=60),
+}
+DEFAULT_L1_POLICY = L1Policy()
+
+
+class CacheEntry(NamedTuple):
+    """
+    Valor lido do cache.
+    
+    Attributes:
+        value: Valor deserializado (ou `Payload`, em leituras sem deserializar).
+        stale: True se passou do TTL "soft" (dentro da janela de stale).
+    """
+    
+    value: Any
+    stale: bool
+
+
+class LocalEntry:
+    """
+    Entrada do L1: os bytes serializados e, a partir da primeira leitura de
+    cada forma, o corpo (`Payload`) e o valor deserializado.
+    
+    O valor deserializado é compartilhado por todas as leituras sem
+    `payload` (`get`, `get_many`, `fetch`) enquanto a entrada estiver no L1:
+    quem for alterá-lo deve trabalhar em uma cópia.
+    """
+    
+    def __init__(self, raw: bytes):
+        """
+        Inicializa a entrada.
+        
+        Args:
+            raw: Entrada serializada (ver `cache_codec.encode`).
+        """
+        self.raw = raw
+        self._payload: Optional[Tuple[Payload, Optional[float]]] = None
+        self._value: Optional[Tuple[Any, Optional[float]]] = None
+    
+    def payload(self) -> Tuple[Payload, Optional[float]]:
+        """
+        Corpo sem deserializar (cabeçalho lido uma única vez).
+        
+        Returns:
+            Tuple[Payload, Optional[float]]: Corpo e fim do TTL "soft".
+        """
+        if self._payload is None:
+            self._payload = cache_codec.decode_payload(self.raw)
+        return self._payload
+    
+    def value(self) -> Tuple[Any, Optional[float]]:
+        """
+        Valor deserializado (JSON lido uma única vez).
+        
+        Returns:
+            Tuple[Any, Optional[float]]: Valor e fim do TTL "soft".
+        """
+        if self._value is None:
+            payload, fresh_until = self.payload()
+            self._value = (payload.value(), fresh_until)
+        return self._value
+
+
+class Tagged(NamedTuple):
+    """
+    Valor devolvido por uma função de cálculo de `fetch` com as tags da entrada.
+    
+    Attributes:
+        value: Valor a cachear.
+        tags: Tags da entrada (ver `CacheService.invalidate_tags`).
+    """
+    
+    value: Any
+    tags: List[str]
+
+
+class CacheItem(NamedTuple):
+    """
+    Entrada a gravar com `CacheService.set_many`.
+    
+    Attributes:
+        key: Chave do cache.
+        value: Valor a ser serializado.
+        ttl: Tempo de vida em segundos.
+        tags: Tags da entrada (ver `CacheService.invalidate_tags`).
+        stale_ttl: Janela de stale após o `ttl` (0 desabilita).
+    """
+    
+    key: str
+    value: Any
+    ttl: int = 3600
+    tags: Iterable[str] = ()
+    stale_ttl: int = 0
+
+
+class FetchResult(NamedTuple):
+    """
+    Resultado de `CacheService.fetch`.
+    
+    Attributes:
+        value: Valor (None se a função de cálculo não encontrou nada), ou
+            `Payload` quando pedido com `payload=True`.
+        source: "hit" (valor válido), "stale" (valor antigo servido) ou "miss" (recalculado).
+    """
+    
+    value: Any
+    source: str
+
 
 class CacheService:
     """
@@ -49,9 +220,10 @@ class CacheService:
         try:
             # Conectar ao Redis
             if settings.REDIS_URL:
+                # Respostas em bytes: as entradas são binárias (ver cache_codec)
                 self._client = redis.from_url(
                     settings.REDIS_URL,
-                    decode_responses=True
+                    decode_responses=False
                 )
                 # Testar conexão
                 self._client.ping()
@@ -63,11 +235,50 @@ class CacheService:
             logger.error(f"Erro ao conectar ao Redis: {e}")
             self._client = None
         
+        # L1 em memória e assinatura das invalidações dos outros workers
+        self._local = LocalCache(settings.CACHE_L1_MAX_ENTRIES)
+        self._origin = uuid.uuid4().hex
+        self._subscriber: Optional[threading.Thread] = None
+        if self._client and settings.CACHE_L1_ENABLED:
+            self._start_subscriber()
+        
+        # Locks de recálculo sem Redis
+        self._refreshing: Set[str] = set()
+        self._refreshing_lock = threading.Lock()
+        
+        # Métricas por prefixo (o cliente é lido a cada flush)
+        self._metrics = CacheMetrics(lambda: self._client)
+        
         self._initialized = True
     
+    @property
+    def local(self) -> LocalCache:
+        """Cache L1 deste processo."""
+        return self._local
+    
+    @property
+    def metrics(self) -> CacheMetrics:
+        """Métricas do cache por prefixo de chave."""
+        return self._metrics
+    
+    @property
+    def client(self) -> Optional[redis.Redis]:
+        """
+        Cliente Redis para operações atômicas que não passam pelo codec
+        (ex: scripts Lua compartilhados entre workers). Respostas em bytes.
+        
+        Returns:
+            Optional[redis.Redis]: Cliente ou None se o cache estiver desabilitado.
+        """
+        return self._client
+    
     def get(self, key: str) -> Optional[Any]:
         """
-        Busca um valor no cache.
+        Busca um valor no cache (L1 e, na ausência, Redis).
+        
+        Valores na janela de stale também são devolvidos; use `get_entry` ou
+        `fetch` para distingui-los. O valor lido do L1 é compartilhado entre
+        as leituras (ver `LocalEntry`): copie antes de alterá-lo.
         
         Args:
             key: Chave do cache.
@@ -75,50 +286,126 @@ class CacheService:
         Returns:
             Optional[Any]: Valor deserializado ou None se não existir.
         """
-        if not self._client:
-            return None
+        entry = self.get_entry(key)
+        return entry.value if entry is not None else None
+    
+    def get_entry(self, key: str, payload: bool = False) -> Optional[CacheEntry]:
+        """
+        Busca um valor no cache indicando se ele já passou do TTL "soft".
         
-        try:
-            value = self._client.get(key)
-            if value:
-                return json.loads(value)
-            return None
-        except json.JSONDecodeError as e:
-            logger.error(f"Erro ao deserializar valor do cache (key={key}): {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Erro ao buscar do cache (key={key}): {e}")
-            return None
+        Args:
+            key: Chave do cache.
+            payload: Se True, devolve o corpo como `Payload`, sem deserializar.
+        
+        Returns:
+            Optional[CacheEntry]: Valor e estado, ou None se não existir.
+        """
+        entry = self._get_entry(key, payload)
+        self._metrics.incr(key, 'misses' if entry is None else 'hits')
+        return entry
+    
+    def get_many(self, keys: Iterable[str], payload: bool = False) -> Dict[str, Any]:
+        """
+        Busca várias chaves com um único round-trip ao Redis (MGET).
+        
+        As chaves presentes no L1 não vão ao Redis; as lidas do Redis populam
+        o L1. Como em `get`, valores na janela de stale também são devolvidos
+        e os valores do L1 são compartilhados entre as leituras.
+        
+        Args:
+            keys: Chaves do cache.
+            payload: Se True, devolve os corpos como `Payload`, sem deserializar.
+        
+        Returns:
+            Dict[str, Any]: Valores das chaves encontradas (as ausentes ficam de fora).
+        """
+        keys = list(dict.fromkeys(keys))
+        local_entries = {}
+        missing = []
+        for key in keys:
+            found, local_entry = self._local.get(key)
+            if found:
+                local_entries[key] = local_entry
+            else:
+                missing.append(key)
+        
+        if missing and self._client:
+            try:
+                with self._metrics.redis_call(missing):
+                    values = self._client.mget(missing)
+            except Exception as e:
+                logger.error(f"Erro ao buscar chaves do cache ({len(missing)} chaves): {e}")
+                values = []
+            
+            for key, raw in zip(missing, values):
+                if raw:
+                    local_entries[key] = self._populate_local(key, raw)
+        
+        values = {}
+        for key in keys:
+            entry = self._decode(key, local_entries[key], payload) if key in local_entries else None
+            if entry is not None:
+                values[key] = entry.value
+            self._metrics.incr(key, 'misses' if entry is None else 'hits')
+        return values
     
-    def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: int = 3600,
+        tags: Optional[Iterable[str]] = None,
+        stale_ttl: int = 0
+    ) -> bool:
         """
-        Salva um valor no cache.
+        Salva um valor no cache (L1 e Redis) e invalida o L1 dos outros workers.
+        
+        O valor é serializado uma única vez (ver `cache_codec`); a escrita e
+        o registro da chave nos SETs das tags vão em um único pipeline.
         
         Args:
             key: Chave do cache.
             value: Valor a ser serializado.
             ttl: Tempo de vida em segundos (padrão: 1 hora).
+            tags: Tags das quais a entrada depende (ver `invalidate_tags`).
+            stale_ttl: Janela após o `ttl` em que o valor ainda pode ser servido
+                como antigo por `fetch` (0 desabilita).
         
         Returns:
             bool: True se salvo com sucesso, False caso contrário.
         """
-        if not self._client:
-            return False
+        return self.set_many([CacheItem(key, value, ttl, tags or (), stale_ttl)])
+    
+    def set_many(self, items: Iterable[CacheItem]) -> bool:
+        """
+        Salva várias entradas, cada uma com seu TTL e suas tags.
         
-        try:
-            serialized = json.dumps(value, default=str)
-            result = self._client.setex(key, ttl, serialized)
-            return result is True
-        except (TypeError, ValueError) as e:
-            logger.error(f"Erro ao serializar valor para cache (key={key}): {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Erro ao salvar no cache (key={key}): {e}")
+        Todas as escritas (SETEX e SETs das tags) vão em um único pipeline e
+        os outros workers recebem uma única invalidação do L1.
+        
+        Args:
+            items: Entradas a gravar.
+        
+        Returns:
+            bool: True se todas foram salvas, False caso contrário.
+        """
+        entries = []
+        encoded_all = True
+        for item in items:
+            raw = self._encode(item.key, item.value, item.ttl, item.stale_ttl)
+            if raw is None:
+                encoded_all = False
+                continue
+            entries.append((item.key, raw, item.ttl + max(item.stale_ttl, 0), tuple(item.tags or ())))
+        
+        if not entries:
             return False
+        
+        return self._store(entries) and encoded_all
     
     def delete(self, key: str) -> bool:
         """
-        Remove uma chave do cache.
+        Remove uma chave do cache (L1 de todos os workers e Redis).
         
         Args:
             key: Chave a ser removida.
@@ -126,11 +413,15 @@ class CacheService:
         Returns:
             bool: True se removido com sucesso, False caso contrário.
         """
+        removed_local = self._local.delete(key)
+        
         if not self._client:
-            return False
+            return removed_local
         
         try:
-            result = self._client.delete(key)
+            with self._metrics.redis_call([key]):
+                result = self._client.delete(key)
+            self._broadcast(keys=[key])
             return result > 0
         except Exception as e:
             logger.error(f"Erro ao deletar do cache (key={key}): {e}")
@@ -146,37 +437,640 @@ class CacheService:
         Returns:
             bool: True se existe, False caso contrário.
         """
+        if self._local.get(key)[0]:
+            return True
+        
         if not self._client:
             return False
         
         try:
-            return self._client.exists(key) > 0
+            with self._metrics.redis_call([key]):
+                return self._client.exists(key) > 0
         except Exception as e:
             logger.error(f"Erro ao verificar existência no cache (key={key}): {e}")
             return False
     
+    def fetch(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        ttl: int = 3600,
+        tags: Optional[Iterable[str]] = None,
+        stale_ttl: Optional[int] = None,
+        payload: bool = False
+    ) -> FetchResult:
+        """
+        Busca um valor no cache e, se ausente ou antigo, recalcula com um único chamador.
+        
+        - Valor válido: devolvido direto.
+        - Valor antigo (passou do `ttl`, dentro de `stale_ttl`): quem obtém o
+          lock recalcula; os demais recebem o valor antigo.
+        - Sem valor: quem obtém o lock calcula; os demais aguardam o resultado
+          até CACHE_LOCK_TIMEOUT e, esgotado o prazo, calculam por conta própria.
+        
+        Se o cálculo falhar e houver valor antigo, ele é servido; sem valor
+        antigo, a exceção é propagada.
+        
+        Args:
+            key: Chave do cache.
+            compute: Função que calcula o valor; pode devolver `Tagged` para
+                informar as tags, e None para não cachear (ex: não encontrado).
+            ttl: TTL "soft" em segundos.
+            tags: Tags da entrada (quando `compute` não devolve `Tagged`).
+            stale_ttl: Janela de stale (padrão: CACHE_STALE_TTL).
+            payload: Se True, o valor é devolvido como `Payload` (corpo pronto
+                para a resposta HTTP, sem deserializar).
+        
+        Returns:
+            FetchResult: Valor e origem ("hit", "stale" ou "miss").
+        """
+        if stale_ttl is None:
+            stale_ttl = settings.CACHE_STALE_TTL
+        
+        entry = self._get_entry(key, payload)
+        deadline = None
+        
+        while True:
+            if entry is not None and not entry.stale:
+                return self._counted(key, FetchResult(entry.value, 'hit'))
+            
+            with self.refresh_lock(key) as acquired:
+                if acquired:
+                    return self._counted(key, self._recompute(key, compute, ttl, tags, stale_ttl, entry, payload))
+            
+            if entry is not None:
+                self._metrics.incr(key, 'stale_served')
+                return self._counted(key, FetchResult(entry.value, 'stale'))
+            
+            # Sem valor para servir: aguardar quem está calculando
+            if deadline is None:
+                deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+            elif time.monotonic() >= deadline:
+                logger.warning(f"Tempo esgotado aguardando o recálculo do cache (key={key})")
+                return self._counted(key, self._recompute(key, compute, ttl, tags, stale_ttl, None, payload))
+            
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = self._get_entry(key, payload)
+    
+    def refresh(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        ttl: int = 3600,
+        tags: Optional[Iterable[str]] = None,
+        stale_ttl: Optional[int] = None
+    ) -> bool:
+        """
+        Recalcula e salva um valor mesmo que ainda válido (aquecimento do cache).
+        
+        Usa o mesmo lock de `fetch`: se outro chamador já está recalculando a
+        chave, nada é feito. Exceções de `compute` são propagadas.
+        
+        Args:
+            key: Chave do cache.
+            compute: Função de cálculo (pode devolver `Tagged`; None não é cacheado).
+            ttl: TTL "soft" em segundos.
+            tags: Tags da entrada (quando `compute` não devolve `Tagged`).
+            stale_ttl: Janela de stale (padrão: CACHE_STALE_TTL).
+        
+        Returns:
+            bool: True se o valor foi recalculado e salvo.
+        """
+        if stale_ttl is None:
+            stale_ttl = settings.CACHE_STALE_TTL
+        
+        with self.refresh_lock(key) as acquired:
+            if not acquired:
+                return False
+            
+            value = compute()
+            self._metrics.incr(key, 'refreshes')
+            if isinstance(value, Tagged):
+                value, tags = value.value, value.tags
+            if value is None:
+                return False
+            
+            return self.set(key, value, ttl, tags, stale_ttl)
+    
+    @contextmanager
+    def refresh_lock(self, key: str) -> Iterator[bool]:
+        """
+        Lock de recálculo de uma chave, sem espera.
+        
+        Com Redis, SET NX com expiração CACHE_LOCK_TIMEOUT (vale para todos os
+        workers); sem Redis, exclusivo no processo. Se o Redis falhar, o
+        chamador recalcula sem lock.
+        
+        Args:
+            key: Chave do cache.
+        
+        Yields:
+            bool: True se o lock foi obtido.
+        """
+        lock_key = f"{LOCK_KEY_PREFIX}{key}"
+        
+        if not self._client:
+            with self._refreshing_lock:
+                acquired = lock_key not in self._refreshing
+                self._refreshing.add(lock_key)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    with self._refreshing_lock:
+                        self._refreshing.discard(lock_key)
+            return
+        
+        token = uuid.uuid4().hex
+        try:
+            acquired = bool(self._client.set(
+                lock_key,
+                token,
+                nx=True,
+                px=int(settings.CACHE_LOCK_TIMEOUT * 1000)
+            ))
+        except Exception as e:
+            logger.warning(f"Erro ao obter lock do cache (key={key}): {e}")
+            acquired, token = True, None
+        
+        try:
+            yield acquired
+        finally:
+            if acquired and token:
+                try:
+                    self._client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.warning(f"Erro ao liberar lock do cache (key={key}): {e}")
+    
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Remove todas as chaves marcadas com qualquer uma das tags.
+        
+        Dois round-trips em pipeline: SMEMBERS das tags e, em seguida, DELETE
+        das chaves com SREM dos membros lidos (chaves registradas na tag entre
+        as duas etapas continuam no SET).
+        
+        Args:
+            tags: Tags (ex: ["product:42", "list:<uuid>"]).
+        
+        Returns:
+            int: Número de chaves removidas.
+        """
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return 0
+        
+        removed_local = self._local.delete_tags(tags)
+        
+        if not self._client:
+            return removed_local
+        
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for tag in tags:
+                pipe.smembers(self._tag_key(tag))
+            members = pipe.execute()
+            
+            keys = sorted(self._decode_key(key) for key in set().union(*members))
+            # Entradas copiadas do Redis para o L1 não guardam as tags, e a
+            # própria mensagem de invalidação é ignorada por este worker
+            for key in keys:
+                self._local.delete(key)
+            
+            if keys:
+                pipe = self._client.pipeline(transaction=False)
+                pipe.delete(*keys)
+                for tag, tag_members in zip(tags, members):
+                    if tag_members:
+                        pipe.srem(self._tag_key(tag), *tag_members)
+                removed = pipe.execute()[0]
+            else:
+                removed = 0
+            
+            self._broadcast(keys=keys, tags=tags)
+            return removed
+        except Exception as e:
+            logger.error(f"Erro ao invalidar tags do cache (tags={tags}): {e}")
+            return 0
+    
+    def tag_members(self, tag: str) -> List[str]:
+        """
+        Lista as chaves registradas em uma tag.
+        
+        No Redis, o SET pode conter chaves já expiradas ou removidas por outra
+        tag: quem percorre os membros deve tratar a ausência do valor.
+        
+        Args:
+            tag: Tag.
+        
+        Returns:
+            List[str]: Chaves em ordem alfabética.
+        """
+        if not self._client:
+            return self._local.tag_members(tag)
+        
+        try:
+            return sorted(self._decode_key(key) for key in self._client.smembers(self._tag_key(tag)))
+        except Exception as e:
+            logger.error(f"Erro ao listar chaves da tag (tag={tag}): {e}")
+            return []
+    
     def invalidate_pattern(self, pattern: str) -> int:
         """
         Invalida múltiplas chaves usando padrão.
         
+        Percorre o keyspace com SCAN (não bloqueia o Redis como o KEYS); para
+        invalidações frequentes, prefira `invalidate_tags`.
+        
         Args:
             pattern: Padrão de chaves (ex: "ranking:*", "product:*").
         
         Returns:
             int: Número de chaves removidas.
         """
+        removed_local = self._local.delete_pattern(pattern)
+        
         if not self._client:
-            return 0
+            return removed_local
         
         try:
-            keys = self._client.keys(pattern)
-            if keys:
-                return self._client.delete(*keys)
-            return 0
+            removed = 0
+            batch = []
+            for key in self._client.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= SCAN_BATCH_SIZE:
+                    removed += self._client.delete(*batch)
+                    batch = []
+            if batch:
+                removed += self._client.delete(*batch)
+            
+            self._broadcast(pattern=pattern)
+            return removed
         except Exception as e:
             logger.error(f"Erro ao invalidar padrão do cache (pattern={pattern}): {e}")
             return 0
     
+    def _recompute(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        ttl: int,
+        tags: Optional[Iterable[str]],
+        stale_ttl: int,
+        entry: Optional[CacheEntry],
+        payload: bool = False
+    ) -> FetchResult:
+        """
+        Recalcula e salva um valor (chamar com o lock de recálculo).
+        
+        Args:
+            key: Chave do cache.
+            compute: Função de cálculo.
+            ttl: TTL "soft" em segundos.
+            tags: Tags da entrada.
+            stale_ttl: Janela de stale.
+            entry: Valor antigo (servido se o cálculo falhar).
+            payload: Se True, devolve o valor como `Payload`.
+        
+        Returns:
+            FetchResult: Valor e origem.
+        """
+        # Outro worker pode ter recalculado entre a leitura e o lock
+        current = self._get_entry(key, payload)
+        if current is not None and not current.stale:
+            return FetchResult(current.value, 'hit')
+        
+        try:
+            value = compute()
+        except Exception as e:
+            if entry is None:
+                raise
+            logger.warning(f"Erro ao recalcular cache, servindo valor antigo (key={key}): {e}")
+            self._metrics.incr(key, 'stale_on_error')
+            return FetchResult(entry.value, 'stale')
+        
+        self._metrics.incr(key, 'refreshes')
+        if isinstance(value, Tagged):
+            value, tags = value.value, value.tags
+        if value is None:
+            return FetchResult(None, 'miss')
+        
+        raw = self._encode(key, value, ttl, stale_ttl)
+        if raw is not None:
+            self._store([(key, raw, ttl + max(stale_ttl, 0), tuple(tags or ()))])
+        
+        if payload:
+            # Mesmos bytes gravados no cache, sem deserializar de volta
+            if raw is not None:
+                value = cache_codec.decode_payload(raw)[0]
+            else:
+                value = Payload(cache_codec.dumps(value), None)
+        
+        return FetchResult(value, 'miss')
+    
+    def _encode(self, key: str, value: Any, ttl: int, stale_ttl: int) -> Optional[bytes]:
+        """
+        Serializa uma entrada (com o fim do TTL "soft" quando há janela de stale).
+        
+        Args:
+            key: Chave do cache.
+            value: Valor.
+            ttl: TTL "soft" em segundos.
+            stale_ttl: Janela de stale (0 desabilita).
+        
+        Returns:
+            Optional[bytes]: Entrada ou None se o valor não for serializável.
+        """
+        fresh_until = time.time() + ttl if stale_ttl > 0 else None
+        try:
+            return cache_codec.encode(value, fresh_until)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Erro ao serializar valor para cache (key={key}): {e}")
+            self._metrics.incr(key, 'errors')
+            return None
+    
+    def _read(self, key: str) -> Optional[LocalEntry]:
+        """
+        Lê uma entrada do L1 e, na ausência, do Redis (populando o L1).
+        
+        Args:
+            key: Chave do cache.
+        
+        Returns:
+            Optional[LocalEntry]: Entrada ou None se não existir.
+        """
+        found, local_entry = self._local.get(key)
+        if found:
+            return local_entry
+        
+        if not self._client:
+            return None
+        
+        try:
+            with self._metrics.redis_call([key]):
+                raw = self._client.get(key)
+        except Exception as e:
+            logger.error(f"Erro ao buscar do cache (key={key}): {e}")
+            return None
+        
+        if raw:
+            return self._populate_local(key, raw)
+        return None
+    
+    def _get_entry(self, key: str, payload: bool = False) -> Optional[CacheEntry]:
+        """
+        Busca um valor no cache sem registrar hit/miss (ver `get_entry`).
+        
+        Args:
+            key: Chave do cache.
+            payload: Se True, devolve o corpo como `Payload`, sem deserializar.
+        
+        Returns:
+            Optional[CacheEntry]: Valor e estado, ou None se não existir.
+        """
+        local_entry = self._read(key)
+        if local_entry is None:
+            return None
+        
+        return self._decode(key, local_entry, payload)
+    
+    def _decode(self, key: str, local_entry: LocalEntry, payload: bool) -> Optional[CacheEntry]:
+        """
+        Deserializa uma entrada lida do cache (ou reaproveita o valor já
+        deserializado por uma leitura anterior do L1).
+        
+        Args:
+            key: Chave do cache.
+            local_entry: Entrada lida do L1 ou do Redis.
+            payload: Se True, devolve o corpo como `Payload`, sem deserializar.
+        
+        Returns:
+            Optional[CacheEntry]: Valor e estado, ou None se a entrada for inválida.
+        """
+        try:
+            if payload:
+                value, fresh_until = local_entry.payload()
+            else:
+                value, fresh_until = local_entry.value()
+        except Exception as e:
+            logger.error(f"Erro ao deserializar valor do cache (key={key}): {e}")
+            self._metrics.incr(key, 'errors')
+            return None
+        
+        return CacheEntry(value, fresh_until is not None and time.time() >= fresh_until)
+    
+    def _populate_local(self, key: str, raw: bytes) -> LocalEntry:
+        """
+        Copia para o L1 uma entrada lida do Redis.
+        
+        Args:
+            key: Chave do cache.
+            raw: Entrada serializada.
+        
+        Returns:
+            LocalEntry: Entrada (guardada no L1 se a política do prefixo permitir).
+        """
+        local_entry = LocalEntry(raw)
+        l1_ttl = self._l1_ttl(self._l1_policy(key))
+        if l1_ttl > 0:
+            self._local.set(key, local_entry, l1_ttl)
+        return local_entry
+    
+    def _store(self, entries: List[Tuple[str, bytes, int, Tuple[str, ...]]]) -> bool:
+        """
+        Grava entradas serializadas no L1 e no Redis (um pipeline) e invalida o
+        L1 dos outros workers.
+        
+        Args:
+            entries: Entradas como (chave, bytes, TTL total em segundos incluindo
+                a janela de stale, tags).
+        
+        Returns:
+            bool: True se todas foram salvas, False caso contrário.
+        """
+        stored_local = True
+        for key, raw, ttl, tags in entries:
+            self._metrics.incr(key, 'sets')
+            self._metrics.incr(key, 'bytes_written', len(raw))
+            l1_ttl = self._l1_ttl(self._l1_policy(key), ttl)
+            if l1_ttl > 0:
+                self._local.set(key, LocalEntry(raw), l1_ttl, tags)
+            else:
+                stored_local = False
+        
+        if not self._client:
+            return stored_local
+        
+        keys = [key for key, _, _, _ in entries]
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            setex_positions = []
+            commands = 0
+            for key, raw, ttl, tags in entries:
+                pipe.setex(key, ttl, raw)
+                setex_positions.append(commands)
+                commands += 1
+                # O SET da tag vive ao menos tanto quanto a entrada mais longa
+                tag_ttl = max(ttl, settings.CACHE_TAG_TTL)
+                for tag in tags:
+                    pipe.sadd(self._tag_key(tag), key)
+                    pipe.expire(self._tag_key(tag), tag_ttl)
+                    commands += 2
+            with self._metrics.redis_call(keys):
+                results = pipe.execute()
+            self._broadcast(keys=keys)
+            return all(results[position] is True for position in setex_positions)
+        except Exception as e:
+            logger.error(f"Erro ao salvar no cache ({len(keys)} chaves, ex: {keys[0]}): {e}")
+            return False
+    
+    def _counted(self, key: str, result: FetchResult) -> FetchResult:
+        """
+        Registra o resultado de `fetch` nas métricas (valor antigo conta como hit).
+        
+        Args:
+            key: Chave do cache.
+            result: Resultado.
+        
+        Returns:
+            FetchResult: O próprio resultado.
+        """
+        self._metrics.incr(key, 'misses' if result.source == 'miss' else 'hits')
+        return result
+    
+    @staticmethod
+    def _decode_key(key: Any) -> str:
+        """
+        Converte uma chave lida do Redis (bytes) para str.
+        
+        Args:
+            key: Chave em bytes ou str.
+        
+        Returns:
+            str: Chave.
+        """
+        return key.decode() if isinstance(key, bytes) else key
+    
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        """
+        Chave do SET com as chaves de uma tag.
+        
+        Args:
+            tag: Tag.
+        
+        Returns:
+            str: Chave no Redis.
+        """
+        return f"{TAG_KEY_PREFIX}{tag}"
+    
+    def _l1_policy(self, key: str) -> L1Policy:
+        """
+        Retorna a política do L1 para o prefixo da chave.
+        
+        Args:
+            key: Chave do cache.
+        
+        Returns:
+            L1Policy: Política do prefixo (ou a padrão).
+        """
+        return L1_POLICIES.get(key.split(':', 1)[0], DEFAULT_L1_POLICY)
+    
+    def _l1_ttl(self, policy: L1Policy, ttl: Optional[int] = None) -> float:
+        """
+        Calcula o tempo de vida de uma entrada no L1.
+        
+        Com Redis, o L1 guarda cópias curtas (limitadas pela política); sem
+        Redis, é o único nível e usa o TTL pedido.
+        
+        Args:
+            policy: Política do prefixo.
+            ttl: TTL pedido em `set` (None em leituras do Redis).
+        
+        Returns:
+            float: TTL em segundos (0 desabilita o L1).
+        """
+        if not settings.CACHE_L1_ENABLED:
+            return 0
+        
+        policy_ttl = settings.CACHE_L1_TTL if policy.ttl is None else policy.ttl
+        if not self._client:
+            return ttl if ttl is not None else policy_ttl
+        
+        return policy_ttl if ttl is None else min(ttl, policy_ttl)
+    
+    def _broadcast(
+        self,
+        keys: Optional[Iterable[str]] = None,
+        pattern: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> None:
+        """
+        Publica uma invalidação do L1 para os outros workers.
+        
+        Args:
+            keys: Chaves alteradas/removidas.
+            pattern: Padrão glob de chaves removidas.
+            tags: Tags invalidadas.
+        """
+        if not settings.CACHE_L1_ENABLED:
+            return
+        
+        message = {'origin': self._origin}
+        if keys is not None:
+            message['keys'] = list(keys)
+        if pattern is not None:
+            message['pattern'] = pattern
+        if tags is not None:
+            message['tags'] = list(tags)
+        
+        try:
+            self._client.publish(INVALIDATION_CHANNEL, json.dumps(message))
+        except Exception as e:
+            logger.warning(f"Erro ao publicar invalidação do cache: {e}")
+    
+    def _apply_invalidation(self, raw_message: Any) -> None:
+        """
+        Aplica no L1 uma invalidação recebida de outro worker.
+        
+        Args:
+            raw_message: Mensagem JSON publicada por `_broadcast` (bytes ou str).
+        """
+        try:
+            message = json.loads(raw_message)
+        except (TypeError, ValueError):
+            logger.warning(f"Mensagem de invalidação inválida: {raw_message!r}")
+            return
+        
+        if message.get('origin') == self._origin:
+            return
+        
+        for key in message.get('keys', []):
+            self._local.delete(key)
+        if message.get('pattern'):
+            self._local.delete_pattern(message['pattern'])
+        if message.get('tags'):
+            self._local.delete_tags(message['tags'])
+    
+    def _start_subscriber(self) -> None:
+        """Inicia a thread que assina as invalidações dos outros workers."""
+        def listen():
+            while True:
+                try:
+                    pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(INVALIDATION_CHANNEL)
+                    for message in pubsub.listen():
+                        if message.get('type') == 'message':
+                            self._apply_invalidation(message['data'])
+                except Exception as e:
+                    # Mensagens perdidas durante a reconexão: o L1 expira pelo TTL
+                    logger.warning(f"Assinatura de invalidações do cache interrompida: {e}")
+                    self._local.clear()
+                    time.sleep(1)
+        
+        self._subscriber = threading.Thread(target=listen, name='cache-invalidation', daemon=True)
+        self._subscriber.start()
+    
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """
         Gera chave de cache única baseada em argumentos.
@@ -213,13 +1107,17 @@ class CacheService:
 cache = CacheService()
 
 
-def cached(ttl: int = 3600, key_prefix: str = "") -> Callable:
+def cached(ttl: int = 3600, key_prefix: str = "", stale_ttl: Optional[int] = None) -> Callable:
     """
     Decorator para cachear resultados de funções.
     
+    Usa `CacheService.fetch`: após o TTL, o resultado antigo é servido por
+    `stale_ttl` segundos enquanto uma única chamada recalcula.
+    
     Args:
         ttl: Tempo de vida do cache em segundos.
         key_prefix: Prefixo para as chaves do cache.
+        stale_ttl: Janela de stale (padrão: CACHE_STALE_TTL).
     
     Returns:
         Callable: Decorator function.
@@ -239,23 +1137,12 @@ def cached(ttl: int = 3600, key_prefix: str = "") -> Callable:
             prefix = key_prefix or func.__name__
             cache_key = cache._generate_key(prefix, *args, **kwargs)
             
-            # Tentar buscar do cache
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                logger.debug(f"Cache hit: {cache_key}")
-                return cached_value
-            
-            # Executar função e cachear resultado
-            logger.debug(f"Cache miss: {cache_key}")
-            result = func(*args, **kwargs)
+            # Buscar do cache ou executar a função (resultado None não é cacheado)
+            result = cache.fetch(cache_key, lambda: func(*args, **kwargs), ttl, stale_ttl=stale_ttl)
+            logger.debug(f"Cache {result.source}: {cache_key}")
             
-            # Cachear resultado se não for None
-            if result is not None:
-                cache.set(cache_key, result, ttl)
-            
-            return result
+            return result.value
         
         return wrapper
     
     return decorator
-
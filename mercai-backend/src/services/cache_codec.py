@@ -0,0 +1,233 @@
+"""
+Cache Codec - Serialização das Entradas do Cache
+
+Módulo responsável pelo formato binário das entradas do cache: cabeçalho
+(versão, compressão, fim do TTL "soft", momento da gravação e hash do
+conteúdo) seguido do corpo em JSON, comprimido acima de
+CACHE_COMPRESS_MIN_BYTES.
+
+O corpo é exatamente a resposta HTTP: os endpoints enviam os bytes cacheados
+sem decodificar (ver `src.utils.http.payload_response`), com Content-Encoding
+quando o cliente aceita a compressão usada. O hash e o momento da gravação
+viram ETag e Last-Modified, permitindo responder 304 sem tocar no corpo.
+
+orjson e zstandard são opcionais: sem eles, usa-se o json da biblioteca
+padrão e o zlib (Content-Encoding "deflate").
+"""
+
+from typing import Any, NamedTuple, Optional, Tuple
+import hashlib
+import json
+import struct
+import time
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from src.config.settings import Settings
+
+settings = Settings()
+
+# Cabeçalho: marcador, versão, compressão, fim do TTL "soft" (0 = sem TTL
+# soft), momento da gravação e hash do JSON (ETag)
+HEADER = struct.Struct('>2sBBdd8s')
+MAGIC = b'MC'
+VERSION = 2
+
+# Tamanho do hash do conteúdo (bytes)
+DIGEST_SIZE = 8
+
+# Compressões (valor no cabeçalho -> Content-Encoding)
+COMPRESSION_NONE = 0
+COMPRESSION_DEFLATE = 1
+COMPRESSION_ZSTD = 2
+CONTENT_ENCODINGS = {
+    COMPRESSION_NONE: None,
+    COMPRESSION_DEFLATE: 'deflate',
+    COMPRESSION_ZSTD: 'zstd',
+}
+
+# Níveis de compressão (priorizam CPU: as entradas são gravadas a cada recálculo)
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class Payload(NamedTuple):
+    """
+    Corpo de uma entrada do cache, pronto para envio.
+    
+    Attributes:
+        body: JSON (comprimido se `encoding` não for None).
+        encoding: Content-Encoding do corpo ("deflate", "zstd" ou None).
+        digest: Hash do JSON sem compressão (None em entradas antigas).
+        modified_at: Momento da gravação (timestamp; None em entradas antigas).
+    """
+    
+    body: bytes
+    encoding: Optional[str]
+    digest: Optional[bytes] = None
+    modified_at: Optional[float] = None
+    
+    def decompressed(self) -> bytes:
+        """
+        Retorna o JSON sem compressão.
+        
+        Returns:
+            bytes: JSON.
+        """
+        if self.encoding == 'deflate':
+            return zlib.decompress(self.body)
+        if self.encoding == 'zstd':
+            return zstandard.ZstdDecompressor().decompress(self.body)
+        return self.body
+    
+    def value(self) -> Any:
+        """
+        Deserializa o corpo.
+        
+        Returns:
+            Any: Valor.
+        """
+        return loads(self.decompressed())
+    
+    def etag(self) -> str:
+        """
+        Retorna a ETag forte do conteúdo.
+        
+        Entradas antigas, sem hash no cabeçalho, usam o hash do corpo armazenado.
+        
+        Returns:
+            str: ETag (sem aspas).
+        """
+        return (self.digest or content_digest(self.body)).hex()
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Serializa um valor em JSON (tipos não suportados viram string).
+    
+    Args:
+        value: Valor.
+    
+    Returns:
+        bytes: JSON em UTF-8.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=str, separators=(',', ':')).encode()
+
+
+def loads(data: bytes) -> Any:
+    """
+    Deserializa JSON.
+    
+    Args:
+        data: JSON em UTF-8.
+    
+    Returns:
+        Any: Valor.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def content_digest(body: bytes) -> bytes:
+    """
+    Calcula o hash de um corpo.
+    
+    Args:
+        body: JSON.
+    
+    Returns:
+        bytes: Hash (DIGEST_SIZE bytes).
+    """
+    return hashlib.blake2b(body, digest_size=DIGEST_SIZE).digest()
+
+
+def compress(body: bytes) -> Tuple[int, bytes]:
+    """
+    Comprime o corpo se ele passar do limite e a compressão compensar.
+    
+    Args:
+        body: JSON.
+    
+    Returns:
+        Tuple[int, bytes]: Compressão usada e corpo.
+    """
+    if len(body) < settings.CACHE_COMPRESS_MIN_BYTES:
+        return COMPRESSION_NONE, body
+    
+    if zstandard is not None:
+        compression = COMPRESSION_ZSTD
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    else:
+        compression = COMPRESSION_DEFLATE
+        compressed = zlib.compress(body, ZLIB_LEVEL)
+    
+    if len(compressed) >= len(body):
+        return COMPRESSION_NONE, body
+    return compression, compressed
+
+
+def encode(value: Any, fresh_until: Optional[float] = None) -> bytes:
+    """
+    Monta uma entrada do cache.
+    
+    Args:
+        value: Valor a serializar.
+        fresh_until: Fim do TTL "soft" (timestamp; None se não houver).
+    
+    Returns:
+        bytes: Cabeçalho + corpo.
+    """
+    body = dumps(value)
+    digest = content_digest(body)
+    compression, body = compress(body)
+    return HEADER.pack(MAGIC, VERSION, compression, fresh_until or 0.0, time.time(), digest) + body
+
+
+def decode_payload(raw: bytes) -> Tuple[Payload, Optional[float]]:
+    """
+    Separa o cabeçalho do corpo, sem descomprimir nem deserializar.
+    
+    Entradas sem cabeçalho (JSON gravado por versões anteriores) são tratadas
+    como corpo sem compressão, sem TTL "soft", hash nem momento da gravação.
+    
+    Args:
+        raw: Entrada lida do cache.
+    
+    Returns:
+        Tuple[Payload, Optional[float]]: Corpo e fim do TTL "soft".
+    """
+    if isinstance(raw, str):
+        raw = raw.encode()
+    
+    if len(raw) < HEADER.size or raw[:2] != MAGIC:
+        return Payload(raw, None), None
+    
+    _, _, compression, fresh_until, modified_at, digest = HEADER.unpack_from(raw)
+    payload = Payload(raw[HEADER.size:], CONTENT_ENCODINGS[compression], digest, modified_at)
+    return payload, fresh_until or None
+
+
+def decode(raw: bytes) -> Tuple[Any, Optional[float]]:
+    """
+    Deserializa uma entrada do cache.
+    
+    Args:
+        raw: Entrada lida do cache.
+    
+    Returns:
+        Tuple[Any, Optional[float]]: Valor e fim do TTL "soft".
+    """
+    payload, fresh_until = decode_payload(raw)
+    return payload.value(), fresh_until
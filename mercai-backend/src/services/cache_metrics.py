@@ -0,0 +1,251 @@
+"""
+Cache Metrics - Métricas do Cache por Prefixo de Chave
+
+Módulo com os contadores do CacheService por prefixo de chave (parte antes do
+primeiro ':', ex: "product", "products_search", "ranking", "geocode"): hits,
+misses, escritas, erros, bytes gravados, chamadas e latência do Redis,
+recálculos e valores antigos servidos.
+
+Os incrementos ficam em memória (sob lock, sem I/O) e são somados a cada
+CACHE_METRICS_FLUSH_INTERVAL segundos em hashes do Redis compartilhados pelos
+workers: um pipeline de HINCRBY por flush, e não um INCR por requisição. Sem
+Redis, o snapshot mostra apenas o processo atual.
+"""
+
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+import logging
+import time
+
+from src.config.settings import Settings
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Contadores inteiros por prefixo
+COUNTERS = (
+    'hits',
+    'misses',
+    'sets',
+    'errors',
+    'bytes_written',
+    'redis_calls',
+    'refreshes',
+    'stale_served',
+    'stale_on_error',
+)
+
+# Soma da latência das chamadas ao Redis (ms)
+LATENCY_FIELD = 'redis_ms'
+
+# Hash com os contadores compartilhados de cada prefixo e SET com os prefixos
+METRICS_KEY_PREFIX = 'metrics:cache:'
+PREFIXES_KEY = 'metrics:cache:prefixes'
+
+
+def key_prefix(key: str) -> str:
+    """
+    Prefixo de uma chave do cache.
+    
+    Args:
+        key: Chave (ex: "product:42") ou o próprio prefixo (ex: "geocode").
+    
+    Returns:
+        str: Prefixo.
+    """
+    return key.split(':', 1)[0]
+
+
+class CacheMetrics:
+    """
+    Contadores do cache por prefixo, agregados entre workers no Redis.
+    """
+    
+    def __init__(self, client: Callable[[], Any]):
+        """
+        Inicializa os contadores.
+        
+        Args:
+            client: Função que devolve o cliente Redis do cache (ou None).
+        """
+        self._client = client
+        self._lock = Lock()
+        self._pending: Dict[str, Dict[str, float]] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._flushed_at = time.monotonic()
+    
+    def incr(self, key: str, counter: str, value: float = 1) -> None:
+        """
+        Soma um valor a um contador do prefixo da chave.
+        
+        Args:
+            key: Chave do cache (ou prefixo).
+            counter: Contador (ver COUNTERS e LATENCY_FIELD).
+            value: Valor a somar.
+        """
+        self._add({key_prefix(key)}, counter, value)
+    
+    @contextmanager
+    def redis_call(self, keys: Iterable[str]) -> Iterator[None]:
+        """
+        Mede uma chamada ao Redis (latência e erros).
+        
+        Chamadas com chaves de prefixos diferentes (ex: MGET misto) contam
+        para cada prefixo.
+        
+        Args:
+            keys: Chaves envolvidas na chamada.
+        """
+        prefixes = {key_prefix(key) for key in keys}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self._add(prefixes, 'errors', 1)
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._add(prefixes, 'redis_calls', 1)
+            self._add(prefixes, LATENCY_FIELD, elapsed_ms)
+    
+    def flush(self) -> bool:
+        """
+        Soma os incrementos pendentes aos contadores compartilhados no Redis.
+        
+        Em caso de falha, os incrementos voltam para a fila do próximo flush.
+        
+        Returns:
+            bool: True se não havia Redis ou o flush foi concluído.
+        """
+        client = self._client()
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            if client is None or not self._pending:
+                return True
+            pending, self._pending = self._pending, {}
+        
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.sadd(PREFIXES_KEY, *pending)
+            for prefix, counters in pending.items():
+                for counter, value in counters.items():
+                    if counter == LATENCY_FIELD:
+                        pipe.hincrbyfloat(f"{METRICS_KEY_PREFIX}{prefix}", counter, value)
+                    else:
+                        pipe.hincrby(f"{METRICS_KEY_PREFIX}{prefix}", counter, int(value))
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Erro ao publicar métricas do cache: {e}")
+            with self._lock:
+                for prefix, counters in pending.items():
+                    target = self._pending.setdefault(prefix, {})
+                    for counter, value in counters.items():
+                        target[counter] = target.get(counter, 0) + value
+            return False
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retorna os contadores por prefixo.
+        
+        Com Redis, faz o flush deste processo e lê os contadores de todos os
+        workers; sem Redis (ou se a leitura falhar), usa os do processo.
+        
+        Returns:
+            Dict[str, Any]: Escopo ("cluster" ou "process"), intervalo de flush
+                e, por prefixo, os contadores, hit_rate e avg_redis_ms.
+        """
+        client = self._client()
+        totals = None
+        if client is not None and self.flush():
+            totals = self._read_shared(client)
+        
+        scope = 'cluster'
+        if totals is None:
+            scope = 'process'
+            with self._lock:
+                totals = {prefix: dict(counters) for prefix, counters in self._totals.items()}
+        
+        return {
+            'scope': scope,
+            'flush_interval': settings.CACHE_METRICS_FLUSH_INTERVAL,
+            'prefixes': {prefix: self._summarize(counters) for prefix, counters in sorted(totals.items())}
+        }
+    
+    def reset(self) -> None:
+        """Zera os contadores deste processo (os compartilhados não são alterados)."""
+        with self._lock:
+            self._pending.clear()
+            self._totals.clear()
+    
+    def _add(self, prefixes: Iterable[str], counter: str, value: float) -> None:
+        """
+        Soma um valor aos contadores pendentes e totais e dispara o flush no intervalo.
+        
+        Args:
+            prefixes: Prefixos.
+            counter: Contador.
+            value: Valor a somar.
+        """
+        with self._lock:
+            for prefix in prefixes:
+                for counters in (self._pending, self._totals):
+                    target = counters.setdefault(prefix, {})
+                    target[counter] = target.get(counter, 0) + value
+            due = time.monotonic() - self._flushed_at >= settings.CACHE_METRICS_FLUSH_INTERVAL
+        
+        if due:
+            self.flush()
+    
+    @staticmethod
+    def _read_shared(client: Any) -> Optional[Dict[str, Dict[str, float]]]:
+        """
+        Lê os contadores compartilhados de todos os prefixos.
+        
+        Args:
+            client: Cliente Redis.
+        
+        Returns:
+            Optional[Dict[str, Dict[str, float]]]: Contadores por prefixo ou None se a leitura falhar.
+        """
+        try:
+            prefixes = sorted(
+                prefix.decode() if isinstance(prefix, bytes) else prefix
+                for prefix in client.smembers(PREFIXES_KEY)
+            )
+            pipe = client.pipeline(transaction=False)
+            for prefix in prefixes:
+                pipe.hgetall(f"{METRICS_KEY_PREFIX}{prefix}")
+            hashes = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Erro ao ler métricas do cache: {e}")
+            return None
+        
+        totals = {}
+        for prefix, fields in zip(prefixes, hashes):
+            totals[prefix] = {
+                (name.decode() if isinstance(name, bytes) else name): float(value)
+                for name, value in fields.items()
+            }
+        return totals
+    
+    @staticmethod
+    def _summarize(counters: Dict[str, float]) -> Dict[str, Any]:
+        """
+        Monta as métricas de um prefixo.
+        
+        Args:
+            counters: Contadores acumulados.
+        
+        Returns:
+            Dict[str, Any]: Contadores, hit_rate e latência média do Redis.
+        """
+        summary: Dict[str, Any] = {counter: int(counters.get(counter, 0)) for counter in COUNTERS}
+        lookups = summary['hits'] + summary['misses']
+        summary['hit_rate'] = round(summary['hits'] / lookups, 4) if lookups else None
+        summary[LATENCY_FIELD] = round(counters.get(LATENCY_FIELD, 0.0), 3)
+        summary['avg_redis_ms'] = (
+            round(summary[LATENCY_FIELD] / summary['redis_calls'], 3) if summary['redis_calls'] else None
+        )
+        return summary
@@ -0,0 +1,331 @@
+"""
+Cache Tags - Tags de Invalidação do Cache
+
+Módulo com os nomes das tags usadas nas entradas do cache e as invalidações
+por entidade, disparadas pelos commits da sessão do banco.
+
+Tags por entidade marcam as respostas que exibem seus dados ("product:42",
+"store:7", "list:<uuid>"); tags de coleção ("products", "stores", "offers")
+marcam listagens e agregados que mudam quando entram ou saem registros.
+
+As invalidações são disparadas por eventos da sessão do SQLAlchemy: cada
+flush registra os IDs de Offer, Product, Store e ShoppingList alterados e,
+após o commit, as entradas afetadas são invalidadas em um único lote (nada é
+invalidado se a transação for desfeita). Por isso as respostas cacheadas
+podem usar TTLs longos (CACHE_ENTITY_TTL).
+"""
+
+from itertools import chain
+from typing import Any, Iterable, List, Set
+import logging
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from src.models.offer import Offer
+from src.models.product import Product
+from src.models.shopping_list import ShoppingList
+from src.models.store import Store
+from src.services.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Listagens de produtos (busca, categorias, populares)
+PRODUCTS_TAG = 'products'
+
+# Listagens de lojas (paginação, lojas próximas)
+STORES_TAG = 'stores'
+
+# Agregados sobre ofertas (produtos populares)
+OFFERS_TAG = 'offers'
+
+# Chave em session.info com as entidades alteradas na transação
+PENDING_CHANGES_KEY = 'cache_pending_changes'
+
+
+def product_tag(product_id: int) -> str:
+    """
+    Tag das entradas que exibem dados ou ofertas de um produto.
+    
+    Args:
+        product_id: ID do produto.
+    
+    Returns:
+        str: Tag.
+    """
+    return f"product:{product_id}"
+
+
+def store_tag(store_id: int) -> str:
+    """
+    Tag das entradas que exibem dados de uma loja.
+    
+    Args:
+        store_id: ID da loja.
+    
+    Returns:
+        str: Tag.
+    """
+    return f"store:{store_id}"
+
+
+def store_offers_tag(store_id: int) -> str:
+    """
+    Tag das entradas com agregados das ofertas de uma loja (ex: offers_count).
+    
+    Args:
+        store_id: ID da loja.
+    
+    Returns:
+        str: Tag.
+    """
+    return f"store_offers:{store_id}"
+
+
+def list_tag(shopping_list_id: str) -> str:
+    """
+    Tag das entradas derivadas de uma lista de compras (rankings).
+    
+    Args:
+        shopping_list_id: UUID da lista.
+    
+    Returns:
+        str: Tag.
+    """
+    return f"list:{shopping_list_id}"
+
+
+def invalidate_products(product_ids: Iterable[int]) -> int:
+    """
+    Invalida o cache após inserir, alterar ou remover produtos.
+    
+    Args:
+        product_ids: IDs dos produtos.
+    
+    Returns:
+        int: Número de chaves removidas.
+    """
+    return _invalidate(_product_tags(product_ids))
+
+
+def invalidate_offers(product_ids: Iterable[int], store_ids: Iterable[int]) -> int:
+    """
+    Invalida o cache após inserir, alterar ou remover ofertas.
+    
+    Args:
+        product_ids: IDs dos produtos das ofertas.
+        store_ids: IDs das lojas das ofertas.
+    
+    Returns:
+        int: Número de chaves removidas.
+    """
+    return _invalidate(_offer_tags(product_ids, store_ids))
+
+
+def invalidate_stores(store_ids: Iterable[int]) -> int:
+    """
+    Invalida o cache após inserir, alterar ou remover lojas.
+    
+    Args:
+        store_ids: IDs das lojas.
+    
+    Returns:
+        int: Número de chaves removidas.
+    """
+    return _invalidate(_store_tags(store_ids))
+
+
+def invalidate_list(shopping_list_id: str) -> int:
+    """
+    Invalida o cache derivado de uma lista de compras.
+    
+    Args:
+        shopping_list_id: UUID da lista.
+    
+    Returns:
+        int: Número de chaves removidas.
+    """
+    return _invalidate([list_tag(shopping_list_id)])
+
+
+class EntityChanges:
+    """
+    IDs das entidades alteradas em uma transação, acumulados entre flushes.
+    """
+    
+    def __init__(self):
+        """Inicializa os conjuntos vazios."""
+        self.products: Set[int] = set()
+        self.stores: Set[int] = set()
+        self.offer_products: Set[int] = set()
+        self.offer_stores: Set[int] = set()
+        self.lists: Set[str] = set()
+    
+    def tags(self) -> List[str]:
+        """
+        Tags a invalidar, sem repetição.
+        
+        Returns:
+            List[str]: Tags das entidades e das coleções alteradas.
+        """
+        tags = []
+        if self.products:
+            tags.extend(_product_tags(sorted(self.products)))
+        if self.stores:
+            tags.extend(_store_tags(sorted(self.stores)))
+        if self.offer_products or self.offer_stores:
+            tags.extend(_offer_tags(sorted(self.offer_products), sorted(self.offer_stores)))
+        tags.extend(list_tag(shopping_list_id) for shopping_list_id in sorted(self.lists))
+        return list(dict.fromkeys(tags))
+
+
+def invalidate_changes(changes: EntityChanges) -> int:
+    """
+    Invalida, em um único lote, o cache afetado pelas entidades alteradas.
+    
+    Args:
+        changes: Entidades alteradas.
+    
+    Returns:
+        int: Número de chaves removidas.
+    """
+    tags = changes.tags()
+    if not tags:
+        return 0
+    return _invalidate(tags)
+
+
+def _product_tags(product_ids: Iterable[int]) -> List[str]:
+    """
+    Tags afetadas por alterações em produtos.
+    
+    Args:
+        product_ids: IDs dos produtos.
+    
+    Returns:
+        List[str]: Tags dos produtos e do catálogo.
+    """
+    return [product_tag(product_id) for product_id in product_ids] + [PRODUCTS_TAG]
+
+
+def _offer_tags(product_ids: Iterable[int], store_ids: Iterable[int]) -> List[str]:
+    """
+    Tags afetadas por alterações em ofertas.
+    
+    Args:
+        product_ids: IDs dos produtos das ofertas.
+        store_ids: IDs das lojas das ofertas.
+    
+    Returns:
+        List[str]: Tags dos produtos, dos agregados por loja e das ofertas.
+    """
+    tags = [product_tag(product_id) for product_id in product_ids]
+    tags.extend(store_offers_tag(store_id) for store_id in store_ids)
+    return tags + [OFFERS_TAG]
+
+
+def _store_tags(store_ids: Iterable[int]) -> List[str]:
+    """
+    Tags afetadas por alterações em lojas.
+    
+    Args:
+        store_ids: IDs das lojas.
+    
+    Returns:
+        List[str]: Tags das lojas e das listagens de lojas.
+    """
+    return [store_tag(store_id) for store_id in store_ids] + [STORES_TAG]
+
+
+def _current_and_previous(obj: Any, attribute: str) -> Set[Any]:
+    """
+    Valor atual de um atributo e, se ele mudou no flush, o anterior.
+    
+    Args:
+        obj: Instância mapeada.
+        attribute: Nome do atributo (ex: "product_id").
+    
+    Returns:
+        Set[Any]: Valores não nulos.
+    """
+    values = set(getattr(inspect(obj).attrs, attribute).history.deleted)
+    values.add(getattr(obj, attribute))
+    values.discard(None)
+    return values
+
+
+def _invalidate(tags: List[str]) -> int:
+    """
+    Invalida as tags e registra o resultado.
+    
+    Args:
+        tags: Tags a invalidar.
+    
+    Returns:
+        int: Número de chaves removidas.
+    """
+    removed = cache.invalidate_tags(tags)
+    logger.debug(f"Cache invalidado por tags: {len(tags)} tags, {removed} chaves")
+    return removed
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_entities(session: Session, flush_context) -> None:
+    """
+    Registra os IDs das entidades inseridas, alteradas ou removidas no flush.
+    
+    Itens de lista (ListItem) não invalidam os rankings: a chave do ranking
+    inclui o hash do conteúdo da lista e os endpoints de itens atualizam os
+    rankings cacheados no lugar (ver `ranking_item_added`). Apenas listas
+    removidas têm os rankings invalidados.
+    
+    Args:
+        session: Sessão sincronizada.
+        flush_context: Contexto do flush.
+    """
+    changes = None
+    
+    deleted = session.deleted
+    modified = [obj for obj in session.dirty if session.is_modified(obj)]
+    
+    for obj in chain(session.new, modified, deleted):
+        if not isinstance(obj, (Offer, Product, Store, ShoppingList)):
+            continue
+        
+        if changes is None:
+            changes = session.info.setdefault(PENDING_CHANGES_KEY, EntityChanges())
+        
+        if isinstance(obj, Offer):
+            changes.offer_products.update(_current_and_previous(obj, 'product_id'))
+            changes.offer_stores.update(_current_and_previous(obj, 'store_id'))
+        elif isinstance(obj, Product):
+            changes.products.add(obj.id)
+        elif isinstance(obj, Store):
+            changes.stores.add(obj.id)
+        elif isinstance(obj, ShoppingList) and obj in deleted:
+            changes.lists.add(str(obj.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_entities(session: Session) -> None:
+    """
+    Invalida, após o commit, o cache afetado pelas entidades alteradas.
+    
+    Args:
+        session: Sessão confirmada.
+    """
+    changes = session.info.pop(PENDING_CHANGES_KEY, None)
+    if changes is not None:
+        invalidate_changes(changes)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_changed_entities(session: Session, previous_transaction) -> None:
+    """
+    Descarta as entidades registradas quando a transação é desfeita.
+    
+    Args:
+        session: Sessão.
+        previous_transaction: Transação desfeita.
+    """
+    session.info.pop(PENDING_CHANGES_KEY, None)
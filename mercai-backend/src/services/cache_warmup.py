@@ -0,0 +1,201 @@
+"""
+Cache Warmup - Aquecimento do Cache
+
+Módulo com o aquecimento das entradas mais acessadas do cache (categorias,
+produtos populares, páginas de lojas, lojas próximas dos bairros com mais
+acessos), para que os primeiros usuários após um deploy ou um flush do Redis
+não encontrem o cache frio.
+
+Os endpoints declaram as suas chaves quentes com `cache_warmer.hot_keys`:
+geradores que devolvem `WarmupEntry` (chave, função de cálculo e TTL, os
+mesmos usados pelo endpoint). Uma thread daemon recalcula as entradas na
+inicialização e a cada CACHE_WARMUP_INTERVAL segundos, antes que expirem,
+com no máximo CACHE_WARMUP_CONCURRENCY recálculos simultâneos para não
+disputar as conexões do banco com as requisições. Com Redis, apenas um
+worker aquece o cache em cada ciclo.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import logging
+import uuid
+
+from src.config.settings import Settings
+from src.services.cache import cache
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Marca do ciclo em andamento (um worker por ciclo)
+CYCLE_KEY = 'cache_warmup:cycle'
+
+
+class WarmupEntry(NamedTuple):
+    """
+    Entrada do cache a aquecer.
+    
+    Attributes:
+        key: Chave do cache.
+        compute: Função de cálculo (a mesma do `cache.fetch` do endpoint).
+        ttl: TTL "soft" em segundos.
+    """
+    
+    key: str
+    compute: Callable[[], Any]
+    ttl: int
+
+
+class CacheWarmer:
+    """
+    Aquecimento periódico das chaves quentes do cache.
+    """
+    
+    def __init__(self):
+        """Inicializa o aquecedor sem geradores."""
+        self._generators: List[Tuple[str, Callable[[], Iterable[WarmupEntry]]]] = []
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+    
+    def hot_keys(self, name: str) -> Callable:
+        """
+        Decorator que registra um gerador de chaves quentes.
+        
+        Exemplo:
+            @cache_warmer.hot_keys('products')
+            def _hot_product_keys():
+                return [_categories_entry()]
+        
+        Args:
+            name: Nome do gerador (usado nos logs).
+        
+        Returns:
+            Callable: Decorator (devolve o gerador sem alteração).
+        """
+        def decorator(generator: Callable[[], Iterable[WarmupEntry]]) -> Callable[[], Iterable[WarmupEntry]]:
+            self._generators.append((name, generator))
+            return generator
+        return decorator
+    
+    def entries(self) -> List[WarmupEntry]:
+        """
+        Lista as entradas declaradas, sem chaves repetidas.
+        
+        Um gerador com erro é ignorado (os demais continuam).
+        
+        Returns:
+            List[WarmupEntry]: Entradas a aquecer.
+        """
+        entries: Dict[str, WarmupEntry] = {}
+        for name, generator in self._generators:
+            try:
+                for entry in generator():
+                    entries.setdefault(entry.key, entry)
+            except Exception as e:
+                logger.error(f"Erro ao listar chaves quentes ({name}): {e}", exc_info=True)
+        return list(entries.values())
+    
+    def warm(self) -> Dict[str, int]:
+        """
+        Recalcula todas as entradas declaradas.
+        
+        Returns:
+            Dict[str, int]: Entradas recalculadas, ignoradas (outro chamador
+                recalculando ou valor vazio) e com erro; vazio se outro worker
+                já aqueceu o cache neste ciclo.
+        """
+        if not self._claim_cycle():
+            return {}
+        
+        stats = {'refreshed': 0, 'skipped': 0, 'failed': 0}
+        entries = self.entries()
+        workers = max(1, settings.CACHE_WARMUP_CONCURRENCY)
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cache-warmup') as executor:
+            for outcome in executor.map(self._refresh, entries):
+                stats[outcome] += 1
+        
+        logger.info(
+            f"Cache aquecido: {stats['refreshed']} entradas recalculadas, "
+            f"{stats['skipped']} ignoradas, {stats['failed']} com erro"
+        )
+        return stats
+    
+    def start(self) -> bool:
+        """
+        Inicia a thread de aquecimento (primeiro ciclo imediato).
+        
+        Returns:
+            bool: True se a thread foi iniciada agora.
+        """
+        if not settings.CACHE_WARMUP_ENABLED:
+            return False
+        
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self._thread = Thread(target=self._run, name='cache-warmup', daemon=True)
+            self._thread.start()
+        return True
+    
+    def stop(self) -> None:
+        """Interrompe a thread de aquecimento após o ciclo atual."""
+        self._stop.set()
+    
+    def _run(self) -> None:
+        """Loop da thread de aquecimento."""
+        while not self._stop.is_set():
+            try:
+                self.warm()
+            except Exception as e:
+                logger.error(f"Erro ao aquecer o cache: {e}", exc_info=True)
+            self._stop.wait(settings.CACHE_WARMUP_INTERVAL)
+    
+    @staticmethod
+    def _refresh(entry: WarmupEntry) -> str:
+        """
+        Recalcula uma entrada.
+        
+        Args:
+            entry: Entrada a aquecer.
+        
+        Returns:
+            str: "refreshed", "skipped" ou "failed".
+        """
+        try:
+            return 'refreshed' if cache.refresh(entry.key, entry.compute, entry.ttl) else 'skipped'
+        except Exception as e:
+            logger.warning(f"Erro ao aquecer o cache (key={entry.key}): {e}")
+            return 'failed'
+    
+    @staticmethod
+    def _claim_cycle() -> bool:
+        """
+        Reserva o ciclo atual para este worker.
+        
+        A marca expira pouco antes do próximo ciclo; sem Redis (ou se ele
+        falhar), cada processo aquece o próprio cache.
+        
+        Returns:
+            bool: True se este worker deve aquecer o cache.
+        """
+        client = cache.client
+        if client is None:
+            return True
+        
+        try:
+            return bool(client.set(
+                CYCLE_KEY,
+                uuid.uuid4().hex,
+                nx=True,
+                px=max(1, int(settings.CACHE_WARMUP_INTERVAL * 900))
+            ))
+        except Exception as e:
+            logger.warning(f"Erro ao reservar o ciclo de aquecimento do cache: {e}")
+            return True
+
+
+# Instância global
+cache_warmer = CacheWarmer()
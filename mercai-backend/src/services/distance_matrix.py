@@ -0,0 +1,229 @@
+"""
+Distance Matrix Service - Distâncias Célula × Loja
+
+Módulo responsável por calcular, uma vez por célula geohash, as distâncias
+do centróide da célula até todas as lojas no raio de busca
+(DISTANCE_MATRIX_RADIUS_KM). As linhas da matriz ficam em um LRU limitado e
+são reaproveitadas pelo ranking (score de proximidade vira uma consulta) e por
+/api/stores/nearby.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import logging
+import time
+
+import numpy as np
+
+from src.config.settings import Settings
+from src.services.geo import haversine_km
+from src.services.store_index import store_index
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Folga (km) da busca no índice antes do cálculo exato das distâncias
+INDEX_SLACK_KM = 0.01
+
+
+class DistanceRow:
+    """
+    Distâncias de uma célula até as lojas no raio.
+    
+    Attributes:
+        stores: (loja serializada, distância em km) ordenados por distância.
+        by_store_id: Distância (km, 2 casas decimais) por store_id.
+        version: Versão do índice de lojas usada no cálculo.
+        created_at: Instante do cálculo (time.monotonic).
+    """
+    
+    __slots__ = ('stores', 'by_store_id', 'version', 'created_at')
+    
+    def __init__(self, stores: List[Tuple[Dict[str, Any], float]], version: int):
+        """
+        Inicializa a linha.
+        
+        Args:
+            stores: (loja serializada, distância exata em km), mais próximas primeiro.
+            version: Versão do índice de lojas.
+        """
+        self.stores = stores
+        self.version = version
+        self.created_at = time.monotonic()
+        
+        # Mesmo arredondamento de geo.calculate_distance / scoring.haversine_distances
+        self.by_store_id = {store['id']: round(distance, 2) for store, distance in stores}
+
+
+class DistanceMatrix:
+    """
+    Matriz célula × loja com LRU por célula.
+    
+    Uma linha é recalculada quando o índice de lojas muda (nova versão, também
+    para lojas alteradas em outros workers) ou após DISTANCE_MATRIX_TTL segundos.
+    """
+    
+    def __init__(self, max_cells: Optional[int] = None):
+        """
+        Inicializa o LRU.
+        
+        Args:
+            max_cells: Número máximo de células em memória (padrão: DISTANCE_MATRIX_MAX_CELLS).
+        """
+        self._lock = Lock()
+        self._rows: 'OrderedDict[str, DistanceRow]' = OrderedDict()
+        self._max_cells = max_cells
+        self._hits = 0
+        self._misses = 0
+    
+    def row(self, location: Dict[str, Any]) -> DistanceRow:
+        """
+        Retorna a linha da célula de uma localização quantizada.
+        
+        Args:
+            location: Localização quantizada ({'lat', 'lon', 'cell'}).
+        
+        Returns:
+            DistanceRow: Distâncias do centróide até as lojas no raio.
+        """
+        cell = location['cell']
+        version = store_index.current_version()
+        
+        with self._lock:
+            row = self._rows.get(cell)
+            if row is not None and row.version == version and not self._expired(row):
+                self._rows.move_to_end(cell)
+                self._hits += 1
+                return row
+            self._misses += 1
+        
+        row = self._compute(location, version)
+        
+        with self._lock:
+            self._rows[cell] = row
+            self._rows.move_to_end(cell)
+            while len(self._rows) > (self._max_cells or settings.DISTANCE_MATRIX_MAX_CELLS):
+                self._rows.popitem(last=False)
+        
+        return row
+    
+    def store_distances(self, location: Dict[str, Any], store_ids: Sequence[int]) -> np.ndarray:
+        """
+        Consulta as distâncias da célula até várias lojas.
+        
+        Args:
+            location: Localização quantizada.
+            store_ids: IDs das lojas (ex: uma por oferta).
+        
+        Returns:
+            np.ndarray: Distâncias em km (2 casas decimais); NaN para lojas
+                fora do raio ou sem coordenadas.
+        """
+        by_store_id = self.row(location).by_store_id
+        return np.array(
+            [by_store_id.get(store_id, np.nan) for store_id in store_ids],
+            dtype=np.float64
+        )
+    
+    def nearby(
+        self,
+        location: Dict[str, Any],
+        radius_km: float,
+        limit: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Lojas da célula dentro de um raio, mais próximas primeiro.
+        
+        Raios acima de DISTANCE_MATRIX_RADIUS_KM consultam o índice diretamente.
+        
+        Args:
+            location: Localização quantizada.
+            radius_km: Raio em km.
+            limit: Número máximo de lojas (opcional).
+        
+        Returns:
+            List[Tuple[Dict[str, Any], float]]: (loja serializada, distância em km).
+        """
+        if radius_km > settings.DISTANCE_MATRIX_RADIUS_KM:
+            return store_index.within_radius(location['lat'], location['lon'], radius_km, limit)
+        
+        stores = [entry for entry in self.row(location).stores if entry[1] <= radius_km]
+        return stores[:limit] if limit is not None else stores
+    
+    def _compute(self, location: Dict[str, Any], version: int) -> DistanceRow:
+        """
+        Calcula a linha de uma célula: lojas do índice no raio e distâncias exatas.
+        
+        Args:
+            location: Localização quantizada.
+            version: Versão do índice de lojas.
+        
+        Returns:
+            DistanceRow: Linha calculada.
+        """
+        radius_km = settings.DISTANCE_MATRIX_RADIUS_KM
+        candidates = store_index.within_radius(
+            location['lat'],
+            location['lon'],
+            radius_km + INDEX_SLACK_KM
+        )
+        
+        stores = []
+        if candidates:
+            # Distâncias exatas com o mesmo kernel do scoring (uma chamada NumPy)
+            distances = haversine_km(
+                location['lat'],
+                location['lon'],
+                [store['latitude'] for store, _ in candidates],
+                [store['longitude'] for store, _ in candidates]
+            )
+            stores = [
+                (store, float(distance))
+                for (store, _), distance in zip(candidates, distances.tolist())
+                if distance <= radius_km
+            ]
+        
+        logger.debug(f"Matriz de distâncias calculada para {location['cell']}: {len(stores)} lojas")
+        return DistanceRow(stores, version)
+    
+    @staticmethod
+    def _expired(row: DistanceRow) -> bool:
+        """
+        Verifica se a linha passou do tempo de vida.
+        
+        Args:
+            row: Linha da matriz.
+        
+        Returns:
+            bool: True se calculada há mais de DISTANCE_MATRIX_TTL segundos.
+        """
+        return time.monotonic() - row.created_at > settings.DISTANCE_MATRIX_TTL
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retorna os contadores do LRU.
+        
+        Returns:
+            Dict[str, Any]: cells, max_cells, hits, misses e hit_rate.
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'cells': len(self._rows),
+                'max_cells': self._max_cells or settings.DISTANCE_MATRIX_MAX_CELLS,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / total, 4) if total else 0.0
+            }
+    
+    def clear(self) -> None:
+        """Remove todas as linhas e zera os contadores."""
+        with self._lock:
+            self._rows.clear()
+            self._hits = 0
+            self._misses = 0
+
+
+# Instância global da matriz
+distance_matrix = DistanceMatrix()
@@ -4,23 +4,64 @@ Geo Service - Geolocalização
 Módulo responsável por geocoding e cálculos de distância.
 """
 
-import time
-import requests
 from typing import Optional, Dict, List, Tuple
-from math import radians, cos, sin, asin, sqrt
+from math import cos, radians
 import logging
 
+import numpy as np
+
 from src.config.settings import Settings
-from src.services.cache import cache
+from src.services.geocoding import default_geocoder
+from src.services.store_index import store_index
 
 logger = logging.getLogger(__name__)
 settings = Settings()
 
 
+# Raio da Terra em km
+EARTH_RADIUS_KM = 6371
+
+# Km por grau de latitude
+KM_PER_DEGREE = 2 * np.pi * EARTH_RADIUS_KM / 360
+
+
+def haversine_km(
+    lat: float,
+    lon: float,
+    lats: np.ndarray,
+    lons: np.ndarray
+) -> np.ndarray:
+    """
+    Calcula, em uma única chamada NumPy, a distância de um ponto até vários pontos.
+    
+    Kernel único de Haversine do sistema (usado pelo wrapper escalar
+    calculate_distance, pelo scoring vetorizado e pela busca de lojas).
+    
+    Args:
+        lat: Latitude de origem.
+        lon: Longitude de origem.
+        lats: Latitudes de destino.
+        lons: Longitudes de destino.
+    
+    Returns:
+        np.ndarray: Distâncias em km, sem arredondamento (NaN onde não há coordenadas).
+    """
+    lat1 = np.radians(float(lat))
+    lon1 = np.radians(float(lon))
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+    
+    # Fórmula de Haversine
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Calcula a distância entre dois pontos usando fórmula de Haversine.
     
+    Wrapper escalar de haversine_km, mantido por compatibilidade.
+    
     Args:
         lat1: Latitude do primeiro ponto.
         lon1: Longitude do primeiro ponto.
@@ -31,33 +72,57 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
         float: Distância em quilômetros (precisão de 2 casas decimais).
     """
     try:
-        # Converter graus para radianos
-        lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-        
-        # Diferença de longitude e latitude
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        
-        # Fórmula de Haversine
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        
-        # Raio da Terra em km
-        km = 6371 * c
-        
-        return round(km, 2)
+        km = haversine_km(lat1, lon1, [float(lat2)], [float(lon2)])[0]
+        return round(float(km), 2)
     
     except Exception as e:
         logger.error(f"Erro ao calcular distância: {e}", exc_info=True)
         return 0.0
 
 
-def geocode_address(address: str) -> Optional[Dict[str, float]]:
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Calcula o retângulo lat/lon que contém o círculo de raio `radius_km`.
+    
+    Usado como pré-filtro em SQL (índice em latitude/longitude) antes do
+    cálculo exato das distâncias.
+    
+    Args:
+        lat: Latitude do centro.
+        lon: Longitude do centro.
+        radius_km: Raio em km.
+    
+    Returns:
+        Tuple[float, float, float, float]: (lat_min, lat_max, lon_min, lon_max).
+            Perto dos polos ou da linha de data a longitude cobre -180 a 180.
+    """
+    delta_lat = radius_km / KM_PER_DEGREE
+    lat_min = max(-90.0, lat - delta_lat)
+    lat_max = min(90.0, lat + delta_lat)
+    
+    # Largura de um grau de longitude na latitude mais afastada do equador
+    max_abs_lat = max(abs(lat_min), abs(lat_max))
+    if max_abs_lat >= 90.0:
+        return lat_min, lat_max, -180.0, 180.0
+    
+    delta_lon = radius_km / (KM_PER_DEGREE * cos(radians(max_abs_lat)))
+    if lon - delta_lon < -180.0 or lon + delta_lon > 180.0:
+        return lat_min, lat_max, -180.0, 180.0
+    
+    return lat_min, lat_max, lon - delta_lon, lon + delta_lon
+
+
+def geocode_address(address: str, timeout: Optional[float] = None) -> Optional[Dict[str, float]]:
     """
     Converte um endereço em coordenadas (lat, lon) usando Nominatim (OpenStreetMap).
     
+    Consulta primeiro o geocode_cache persistente; o provedor só é chamado
+    quando há token no limite global entre workers (ver `geocoding`). Para
+    lojas, prefira a fila em background (`geocoding.geocoding_queue`).
+    
     Args:
         address: Endereço a ser geocodificado.
+        timeout: Espera máxima pelo limite de requisições (padrão: GEOCODING_MAX_WAIT).
     
     Returns:
         Optional[Dict[str, float]]: Dicionário com 'lat' e 'lon' ou None se falhar.
@@ -65,77 +130,32 @@ def geocode_address(address: str) -> Optional[Dict[str, float]]:
     if not address:
         return None
     
-    # Verificar cache primeiro
-    cache_key = f"geocode:{address}"
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        logger.debug(f"Geocoding cache hit para: {address}")
-        return cached_result
-    
     try:
-        # Nominatim API
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            'q': address,
-            'format': 'json',
-            'limit': 1,
-            'addressdetails': 1,
-            'countrycodes': 'br'  # Restringir ao Brasil
-        }
-        
-        headers = {
-            'User-Agent': settings.USER_AGENT
-        }
-        
-        logger.info(f"Geocodificando endereço: {address}")
-        
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if data and len(data) > 0:
-            result = data[0]
-            coordinates = {
-                'lat': float(result['lat']),
-                'lon': float(result['lon'])
-            }
-            
-            # Cachear resultado (24 horas)
-            cache.set(cache_key, coordinates, ttl=86400)
-            
-            logger.info(f"Endereço geocodificado: {address} -> lat={coordinates['lat']}, lon={coordinates['lon']}")
-            
-            return coordinates
-        else:
-            logger.warning(f"Endereço não encontrado: {address}")
-            return None
-    
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Erro ao geocodificar endereço '{address}': {e}")
-        return None
+        return default_geocoder.geocode(address, timeout=timeout)
     
     except Exception as e:
         logger.error(f"Erro ao processar geocoding: {e}", exc_info=True)
         return None
-    
-    finally:
-        # Rate limiting: Nominatim permite 1 req/segundo
-        time.sleep(1)
 
 
 def find_nearest_stores(
     user_location: Dict[str, float],
-    stores: List[Dict],
-    max_distance: float = 20.0
+    stores: Optional[List[Dict]] = None,
+    max_distance: float = 20.0,
+    limit: Optional[int] = None
 ) -> List[Dict]:
     """
     Encontra lojas dentro de um raio máximo e ordena por distância.
     
+    Sem `stores`, consulta o índice espacial compartilhado (todas as lojas do
+    banco) em vez de percorrer a lista.
+    
     Args:
         user_location: Dicionário com 'lat' e 'lon' do usuário.
-        stores: Lista de lojas (cada loja deve ter 'latitude' e 'longitude').
+        stores: Lista de lojas (cada loja deve ter 'latitude' e 'longitude');
+            None para usar o índice de lojas.
         max_distance: Distância máxima em km (padrão: 20km).
+        limit: Número máximo de lojas (opcional).
     
     Returns:
         List[Dict]: Lista de lojas dentro do raio, ordenadas por distância.
@@ -148,6 +168,19 @@ def find_nearest_stores(
         user_lat = user_location['lat']
         user_lon = user_location['lon']
         
+        if stores is None:
+            nearby_stores = [
+                {**store, 'distance_km': round(distance, 2)}
+                for store, distance in store_index.within_radius(
+                    float(user_lat),
+                    float(user_lon),
+                    max_distance,
+                    limit
+                )
+            ]
+            logger.info(f"Encontradas {len(nearby_stores)} lojas dentro de {max_distance}km")
+            return nearby_stores
+        
         nearby_stores = []
         
         for store in stores:
@@ -176,6 +209,8 @@ def find_nearest_stores(
         
         # Ordenar por distância
         nearby_stores.sort(key=lambda x: x['distance_km'])
+        if limit is not None:
+            nearby_stores = nearby_stores[:limit]
         
         logger.info(f"Encontradas {len(nearby_stores)} lojas dentro de {max_distance}km")
         
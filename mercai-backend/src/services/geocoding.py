@@ -0,0 +1,573 @@
+"""
+Geocoding Service - Geocoding com Limite Global e Fila em Background
+
+Módulo responsável por converter endereços em coordenadas sem bloquear
+requisições:
+- resultados persistidos na tabela geocode_cache (endereço normalizado);
+- token bucket compartilhado entre workers (Redis, ou local sem Redis) que
+  limita as consultas ao provedor a GEOCODING_RATE_PER_SECOND no total;
+- fila em background que geocodifica lojas salvas com endereço e sem
+  coordenadas, fora da thread da requisição;
+- provedor plugável (Nominatim em NOMINATIM_URL por padrão), permitindo
+  apontar para um servidor local compatível em testes.
+"""
+
+from datetime import datetime, timedelta
+from itertools import chain
+from queue import Queue
+from threading import Lock, Thread
+from typing import Dict, Any, Optional, Callable
+import logging
+import re
+import time
+import unicodedata
+
+import requests
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.config.database import SessionLocal
+from src.config.settings import Settings
+from src.models.geocode_cache import GeocodeCache
+from src.models.store import Store
+from src.services.cache import cache
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Chave do token bucket no Redis
+RATE_LIMIT_KEY = 'geocode:rate_limit'
+
+# Prefixo das métricas do geocode_cache em `cache.metrics`
+GEOCODE_METRICS_PREFIX = 'geocode'
+
+# Chave em session.info com as lojas a geocodificar após o commit
+PENDING_STORES_KEY = 'geocode_pending_stores'
+
+# Token bucket atômico no Redis (relógio do próprio Redis, comum a todos os workers).
+# Retorna 0 se consumiu um token ou os segundos até o próximo token.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """
+    Normaliza um endereço para uso como chave do geocode_cache.
+    
+    Remove acentos, pontuação e espaços repetidos e converte para minúsculas,
+    de modo que "Av. Central, 123" e "av central 123" compartilhem o resultado.
+    
+    Args:
+        address: Endereço informado.
+    
+    Returns:
+        str: Endereço normalizado (vazio se não houver endereço).
+    """
+    if not address:
+        return ''
+    
+    text = unicodedata.normalize('NFKD', address)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r'[^\w]+', ' ', text.lower())
+    return ' '.join(text.split())[:500]
+
+
+class NominatimProvider:
+    """
+    Provedor de geocoding com a API de busca do Nominatim (OpenStreetMap).
+    
+    Qualquer servidor compatível pode ser usado via `base_url` (ex: um
+    servidor local nos testes).
+    """
+    
+    name = 'nominatim'
+    
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        timeout: Optional[int] = None
+    ):
+        """
+        Inicializa o provedor.
+        
+        Args:
+            base_url: URL base do servidor (padrão: NOMINATIM_URL).
+            user_agent: User-Agent das requisições (padrão: USER_AGENT).
+            timeout: Timeout em segundos (padrão: GEOCODING_TIMEOUT).
+        """
+        self.base_url = (base_url or settings.NOMINATIM_URL).rstrip('/')
+        self.user_agent = user_agent or settings.USER_AGENT
+        self.timeout = timeout or settings.GEOCODING_TIMEOUT
+    
+    def geocode(self, address: str) -> Optional[Dict[str, float]]:
+        """
+        Consulta as coordenadas de um endereço.
+        
+        Args:
+            address: Endereço a ser geocodificado.
+        
+        Returns:
+            Optional[Dict[str, float]]: {'lat', 'lon'} ou None se não encontrado.
+        
+        Raises:
+            requests.exceptions.RequestException: Em falhas de rede/HTTP.
+        """
+        params = {
+            'q': address,
+            'format': 'json',
+            'limit': 1,
+            'addressdetails': 1,
+            'countrycodes': 'br'  # Restringir ao Brasil
+        }
+        headers = {
+            'User-Agent': self.user_agent
+        }
+        
+        response = requests.get(
+            f"{self.base_url}/search",
+            params=params,
+            headers=headers,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        
+        data = response.json()
+        if not data:
+            return None
+        
+        return {
+            'lat': float(data[0]['lat']),
+            'lon': float(data[0]['lon'])
+        }
+
+
+class TokenBucket:
+    """
+    Token bucket para o limite de consultas ao provedor.
+    
+    Com Redis, o estado fica em RATE_LIMIT_KEY e é atualizado por um script
+    Lua, valendo para todos os workers; sem Redis, o limite é por processo.
+    """
+    
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        capacity: float = 1.0,
+        key: str = RATE_LIMIT_KEY,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Inicializa o bucket.
+        
+        Args:
+            rate: Tokens por segundo (padrão: GEOCODING_RATE_PER_SECOND).
+            capacity: Máximo de tokens acumulados (rajada).
+            key: Chave do estado no Redis.
+            clock: Relógio do bucket local.
+            sleep: Função de espera.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.key = key
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = Lock()
+        self._tokens = capacity
+        self._updated_at = clock()
+    
+    def try_acquire(self) -> float:
+        """
+        Tenta consumir um token.
+        
+        Returns:
+            float: 0 se o token foi consumido ou os segundos até haver um token.
+        """
+        rate = self.rate or settings.GEOCODING_RATE_PER_SECOND
+        
+        client = cache.client
+        if client is not None:
+            try:
+                return float(client.eval(TOKEN_BUCKET_SCRIPT, 1, self.key, rate, self.capacity))
+            except Exception as e:
+                logger.error(f"Erro no token bucket do Redis, usando limite local: {e}")
+        
+        with self._lock:
+            now = self._clock()
+            elapsed = max(0.0, now - self._updated_at)
+            self._tokens = min(self.capacity, self._tokens + elapsed * rate)
+            self._updated_at = now
+            
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / rate
+    
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Aguarda até consumir um token.
+        
+        Args:
+            timeout: Espera máxima em segundos (None: sem limite).
+        
+        Returns:
+            bool: True se o token foi consumido, False se o timeout expirou.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return True
+            if timeout is not None and waited + wait > timeout:
+                return False
+            self._sleep(wait)
+            waited += wait
+
+
+class Geocoder:
+    """
+    Geocoding com cache persistente e limite global de consultas.
+    """
+    
+    def __init__(self, provider: Optional[Any] = None, bucket: Optional[TokenBucket] = None):
+        """
+        Inicializa o geocoder.
+        
+        Args:
+            provider: Provedor com `name` e `geocode(address)` (padrão: NominatimProvider).
+            bucket: Token bucket das consultas (padrão: bucket global).
+        """
+        self._provider = provider
+        self.bucket = bucket or TokenBucket()
+    
+    @property
+    def provider(self) -> Any:
+        """Provedor em uso (criado a partir das configurações na primeira consulta)."""
+        if self._provider is None:
+            self._provider = NominatimProvider()
+        return self._provider
+    
+    def set_provider(self, provider: Any) -> None:
+        """
+        Troca o provedor de geocoding.
+        
+        Args:
+            provider: Provedor com `name` e `geocode(address)`.
+        """
+        self._provider = provider
+    
+    def lookup(self, address: str) -> Optional[GeocodeCache]:
+        """
+        Busca o resultado persistido de um endereço, sem consultar o provedor.
+        
+        Args:
+            address: Endereço (normalizado ou não).
+        
+        Returns:
+            Optional[GeocodeCache]: Resultado válido ou None (ausente ou negativo expirado).
+        """
+        key = normalize_address(address)
+        if not key:
+            return None
+        
+        db = SessionLocal()
+        try:
+            entry = db.get(GeocodeCache, key)
+            if entry is None:
+                return None
+            
+            if not entry.found:
+                max_age = timedelta(days=settings.GEOCODING_NEGATIVE_TTL_DAYS)
+                if datetime.utcnow() - entry.updated_at > max_age:
+                    return None
+            
+            db.expunge(entry)
+            return entry
+        finally:
+            db.close()
+    
+    def geocode(self, address: str, timeout: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """
+        Converte um endereço em coordenadas.
+        
+        Consulta o geocode_cache; na ausência, aguarda um token do limite
+        global, consulta o provedor e persiste o resultado (inclusive
+        "não encontrado"). Falhas de rede não são persistidas.
+        
+        Args:
+            address: Endereço a ser geocodificado.
+            timeout: Espera máxima por um token (padrão: GEOCODING_MAX_WAIT).
+        
+        Returns:
+            Optional[Dict[str, float]]: {'lat', 'lon'} ou None se não encontrado.
+        """
+        key = normalize_address(address)
+        if not key:
+            return None
+        
+        entry = self.lookup(key)
+        cache.metrics.incr(GEOCODE_METRICS_PREFIX, 'misses' if entry is None else 'hits')
+        if entry is not None:
+            logger.debug(f"Geocoding cache hit para: {address}")
+            return entry.coordinates()
+        
+        wait = settings.GEOCODING_MAX_WAIT if timeout is None else timeout
+        if not self.bucket.acquire(timeout=wait):
+            logger.warning(f"Limite de geocoding atingido, endereço adiado: {address}")
+            return None
+        
+        provider = self.provider
+        try:
+            logger.info(f"Geocodificando endereço: {address}")
+            coordinates = provider.geocode(address)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Erro ao geocodificar endereço '{address}': {e}")
+            return None
+        
+        self._save(key, coordinates, provider.name)
+        
+        if coordinates:
+            logger.info(f"Endereço geocodificado: {address} -> lat={coordinates['lat']}, lon={coordinates['lon']}")
+        else:
+            logger.warning(f"Endereço não encontrado: {address}")
+        
+        return coordinates
+    
+    @staticmethod
+    def _save(key: str, coordinates: Optional[Dict[str, float]], provider_name: str) -> None:
+        """
+        Persiste o resultado de uma consulta.
+        
+        Args:
+            key: Endereço normalizado.
+            coordinates: Coordenadas ou None (não encontrado).
+            provider_name: Nome do provedor.
+        """
+        db = SessionLocal()
+        try:
+            entry = db.get(GeocodeCache, key) or GeocodeCache(address=key)
+            entry.latitude = coordinates['lat'] if coordinates else None
+            entry.longitude = coordinates['lon'] if coordinates else None
+            entry.provider = provider_name
+            entry.updated_at = datetime.utcnow()
+            db.add(entry)
+            db.commit()
+        except IntegrityError:
+            # Outro worker gravou o mesmo endereço ao mesmo tempo
+            db.rollback()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erro ao salvar resultado de geocoding ({key}): {e}", exc_info=True)
+        finally:
+            db.close()
+
+
+def geocode_store(db: Session, store: Store, geocoder: Optional[Geocoder] = None) -> bool:
+    """
+    Preenche as coordenadas de uma loja a partir do endereço.
+    
+    Args:
+        db: Sessão do banco (a loja é apenas alterada, sem commit).
+        store: Loja com endereço.
+        geocoder: Geocoder a usar (padrão: global).
+    
+    Returns:
+        bool: True se as coordenadas foram preenchidas.
+    """
+    coordinates = (geocoder or default_geocoder).geocode(store.address)
+    if not coordinates:
+        return False
+    
+    store.latitude = coordinates['lat']
+    store.longitude = coordinates['lon']
+    return True
+
+
+def geocode_missing_stores(
+    db: Session,
+    limit: Optional[int] = None,
+    geocoder: Optional[Geocoder] = None
+) -> Dict[str, int]:
+    """
+    Geocodifica as lojas com endereço e sem coordenadas (respeitando o limite global).
+    
+    Cada loja é confirmada individualmente, preservando o progresso se o
+    processo for interrompido.
+    
+    Args:
+        db: Sessão do banco.
+        limit: Número máximo de lojas (opcional).
+        geocoder: Geocoder a usar (padrão: global).
+    
+    Returns:
+        Dict[str, int]: total, geocoded e not_found.
+    """
+    query = db.query(Store).filter(
+        Store.address.isnot(None),
+        Store.address != '',
+        (Store.latitude.is_(None)) | (Store.longitude.is_(None))
+    ).order_by(Store.id)
+    if limit:
+        query = query.limit(limit)
+    
+    stats = {'total': 0, 'geocoded': 0, 'not_found': 0}
+    for store in query.all():
+        stats['total'] += 1
+        if geocode_store(db, store, geocoder):
+            db.commit()
+            stats['geocoded'] += 1
+        else:
+            stats['not_found'] += 1
+    
+    return stats
+
+
+class GeocodingQueue:
+    """
+    Fila em background de lojas a geocodificar.
+    
+    Uma thread daemon (iniciada na primeira loja enfileirada) processa as
+    lojas em ordem, cada uma em sua própria sessão.
+    """
+    
+    def __init__(self, geocoder: Optional[Geocoder] = None):
+        """
+        Inicializa a fila.
+        
+        Args:
+            geocoder: Geocoder a usar (padrão: global).
+        """
+        self._geocoder = geocoder
+        self._queue: Queue = Queue()
+        self._pending = set()
+        self._lock = Lock()
+        self._thread: Optional[Thread] = None
+    
+    def enqueue_store(self, store_id: int) -> bool:
+        """
+        Enfileira uma loja (ignorada se já estiver pendente).
+        
+        Args:
+            store_id: ID da loja.
+        
+        Returns:
+            bool: True se a loja foi enfileirada.
+        """
+        if not settings.GEOCODING_QUEUE_ENABLED:
+            return False
+        
+        with self._lock:
+            if store_id in self._pending:
+                return False
+            self._pending.add(store_id)
+            
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name='geocoding-queue', daemon=True)
+                self._thread.start()
+        
+        self._queue.put(store_id)
+        return True
+    
+    def join(self) -> None:
+        """Aguarda o processamento de todas as lojas enfileiradas."""
+        self._queue.join()
+    
+    def _run(self) -> None:
+        """Loop da thread de processamento."""
+        while True:
+            store_id = self._queue.get()
+            try:
+                self._process(store_id)
+            except Exception as e:
+                logger.error(f"Erro ao geocodificar loja {store_id}: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    self._pending.discard(store_id)
+                self._queue.task_done()
+    
+    def _process(self, store_id: int) -> None:
+        """
+        Geocodifica uma loja, se ainda estiver sem coordenadas.
+        
+        Args:
+            store_id: ID da loja.
+        """
+        db = SessionLocal()
+        try:
+            store = db.get(Store, store_id)
+            if store is None or not store.address:
+                return
+            if store.latitude is not None and store.longitude is not None:
+                return
+            
+            if geocode_store(db, store, self._geocoder):
+                db.commit()
+                logger.info(f"Loja {store_id} geocodificada em background")
+        finally:
+            db.close()
+
+
+# Instâncias globais
+default_geocoder = Geocoder()
+geocoding_queue = GeocodingQueue()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stores_to_geocode(session: Session, flush_context) -> None:
+    """
+    Registra as lojas salvas com endereço e sem coordenadas.
+    
+    Args:
+        session: Sessão sincronizada.
+        flush_context: Contexto do flush.
+    """
+    for obj in chain(session.new, session.dirty):
+        if (
+            isinstance(obj, Store)
+            and obj.address
+            and (obj.latitude is None or obj.longitude is None)
+        ):
+            session.info.setdefault(PENDING_STORES_KEY, set()).add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_stores_to_geocode(session: Session) -> None:
+    """
+    Enfileira, após o commit, as lojas a geocodificar.
+    
+    Args:
+        session: Sessão confirmada.
+    """
+    for store_id in sorted(session.info.pop(PENDING_STORES_KEY, ())):
+        geocoding_queue.enqueue_store(store_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_stores_to_geocode(session: Session, previous_transaction) -> None:
+    """
+    Descarta as lojas registradas quando a transação é desfeita.
+    
+    Args:
+        session: Sessão.
+        previous_transaction: Transação desfeita.
+    """
+    session.info.pop(PENDING_STORES_KEY, None)
@@ -0,0 +1,83 @@
+"""
+List Summary - Resumo das Listas de Compras
+
+Módulo com o resumo (número de itens e total estimado) de todas as listas de
+um usuário em uma única query agregada, sem carregar itens, produtos e
+ofertas como objetos ORM.
+
+O total segue `ShoppingList.calculate_total`: menor preço materializado em
+product_best_offers e, para produtos sem resumo, a oferta em estoque mais
+barata (subquery correlacionada).
+"""
+
+from typing import Any, Dict, NamedTuple, Optional
+import logging
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from src.models.list_item import ListItem
+from src.models.offer import Offer
+from src.models.product_best_offers import ProductBestOffers
+from src.models.shopping_list import ShoppingList
+
+logger = logging.getLogger(__name__)
+
+
+class ListSummary(NamedTuple):
+    """
+    Resumo de uma lista de compras.
+    
+    Attributes:
+        items_count: Número de itens.
+        estimated_total: Total estimado pelas ofertas mais baratas (None se
+            nenhum item tem preço).
+    """
+    
+    items_count: int
+    estimated_total: Optional[float]
+
+
+def load_list_summaries(db: Session, user_id: Any) -> Dict[Any, ListSummary]:
+    """
+    Calcula o resumo de todas as listas de um usuário (1 query).
+    
+    Args:
+        db: Sessão do banco de dados.
+        user_id: UUID do usuário.
+    
+    Returns:
+        Dict[Any, ListSummary]: Resumo por id da lista (inclusive listas vazias).
+    """
+    cheapest_offer = select(
+        func.min(Offer.price)
+    ).where(
+        Offer.product_id == ListItem.product_id,
+        Offer.in_stock == True
+    ).correlate(ListItem).scalar_subquery()
+    
+    unit_price = case(
+        (ProductBestOffers.product_id.isnot(None), ProductBestOffers.min_price),
+        else_=cheapest_offer
+    )
+    
+    rows = db.query(
+        ShoppingList.id,
+        func.count(ListItem.id).label('items_count'),
+        func.sum(unit_price * ListItem.quantity).label('total'),
+        func.count(unit_price).label('priced_items')
+    ).outerjoin(
+        ListItem, ListItem.list_id == ShoppingList.id
+    ).outerjoin(
+        ProductBestOffers, ProductBestOffers.product_id == ListItem.product_id
+    ).filter(
+        ShoppingList.user_id == user_id
+    ).group_by(ShoppingList.id).all()
+    
+    return {
+        row.id: ListSummary(
+            row.items_count,
+            round(float(row.total), 2) if row.priced_items else None
+        )
+        for row in rows
+    }
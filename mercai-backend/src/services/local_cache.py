@@ -0,0 +1,183 @@
+"""
+Local Cache - Cache em Memória do Processo (L1)
+
+Módulo com o LRU limitado por número de entradas e por TTL usado pelo
+CacheService na frente do Redis (L2). Cada worker tem o seu; as invalidações
+entre workers chegam pelo pub/sub do Redis (ver `cache`).
+"""
+
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from threading import Lock
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import time
+
+
+class L1Policy(NamedTuple):
+    """
+    Política do L1 para um prefixo de chave.
+    
+    Attributes:
+        ttl: TTL máximo (segundos) da entrada no L1 quando há Redis; sem Redis,
+            vale o TTL pedido em `set` (o L1 é o único nível). None usa CACHE_L1_TTL.
+    """
+    
+    ttl: Optional[int] = None
+
+
+class LocalCache:
+    """
+    LRU thread-safe com expiração por entrada e índice de tags.
+    """
+    
+    def __init__(self, max_entries: int):
+        """
+        Inicializa o cache.
+        
+        Args:
+            max_entries: Número máximo de entradas.
+        """
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]' = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = Lock()
+    
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Busca uma entrada válida.
+        
+        Args:
+            key: Chave do cache.
+        
+        Returns:
+            Tuple[bool, Any]: (encontrada, valor armazenado).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            
+            expires_at, value, _ = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                return False, None
+            
+            self._entries.move_to_end(key)
+            return True, value
+    
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        """
+        Salva uma entrada, descartando as menos usadas acima do limite.
+        
+        Args:
+            key: Chave do cache.
+            value: Valor armazenado.
+            ttl: Tempo de vida em segundos.
+            tags: Tags da entrada (ver `delete_tags`).
+        """
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def delete(self, key: str) -> bool:
+        """
+        Remove uma entrada.
+        
+        Args:
+            key: Chave do cache.
+        
+        Returns:
+            bool: True se a entrada existia.
+        """
+        with self._lock:
+            return self._remove(key)
+    
+    def delete_pattern(self, pattern: str) -> int:
+        """
+        Remove as entradas que casam com um padrão glob (mesma sintaxe do KEYS).
+        
+        Args:
+            pattern: Padrão (ex: "ranking:*").
+        
+        Returns:
+            int: Número de entradas removidas.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if fnmatchcase(key, pattern)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+    
+    def delete_tags(self, tags: Iterable[str]) -> int:
+        """
+        Remove as entradas marcadas com qualquer uma das tags.
+        
+        Args:
+            tags: Tags (ex: ["product:42", "list:<uuid>"]).
+        
+        Returns:
+            int: Número de entradas removidas.
+        """
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+    
+    def tag_members(self, tag: str) -> List[str]:
+        """
+        Lista as chaves marcadas com uma tag.
+        
+        Args:
+            tag: Tag.
+        
+        Returns:
+            List[str]: Chaves em ordem alfabética.
+        """
+        with self._lock:
+            return sorted(self._tags.get(tag, ()))
+    
+    def clear(self) -> None:
+        """Remove todas as entradas."""
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+    
+    def _remove(self, key: str) -> bool:
+        """
+        Remove uma entrada e suas referências no índice de tags (chamar com o lock).
+        
+        Args:
+            key: Chave do cache.
+        
+        Returns:
+            bool: True se a entrada existia.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+    
+    def __len__(self) -> int:
+        """Número de entradas (inclui as expiradas ainda não removidas)."""
+        return len(self._entries)
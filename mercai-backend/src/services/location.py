@@ -0,0 +1,253 @@
+"""
+Location Service - Quantização de Localização
+
+Módulo responsável por quantizar coordenadas em células geohash, para que
+chaves de cache que dependem da localização do usuário não mudem a cada
+variação de GPS. Os cálculos de proximidade usam o centróide da célula.
+"""
+
+from typing import Optional, Dict, Any, Tuple
+from threading import Lock
+import logging
+
+from src.config.settings import Settings
+from src.services.geo import calculate_distance
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Alfabeto base32 do geohash
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precisão máxima suportada (12 caracteres ≈ 3,7 cm)
+GEOHASH_MAX_PRECISION = 12
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 7) -> str:
+    """
+    Codifica uma coordenada em geohash.
+    
+    Precisões de referência: 6 ≈ 1,2 km x 0,6 km; 7 ≈ 153 m x 153 m;
+    8 ≈ 38 m x 19 m.
+    
+    Args:
+        lat: Latitude (-90 a 90).
+        lon: Longitude (-180 a 180).
+        precision: Número de caracteres do geohash (1 a 12).
+    
+    Returns:
+        str: Geohash da célula que contém a coordenada.
+    
+    Raises:
+        ValueError: Se a precisão ou as coordenadas forem inválidas.
+    """
+    if not 1 <= precision <= GEOHASH_MAX_PRECISION:
+        raise ValueError(f"Precisão de geohash inválida: {precision}")
+    
+    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        raise ValueError(f"Coordenadas fora do range válido: {lat}, {lon}")
+    
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    
+    cell = []
+    bits = 0
+    bit_count = 0
+    even_bit = True  # Bits pares codificam longitude
+    
+    while len(cell) < precision:
+        value, value_range = (lon, lon_range) if even_bit else (lat, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        
+        even_bit = not even_bit
+        bit_count += 1
+        
+        if bit_count == 5:
+            cell.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    
+    return ''.join(cell)
+
+
+def geohash_bounds(cell: str) -> Tuple[float, float, float, float]:
+    """
+    Retorna os limites de uma célula geohash.
+    
+    Args:
+        cell: Geohash.
+    
+    Returns:
+        Tuple[float, float, float, float]: (lat_min, lat_max, lon_min, lon_max).
+    
+    Raises:
+        ValueError: Se o geohash contiver caracteres inválidos.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even_bit = True
+    
+    for char in cell.lower():
+        index = GEOHASH_BASE32.find(char)
+        if index < 0:
+            raise ValueError(f"Geohash inválido: {cell}")
+        
+        for shift in range(4, -1, -1):
+            bit = (index >> shift) & 1
+            value_range = lon_range if even_bit else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            
+            if bit:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            
+            even_bit = not even_bit
+    
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def geohash_decode(cell: str) -> Tuple[float, float]:
+    """
+    Retorna o centróide de uma célula geohash.
+    
+    Args:
+        cell: Geohash.
+    
+    Returns:
+        Tuple[float, float]: (latitude, longitude) do centro da célula.
+    """
+    lat_min, lat_max, lon_min, lon_max = geohash_bounds(cell)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def quantize_location(
+    user_location: Optional[Dict[str, float]],
+    precision: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Substitui a localização do usuário pelo centróide da sua célula geohash.
+    
+    Args:
+        user_location: Dicionário com 'lat' e 'lon' (opcional).
+        precision: Precisão do geohash (padrão: LOCATION_GEOHASH_PRECISION).
+    
+    Returns:
+        Optional[Dict[str, Any]]: {'lat', 'lon', 'cell'} do centróide ou None
+            se a localização não for informada ou for inválida.
+    """
+    if not user_location:
+        return None
+    
+    try:
+        lat = float(user_location['lat'])
+        lon = float(user_location['lon'])
+        cell = geohash_encode(lat, lon, precision or settings.LOCATION_GEOHASH_PRECISION)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Localização inválida para quantização: {user_location} ({e})")
+        return None
+    
+    centroid_lat, centroid_lon = geohash_decode(cell)
+    return {
+        'lat': centroid_lat,
+        'lon': centroid_lon,
+        'cell': cell
+    }
+
+
+class LocationCacheStats:
+    """
+    Contadores de hit/miss dos caches chaveados por célula geohash.
+    
+    Também acumula o deslocamento (km) entre a localização real e o centróide
+    usado no cálculo, para calibrar a precisão contra o erro de score.
+    """
+    
+    def __init__(self):
+        """Inicializa os contadores."""
+        self._lock = Lock()
+        self._namespaces: Dict[str, Dict[str, float]] = {}
+    
+    def record(
+        self,
+        namespace: str,
+        hit: bool,
+        user_location: Optional[Dict[str, float]] = None,
+        quantized: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Registra um acesso ao cache.
+        
+        Args:
+            namespace: Cache de origem (ex: "ranking", "stores_nearby").
+            hit: True se o valor veio do cache.
+            user_location: Localização original do usuário (opcional).
+            quantized: Localização quantizada usada na chave (opcional).
+        """
+        displacement = None
+        if user_location and quantized:
+            displacement = calculate_distance(
+                float(user_location['lat']),
+                float(user_location['lon']),
+                quantized['lat'],
+                quantized['lon']
+            )
+        
+        with self._lock:
+            counters = self._namespaces.setdefault(namespace, {
+                'hits': 0,
+                'misses': 0,
+                'displacement_sum_km': 0.0,
+                'displacement_max_km': 0.0,
+                'displacement_samples': 0
+            })
+            counters['hits' if hit else 'misses'] += 1
+            
+            if displacement is not None:
+                counters['displacement_sum_km'] += displacement
+                counters['displacement_max_km'] = max(counters['displacement_max_km'], displacement)
+                counters['displacement_samples'] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retorna os contadores atuais.
+        
+        Returns:
+            Dict[str, Any]: Precisão configurada e, por namespace, hits, misses,
+                hit_rate e deslocamento médio/máximo em km.
+        """
+        with self._lock:
+            namespaces = {}
+            for namespace, counters in self._namespaces.items():
+                total = counters['hits'] + counters['misses']
+                samples = counters['displacement_samples']
+                namespaces[namespace] = {
+                    'hits': counters['hits'],
+                    'misses': counters['misses'],
+                    'hit_rate': round(counters['hits'] / total, 4) if total else 0.0,
+                    'avg_displacement_km': (
+                        round(counters['displacement_sum_km'] / samples, 4) if samples else 0.0
+                    ),
+                    'max_displacement_km': counters['displacement_max_km']
+                }
+        
+        return {
+            'precision': settings.LOCATION_GEOHASH_PRECISION,
+            'namespaces': namespaces
+        }
+    
+    def reset(self) -> None:
+        """Zera todos os contadores."""
+        with self._lock:
+            self._namespaces.clear()
+
+
+# Instância global dos contadores
+location_cache_stats = LocationCacheStats()
@@ -4,21 +4,57 @@ Ranking Service - Algoritmo de Ranking
 Módulo responsável por calcular scores e gerar rankings de ofertas.
 """
 
-from typing import Dict, List, Optional, Any
-from decimal import Decimal
+from typing import Dict, List, Optional, Any, Callable, Iterator, Tuple
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+import hashlib
+import json
 import logging
 import uuid
 
+import numpy as np
+
 from src.config.database import get_db
+from src.config.settings import Settings
 from src.models.shopping_list import ShoppingList
 from src.models.list_item import ListItem
 from src.models.offer import Offer
-from src.models.product import Product
-from src.models.store import Store
-from src.services.cache import cache
+from src.services.cache import CacheItem, Tagged, cache
+from src.services.cache_tags import list_tag, product_tag, store_tag, invalidate_list
+from src.services.distance_matrix import distance_matrix
+from src.services.basket_optimizer import optimize_basket
 from src.services.geo import calculate_distance, calculate_proximity_score
+from src.services.location import quantize_location, location_cache_stats
+from src.services.ranking_loader import (
+    load_items_for_lists,
+    load_list_items,
+    load_list_signature,
+    load_best_offers_for_products,
+    load_products,
+    StorePrices,
+)
+from src.services.scoring import build_offer_columns, rank_offer_columns
+from src.services.timing import span, count
 
 logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Número de ofertas retornadas por item do ranking
+TOP_OFFERS_PER_ITEM = 5
+
+# Tempo de vida do ranking cacheado (invalidado pela tag da lista e das ofertas)
+RANKING_CACHE_TTL = settings.CACHE_ENTITY_TTL
+
+# Itens pontuados por vez no ranking em streaming
+STREAM_CHUNK_SIZE = 20
+
+# Item de uma cesta avulsa (mesma interface de ListItem usada no ranking)
+BasketLine = namedtuple('BasketLine', ['id', 'product_id', 'product', 'quantity'])
+
+# Pool de processos para o cálculo das combinações em lote (criado sob demanda)
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = Lock()
 
 
 def calculate_offer_score(
@@ -110,131 +146,601 @@ def calculate_offer_score(
         return 0.0
 
 
+def score_list_offers(
+    offers_by_product: Dict[int, List[Offer]],
+    user_location: Optional[Dict[str, float]] = None,
+    top_k: int = TOP_OFFERS_PER_ITEM,
+    max_prices: Optional[Dict[int, float]] = None
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Pontua todas as ofertas de uma lista de uma vez e retorna o top-k de cada produto.
+    
+    Usa o kernel vetorizado de `scoring` (mesmos scores de calculate_offer_score,
+    normalizados pelo maior preço de cada produto) e serializa apenas as
+    ofertas selecionadas.
+    
+    Args:
+        offers_by_product: Ofertas (com lojas carregadas) agrupadas por product_id.
+        user_location: Dicionário com 'lat' e 'lon' do usuário (opcional). Se
+            quantizada (com 'cell'), as distâncias vêm da matriz célula × loja.
+        top_k: Número de ofertas a retornar por produto.
+        max_prices: Maior preço em estoque por product_id (opcional). Quando as
+            ofertas são apenas candidatas (product_best_offers), mantém a
+            normalização pelo maior preço de todas as ofertas do produto.
+    
+    Returns:
+        Dict[int, List[Dict[str, Any]]]: Ofertas serializadas com 'score',
+            maior score primeiro, por product_id.
+    """
+    product_ids = [product_id for product_id, offers in offers_by_product.items() if offers]
+    if not product_ids:
+        return {}
+    
+    max_prices = max_prices or {}
+    flat_offers = []
+    group_index = []
+    offer_max_price = []
+    for position, product_id in enumerate(product_ids):
+        offers = offers_by_product[product_id]
+        product_max = max_prices.get(product_id)
+        if product_max is None:
+            product_max = max(float(offer.price) for offer in offers)
+        flat_offers.extend(offers)
+        group_index.extend([position] * len(offers))
+        offer_max_price.extend([product_max] * len(offers))
+    
+    count('offers_scored', len(flat_offers))
+    
+    with span('scoring'):
+        columns = build_offer_columns(flat_offers)
+        if user_location and 'cell' in user_location:
+            columns['store_distance'] = distance_matrix.store_distances(
+                user_location,
+                [offer.store_id for offer in flat_offers]
+            )
+        scores, top_indices = rank_offer_columns(
+            columns,
+            np.array(group_index, dtype=np.int64),
+            user_location,
+            k=top_k,
+            max_price=np.array(offer_max_price, dtype=np.float64)
+        )
+    
+    result = {}
+    with span('serialize'):
+        for position, indices in top_indices.items():
+            scored_offers = []
+            for index in indices:
+                offer_dict = flat_offers[index].to_dict(include_store=True)
+                offer_dict['score'] = float(scores[index])
+                scored_offers.append(offer_dict)
+            result[product_ids[position]] = scored_offers
+    
+    return result
+
+
+def build_basket_item(item: ListItem, prices: Dict[int, float]) -> Dict[str, Any]:
+    """
+    Monta o estado de um item para o otimizador de cesta.
+    
+    As ofertas ficam como pares [store_id, preço] para sobreviver à
+    serialização JSON do cache sem converter os IDs em string.
+    
+    Args:
+        item: Item da lista (ListItem ou BasketLine, com produto).
+        prices: Menor preço do produto em cada loja que o vende, por store_id.
+    
+    Returns:
+        Dict[str, Any]: {item_id, product_id, quantity, offers: [[store_id, price]]}.
+    """
+    return {
+        "item_id": item.id,
+        "product_id": item.product_id,
+        "quantity": item.quantity,
+        "offers": [[store_id, price] for store_id, price in prices.items()]
+    }
+
+
+def build_ranking_item(item: ListItem, scored_offers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Monta a entrada do ranking de um item.
+    
+    Args:
+        item: Item da lista (ListItem ou BasketLine, com produto).
+        scored_offers: Top ofertas do produto com 'score' (maior primeiro).
+    
+    Returns:
+        Dict[str, Any]: Item do ranking com melhor oferta e top 5 ofertas.
+    """
+    return {
+        "item_id": item.id,
+        "product": item.product.to_dict(),
+        "quantity": item.quantity,
+        "best_offer": scored_offers[0] if scored_offers else None,
+        "all_offers": scored_offers  # Top 5 ofertas
+    }
+
+
+def _collect_stores(stores: Dict[int, Dict[str, Any]], store_prices: StorePrices, product_id: int) -> None:
+    """
+    Adiciona ao dicionário os dados das lojas que vendem o produto.
+    
+    Args:
+        stores: Dados das lojas por store_id (modificado no lugar).
+        store_prices: Preços por loja e lojas carregadas (load_best_offers_for_products).
+        product_id: ID do produto.
+    """
+    for store_id in store_prices.prices.get(product_id, {}):
+        if store_id not in stores:
+            stores[store_id] = store_prices.stores[store_id].to_dict()
+
+
+def build_ranking_entry(
+    header: Dict[str, Any],
+    items: List[Any],
+    store_prices: StorePrices,
+    top_offers_by_product: Dict[int, List[Dict[str, Any]]],
+    location: Optional[Dict[str, Any]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Monta a entrada de ranking (itens pontuados + estado da cesta), sem as combinações.
+    
+    Args:
+        header: Campos de identificação do ranking (ex: {"list_id": ...}).
+        items: Itens (ListItem ou BasketLine) com produto.
+        store_prices: Menor preço por loja de cada produto (cesta otimizada).
+        top_offers_by_product: Top ofertas pontuadas por product_id.
+        location: Localização quantizada (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra (opcional).
+    
+    Returns:
+        Dict[str, Any]: Entrada {"ranking": ..., "state": ...}.
+    """
+    ranking_items = []
+    basket = []
+    stores = {}
+    
+    # Para cada item da lista
+    with span('build_entry'):
+        for item in items:
+            if not item.product:
+                continue
+            
+            ranking_items.append(
+                build_ranking_item(item, top_offers_by_product.get(item.product_id, []))
+            )
+            basket.append(build_basket_item(item, store_prices.prices.get(item.product_id, {})))
+            _collect_stores(stores, store_prices, item.product_id)
+    
+    return {
+        "ranking": {**header, "items": ranking_items},
+        "state": {
+            "user_location": location,
+            "max_stores": max_stores,
+            "store_penalty": store_penalty,
+            "basket": basket,
+            "stores": list(stores.values())
+        }
+    }
+
+
+def refresh_combinations(entry: Dict[str, Any]) -> None:
+    """
+    Recalcula apenas a etapa de combinação de lojas de um ranking.
+    
+    Usa os itens já pontuados (combinação gulosa) e o estado da cesta
+    (otimizador multi-loja); nenhuma oferta é recarregada ou repontuada.
+    
+    Args:
+        entry: Entrada do cache {"ranking": ..., "state": ...} (modificada no lugar).
+    """
+    ranking = entry['ranking']
+    state = entry['state']
+    
+    with span('greedy_combination'):
+        ranking['best_combination'] = optimize_store_combination(ranking['items'])
+    
+    stores = {store['id']: store for store in state['stores']}
+    basket_items = [
+        {
+            "product_id": basket_item['product_id'],
+            "quantity": basket_item['quantity'],
+            "offers": {store_id: price for store_id, price in basket_item['offers']}
+        }
+        for basket_item in state['basket']
+    ]
+    
+    max_stores = state.get('max_stores')
+    store_penalty = state.get('store_penalty')
+    with span('basket_optimizer'):
+        ranking['optimized_combination'] = optimize_basket(
+            basket_items,
+            stores,
+            max_stores=max_stores or settings.RANKING_MAX_STORES,
+            store_penalty=(
+                store_penalty if store_penalty is not None else settings.RANKING_STORE_PENALTY
+            ),
+            time_budget_ms=settings.RANKING_OPTIMIZER_BUDGET_MS
+        )
+
+
+def list_contents_hash(signature: List[List[int]]) -> str:
+    """
+    Gera um hash curto do conteúdo de uma lista.
+    
+    Args:
+        signature: Itens da lista como (item_id, product_id, quantity), ordenados por id
+            (ou, em cestas avulsas, (product_id, quantity) ordenados por produto).
+    
+    Returns:
+        str: Hash hexadecimal (16 caracteres).
+    """
+    payload = json.dumps([list(row) for row in signature], separators=(',', ':'))
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def _ranking_cache_key(
+    shopping_list_id: str,
+    contents_hash: str,
+    location: Optional[Dict[str, Any]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None
+) -> str:
+    """
+    Monta a chave de cache de um ranking.
+    
+    A chave usa a célula geohash da localização (não as coordenadas) e o
+    hash do conteúdo da lista.
+    
+    Args:
+        shopping_list_id: UUID da lista.
+        contents_hash: Hash do conteúdo da lista.
+        location: Localização quantizada (com 'cell') ou None.
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra (opcional).
+    
+    Returns:
+        str: Chave do cache.
+    """
+    cache_key = f"ranking:{shopping_list_id}:{contents_hash}"
+    if location:
+        cache_key += f":{location['cell']}"
+    if max_stores is not None or store_penalty is not None:
+        cache_key += f":k{max_stores}:p{store_penalty}"
+    return cache_key
+
+
+def _state_cache_key(shopping_list_id: str, state: Dict[str, Any]) -> str:
+    """
+    Recalcula a chave de cache de um ranking a partir do seu estado.
+    
+    Args:
+        shopping_list_id: UUID da lista.
+        state: Estado do ranking cacheado.
+    
+    Returns:
+        str: Chave do cache para o conteúdo atual do estado.
+    """
+    signature = sorted(
+        (item['item_id'], item['product_id'], item['quantity'])
+        for item in state['basket']
+    )
+    return _ranking_cache_key(
+        shopping_list_id,
+        list_contents_hash(signature),
+        state.get('user_location'),
+        state.get('max_stores'),
+        state.get('store_penalty')
+    )
+
+
+def _ranking_tags(shopping_list_id: Optional[str], entry: Dict[str, Any]) -> List[str]:
+    """
+    Tags de uma entrada de ranking: a lista, os produtos da cesta e as lojas.
+    
+    A tag da lista também serve de índice dos rankings cacheados da lista
+    (ver `_update_cached_rankings`).
+    
+    Args:
+        shopping_list_id: UUID da lista (None para cestas avulsas).
+        entry: Entrada {"ranking": ..., "state": ...}.
+    
+    Returns:
+        List[str]: Tags.
+    """
+    state = entry['state']
+    tags = [list_tag(shopping_list_id)] if shopping_list_id else []
+    tags.extend(sorted({product_tag(item['product_id']) for item in state['basket']}))
+    tags.extend(sorted({store_tag(store['id']) for store in state['stores']}))
+    return tags
+
+
+def _ranking_cache_item(shopping_list_id: Optional[str], cache_key: str, entry: Dict[str, Any]) -> CacheItem:
+    """
+    Monta a gravação de uma entrada de ranking com as suas tags.
+    
+    Args:
+        shopping_list_id: UUID da lista (None para cestas avulsas).
+        cache_key: Chave do ranking.
+        entry: Entrada {"ranking": ..., "state": ...}.
+    
+    Returns:
+        CacheItem: Entrada para `cache.set_many`.
+    """
+    return CacheItem(
+        cache_key,
+        entry,
+        ttl=RANKING_CACHE_TTL,
+        tags=_ranking_tags(shopping_list_id, entry),
+        stale_ttl=settings.CACHE_STALE_TTL
+    )
+
+
+def _cache_ranking(shopping_list_id: Optional[str], cache_key: str, entry: Dict[str, Any]) -> None:
+    """
+    Salva uma entrada de ranking no cache com as suas tags.
+    
+    Args:
+        shopping_list_id: UUID da lista (None para cestas avulsas).
+        cache_key: Chave do ranking.
+        entry: Entrada {"ranking": ..., "state": ...}.
+    """
+    cache.set_many([_ranking_cache_item(shopping_list_id, cache_key, entry)])
+
+
+def _lookup_cached_ranking(
+    db,
+    shopping_list_id: str,
+    user_location: Optional[Dict[str, float]],
+    location: Optional[Dict[str, Any]],
+    max_stores: Optional[int],
+    store_penalty: Optional[float],
+    signature: Optional[List[Tuple[int, int, int]]] = None
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Monta a chave de cache do ranking de uma lista e busca a entrada cacheada.
+    
+    Args:
+        db: Sessão do banco de dados.
+        shopping_list_id: UUID da lista.
+        user_location: Localização original do usuário (para as métricas).
+        location: Localização quantizada.
+        max_stores: Máximo de lojas na cesta otimizada.
+        store_penalty: Penalidade por loja extra.
+        signature: Itens da lista já consultados (opcional; padrão: load_list_signature).
+    
+    Returns:
+        Tuple[str, Optional[Dict[str, Any]]]: Chave do cache e entrada cacheada (ou None).
+    """
+    with span('cache_lookup'):
+        if signature is None:
+            signature = load_list_signature(db, uuid.UUID(shopping_list_id))
+        cache_key = _ranking_cache_key(
+            shopping_list_id,
+            list_contents_hash(signature),
+            location,
+            max_stores,
+            store_penalty
+        )
+        
+        cached_entry = cache.get(cache_key) if signature else None
+    
+    location_cache_stats.record('ranking', cached_entry is not None, user_location, location)
+    return cache_key, cached_entry
+
+
+def cached_ranking_etag(
+    shopping_list_id: str,
+    signature: List[Tuple[int, int, int]],
+    user_location: Optional[Dict[str, float]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None
+) -> Optional[str]:
+    """
+    Retorna a ETag do ranking cacheado de uma lista, sem deserializar a entrada.
+    
+    A ETag é o hash do corpo gravado no cabeçalho da entrada (ver
+    `cache_codec`). A chave depende do conteúdo da lista: a assinatura dos
+    itens é recebida de quem já a consultou, sem acessar o banco.
+    
+    Args:
+        shopping_list_id: UUID da lista.
+        signature: Itens da lista (load_list_signature).
+        user_location: Dicionário com 'lat' e 'lon' do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra em R$ (opcional).
+    
+    Returns:
+        Optional[str]: ETag, ou None se não houver ranking válido no cache
+            (ausente ou já fora do TTL).
+    """
+    if not signature:
+        return None
+    
+    cache_key = _ranking_cache_key(
+        shopping_list_id,
+        list_contents_hash(signature),
+        quantize_location(user_location),
+        max_stores,
+        store_penalty
+    )
+    with span('cache_lookup'):
+        entry = cache.get_entry(cache_key, payload=True)
+    
+    if entry is None or entry.stale:
+        return None
+    return entry.value.etag()
+
+
+def _build_list_ranking(
+    db,
+    shopping_list_id: str,
+    location: Optional[Dict[str, Any]],
+    max_stores: Optional[int],
+    store_penalty: Optional[float]
+) -> Optional[Tagged]:
+    """
+    Calcula a entrada de ranking de uma lista (função de cálculo do cache).
+    
+    Args:
+        db: Sessão do banco de dados.
+        shopping_list_id: UUID da lista.
+        location: Localização quantizada.
+        max_stores: Máximo de lojas na cesta otimizada.
+        store_penalty: Penalidade por loja extra.
+    
+    Returns:
+        Optional[Tagged]: Entrada {"ranking", "state"} com as tags, ou None se
+            a lista não existir ou estiver vazia.
+    """
+    logger.info(f"Gerando ranking para lista: {shopping_list_id}")
+    
+    # Buscar lista
+    with span('load_list'):
+        shopping_list = db.query(ShoppingList).filter(
+            ShoppingList.id == uuid.UUID(shopping_list_id)
+        ).first()
+    
+    if not shopping_list:
+        return None
+    
+    # Buscar itens da lista (produtos carregados via JOIN)
+    with span('load_list'):
+        items = load_list_items(db, shopping_list.id)
+    
+    if not items:
+        return None
+    
+    # Buscar ofertas candidatas (top-N materializado, com lojas) e o menor preço
+    # de cada produto em todas as lojas (otimizador de cesta)
+    product_ids = [item.product_id for item in items if item.product]
+    with span('load_offers'):
+        offers_by_product, max_prices, store_prices = load_best_offers_for_products(db, product_ids)
+    
+    # Pontuar todas as ofertas da lista em um único passo vetorizado
+    top_offers_by_product = score_list_offers(
+        offers_by_product,
+        location,
+        max_prices=max_prices
+    )
+    
+    entry = build_ranking_entry(
+        {"list_id": str(shopping_list_id)},
+        items,
+        store_prices,
+        top_offers_by_product,
+        location,
+        max_stores,
+        store_penalty
+    )
+    
+    # Otimizar combinação de lojas (gulosa e cesta ótima com até K lojas)
+    refresh_combinations(entry)
+    
+    logger.info(f"Ranking gerado com sucesso: {len(entry['ranking']['items'])} itens processados")
+    
+    return Tagged(entry, _ranking_tags(shopping_list_id, entry))
+
+
+def _missing_or_empty_ranking(db, shopping_list_id: str) -> Dict[str, Any]:
+    """
+    Resposta do ranking de uma lista inexistente ou sem itens.
+    
+    Args:
+        db: Sessão do banco de dados.
+        shopping_list_id: UUID da lista.
+    
+    Returns:
+        Dict[str, Any]: Ranking vazio com "error" ou "message".
+    """
+    exists = db.query(ShoppingList.id).filter(
+        ShoppingList.id == uuid.UUID(shopping_list_id)
+    ).first() is not None
+    
+    if not exists:
+        logger.warning(f"Lista não encontrada: {shopping_list_id}")
+        return {
+            "list_id": shopping_list_id,
+            "items": [],
+            "error": "Lista não encontrada"
+        }
+    
+    logger.info(f"Lista vazia: {shopping_list_id}")
+    return {
+        "list_id": shopping_list_id,
+        "items": [],
+        "message": "Lista vazia"
+    }
+
+
 def generate_ranking(
     shopping_list_id: str,
-    user_location: Optional[Dict[str, float]] = None
+    user_location: Optional[Dict[str, float]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None,
+    signature: Optional[List[Tuple[int, int, int]]] = None
 ) -> Dict[str, Any]:
     """
     Gera ranking completo de ofertas para uma lista de compras.
     
+    O ranking cacheado é recalculado por um único chamador após o TTL; os
+    demais recebem o ranking antigo, que também é servido se o recálculo falhar.
+    
     Args:
         shopping_list_id: UUID da lista de compras.
         user_location: Dicionário com 'lat' e 'lon' do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (padrão: RANKING_MAX_STORES).
+        store_penalty: Penalidade por loja extra em R$ (padrão: RANKING_STORE_PENALTY).
+        signature: Itens da lista já consultados na requisição (opcional;
+            padrão: load_list_signature).
     
     Returns:
         Dict[str, Any]: Ranking completo com melhores ofertas por produto.
     """
     try:
-        # Verificar cache
-        cache_key = f"ranking:{shopping_list_id}"
-        if user_location:
-            cache_key += f":{user_location.get('lat', '')}:{user_location.get('lon', '')}"
-        
-        cached_ranking = cache.get(cache_key)
-        if cached_ranking:
-            logger.info(f"Ranking cacheado encontrado para lista: {shopping_list_id}")
-            return cached_ranking
-        
-        logger.info(f"Gerando ranking para lista: {shopping_list_id}")
+        # Quantizar localização (célula geohash; proximidade calculada pelo centróide)
+        location = quantize_location(user_location)
         
         db = next(get_db())
         
         try:
-            # Buscar lista
-            shopping_list = db.query(ShoppingList).filter(
-                ShoppingList.id == uuid.UUID(shopping_list_id)
-            ).first()
-            
-            if not shopping_list:
-                logger.warning(f"Lista não encontrada: {shopping_list_id}")
-                return {
-                    "list_id": shopping_list_id,
-                    "items": [],
-                    "error": "Lista não encontrada"
-                }
-            
-            # Buscar itens da lista
-            items = db.query(ListItem).filter(
-                ListItem.list_id == shopping_list.id
-            ).all()
-            
-            if not items:
-                logger.info(f"Lista vazia: {shopping_list_id}")
-                return {
-                    "list_id": shopping_list_id,
-                    "items": [],
-                    "message": "Lista vazia"
-                }
+            # Chave do cache: conteúdo da lista + célula da localização
+            if signature is None:
+                with span('cache_lookup'):
+                    signature = load_list_signature(db, uuid.UUID(shopping_list_id))
             
-            ranking_items = []
+            if not signature:
+                location_cache_stats.record('ranking', False, user_location, location)
+                return _missing_or_empty_ranking(db, shopping_list_id)
             
-            # Para cada item da lista
-            for item in items:
-                if not item.product:
-                    continue
-                
-                product_id = item.product_id
-                quantity = item.quantity
-                
-                # Buscar ofertas do produto
-                offers = db.query(Offer).filter(
-                    Offer.product_id == product_id,
-                    Offer.in_stock == True
-                ).all()
-                
-                if not offers:
-                    # Sem ofertas disponíveis
-                    ranking_items.append({
-                        "product": item.product.to_dict(),
-                        "quantity": quantity,
-                        "best_offer": None,
-                        "all_offers": []
-                    })
-                    continue
-                
-                # Calcular max_price para normalização
-                max_price = max(float(offer.price) for offer in offers)
-                
-                # Calcular score de cada oferta
-                scored_offers = []
-                for offer in offers:
-                    offer_dict = offer.to_dict(include_store=True)
-                    score = calculate_offer_score(
-                        offer_dict,
-                        user_location,
-                        max_price
-                    )
-                    offer_dict['score'] = score
-                    scored_offers.append(offer_dict)
-                
-                # Ordenar por score (maior primeiro)
-                scored_offers.sort(key=lambda x: x['score'], reverse=True)
-                
-                # Melhor oferta
-                best_offer = scored_offers[0] if scored_offers else None
-                
-                ranking_items.append({
-                    "product": item.product.to_dict(),
-                    "quantity": quantity,
-                    "best_offer": best_offer,
-                    "all_offers": scored_offers[:5]  # Top 5 ofertas
-                })
-            
-            # Otimizar combinação de lojas
-            best_combination = optimize_store_combination(ranking_items)
+            cache_key = _ranking_cache_key(
+                shopping_list_id,
+                list_contents_hash(signature),
+                location,
+                max_stores,
+                store_penalty
+            )
             
-            ranking = {
-                "list_id": str(shopping_list_id),
-                "items": ranking_items,
-                "best_combination": best_combination
-            }
+            # Cachear ranking (RANKING_CACHE_TTL = CACHE_ENTITY_TTL; invalidado pelas
+            # tags da lista, dos produtos e das lojas) com o estado para atualizações
+            # incrementais
+            fetched = cache.fetch(
+                cache_key,
+                lambda: _build_list_ranking(db, shopping_list_id, location, max_stores, store_penalty),
+                ttl=RANKING_CACHE_TTL
+            )
+            location_cache_stats.record('ranking', fetched.source != 'miss', user_location, location)
             
-            # Cachear ranking (1 hora)
-            cache.set(cache_key, ranking, ttl=3600)
+            if fetched.value is None:
+                return _missing_or_empty_ranking(db, shopping_list_id)
             
-            logger.info(f"Ranking gerado com sucesso: {len(ranking_items)} itens processados")
+            if fetched.source != 'miss':
+                logger.info(f"Ranking cacheado encontrado para lista: {shopping_list_id}")
             
-            return ranking
+            return fetched.value['ranking']
         
         except Exception as e:
             logger.error(f"Erro ao gerar ranking: {e}", exc_info=True)
@@ -256,6 +762,644 @@ def generate_ranking(
         }
 
 
+def stream_ranking(
+    shopping_list_id: str,
+    user_location: Optional[Dict[str, float]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None,
+    chunk_size: Optional[int] = None,
+    signature: Optional[List[Tuple[int, int, int]]] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Gera o ranking de uma lista progressivamente.
+    
+    Os itens são pontuados em blocos de `chunk_size` produtos e emitidos assim
+    que cada bloco fica pronto; as combinações de lojas (que dependem da lista
+    inteira) vêm no evento final. O resultado é cacheado como em generate_ranking.
+    
+    Args:
+        shopping_list_id: UUID da lista de compras.
+        user_location: Dicionário com 'lat' e 'lon' do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra em R$ (opcional).
+        chunk_size: Número de itens pontuados por bloco (padrão: STREAM_CHUNK_SIZE).
+        signature: Itens da lista já consultados na requisição (opcional).
+    
+    Yields:
+        Tuple[str, Dict[str, Any]]: ("item", item do ranking) para cada item e,
+            por último, ("done", ranking sem 'items') ou ("done", {..., "error"}).
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    location = quantize_location(user_location)
+    db = next(get_db())
+    
+    try:
+        cache_key, cached_entry = _lookup_cached_ranking(
+            db,
+            shopping_list_id,
+            user_location,
+            location,
+            max_stores,
+            store_penalty,
+            signature
+        )
+        
+        if cached_entry:
+            ranking = cached_entry['ranking']
+            for item in ranking['items']:
+                yield "item", item
+            yield "done", {key: value for key, value in ranking.items() if key != 'items'}
+            return
+        
+        shopping_list = db.query(ShoppingList).filter(
+            ShoppingList.id == uuid.UUID(shopping_list_id)
+        ).first()
+        
+        if not shopping_list:
+            yield "done", {"list_id": shopping_list_id, "error": "Lista não encontrada"}
+            return
+        
+        items = [item for item in load_list_items(db, shopping_list.id) if item.product]
+        
+        if not items:
+            yield "done", {"list_id": shopping_list_id, "message": "Lista vazia"}
+            return
+        
+        entry = build_ranking_entry(
+            {"list_id": str(shopping_list_id)},
+            [],
+            StorePrices({}, {}),
+            {},
+            location,
+            max_stores,
+            store_penalty
+        )
+        known_stores = set()
+        
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            
+            product_ids = [item.product_id for item in chunk]
+            offers_by_product, max_prices, store_prices = load_best_offers_for_products(db, product_ids)
+            top_offers_by_product = score_list_offers(
+                offers_by_product,
+                location,
+                max_prices=max_prices
+            )
+            chunk_entry = build_ranking_entry(
+                {},
+                chunk,
+                store_prices,
+                top_offers_by_product
+            )
+            
+            entry['state']['basket'].extend(chunk_entry['state']['basket'])
+            for store in chunk_entry['state']['stores']:
+                if store['id'] not in known_stores:
+                    known_stores.add(store['id'])
+                    entry['state']['stores'].append(store)
+            
+            for ranking_item in chunk_entry['ranking']['items']:
+                entry['ranking']['items'].append(ranking_item)
+                yield "item", ranking_item
+        
+        # Otimizar combinação de lojas com a lista completa
+        refresh_combinations(entry)
+        
+        _cache_ranking(shopping_list_id, cache_key, entry)
+        
+        logger.info(f"Ranking em streaming gerado: {len(items)} itens processados")
+        
+        yield "done", {
+            key: value for key, value in entry['ranking'].items() if key != 'items'
+        }
+    
+    except Exception as e:
+        logger.error(f"Erro ao gerar ranking em streaming: {e}", exc_info=True)
+        yield "done", {"list_id": shopping_list_id, "error": str(e)}
+    
+    finally:
+        db.close()
+
+
+def _update_cached_rankings(
+    shopping_list_id: str,
+    apply: Callable[[Dict[str, Any]], bool]
+) -> int:
+    """
+    Aplica uma alteração a todos os rankings cacheados de uma lista.
+    
+    Se a alteração falhar em alguma entrada, a entrada é removida do cache
+    (o próximo acesso reconstrói o ranking completo).
+    
+    Args:
+        shopping_list_id: UUID da lista.
+        apply: Função que altera a entrada no lugar; retorna False para descartá-la.
+    
+    Returns:
+        int: Número de rankings atualizados.
+    """
+    updated = []
+    
+    # Todas as entradas da lista em um único round-trip; como `apply` altera a
+    # entrada no lugar, cada uma é deserializada em uma cópia própria (o valor
+    # deserializado do L1 é compartilhado com as leituras do ranking)
+    payloads = cache.get_many(cache.tag_members(list_tag(shopping_list_id)), payload=True)
+    
+    for cache_key, payload in payloads.items():
+        try:
+            entry = payload.value()
+            if not entry:
+                continue
+            
+            if apply(entry):
+                refresh_combinations(entry)
+                
+                # O conteúdo da lista faz parte da chave: regravar na chave nova
+                new_key = _state_cache_key(shopping_list_id, entry['state'])
+                updated.append(_ranking_cache_item(shopping_list_id, new_key, entry))
+                if new_key != cache_key:
+                    cache.delete(cache_key)
+            else:
+                cache.delete(cache_key)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar ranking cacheado (key={cache_key}): {e}", exc_info=True)
+            cache.delete(cache_key)
+    
+    if updated:
+        cache.set_many(updated)
+    
+    return len(updated)
+
+
+def ranking_item_added(db, list_item: ListItem) -> int:
+    """
+    Atualiza os rankings cacheados da lista após a inclusão de um item.
+    
+    Carrega e pontua apenas as ofertas do produto adicionado e refaz só a
+    etapa de combinação de lojas.
+    
+    Args:
+        db: Sessão do banco de dados.
+        list_item: Item recém-criado (com produto).
+    
+    Returns:
+        int: Número de rankings atualizados.
+    """
+    shopping_list_id = str(list_item.list_id)
+    if not cache.tag_members(list_tag(shopping_list_id)) or not list_item.product:
+        return 0
+    
+    try:
+        offers_by_product, max_prices, store_prices = load_best_offers_for_products(db, [list_item.product_id])
+        offers = offers_by_product[list_item.product_id]
+    except Exception as e:
+        logger.error(f"Erro ao carregar ofertas do item adicionado: {e}", exc_info=True)
+        invalidate_list_rankings(shopping_list_id)
+        return 0
+    
+    stores = {}
+    _collect_stores(stores, store_prices, list_item.product_id)
+    basket_item = build_basket_item(list_item, store_prices.prices[list_item.product_id])
+    scored_by_location = {}
+    
+    def apply(entry: Dict[str, Any]) -> bool:
+        ranking = entry['ranking']
+        state = entry['state']
+        
+        if any(item.get('item_id') == list_item.id for item in ranking['items']):
+            return True
+        
+        location = state.get('user_location')
+        location_key = repr(location)
+        if location_key not in scored_by_location:
+            scored = score_list_offers(
+                {list_item.product_id: offers},
+                location,
+                max_prices=max_prices
+            )
+            scored_by_location[location_key] = scored.get(list_item.product_id, [])
+        
+        ranking['items'].append(build_ranking_item(list_item, scored_by_location[location_key]))
+        state['basket'].append(basket_item)
+        
+        known_stores = {store['id'] for store in state['stores']}
+        state['stores'].extend(
+            store for store_id, store in stores.items() if store_id not in known_stores
+        )
+        return True
+    
+    return _update_cached_rankings(shopping_list_id, apply)
+
+
+def ranking_item_updated(shopping_list_id: str, item_id: int, quantity: int) -> int:
+    """
+    Atualiza os rankings cacheados da lista após a mudança de quantidade de um item.
+    
+    Nenhuma oferta é recarregada: apenas a quantidade e a combinação de lojas mudam.
+    
+    Args:
+        shopping_list_id: UUID da lista.
+        item_id: ID do item alterado.
+        quantity: Nova quantidade.
+    
+    Returns:
+        int: Número de rankings atualizados.
+    """
+    def apply(entry: Dict[str, Any]) -> bool:
+        found = False
+        for item in entry['ranking']['items']:
+            if item.get('item_id') == item_id:
+                item['quantity'] = quantity
+                found = True
+        for basket_item in entry['state']['basket']:
+            if basket_item['item_id'] == item_id:
+                basket_item['quantity'] = quantity
+        return found
+    
+    return _update_cached_rankings(str(shopping_list_id), apply)
+
+
+def ranking_item_removed(shopping_list_id: str, item_id: int) -> int:
+    """
+    Atualiza os rankings cacheados da lista após a remoção de um item.
+    
+    Args:
+        shopping_list_id: UUID da lista.
+        item_id: ID do item removido.
+    
+    Returns:
+        int: Número de rankings atualizados.
+    """
+    def apply(entry: Dict[str, Any]) -> bool:
+        ranking = entry['ranking']
+        state = entry['state']
+        ranking['items'] = [item for item in ranking['items'] if item.get('item_id') != item_id]
+        state['basket'] = [item for item in state['basket'] if item['item_id'] != item_id]
+        # Lista vazia tem resposta própria em generate_ranking
+        return bool(ranking['items'])
+    
+    return _update_cached_rankings(str(shopping_list_id), apply)
+
+
+def invalidate_list_rankings(shopping_list_id: str) -> None:
+    """
+    Remove todos os rankings cacheados de uma lista.
+    
+    Args:
+        shopping_list_id: UUID da lista.
+    """
+    invalidate_list(str(shopping_list_id))
+
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Retorna o pool de processos do ranking em lote (criado na primeira chamada).
+    
+    Returns:
+        Optional[ProcessPoolExecutor]: Pool ou None se RANKING_BATCH_WORKERS <= 1.
+    """
+    global _process_pool
+    
+    if settings.RANKING_BATCH_WORKERS <= 1:
+        return None
+    
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=settings.RANKING_BATCH_WORKERS)
+        return _process_pool
+
+
+def _reset_process_pool() -> None:
+    """Descarta o pool de processos (ex: após um worker morrer)."""
+    global _process_pool
+    
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+def _compute_combinations(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calcula as combinações de lojas de uma entrada (executado nos workers).
+    
+    Args:
+        entry: Entrada {"ranking": ..., "state": ...}.
+    
+    Returns:
+        Dict[str, Any]: best_combination e optimized_combination.
+    """
+    refresh_combinations(entry)
+    return {
+        "best_combination": entry['ranking']['best_combination'],
+        "optimized_combination": entry['ranking']['optimized_combination']
+    }
+
+
+def _run_combinations(entries: List[Dict[str, Any]]) -> None:
+    """
+    Calcula as combinações de várias entradas em paralelo no pool de processos.
+    
+    Sem pool (ou se ele falhar), calcula no processo atual.
+    
+    Args:
+        entries: Entradas a completar (modificadas no lugar).
+    """
+    results = None
+    pool = _get_process_pool() if len(entries) > 1 else None
+    
+    if pool is not None:
+        try:
+            results = list(pool.map(_compute_combinations, entries))
+        except Exception as e:
+            logger.warning(f"Pool de processos indisponível, calculando no processo atual: {e}")
+            _reset_process_pool()
+    
+    if results is None:
+        results = [_compute_combinations(entry) for entry in entries]
+    
+    for entry, combinations in zip(entries, results):
+        entry['ranking'].update(combinations)
+
+
+def generate_rankings_batch(
+    shopping_list_ids: List[str],
+    baskets: Optional[List[Dict[str, Any]]] = None,
+    user_location: Optional[Dict[str, float]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    Gera os rankings de várias listas (e cestas avulsas) de uma vez.
+    
+    Itens e ofertas de todas as listas são carregados em queries únicas e as
+    ofertas de produtos repetidos entre listas são pontuadas uma só vez; as
+    combinações de lojas de cada lista são calculadas em paralelo no pool de
+    processos. Rankings de listas já cacheados são reaproveitados.
+    
+    Args:
+        shopping_list_ids: UUIDs das listas (a posse deve ter sido validada).
+        baskets: Cestas avulsas [{"name", "items": [{"product_id", "quantity"}]}] (opcional).
+        user_location: Dicionário com 'lat' e 'lon' do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra em R$ (opcional).
+    
+    Returns:
+        List[Dict[str, Any]]: Rankings das listas (na ordem recebida) seguidos
+            dos rankings das cestas.
+    """
+    baskets = baskets or []
+    location = quantize_location(user_location)
+    
+    db = next(get_db())
+    
+    try:
+        list_uuids = [uuid.UUID(list_id) for list_id in shopping_list_ids]
+        with span('load_list'):
+            items_by_list = load_items_for_lists(db, list_uuids)
+        
+        rankings: List[Optional[Dict[str, Any]]] = [None] * (len(list_uuids) + len(baskets))
+        pending = []  # (posição, itens, cabeçalho, chave do cache)
+        
+        # Listas: chaves dos rankings cacheados
+        list_keys = {}
+        for position, list_uuid in enumerate(list_uuids):
+            shopping_list_id = str(list_uuid)
+            items = items_by_list[list_uuid]
+            
+            if not items:
+                rankings[position] = {
+                    "list_id": shopping_list_id,
+                    "items": [],
+                    "message": "Lista vazia"
+                }
+                continue
+            
+            signature = [(item.id, item.product_id, item.quantity) for item in items]
+            list_keys[position] = _ranking_cache_key(
+                shopping_list_id,
+                list_contents_hash(signature),
+                location,
+                max_stores,
+                store_penalty
+            )
+        
+        # Listas: reaproveitar rankings cacheados (um único round-trip)
+        with span('cache_lookup'):
+            cached_entries = cache.get_many(list_keys.values())
+        
+        for position, cache_key in list_keys.items():
+            shopping_list_id = str(list_uuids[position])
+            items = items_by_list[list_uuids[position]]
+            cached_entry = cached_entries.get(cache_key)
+            location_cache_stats.record('ranking', cached_entry is not None, user_location, location)
+            if cached_entry:
+                rankings[position] = cached_entry['ranking']
+            else:
+                pending.append((position, items, {"list_id": shopping_list_id}, cache_key))
+        
+        # Cestas avulsas: produtos carregados em uma única query
+        products = load_products(db, [
+            line.get('product_id')
+            for basket in baskets
+            for line in basket.get('items', [])
+        ])
+        
+        for index, basket in enumerate(baskets):
+            lines = [
+                BasketLine(
+                    id=None,
+                    product_id=line['product_id'],
+                    product=products.get(line['product_id']),
+                    quantity=line.get('quantity', 1)
+                )
+                for line in basket.get('items', [])
+            ]
+            header = {"basket": basket.get('name') or f"Cesta {index + 1}"}
+            pending.append((len(list_uuids) + index, lines, header, None))
+        
+        if pending:
+            # Ofertas de todos os produtos pendentes: uma query e um passo de scoring
+            product_ids = {
+                item.product_id
+                for _, items, _, _ in pending
+                for item in items
+                if item.product
+            }
+            with span('load_offers'):
+                offers_by_product, max_prices, store_prices = load_best_offers_for_products(db, product_ids)
+            top_offers_by_product = score_list_offers(
+                offers_by_product,
+                location,
+                max_prices=max_prices
+            )
+            
+            entries = [
+                build_ranking_entry(
+                    header,
+                    items,
+                    store_prices,
+                    top_offers_by_product,
+                    location,
+                    max_stores,
+                    store_penalty
+                )
+                for _, items, header, _ in pending
+            ]
+            
+            # Combinações de lojas em paralelo
+            with span('combinations'):
+                _run_combinations(entries)
+            
+            cache_items = []
+            for (position, _, header, cache_key), entry in zip(pending, entries):
+                rankings[position] = entry['ranking']
+                if cache_key:
+                    cache_items.append(_ranking_cache_item(header['list_id'], cache_key, entry))
+            if cache_items:
+                with span('cache_write'):
+                    cache.set_many(cache_items)
+        
+        logger.info(
+            f"Rankings em lote gerados: {len(list_uuids)} listas, {len(baskets)} cestas, "
+            f"{len(pending)} calculados"
+        )
+        
+        return rankings
+    
+    finally:
+        db.close()
+
+
+def normalize_basket(lines: List[Dict[str, int]]) -> List[Tuple[int, int]]:
+    """
+    Normaliza os itens de uma cesta avulsa.
+    
+    Produtos repetidos têm as quantidades somadas; o resultado é ordenado por
+    product_id para que a mesma cesta (em qualquer ordem) gere o mesmo hash.
+    
+    Args:
+        lines: Itens [{"product_id", "quantity"}].
+    
+    Returns:
+        List[Tuple[int, int]]: Pares (product_id, quantity) ordenados.
+    """
+    quantities: Dict[int, int] = {}
+    for line in lines:
+        product_id = line['product_id']
+        quantities[product_id] = quantities.get(product_id, 0) + line.get('quantity', 1)
+    return sorted(quantities.items())
+
+
+def _basket_cache_key(
+    contents_hash: str,
+    location: Optional[Dict[str, Any]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None
+) -> str:
+    """
+    Monta a chave de cache do ranking de uma cesta avulsa.
+    
+    Args:
+        contents_hash: Hash do conteúdo normalizado da cesta.
+        location: Localização quantizada (com 'cell') ou None.
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra (opcional).
+    
+    Returns:
+        str: Chave do cache (ex: "ranking:basket:{hash}:{cell}").
+    """
+    return _ranking_cache_key('basket', contents_hash, location, max_stores, store_penalty)
+
+
+def generate_basket_ranking(
+    lines: List[Dict[str, int]],
+    user_location: Optional[Dict[str, float]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Gera o ranking de uma cesta avulsa, sem lista persistida.
+    
+    A chave de cache depende apenas do conteúdo da cesta (e da célula da
+    localização), então cestas iguais de usuários diferentes compartilham o
+    resultado; um hit não abre sessão no banco.
+    
+    Args:
+        lines: Itens [{"product_id", "quantity"}].
+        user_location: Dicionário com 'lat' e 'lon' do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra em R$ (opcional).
+    
+    Returns:
+        Dict[str, Any]: Ranking com "basket_hash" e "unknown_product_ids"
+            (produtos inexistentes, ignorados).
+    """
+    location = quantize_location(user_location)
+    basket = normalize_basket(lines)
+    contents_hash = list_contents_hash(basket)
+    cache_key = _basket_cache_key(contents_hash, location, max_stores, store_penalty)
+    
+    with span('cache_lookup'):
+        cached_entry = cache.get(cache_key)
+    location_cache_stats.record('ranking_basket', cached_entry is not None, user_location, location)
+    if cached_entry:
+        logger.info(f"Ranking de cesta cacheado encontrado: {contents_hash}")
+        return cached_entry['ranking']
+    
+    db = next(get_db())
+    
+    try:
+        with span('load_list'):
+            products = load_products(db, [product_id for product_id, _ in basket])
+        
+        items = [
+            BasketLine(
+                id=None,
+                product_id=product_id,
+                product=products.get(product_id),
+                quantity=quantity
+            )
+            for product_id, quantity in basket
+        ]
+        
+        with span('load_offers'):
+            offers_by_product, max_prices, store_prices = load_best_offers_for_products(db, list(products))
+        
+        top_offers_by_product = score_list_offers(
+            offers_by_product,
+            location,
+            max_prices=max_prices
+        )
+        
+        entry = build_ranking_entry(
+            {
+                "basket_hash": contents_hash,
+                "unknown_product_ids": [
+                    product_id for product_id, _ in basket if product_id not in products
+                ]
+            },
+            items,
+            store_prices,
+            top_offers_by_product,
+            location,
+            max_stores,
+            store_penalty
+        )
+        refresh_combinations(entry)
+        
+        with span('cache_write'):
+            _cache_ranking(None, cache_key, entry)
+        
+        logger.info(f"Ranking de cesta gerado: {len(entry['ranking']['items'])} itens processados")
+        
+        return entry['ranking']
+    
+    finally:
+        db.close()
+
+
 def optimize_store_combination(ranking_items: List[Dict]) -> Dict[str, Any]:
     """
     Encontra a melhor combinação de lojas para minimizar custo total.
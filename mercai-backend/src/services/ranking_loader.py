@@ -0,0 +1,308 @@
+"""
+Ranking Loader - Carregamento em Lote
+
+Módulo responsável por carregar, em um número fixo de queries, todos os dados
+necessários para gerar o ranking de uma lista (itens, produtos, ofertas e lojas).
+"""
+
+from typing import Any, Dict, List, Iterable, NamedTuple, Tuple
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+
+from src.models.list_item import ListItem
+from src.models.offer import Offer
+from src.models.product import Product
+from src.models.product_best_offers import ProductBestOffers
+from src.models.store import Store
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo do IN (...) por query (SQLite limita a 999 parâmetros)
+MAX_IN_CLAUSE = 900
+
+
+class StorePrices(NamedTuple):
+    """
+    Menor preço de cada produto em cada loja (entrada do otimizador de cesta).
+    
+    Montado a partir de `product_best_offers.store_prices`.
+    
+    Attributes:
+        prices: Menor preço em estoque por product_id e store_id.
+        stores: Lojas que vendem algum dos produtos, por store_id.
+    """
+    
+    prices: Dict[int, Dict[int, float]]
+    stores: Dict[int, Store]
+
+
+def _chunks(values: List[int], size: int = MAX_IN_CLAUSE) -> Iterable[List[int]]:
+    """
+    Divide uma lista de IDs em blocos para cláusulas IN.
+    
+    Args:
+        values: Lista de IDs.
+        size: Tamanho máximo de cada bloco.
+    
+    Yields:
+        List[int]: Bloco de IDs.
+    """
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def load_list_items(db: Session, list_id) -> List[ListItem]:
+    """
+    Carrega os itens de uma lista já com os produtos (1 query).
+    
+    Args:
+        db: Sessão do banco de dados.
+        list_id: UUID da lista.
+    
+    Returns:
+        List[ListItem]: Itens da lista com `product` carregado.
+    """
+    return db.query(ListItem).options(
+        joinedload(ListItem.product)
+    ).filter(
+        ListItem.list_id == list_id
+    ).order_by(ListItem.id).all()
+
+
+def load_items_for_lists(db: Session, list_ids: Iterable) -> Dict[Any, List[ListItem]]:
+    """
+    Carrega os itens (com produtos) de várias listas em uma única query por bloco.
+    
+    Args:
+        db: Sessão do banco de dados.
+        list_ids: UUIDs das listas.
+    
+    Returns:
+        Dict[Any, List[ListItem]]: Itens agrupados por list_id (ordem por id).
+    """
+    ids = list(dict.fromkeys(list_ids))
+    items_by_list: Dict[Any, List[ListItem]] = {list_id: [] for list_id in ids}
+    
+    for chunk in _chunks(ids):
+        items = db.query(ListItem).options(
+            joinedload(ListItem.product)
+        ).filter(
+            ListItem.list_id.in_(chunk)
+        ).order_by(ListItem.id).all()
+        
+        for item in items:
+            items_by_list[item.list_id].append(item)
+    
+    return items_by_list
+
+
+def load_products(db: Session, product_ids: Iterable[int]) -> Dict[int, Product]:
+    """
+    Carrega produtos por ID em uma única query por bloco.
+    
+    Args:
+        db: Sessão do banco de dados.
+        product_ids: IDs dos produtos.
+    
+    Returns:
+        Dict[int, Product]: Produtos encontrados por id.
+    """
+    ids = sorted(set(product_ids))
+    products: Dict[int, Product] = {}
+    
+    for chunk in _chunks(ids):
+        for product in db.query(Product).filter(Product.id.in_(chunk)).all():
+            products[product.id] = product
+    
+    return products
+
+
+def load_list_signature(db: Session, list_id) -> List[Tuple[int, int, int]]:
+    """
+    Carrega apenas (id, product_id, quantity) dos itens de uma lista (1 query).
+    
+    Usado para montar a chave de cache do ranking sem carregar produtos.
+    
+    Args:
+        db: Sessão do banco de dados.
+        list_id: UUID da lista.
+    
+    Returns:
+        List[Tuple[int, int, int]]: Itens da lista ordenados por id.
+    """
+    rows = db.query(
+        ListItem.id,
+        ListItem.product_id,
+        ListItem.quantity
+    ).filter(
+        ListItem.list_id == list_id
+    ).order_by(ListItem.id).all()
+    
+    return [(row.id, row.product_id, row.quantity) for row in rows]
+
+
+def load_offers_for_products(
+    db: Session,
+    product_ids: Iterable[int],
+    in_stock_only: bool = True
+) -> Dict[int, List[Offer]]:
+    """
+    Carrega todas as ofertas dos produtos informados, já com as lojas.
+    
+    Executa uma única query (JOIN com stores) por bloco de até
+    MAX_IN_CLAUSE produtos, independente do número de ofertas.
+    
+    Args:
+        db: Sessão do banco de dados.
+        product_ids: IDs dos produtos.
+        in_stock_only: Se deve considerar apenas ofertas em estoque.
+    
+    Returns:
+        Dict[int, List[Offer]]: Ofertas agrupadas por product_id (ordem por id).
+    """
+    ids = sorted(set(product_ids))
+    offers_by_product: Dict[int, List[Offer]] = {product_id: [] for product_id in ids}
+    
+    for chunk in _chunks(ids):
+        query = db.query(Offer).options(
+            joinedload(Offer.store)
+        ).filter(Offer.product_id.in_(chunk))
+        
+        if in_stock_only:
+            query = query.filter(Offer.in_stock == True)
+        
+        for offer in query.order_by(Offer.id).all():
+            offers_by_product[offer.product_id].append(offer)
+    
+    return offers_by_product
+
+
+def load_top_offers_for_products(
+    db: Session,
+    product_ids: Iterable[int],
+    limit: int = 5,
+    in_stock_only: bool = True
+) -> Dict[int, List[Offer]]:
+    """
+    Carrega apenas as N ofertas mais baratas de cada produto, já com as lojas.
+    
+    Usa ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY price) para que o
+    banco devolva no máximo `limit` linhas por produto.
+    
+    Args:
+        db: Sessão do banco de dados.
+        product_ids: IDs dos produtos.
+        limit: Número máximo de ofertas por produto.
+        in_stock_only: Se deve considerar apenas ofertas em estoque.
+    
+    Returns:
+        Dict[int, List[Offer]]: Ofertas agrupadas por product_id (menor preço primeiro).
+    """
+    ids = sorted(set(product_ids))
+    offers_by_product: Dict[int, List[Offer]] = {product_id: [] for product_id in ids}
+    
+    for chunk in _chunks(ids):
+        ranked = db.query(
+            Offer.id.label('offer_id'),
+            func.row_number().over(
+                partition_by=Offer.product_id,
+                order_by=(Offer.price.asc(), Offer.id.asc())
+            ).label('position')
+        ).filter(Offer.product_id.in_(chunk))
+        
+        if in_stock_only:
+            ranked = ranked.filter(Offer.in_stock == True)
+        
+        ranked = ranked.subquery()
+        
+        query = db.query(Offer).join(
+            ranked, Offer.id == ranked.c.offer_id
+        ).options(
+            joinedload(Offer.store)
+        ).filter(
+            ranked.c.position <= limit
+        ).order_by(Offer.product_id, ranked.c.position)
+        
+        for offer in query.all():
+            offers_by_product[offer.product_id].append(offer)
+    
+    return offers_by_product
+
+
+def load_best_offers_for_products(
+    db: Session,
+    product_ids: Iterable[int]
+) -> Tuple[Dict[int, List[Offer]], Dict[int, float], StorePrices]:
+    """
+    Carrega as ofertas candidatas e os preços por loja a partir de `product_best_offers`.
+    
+    Em vez de todas as ofertas, carrega apenas as candidatas ao top-N do
+    ranking por score de cada produto (exatas para qualquer localização), então
+    o custo não depende de quantas lojas vendem o produto. O menor preço de
+    cada loja também vem do resumo: o otimizador de cesta precisa de todas as
+    lojas que vendem cada produto, não só das candidatas (uma loja que vende
+    toda a lista pode não estar no top-N de nenhum produto). Apenas as lojas
+    que não vieram com as candidatas são carregadas à parte. Produtos sem
+    resumo materializado caem no carregamento completo.
+    
+    Args:
+        db: Sessão do banco de dados.
+        product_ids: IDs dos produtos.
+    
+    Returns:
+        Tuple[Dict[int, List[Offer]], Dict[int, float], StorePrices]: Ofertas
+            candidatas (com lojas, ordem por id) por product_id, o maior preço
+            em estoque de cada produto com resumo e o menor preço de cada
+            produto em cada loja.
+    """
+    ids = sorted(set(product_ids))
+    offers_by_product: Dict[int, List[Offer]] = {product_id: [] for product_id in ids}
+    max_prices: Dict[int, float] = {}
+    prices: Dict[int, Dict[int, float]] = {product_id: {} for product_id in ids}
+    stores: Dict[int, Store] = {}
+    candidate_ids: List[int] = []
+    missing = set(ids)
+    
+    for chunk in _chunks(ids):
+        summaries = db.query(ProductBestOffers).filter(
+            ProductBestOffers.product_id.in_(chunk)
+        ).all()
+        
+        for summary in summaries:
+            missing.discard(summary.product_id)
+            candidate_ids.extend(summary.candidate_offer_ids())
+            prices[summary.product_id] = {store_id: price for store_id, price in summary.store_prices or []}
+            if summary.max_price is not None:
+                max_prices[summary.product_id] = float(summary.max_price)
+    
+    for chunk in _chunks(sorted(set(candidate_ids))):
+        offers = db.query(Offer).options(
+            joinedload(Offer.store)
+        ).filter(
+            Offer.id.in_(chunk)
+        ).order_by(Offer.id).all()
+        
+        for offer in offers:
+            offers_by_product[offer.product_id].append(offer)
+            stores[offer.store_id] = offer.store
+    
+    if missing:
+        logger.warning(f"Produtos sem melhores ofertas materializadas: {len(missing)}")
+        fallback = load_offers_for_products(db, missing)
+        offers_by_product.update(fallback)
+        
+        for product_id, offers in fallback.items():
+            for offer in offers:
+                price = float(offer.price)
+                if price < prices[product_id].get(offer.store_id, float('inf')):
+                    prices[product_id][offer.store_id] = price
+                stores[offer.store_id] = offer.store
+    
+    store_ids = sorted({store_id for by_store in prices.values() for store_id in by_store} - stores.keys())
+    for chunk in _chunks(store_ids):
+        for store in db.query(Store).filter(Store.id.in_(chunk)).all():
+            stores[store.id] = store
+    
+    return offers_by_product, max_prices, StorePrices(prices, stores)
@@ -0,0 +1,294 @@
+"""
+Route Planner - Roteiro de Compras Multi-Loja
+
+Módulo responsável por ordenar as lojas da cesta otimizada em um roteiro e
+comparar o custo total (compras + deslocamento a ROUTE_COST_PER_KM) com o de
+comprar tudo em uma única loja.
+
+A ordem de visita é exata (Held-Karp) para até ROUTE_EXACT_MAX_STOPS lojas e
+heurística (vizinho mais próximo + 2-opt) acima disso. A matriz de distâncias
+loja × loja é memoizada por conjunto de lojas.
+"""
+
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from src.config.settings import Settings
+from src.services.geo import haversine_km
+from src.services.ranking import generate_ranking
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Número de conjuntos de lojas com matriz de distâncias memoizada
+ROUTE_MATRIX_CACHE_SIZE = 1024
+
+# Melhoria mínima (km) para aceitar uma troca do 2-opt
+TWO_OPT_EPSILON = 1e-9
+
+
+@lru_cache(maxsize=ROUTE_MATRIX_CACHE_SIZE)
+def store_distance_matrix(stops: Tuple[Tuple[Any, float, float], ...]) -> np.ndarray:
+    """
+    Calcula (e memoiza) as distâncias entre todas as lojas de um conjunto.
+    
+    Args:
+        stops: Lojas como (store_id, latitude, longitude), em ordem de store_id.
+    
+    Returns:
+        np.ndarray: Matriz simétrica (n x n) em km (somente leitura).
+    """
+    lats = np.array([lat for _, lat, _ in stops], dtype=np.float64)
+    lons = np.array([lon for _, _, lon in stops], dtype=np.float64)
+    
+    matrix = np.vstack([haversine_km(lat, lon, lats, lons) for lat, lon in zip(lats, lons)])
+    matrix.setflags(write=False)
+    return matrix
+
+
+def held_karp(dist: np.ndarray) -> Tuple[List[int], float]:
+    """
+    Menor ciclo que parte do nó 0, visita todos os nós e volta ao nó 0 (exato).
+    
+    Programação dinâmica sobre subconjuntos: O(2^n · n²).
+    
+    Args:
+        dist: Matriz de distâncias (n x n).
+    
+    Returns:
+        Tuple[List[int], float]: Ordem de visita dos nós 1..n-1 e custo do ciclo.
+    """
+    m = dist.shape[0] - 1
+    if m <= 0:
+        return [], 0.0
+    
+    full = (1 << m) - 1
+    cost = np.full((full + 1, m), np.inf)
+    parent = np.full((full + 1, m), -1, dtype=np.int64)
+    to_node = dist[1:, 1:]
+    
+    for j in range(m):
+        cost[1 << j, j] = dist[0, j + 1]
+    
+    for mask in range(1, full + 1):
+        for j in range(m):
+            bit = 1 << j
+            if not mask & bit or mask == bit:
+                continue
+            candidates = cost[mask ^ bit] + to_node[:, j]
+            k = int(np.argmin(candidates))
+            cost[mask, j] = candidates[k]
+            parent[mask, j] = k
+    
+    closing = cost[full] + dist[1:, 0]
+    last = int(np.argmin(closing))
+    total = float(closing[last])
+    
+    order = []
+    mask = full
+    while last >= 0:
+        order.append(last + 1)
+        previous = int(parent[mask, last])
+        mask ^= 1 << last
+        last = previous
+    
+    return order[::-1], total
+
+
+def two_opt(dist: np.ndarray) -> Tuple[List[int], float]:
+    """
+    Ciclo a partir do nó 0 pelo vizinho mais próximo, melhorado por 2-opt.
+    
+    Args:
+        dist: Matriz de distâncias (n x n).
+    
+    Returns:
+        Tuple[List[int], float]: Ordem de visita dos nós 1..n-1 e custo do ciclo.
+    """
+    n = dist.shape[0]
+    
+    # Vizinho mais próximo
+    tour = [0]
+    remaining = set(range(1, n))
+    while remaining:
+        current = tour[-1]
+        nearest = min(remaining, key=lambda node: (dist[current, node], node))
+        tour.append(nearest)
+        remaining.remove(nearest)
+    
+    # 2-opt: inverter trechos enquanto houver troca de arestas que encurte o ciclo
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for k in range(i + 1, n):
+                a, b = tour[i - 1], tour[i]
+                c, d = tour[k], tour[(k + 1) % n]
+                delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+                if delta < -TWO_OPT_EPSILON:
+                    tour[i:k + 1] = tour[i:k + 1][::-1]
+                    improved = True
+    
+    total = float(sum(dist[tour[i], tour[(i + 1) % n]] for i in range(n)))
+    return tour[1:], total
+
+
+def solve_route(dist: np.ndarray) -> Tuple[List[int], float, str]:
+    """
+    Escolhe o algoritmo pelo número de paradas.
+    
+    Args:
+        dist: Matriz de distâncias com o ponto de partida no nó 0.
+    
+    Returns:
+        Tuple[List[int], float, str]: Ordem dos nós 1..n-1, custo e algoritmo usado.
+    """
+    stops = dist.shape[0] - 1
+    if stops == 0:
+        return [], 0.0, 'trivial'
+    
+    if stops == 1:
+        return [1], float(dist[0, 1] + dist[1, 0]), 'trivial'
+    
+    if stops <= settings.ROUTE_EXACT_MAX_STOPS:
+        order, total = held_karp(dist)
+        return order, total, 'held_karp'
+    
+    order, total = two_opt(dist)
+    return order, total, 'two_opt'
+
+
+def plan_route(
+    stores: List[Dict[str, Any]],
+    origin: Optional[Dict[str, float]] = None,
+    cost_per_km: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Ordena as lojas de uma combinação em um roteiro.
+    
+    Com origem, o roteiro sai e volta para ela; sem origem, é um caminho
+    aberto entre as lojas (o nó 0 fica a distância zero de todas). Lojas sem
+    coordenadas vão para `unrouted_stores`.
+    
+    Args:
+        stores: Lojas da combinação (com latitude/longitude, estimated_total e items_count).
+        origin: Ponto de partida {'lat', 'lon'} (opcional).
+        cost_per_km: Custo de deslocamento em R$/km (padrão: ROUTE_COST_PER_KM).
+    
+    Returns:
+        Dict[str, Any]: Paradas em ordem, km total, custo de deslocamento e total.
+    """
+    if cost_per_km is None:
+        cost_per_km = settings.ROUTE_COST_PER_KM
+    
+    located = sorted(
+        (store for store in stores if store.get('latitude') is not None and store.get('longitude') is not None),
+        key=lambda store: str(store['id'])
+    )
+    unrouted = [store for store in stores if store not in located]
+    
+    stops = tuple((store['id'], float(store['latitude']), float(store['longitude'])) for store in located)
+    n = len(stops)
+    
+    # Nó 0: origem (ou ponto neutro para caminho aberto) + lojas
+    dist = np.zeros((n + 1, n + 1))
+    if n:
+        dist[1:, 1:] = store_distance_matrix(stops)
+        if origin:
+            from_origin = haversine_km(
+                origin['lat'],
+                origin['lon'],
+                np.array([lat for _, lat, _ in stops]),
+                np.array([lon for _, _, lon in stops])
+            )
+            dist[0, 1:] = from_origin
+            dist[1:, 0] = from_origin
+    
+    order, total_km, solver = solve_route(dist)
+    
+    route = []
+    previous = 0
+    for position, node in enumerate(order, start=1):
+        stop = dict(located[node - 1])
+        stop['order'] = position
+        stop['leg_km'] = round(float(dist[previous, node]), 2)
+        route.append(stop)
+        previous = node
+    
+    goods_total = sum(float(store.get('estimated_total', 0.0)) for store in stores)
+    travel_cost = total_km * cost_per_km
+    
+    return {
+        "stops": route,
+        "unrouted_stores": unrouted,
+        "round_trip": bool(origin),
+        "return_km": round(float(dist[previous, 0]), 2) if origin and order else 0.0,
+        "total_km": round(total_km, 2),
+        "cost_per_km": round(float(cost_per_km), 2),
+        "travel_cost": round(travel_cost, 2),
+        "goods_total": round(goods_total, 2),
+        "total_cost": round(goods_total + travel_cost, 2),
+        "solver": solver,
+        "optimal": solver != 'two_opt'
+    }
+
+
+def plan_shopping_route(
+    shopping_list_id: str,
+    user_location: Optional[Dict[str, float]] = None,
+    max_stores: Optional[int] = None,
+    store_penalty: Optional[float] = None,
+    cost_per_km: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Gera o roteiro da cesta otimizada de uma lista e a economia líquida.
+    
+    A economia líquida compara o custo total (compras + deslocamento) do
+    roteiro com o da melhor cesta de uma única loja (ambos a partir dos
+    rankings cacheados).
+    
+    Args:
+        shopping_list_id: UUID da lista.
+        user_location: Dicionário com 'lat' e 'lon' do usuário (opcional).
+        max_stores: Máximo de lojas na cesta otimizada (opcional).
+        store_penalty: Penalidade por loja extra (opcional).
+        cost_per_km: Custo de deslocamento em R$/km (padrão: ROUTE_COST_PER_KM).
+    
+    Returns:
+        Dict[str, Any]: Roteiro, roteiro de uma loja (baseline) e economia, ou
+            {"error"/"message"} repassados do ranking.
+    """
+    ranking = generate_ranking(shopping_list_id, user_location, max_stores, store_penalty)
+    if 'error' in ranking or not ranking.get('items'):
+        return ranking
+    
+    baseline_ranking = generate_ranking(shopping_list_id, user_location, 1, store_penalty)
+    if 'error' in baseline_ranking:
+        return baseline_ranking
+    
+    combination = ranking['optimized_combination']
+    baseline_combination = baseline_ranking['optimized_combination']
+    
+    route = plan_route(combination['stores'], user_location, cost_per_km)
+    baseline = plan_route(baseline_combination['stores'], user_location, cost_per_km)
+    
+    goods_savings = baseline['goods_total'] - route['goods_total']
+    net_savings = baseline['total_cost'] - route['total_cost']
+    
+    return {
+        "list_id": ranking['list_id'],
+        "origin": user_location,
+        **route,
+        "uncovered_product_ids": combination.get('uncovered_product_ids', []),
+        "baseline": {
+            **baseline,
+            "uncovered_product_ids": baseline_combination.get('uncovered_product_ids', [])
+        },
+        "goods_savings": round(goods_savings, 2),
+        "extra_km": round(route['total_km'] - baseline['total_km'], 2),
+        "net_savings": round(net_savings, 2),
+        "worth_it": net_savings > 0
+    }
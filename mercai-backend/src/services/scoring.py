@@ -0,0 +1,344 @@
+"""
+Scoring Service - Kernel Vetorizado de Score
+
+Módulo responsável por calcular, em lote e com NumPy, os scores de todas as
+ofertas de uma lista. Reproduz exatamente `calculate_offer_score` (pesos
+40/30/20/10) sem laços em Python por oferta.
+"""
+
+from typing import Dict, Optional, Sequence, Tuple, Any
+import logging
+
+import numpy as np
+
+from src.services.geo import haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Distância máxima para score de proximidade (geo.calculate_proximity_score)
+PROXIMITY_MAX_DISTANCE_KM = 20.0
+
+# Score máximo de proximidade (loja na localização do usuário)
+PROXIMITY_MAX_SCORE = 10.0
+
+# Colunas esperadas pelo kernel
+OFFER_COLUMNS = (
+    'price',
+    'original_price',
+    'discount_percentage',
+    'in_stock',
+    'store_lat',
+    'store_lon',
+)
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """
+    Arredonda para 2 casas decimais com o mesmo resultado de `round(x, 2)`.
+    
+    `np.round` escala por 100 antes de arredondar e pode divergir do `round`
+    do Python em valores muito próximos de ...5; esses poucos casos são
+    recalculados com o `round` nativo.
+    
+    Args:
+        values: Array de floats.
+    
+    Returns:
+        np.ndarray: Array arredondado.
+    """
+    scaled = values * 100.0
+    rounded = np.rint(scaled) / 100.0
+    
+    ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ambiguous.any():
+        rounded[ambiguous] = [round(float(value), 2) for value in values[ambiguous]]
+    
+    return rounded
+
+
+def _as_float_array(values: Sequence[Any]) -> np.ndarray:
+    """
+    Converte uma sequência (com None) em array float64 (None vira NaN).
+    
+    Args:
+        values: Sequência de números ou None.
+    
+    Returns:
+        np.ndarray: Array float64.
+    """
+    return np.array(
+        [np.nan if value is None else float(value) for value in values],
+        dtype=np.float64
+    )
+
+
+def build_offer_columns(offers: Sequence[Any]) -> Dict[str, np.ndarray]:
+    """
+    Monta as colunas do kernel a partir de objetos `Offer` (com `store` carregado).
+    
+    Os valores seguem a mesma derivação de `Offer.to_dict(include_store=True)`,
+    para que os scores coincidam com os do cálculo escalar.
+    
+    Args:
+        offers: Sequência de ofertas.
+    
+    Returns:
+        Dict[str, np.ndarray]: Colunas price, original_price, discount_percentage,
+            in_stock, store_lat e store_lon.
+    """
+    price = []
+    original_price = []
+    discount_percentage = []
+    in_stock = []
+    store_lat = []
+    store_lon = []
+    
+    for offer in offers:
+        price.append(offer.price)
+        original_price.append(offer.original_price or None)
+        
+        if offer.discount_percentage:
+            discount_percentage.append(offer.discount_percentage)
+        elif offer.original_price and offer.price < offer.original_price:
+            discount_percentage.append(offer.calculate_discount_percentage() or None)
+        else:
+            discount_percentage.append(None)
+        
+        in_stock.append(bool(offer.in_stock))
+        
+        store = offer.store
+        if store is not None and store.latitude and store.longitude:
+            store_lat.append(store.latitude)
+            store_lon.append(store.longitude)
+        else:
+            store_lat.append(None)
+            store_lon.append(None)
+    
+    return {
+        'price': _as_float_array(price),
+        'original_price': _as_float_array(original_price),
+        'discount_percentage': _as_float_array(discount_percentage),
+        'in_stock': np.array(in_stock, dtype=bool),
+        'store_lat': _as_float_array(store_lat),
+        'store_lon': _as_float_array(store_lon),
+    }
+
+
+def group_max(values: np.ndarray, group_index: np.ndarray, n_groups: int) -> np.ndarray:
+    """
+    Calcula o máximo de `values` por grupo.
+    
+    Args:
+        values: Array de valores.
+        group_index: Índice do grupo (0..n_groups-1) de cada valor.
+        n_groups: Número de grupos.
+    
+    Returns:
+        np.ndarray: Máximo de cada grupo (-inf para grupos vazios).
+    """
+    maximum = np.full(n_groups, -np.inf)
+    np.maximum.at(maximum, group_index, values)
+    return maximum
+
+
+def score_offer_columns(
+    columns: Dict[str, np.ndarray],
+    user_location: Optional[Dict[str, float]] = None,
+    max_price: Optional[Any] = None,
+    group_index: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Calcula o score (0-100) de todas as ofertas de uma vez.
+    
+    Equivalente a aplicar `calculate_offer_score` em cada oferta.
+    
+    Args:
+        columns: Colunas das ofertas (ver OFFER_COLUMNS). A coluna opcional
+            'store_distance' (km, NaN fora do raio) substitui o cálculo de distâncias.
+        user_location: Dicionário com 'lat' e 'lon' do usuário (opcional).
+        max_price: Preço máximo para normalização: escalar ou array por oferta (opcional).
+        group_index: Índice do produto de cada oferta; se informado e `max_price`
+            for None, normaliza pelo maior preço de cada produto.
+    
+    Returns:
+        np.ndarray: Scores arredondados em 2 casas decimais.
+    """
+    price = columns['price']
+    original_price = columns['original_price']
+    discount_percentage = columns['discount_percentage']
+    in_stock = columns['in_stock']
+    n = price.shape[0]
+    
+    if n == 0:
+        return np.zeros(0)
+    
+    # Preço máximo por oferta
+    if max_price is None and group_index is not None:
+        max_price = group_max(price, group_index, int(group_index.max()) + 1)[group_index]
+    
+    if max_price is None:
+        max_price = np.full(n, np.nan)
+    else:
+        max_price = np.broadcast_to(np.asarray(max_price, dtype=np.float64), (n,))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 1. Score de Preço (40 pontos)
+        use_max = max_price > 0
+        price_score = np.where(
+            use_max,
+            (1 - (price / np.where(use_max, max_price, 1.0))) * 40,
+            (1 - np.minimum(price / 100.0, 1.0)) * 40
+        )
+        score = price_score
+        
+        # 2. Score de Desconto (30 pontos)
+        has_discount = ~np.isnan(discount_percentage) & (discount_percentage != 0)
+        derived = (
+            ~has_discount
+            & ~np.isnan(original_price)
+            & (original_price != 0)
+            & (original_price > price)
+        )
+        derived_discount = ((original_price - price) / original_price) * 100
+        discount = np.where(has_discount, discount_percentage, derived_discount)
+        discount_score = np.minimum(discount / 50.0, 1.0) * 30
+        score = np.where(has_discount | derived, score + discount_score, score)
+        
+        # 3. Score de Disponibilidade (20 pontos)
+        score = np.where(in_stock, score + 20, score)
+        
+        # 4. Score de Proximidade (10 pontos)
+        if user_location:
+            store_lat = columns['store_lat']
+            store_lon = columns['store_lon']
+            has_coords = (
+                ~np.isnan(store_lat) & ~np.isnan(store_lon)
+                & (store_lat != 0) & (store_lon != 0)
+            )
+            if 'store_distance' in columns:
+                # Distâncias já consultadas na matriz célula × loja (NaN fora do raio)
+                distance = columns['store_distance']
+            else:
+                distance = haversine_distances(
+                    user_location['lat'],
+                    user_location['lon'],
+                    store_lat,
+                    store_lon
+                )
+            proximity = proximity_scores(distance)
+            score = np.where(has_coords, score + proximity, score)
+        
+        score = _round2(np.minimum(score, 100.0))
+    
+    # Preço inválido recebe score 0
+    return np.where(price > 0, score, 0.0)
+
+
+def haversine_distances(
+    lat: float,
+    lon: float,
+    lats: np.ndarray,
+    lons: np.ndarray
+) -> np.ndarray:
+    """
+    Calcula a distância (km, 2 casas decimais) de um ponto até vários pontos.
+    
+    Usa o kernel `geo.haversine_km` com o arredondamento de `geo.calculate_distance`.
+    
+    Args:
+        lat: Latitude de origem.
+        lon: Longitude de origem.
+        lats: Array de latitudes de destino.
+        lons: Array de longitudes de destino.
+    
+    Returns:
+        np.ndarray: Distâncias em km (NaN onde não há coordenadas).
+    """
+    return _round2(haversine_km(lat, lon, lats, lons))
+
+
+def proximity_scores(distance_km: np.ndarray) -> np.ndarray:
+    """
+    Calcula o score de proximidade (0-10) de várias distâncias.
+    
+    Mesma regra de `geo.calculate_proximity_score`.
+    
+    Args:
+        distance_km: Array de distâncias em km.
+    
+    Returns:
+        np.ndarray: Scores de proximidade.
+    """
+    with np.errstate(invalid='ignore'):
+        in_range = (distance_km >= 0) & (distance_km < PROXIMITY_MAX_DISTANCE_KM)
+        score = np.maximum(
+            0,
+            PROXIMITY_MAX_SCORE - (distance_km / PROXIMITY_MAX_DISTANCE_KM) * PROXIMITY_MAX_SCORE
+        )
+        return np.where(in_range, _round2(score), 0.0)
+
+
+def top_k_per_group(
+    scores: np.ndarray,
+    group_index: np.ndarray,
+    k: int
+) -> Dict[int, np.ndarray]:
+    """
+    Retorna os índices das k ofertas de maior score de cada grupo (produto).
+    
+    Empates preservam a ordem original, como o `sort(reverse=True)` do Python.
+    
+    Args:
+        scores: Scores das ofertas.
+        group_index: Índice do grupo de cada oferta.
+        k: Número de ofertas por grupo.
+    
+    Returns:
+        Dict[int, np.ndarray]: Índices (maior score primeiro) por grupo.
+    """
+    n = scores.shape[0]
+    if n == 0:
+        return {}
+    
+    order = np.lexsort((np.arange(n), -scores, group_index))
+    sorted_groups = group_index[order]
+    
+    # Posição de cada oferta dentro do seu grupo
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    group_sizes = np.diff(np.r_[starts, n])
+    rank = np.arange(n) - np.repeat(starts, group_sizes)
+    
+    keep = order[rank < k]
+    kept_groups = group_index[keep]
+    
+    bounds = np.flatnonzero(np.r_[True, kept_groups[1:] != kept_groups[:-1], True])
+    return {
+        int(kept_groups[bounds[i]]): keep[bounds[i]:bounds[i + 1]]
+        for i in range(len(bounds) - 1)
+    }
+
+
+def rank_offer_columns(
+    columns: Dict[str, np.ndarray],
+    group_index: np.ndarray,
+    user_location: Optional[Dict[str, float]] = None,
+    k: int = 5,
+    max_price: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, Dict[int, np.ndarray]]:
+    """
+    Pontua todas as ofertas (normalizando por produto) e seleciona o top-k de cada produto.
+    
+    Args:
+        columns: Colunas das ofertas (ver OFFER_COLUMNS).
+        group_index: Índice do produto de cada oferta.
+        user_location: Dicionário com 'lat' e 'lon' do usuário (opcional).
+        k: Número de ofertas por produto.
+        max_price: Preço máximo de normalização por oferta (opcional; padrão:
+            maior preço de cada produto entre as ofertas recebidas).
+    
+    Returns:
+        Tuple[np.ndarray, Dict[int, np.ndarray]]: Scores de todas as ofertas e
+            índices do top-k por produto.
+    """
+    scores = score_offer_columns(columns, user_location, max_price, group_index=group_index)
+    return scores, top_k_per_group(scores, group_index, k)
@@ -0,0 +1,553 @@
+"""
+Store Index Service - Índice Espacial de Lojas
+
+Módulo responsável por um índice em memória (KD-tree) das coordenadas das
+lojas. As coordenadas são convertidas em vetores unitários 3D: a distância
+euclidiana entre eles (corda) cresce com a distância do grande círculo, então
+buscas por raio e pelos k vizinhos mais próximos percorrem apenas os ramos
+relevantes, sem calcular Haversine para todas as lojas.
+
+O índice é construído sob demanda (ou no startup), marcado como desatualizado
+quando lojas mudam e reconstruído após STORE_INDEX_TTL segundos. Alterações
+feitas em outros workers chegam por um contador de versão no Redis.
+"""
+
+from heapq import heappush, heappushpop
+from math import asin, cos, radians, sin, sqrt
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+import time
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.config.settings import Settings
+from src.services.cache import cache
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Raio da Terra em km (mesmo valor de geo.calculate_distance)
+EARTH_RADIUS_KM = 6371
+
+# Número máximo de lojas em uma folha da árvore (busca linear)
+LEAF_SIZE = 16
+
+# Chave em session.info indicando que lojas mudaram
+STALE_FLAG_KEY = 'store_index_stale'
+
+# Contador no Redis incrementado a cada alteração de lojas (todos os workers)
+STORE_INDEX_VERSION_KEY = 'store_index:version'
+
+
+def _unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    """
+    Converte latitude/longitude em vetor unitário 3D.
+    
+    Args:
+        lat: Latitude em graus.
+        lon: Longitude em graus.
+    
+    Returns:
+        Tuple[float, float, float]: (x, y, z) na esfera unitária.
+    """
+    phi, lam = radians(lat), radians(lon)
+    return cos(phi) * cos(lam), cos(phi) * sin(lam), sin(phi)
+
+
+def _chord_to_km(chord_sq: float) -> float:
+    """
+    Converte o quadrado da corda (esfera unitária) em distância em km.
+    
+    Equivale à fórmula de Haversine: corda² = 4·a.
+    
+    Args:
+        chord_sq: Quadrado da distância euclidiana entre os vetores unitários.
+    
+    Returns:
+        float: Distância do grande círculo em km.
+    """
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(chord_sq) / 2))
+
+
+def _km_to_chord_sq(distance_km: float) -> float:
+    """
+    Converte uma distância em km no quadrado da corda equivalente.
+    
+    Args:
+        distance_km: Distância em km.
+    
+    Returns:
+        float: Quadrado da corda na esfera unitária.
+    """
+    angle = min(distance_km / EARTH_RADIUS_KM, np.pi)
+    return (2 * sin(angle / 2)) ** 2
+
+
+class StoreIndex:
+    """
+    KD-tree imutável sobre as coordenadas das lojas.
+    
+    A árvore é implícita: cada intervalo [lo, hi) das lojas ordenadas tem o nó de
+    divisão no meio e as subárvores à esquerda e à direita; intervalos com até
+    LEAF_SIZE lojas são folhas. Cada loja é serializada uma única vez, na
+    construção.
+    """
+    
+    def __init__(self, stores: List[Dict[str, Any]]):
+        """
+        Constrói o índice.
+        
+        Args:
+            stores: Lojas serializadas (com 'latitude' e 'longitude'); lojas
+                sem coordenadas são ignoradas.
+        """
+        located = [
+            store for store in stores
+            if store.get('latitude') is not None and store.get('longitude') is not None
+        ]
+        
+        points = np.array(
+            [_unit_vector(float(s['latitude']), float(s['longitude'])) for s in located],
+            dtype=np.float64
+        ).reshape(-1, 3)
+        
+        order = np.arange(len(located))
+        axes = np.zeros(len(located), dtype=np.int8)
+        self._build(points, order, axes, 0, len(located))
+        
+        # Listas Python: acesso por índice mais rápido que arrays na busca
+        self._points = [tuple(point) for point in points[order].tolist()]
+        self._entries = [located[i] for i in order.tolist()]
+        self._axes = axes.tolist()
+    
+    def __len__(self) -> int:
+        """
+        Número de lojas indexadas.
+        
+        Returns:
+            int: Quantidade de lojas com coordenadas.
+        """
+        return len(self._entries)
+    
+    @staticmethod
+    def _build(points: np.ndarray, order: np.ndarray, axes: np.ndarray, lo: int, hi: int) -> None:
+        """
+        Particiona `order[lo:hi]` recursivamente pela mediana do eixo de maior amplitude.
+        
+        Args:
+            points: Vetores unitários (n, 3).
+            order: Permutação das lojas (modificada no lugar).
+            axes: Eixo de divisão de cada nó (modificado no lugar).
+            lo: Início do intervalo.
+            hi: Fim do intervalo (exclusivo).
+        """
+        if hi - lo <= LEAF_SIZE:
+            return
+        
+        segment = points[order[lo:hi]]
+        axis = int(np.argmax(segment.max(axis=0) - segment.min(axis=0)))
+        mid = (lo + hi) // 2
+        
+        partition = np.argpartition(segment[:, axis], mid - lo)
+        order[lo:hi] = order[lo:hi][partition]
+        axes[mid] = axis
+        
+        StoreIndex._build(points, order, axes, lo, mid)
+        StoreIndex._build(points, order, axes, mid + 1, hi)
+    
+    def _search(
+        self,
+        query: Tuple[float, float, float],
+        limit: Optional[int],
+        max_chord_sq: float
+    ) -> List[Tuple[float, int]]:
+        """
+        Busca as lojas mais próximas dentro do raio.
+        
+        Args:
+            query: Vetor unitário da localização.
+            limit: Número máximo de lojas (None = todas dentro do raio).
+            max_chord_sq: Raio como quadrado da corda.
+        
+        Returns:
+            List[Tuple[float, int]]: (corda², posição) ordenados por distância.
+        """
+        points = self._points
+        axes = self._axes
+        qx, qy, qz = query
+        found: List[Tuple[float, int]] = []  # max-heap (-corda², posição) quando há limite
+        bound = max_chord_sq
+        
+        def visit(position: int) -> None:
+            nonlocal bound
+            px, py, pz = points[position]
+            dist_sq = (px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2
+            if dist_sq > bound:
+                return
+            if limit is None:
+                found.append((dist_sq, position))
+            elif len(found) < limit:
+                heappush(found, (-dist_sq, position))
+                if len(found) == limit:
+                    bound = -found[0][0]
+            else:
+                heappushpop(found, (-dist_sq, position))
+                bound = -found[0][0]
+        
+        # (início, fim, corda² mínima até a região)
+        stack = [(0, len(points), 0.0)]
+        while stack:
+            lo, hi, min_sq = stack.pop()
+            if min_sq > bound:
+                continue
+            if hi - lo <= LEAF_SIZE:
+                for position in range(lo, hi):
+                    visit(position)
+                continue
+            
+            mid = (lo + hi) // 2
+            axis = axes[mid]
+            diff = query[axis] - points[mid][axis]
+            visit(mid)
+            
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            # O lado oposto só é visitado se o plano de divisão estiver dentro do raio atual
+            stack.append((*far, max(min_sq, diff * diff)))
+            stack.append((*near, min_sq))
+        
+        if limit is None:
+            return sorted(found)
+        return sorted((-neg_sq, position) for neg_sq, position in found)
+    
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        limit: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Retorna as lojas a até `radius_km` da localização, mais próximas primeiro.
+        
+        Args:
+            lat: Latitude.
+            lon: Longitude.
+            radius_km: Raio em km.
+            limit: Número máximo de lojas (opcional).
+        
+        Returns:
+            List[Tuple[Dict[str, Any], float]]: (loja serializada, distância em km).
+                As lojas são compartilhadas pelo índice: copie antes de alterar.
+        """
+        if not self._entries or (limit is not None and limit <= 0):
+            return []
+        
+        results = self._search(_unit_vector(lat, lon), limit, _km_to_chord_sq(radius_km))
+        return [(self._entries[position], _chord_to_km(dist_sq)) for dist_sq, position in results]
+    
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        max_distance_km: Optional[float] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Retorna as k lojas mais próximas da localização.
+        
+        Args:
+            lat: Latitude.
+            lon: Longitude.
+            k: Número de lojas.
+            max_distance_km: Distância máxima em km (opcional).
+        
+        Returns:
+            List[Tuple[Dict[str, Any], float]]: (loja serializada, distância em km).
+        """
+        radius_km = max_distance_km if max_distance_km is not None else np.pi * EARTH_RADIUS_KM
+        return self.within_radius(lat, lon, radius_km, limit=k)
+
+
+class SharedStoreIndex:
+    """
+    Índice de lojas compartilhado pelo processo.
+    
+    Construído a partir do banco na primeira consulta; é reconstruído quando
+    marcado como desatualizado (lojas alteradas neste processo), quando o
+    contador compartilhado STORE_INDEX_VERSION_KEY muda (lojas alteradas em
+    outro worker) ou após STORE_INDEX_TTL segundos (sem Redis).
+    """
+    
+    def __init__(self):
+        """Inicializa o índice vazio (construção sob demanda)."""
+        self._lock = Lock()
+        self._index: Optional[StoreIndex] = None
+        self._built_at = 0.0
+        self._stale = True
+        self._version = 0
+        self._shared_version: Optional[int] = None
+    
+    def get(self) -> StoreIndex:
+        """
+        Retorna o índice atual, reconstruindo-o se necessário.
+        
+        Returns:
+            StoreIndex: Índice das lojas com coordenadas.
+        """
+        shared_version = self._read_shared_version()
+        index = self._index
+        if index is not None and not self._outdated(shared_version):
+            return index
+        
+        with self._lock:
+            if self._index is None or self._outdated(shared_version):
+                self._rebuild(shared_version)
+            return self._index
+    
+    def rebuild(self) -> int:
+        """
+        Reconstrói o índice imediatamente (ex: no startup).
+        
+        Returns:
+            int: Número de lojas indexadas.
+        """
+        with self._lock:
+            self._rebuild(self._read_shared_version())
+            return len(self._index)
+    
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        limit: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Busca lojas no raio pelo índice ou, com STORE_INDEX_ENABLED desligado,
+        direto no banco (pré-filtro por bounding box em SQL).
+        
+        Args:
+            lat: Latitude.
+            lon: Longitude.
+            radius_km: Raio em km.
+            limit: Número máximo de lojas (opcional).
+        
+        Returns:
+            List[Tuple[Dict[str, Any], float]]: (loja serializada, distância em km),
+                mais próximas primeiro.
+        """
+        if settings.STORE_INDEX_ENABLED:
+            return self.get().within_radius(lat, lon, radius_km, limit)
+        
+        from src.config.database import get_db
+        
+        db = next(get_db())
+        try:
+            return load_stores_within_radius(db, lat, lon, radius_km, limit)
+        finally:
+            db.close()
+    
+    def current_version(self) -> int:
+        """
+        Versão do índice atual (incrementada a cada reconstrução).
+        
+        Permite que caches derivados do índice (ex: matriz de distâncias)
+        detectem alterações nas lojas.
+        
+        Returns:
+            int: Versão do índice (0 com STORE_INDEX_ENABLED desligado).
+        """
+        if not settings.STORE_INDEX_ENABLED:
+            return 0
+        
+        self.get()
+        return self._version
+    
+    def invalidate(self) -> None:
+        """
+        Marca o índice como desatualizado (reconstruído na próxima consulta)
+        neste processo e, pelo contador no Redis, nos demais workers.
+        """
+        self._stale = True
+        
+        client = cache.client
+        if client is None:
+            return
+        
+        try:
+            client.incr(STORE_INDEX_VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Erro ao publicar nova versão do índice de lojas: {e}")
+    
+    def _read_shared_version(self) -> Optional[int]:
+        """
+        Lê o contador de versão compartilhado pelos workers.
+        
+        Returns:
+            Optional[int]: Versão no Redis (0 se nunca incrementada), ou None
+                sem Redis ou em caso de erro.
+        """
+        client = cache.client
+        if client is None:
+            return None
+        
+        try:
+            value = client.get(STORE_INDEX_VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Erro ao ler versão do índice de lojas: {e}")
+            return None
+        
+        return int(value) if value is not None else 0
+    
+    def _outdated(self, shared_version: Optional[int]) -> bool:
+        """
+        Verifica se o índice precisa ser reconstruído.
+        
+        Args:
+            shared_version: Versão compartilhada atual (None = indisponível).
+        
+        Returns:
+            bool: True se marcado como desatualizado, se outro worker alterou
+                lojas desde a construção ou se passou do tempo de vida.
+        """
+        if self._stale:
+            return True
+        if shared_version is not None and shared_version != self._shared_version:
+            return True
+        return time.monotonic() - self._built_at > settings.STORE_INDEX_TTL
+    
+    def _rebuild(self, shared_version: Optional[int]) -> None:
+        """
+        Carrega as lojas com coordenadas e troca o índice (chamar com o lock).
+        
+        Args:
+            shared_version: Versão compartilhada lida antes da consulta ao banco.
+        """
+        from src.config.database import get_db
+        from src.models.store import Store
+        
+        # Desmarcar antes de ler: alterações durante a leitura marcam de novo
+        self._stale = False
+        self._shared_version = shared_version
+        
+        db = next(get_db())
+        try:
+            stores = db.query(Store).filter(
+                Store.latitude.isnot(None),
+                Store.longitude.isnot(None)
+            ).all()
+            index = StoreIndex([store.to_dict(include_offers=False) for store in stores])
+        except Exception:
+            self._stale = True
+            raise
+        finally:
+            db.close()
+        
+        self._index = index
+        self._built_at = time.monotonic()
+        self._version += 1
+        logger.info(f"Índice espacial de lojas construído: {len(index)} lojas")
+
+
+def load_stores_within_radius(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    limit: Optional[int] = None
+) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    Busca lojas no raio direto no banco, sem o índice em memória.
+    
+    O bounding box do raio é aplicado em SQL (índice idx_stores_location) e as
+    distâncias exatas das lojas restantes são calculadas em uma única chamada
+    de geo.haversine_km.
+    
+    Args:
+        db: Sessão do banco de dados.
+        lat: Latitude.
+        lon: Longitude.
+        radius_km: Raio em km.
+        limit: Número máximo de lojas (opcional).
+    
+    Returns:
+        List[Tuple[Dict[str, Any], float]]: (loja serializada, distância em km),
+            mais próximas primeiro.
+    """
+    from src.models.store import Store
+    from src.services.geo import bounding_box, haversine_km
+    
+    lat_min, lat_max, lon_min, lon_max = bounding_box(lat, lon, radius_km)
+    candidates = db.query(Store).filter(
+        Store.latitude.between(lat_min, lat_max),
+        Store.longitude.between(lon_min, lon_max)
+    ).all()
+    
+    if not candidates:
+        return []
+    
+    distances = haversine_km(
+        lat,
+        lon,
+        [float(store.latitude) for store in candidates],
+        [float(store.longitude) for store in candidates]
+    )
+    
+    inside = np.flatnonzero(distances <= radius_km)
+    inside = inside[np.argsort(distances[inside], kind='stable')][:limit]
+    
+    # Serializar apenas as lojas selecionadas
+    return [
+        (candidates[i].to_dict(include_offers=False), float(distances[i]))
+        for i in inside.tolist()
+    ]
+
+
+# Instância global do índice
+store_index = SharedStoreIndex()
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_stores(session: Session, flush_context, instances) -> None:
+    """
+    Marca a sessão quando lojas são inseridas, alteradas ou removidas.
+    
+    Args:
+        session: Sessão sendo sincronizada.
+        flush_context: Contexto do flush.
+        instances: Instâncias (não usado).
+    """
+    from src.models.store import Store
+    
+    for collection in (session.new, session.dirty, session.deleted):
+        for obj in collection:
+            if isinstance(obj, Store) and (collection is not session.dirty or session.is_modified(obj)):
+                session.info[STALE_FLAG_KEY] = True
+                return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_store_index(session: Session) -> None:
+    """
+    Invalida o índice após o commit de alterações em lojas.
+    
+    Args:
+        session: Sessão confirmada.
+    """
+    if session.info.pop(STALE_FLAG_KEY, False):
+        store_index.invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_changed_stores(session: Session, previous_transaction) -> None:
+    """
+    Descarta a marcação quando a transação é desfeita.
+    
+    Args:
+        session: Sessão.
+        previous_transaction: Transação desfeita.
+    """
+    session.info.pop(STALE_FLAG_KEY, None)
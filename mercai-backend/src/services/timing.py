@@ -0,0 +1,260 @@
+"""
+Timing Service - Instrumentação do Pipeline de Ranking
+
+Módulo responsável por medir a duração de cada etapa do ranking (spans) e
+contadores por requisição (ex: ofertas pontuadas). Os valores de cada
+requisição viram o header `Server-Timing` e alimentam histogramas agregados
+por etapa. Fora de uma requisição instrumentada, `span` devolve um contexto
+vazio compartilhado, sem medir nada.
+"""
+
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Any, Iterator, Optional
+import bisect
+import logging
+
+from src.config.settings import Settings
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+# Limites superiores (ms) dos buckets dos histogramas
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Nome do span com a duração total da requisição
+TOTAL_SPAN = 'total'
+
+# Contexto reaproveitado quando não há trace ativo
+_NOOP_SPAN = nullcontext()
+
+# Trace da requisição atual
+_current_trace: ContextVar[Optional['RequestTrace']] = ContextVar('ranking_trace', default=None)
+
+
+class RequestTrace:
+    """
+    Durações (ms) por etapa e contadores de uma requisição.
+    
+    Spans com o mesmo nome são somados (ex: uma etapa executada por bloco).
+    """
+    
+    def __init__(self):
+        """Inicializa o trace e marca o início da requisição."""
+        self.started_at = perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+    
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """
+        Mede a duração do bloco e soma ao span `name`.
+        
+        Args:
+            name: Nome da etapa.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = self.spans.get(name, 0.0) + (perf_counter() - start) * 1000
+    
+    def count(self, name: str, value: int) -> None:
+        """
+        Soma um valor ao contador `name`.
+        
+        Args:
+            name: Nome do contador.
+            value: Valor a somar.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def finish(self) -> None:
+        """Registra a duração total da requisição."""
+        self.spans[TOTAL_SPAN] = (perf_counter() - self.started_at) * 1000
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Serializa o trace.
+        
+        Returns:
+            Dict[str, Any]: {"stages": {etapa: ms}, "counters": {...}}.
+        """
+        return {
+            'stages': {name: round(duration, 3) for name, duration in self.spans.items()},
+            'counters': dict(self.counters)
+        }
+    
+    def server_timing(self) -> str:
+        """
+        Formata o trace como valor do header Server-Timing.
+        
+        Returns:
+            str: Ex: 'cache_lookup;dur=0.41, scoring;dur=2.10, offers_scored;desc="42"'.
+        """
+        entries = [f"{name};dur={duration:.2f}" for name, duration in self.spans.items()]
+        entries.extend(f'{name};desc="{value}"' for name, value in self.counters.items())
+        return ', '.join(entries)
+
+
+def span(name: str):
+    """
+    Mede uma etapa no trace da requisição atual (se houver).
+    
+    Args:
+        name: Nome da etapa.
+    
+    Returns:
+        Context manager que mede o bloco (ou não faz nada sem trace ativo).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return trace.span(name)
+
+
+def count(name: str, value: int) -> None:
+    """
+    Soma um valor a um contador do trace da requisição atual (se houver).
+    
+    Args:
+        name: Nome do contador.
+        value: Valor a somar.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, value)
+
+
+@contextmanager
+def trace_request(enabled: Optional[bool] = None) -> Iterator[Optional[RequestTrace]]:
+    """
+    Ativa um trace durante o bloco e o registra nos histogramas ao final.
+    
+    Args:
+        enabled: Força a instrumentação (padrão: RANKING_TIMINGS_ENABLED).
+    
+    Yields:
+        Optional[RequestTrace]: Trace ativo ou None se desabilitado.
+    """
+    if enabled is None:
+        enabled = settings.RANKING_TIMINGS_ENABLED
+    
+    if not enabled:
+        yield None
+        return
+    
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+        stage_histograms.observe(trace)
+
+
+class StageHistograms:
+    """
+    Histogramas agregados das durações de cada etapa do ranking.
+    
+    Cada etapa guarda contagens por bucket (HISTOGRAM_BUCKETS_MS, mais um
+    bucket de estouro), soma e máximo; contadores guardam soma e máximo.
+    """
+    
+    def __init__(self):
+        """Inicializa os histogramas."""
+        self._lock = Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._requests = 0
+    
+    def observe(self, trace: RequestTrace) -> None:
+        """
+        Registra as durações e os contadores de uma requisição.
+        
+        Args:
+            trace: Trace finalizado.
+        """
+        with self._lock:
+            self._requests += 1
+            
+            for name, duration in trace.spans.items():
+                stage = self._stages.setdefault(name, {
+                    'buckets': [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+                    'count': 0,
+                    'sum_ms': 0.0,
+                    'max_ms': 0.0
+                })
+                stage['buckets'][bisect.bisect_left(HISTOGRAM_BUCKETS_MS, duration)] += 1
+                stage['count'] += 1
+                stage['sum_ms'] += duration
+                stage['max_ms'] = max(stage['max_ms'], duration)
+            
+            for name, value in trace.counters.items():
+                counter = self._counters.setdefault(name, {'sum': 0, 'max': 0})
+                counter['sum'] += value
+                counter['max'] = max(counter['max'], value)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retorna os histogramas atuais.
+        
+        Returns:
+            Dict[str, Any]: Número de requisições, limites dos buckets e, por
+                etapa, contagens por bucket, média, máximo e p50/p95 estimados
+                (limite superior do bucket); soma e máximo dos contadores.
+        """
+        with self._lock:
+            stages = {}
+            for name, stage in self._stages.items():
+                stages[name] = {
+                    'count': stage['count'],
+                    'avg_ms': round(stage['sum_ms'] / stage['count'], 3),
+                    'max_ms': round(stage['max_ms'], 3),
+                    'p50_ms': self._quantile(stage, 0.5),
+                    'p95_ms': self._quantile(stage, 0.95),
+                    'buckets': list(stage['buckets'])
+                }
+            
+            return {
+                'requests': self._requests,
+                'buckets_ms': list(HISTOGRAM_BUCKETS_MS),
+                'stages': stages,
+                'counters': {name: dict(counter) for name, counter in self._counters.items()}
+            }
+    
+    @staticmethod
+    def _quantile(stage: Dict[str, Any], quantile: float) -> float:
+        """
+        Estima um quantil pelo limite superior do bucket que o contém.
+        
+        Args:
+            stage: Histograma da etapa.
+            quantile: Quantil (0 a 1).
+        
+        Returns:
+            float: Limite do bucket em ms (máximo observado no bucket de estouro).
+        """
+        target = quantile * stage['count']
+        seen = 0
+        for index, bucket_count in enumerate(stage['buckets']):
+            seen += bucket_count
+            if seen >= target and bucket_count:
+                if index < len(HISTOGRAM_BUCKETS_MS):
+                    return float(HISTOGRAM_BUCKETS_MS[index])
+                break
+        return round(stage['max_ms'], 3)
+    
+    def reset(self) -> None:
+        """Zera todos os histogramas."""
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._requests = 0
+
+
+# Instância global dos histogramas
+stage_histograms = StageHistograms()
@@ -0,0 +1,123 @@
+"""
+Utilitários HTTP - Respostas Pré-Serializadas
+
+Módulo com o envio de corpos JSON lidos do cache sem deserializar (ver
+`src.services.cache_codec`) e as requisições condicionais (ETag,
+Last-Modified e 304).
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from flask import Response, request
+from werkzeug.http import is_resource_modified
+
+from src.services.cache_codec import Payload
+
+
+def payload_response(payload: Payload, status: int = 200, cache_control: Optional[str] = None) -> Response:
+    """
+    Monta uma resposta JSON a partir de um corpo cacheado.
+    
+    Se o cliente aceita a compressão do corpo (Accept-Encoding), os bytes são
+    enviados como estão, com Content-Encoding; caso contrário, o corpo é
+    descomprimido (sem deserializar o JSON).
+    
+    A ETag (forte, por representação) e o Last-Modified vêm do cabeçalho da
+    entrada; se o cliente já tem o conteúdo (If-None-Match/If-Modified-Since),
+    a resposta é 304, sem corpo.
+    
+    Args:
+        payload: Corpo cacheado.
+        status: Status HTTP.
+        cache_control: Política de Cache-Control do endpoint (opcional).
+    
+    Returns:
+        Response: Resposta com mimetype application/json.
+    """
+    response = Response(status=status, mimetype='application/json')
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    
+    encoding = None
+    if payload.encoding is not None:
+        response.vary.add('Accept-Encoding')
+        if request.accept_encodings[payload.encoding] > 0:
+            encoding = payload.encoding
+    
+    # A mesma ETag não pode identificar o corpo comprimido e o descomprimido
+    etag = payload.etag() if encoding is None else f"{payload.etag()}-{encoding}"
+    last_modified = None
+    if payload.modified_at:
+        last_modified = datetime.fromtimestamp(int(payload.modified_at), timezone.utc)
+    
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    
+    if status == 200 and not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response.status_code = 304
+        return response
+    
+    if payload.encoding is None:
+        response.set_data(payload.body)
+    elif encoding is not None:
+        response.set_data(payload.body)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response.set_data(payload.decompressed())
+    
+    return response
+
+
+def conditional_response(
+    response: Response,
+    cache_control: Optional[str] = None,
+    etag: Optional[str] = None
+) -> Response:
+    """
+    Torna condicional uma resposta JSON montada fora do cache de corpos.
+    
+    A ETag é a informada (ex: o hash gravado na entrada do cache) ou, na
+    ausência, o hash do corpo; se o cliente já a tem (If-None-Match), a
+    resposta vira 304, sem corpo.
+    
+    Args:
+        response: Resposta com status 200.
+        cache_control: Política de Cache-Control do endpoint (opcional).
+        etag: ETag da representação (opcional).
+    
+    Returns:
+        Response: Resposta com ETag (ou 304).
+    """
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    return response.make_conditional(request)
+
+
+def not_modified_response(etag: str, cache_control: Optional[str] = None) -> Optional[Response]:
+    """
+    Monta a resposta 304 se o cliente já tem a representação (If-None-Match).
+    
+    Permite responder antes de montar o corpo, quando a ETag é conhecida de
+    antemão (ex: hash gravado na entrada do cache).
+    
+    Args:
+        etag: ETag da representação atual.
+        cache_control: Política de Cache-Control do endpoint (opcional).
+    
+    Returns:
+        Optional[Response]: Resposta 304, ou None se o corpo deve ser enviado.
+    """
+    if is_resource_modified(request.environ, etag=etag):
+        return None
+    
+    response = Response(status=304)
+    response.set_etag(etag)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    return response
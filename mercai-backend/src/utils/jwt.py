@@ -148,3 +148,39 @@ def token_required(f):
         return f(user_id, *args, **kwargs)
     
     return decorated
+
+
+def admin_required(f):
+    """
+    Decorator para proteger rotas administrativas (métricas internas).
+    
+    Deve ser aplicado abaixo de `token_required`: recebe o user_id do token e
+    só chama a função se ele estiver em ADMIN_USER_IDS.
+    
+    Example:
+        ```python
+        @app.route('/api/cache/metrics')
+        @token_required
+        @admin_required
+        def metrics(current_user_id):
+            return {"user_id": current_user_id}
+        ```
+    
+    Args:
+        f: Função Flask a ser decorada.
+    
+    Returns:
+        Função decorada que retorna 403 para usuários que não são administradores.
+    """
+    @wraps(f)
+    def decorated(current_user_id, *args, **kwargs):
+        if str(current_user_id) not in settings.ADMIN_USER_IDS:
+            logger.warning(f"Acesso negado a rota administrativa: user_id={current_user_id}")
+            return jsonify({
+                "success": False,
+                "message": "Acesso restrito a administradores"
+            }), 403
+        
+        return f(current_user_id, *args, **kwargs)
+    
+    return decorated
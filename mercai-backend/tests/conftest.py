@@ -0,0 +1,17 @@
+"""
+Configuração compartilhada dos testes.
+"""
+
+import pytest
+
+from src.services.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    """Isola os testes do cache L1 em memória e das métricas (globais por processo)."""
+    cache.local.clear()
+    cache.metrics.reset()
+    yield
+    cache.local.clear()
+    cache.metrics.reset()
@@ -0,0 +1,109 @@
+"""
+Testes Unitários - Otimizador de Cesta
+
+Testes do branch-and-bound multi-loja contra uma busca exaustiva.
+"""
+
+import random
+from itertools import combinations
+
+import pytest
+
+from src.services.basket_optimizer import optimize_basket
+
+
+def _random_basket(rng, n_items, n_stores, coverage=0.7):
+    """Gera itens com ofertas aleatórias em um subconjunto das lojas."""
+    items = []
+    for product_id in range(n_items):
+        offers = {
+            store_id: round(rng.uniform(2, 40), 2)
+            for store_id in range(n_stores)
+            if rng.random() < coverage
+        }
+        if not offers:
+            offers = {rng.randrange(n_stores): round(rng.uniform(2, 40), 2)}
+        items.append({"product_id": product_id, "quantity": rng.randint(1, 4), "offers": offers})
+    
+    stores = {store_id: {"id": store_id, "name": f"Loja {store_id}"} for store_id in range(n_stores)}
+    return items, stores
+
+
+def _brute_force(items, n_stores, max_stores, penalty):
+    """Menor custo entre todos os conjuntos de até max_stores lojas que cobrem a lista."""
+    best = None
+    for size in range(1, max_stores + 1):
+        for subset in combinations(range(n_stores), size):
+            total = 0.0
+            for item in items:
+                prices = [item['offers'][s] for s in subset if s in item['offers']]
+                if not prices:
+                    break
+                total += min(prices) * item['quantity']
+            else:
+                total += penalty * (size - 1)
+                best = total if best is None else min(best, total)
+    return best
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('penalty', [0.0, 6.5])
+def test_matches_exhaustive_search(seed, penalty):
+    """Testa que a solução ótima coincide com a busca exaustiva."""
+    rng = random.Random(seed)
+    items, stores = _random_basket(rng, n_items=12, n_stores=9)
+    
+    result = optimize_basket(items, stores, max_stores=3, store_penalty=penalty)
+    expected = _brute_force(items, 9, 3, penalty)
+    
+    assert result['optimal'] is True
+    assert result['uncovered_product_ids'] == [] or expected is None
+    if expected is not None:
+        assert result['total_cost'] == pytest.approx(expected, abs=0.01)
+        assert len(result['store_ids']) <= 3
+
+
+def test_assignment_uses_cheapest_chosen_store():
+    """Testa a atribuição item -> loja e os totais por loja."""
+    items = [
+        {"product_id": 1, "quantity": 2, "offers": {"a": 10.0, "b": 8.0}},
+        {"product_id": 2, "quantity": 1, "offers": {"a": 5.0, "b": 9.0}},
+        {"product_id": 3, "quantity": 1, "offers": {}},
+    ]
+    stores = {"a": {"id": "a", "name": "A"}, "b": {"id": "b", "name": "B"}}
+    
+    result = optimize_basket(items, stores, max_stores=2)
+    
+    assert sorted(result['store_ids']) == ["a", "b"]
+    assert result['estimated_total'] == 21.0
+    assert result['unavailable_product_ids'] == [3]
+    assignment = {entry['product_id']: entry['store_id'] for entry in result['assignment']}
+    assert assignment == {1: "b", 2: "a"}
+
+
+def test_store_penalty_prefers_single_store():
+    """Testa que a penalidade por loja extra evita dividir a compra sem economia suficiente."""
+    items = [
+        {"product_id": 1, "quantity": 1, "offers": {"a": 10.0, "b": 9.0}},
+        {"product_id": 2, "quantity": 1, "offers": {"a": 5.0, "b": 6.0}},
+    ]
+    stores = {"a": {"id": "a", "name": "A"}, "b": {"id": "b", "name": "B"}}
+    
+    split = optimize_basket(items, stores, max_stores=2, store_penalty=0.0)
+    single = optimize_basket(items, stores, max_stores=2, store_penalty=5.0)
+    
+    assert len(split['store_ids']) == 2
+    assert len(single['store_ids']) == 1
+    assert single['alternatives']
+
+
+def test_time_budget_falls_back_to_best_known_solution():
+    """Testa que, sem orçamento de tempo, ainda retorna uma solução válida."""
+    rng = random.Random(99)
+    items, stores = _random_basket(rng, n_items=80, n_stores=40, coverage=0.5)
+    
+    result = optimize_basket(items, stores, max_stores=6, time_budget_ms=0)
+    
+    assert result['optimal'] is False
+    assert 1 <= len(result['store_ids']) <= 6
+    assert result['estimated_total'] > 0
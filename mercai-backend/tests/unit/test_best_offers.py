@@ -0,0 +1,346 @@
+"""
+Testes Unitários - Melhores Ofertas Materializadas
+
+Testes para a reconstrução incremental de product_best_offers e seus leitores.
+"""
+
+import pytest
+from contextlib import contextmanager
+from decimal import Decimal
+
+from flask import Flask
+from sqlalchemy import event
+
+from src.api.lists import lists_bp
+from src.api.products import products_bp
+from src.config.database import Base, engine, SessionLocal
+from src.models.user import User
+from src.models.store import Store
+from src.models.product import Product
+from src.models.offer import Offer
+from src.models.shopping_list import ShoppingList
+from src.models.list_item import ListItem
+from src.models.product_best_offers import ProductBestOffers
+from src.services.list_summary import ListSummary, load_list_summaries
+from src.utils.jwt import generate_token
+
+
+@pytest.fixture
+def db():
+    """Fixture que cria as tabelas e fornece uma sessão de teste."""
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    
+    yield session
+    
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def catalog(db):
+    """Fixture com 6 lojas e 2 produtos; o primeiro tem ofertas em todas as lojas."""
+    stores = [Store(name=f'Loja {i}') for i in range(6)]
+    products = [Product(name='Arroz'), Product(name='Feijão')]
+    db.add_all(stores + products)
+    db.flush()
+    
+    prices = ['10.00', '8.50', '12.00', '9.00', '15.00', '7.00']
+    originals = [None, '10.00', None, '18.00', None, None]
+    offers = []
+    for store, price, original in zip(stores, prices, originals):
+        offers.append(Offer(
+            product_id=products[0].id,
+            store_id=store.id,
+            price=Decimal(price),
+            original_price=Decimal(original) if original else None,
+            in_stock=(price != '7.00')
+        ))
+    offers.append(Offer(product_id=products[1].id, store_id=stores[0].id, price=Decimal('6.00')))
+    db.add_all(offers)
+    db.commit()
+    
+    return {"stores": stores, "products": products, "offers": offers}
+
+
+@contextmanager
+def count_queries():
+    """Conta as queries executadas no engine dentro do bloco."""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _user(db):
+    """Cria um usuário de teste."""
+    user = User(email='best@example.com', name='Best')
+    user.password_hash = 'x'
+    db.add(user)
+    db.flush()
+    return user
+
+
+def _list(db, user, items):
+    """Cria uma lista com (produto, quantidade) por item."""
+    shopping_list = ShoppingList(user_id=user.id, name='Lista')
+    db.add(shopping_list)
+    db.flush()
+    for product, quantity in items:
+        db.add(ListItem(list_id=shopping_list.id, product_id=product.id, quantity=quantity))
+    return shopping_list
+
+
+def _summary(db, product):
+    """Lê o resumo materializado do produto direto do banco."""
+    db.expire_all()
+    return db.query(ProductBestOffers).filter(ProductBestOffers.product_id == product.id).first()
+
+
+class TestRefresh:
+    """Testes para a reconstrução incremental."""
+    
+    def test_summary_is_built_on_commit(self, db, catalog):
+        """Testa estatísticas e rankings após inserir ofertas."""
+        offers = catalog['offers']
+        summary = _summary(db, catalog['products'][0])
+        
+        assert summary.offers_count == 5
+        assert summary.min_price == Decimal('8.50')
+        assert summary.median_price == Decimal('10.00')
+        assert summary.max_price == Decimal('15.00')
+        assert summary.top_by_price == [offers[i].id for i in (1, 3, 0, 2, 4)]
+        assert summary.top_by_discount == [offers[i].id for i in (3, 1, 0, 2, 4)]
+        assert summary.store_prices == [
+            [catalog['stores'][i].id, price] for i, price in enumerate([10.0, 8.5, 12.0, 9.0, 15.0])
+        ]
+    
+    def test_offer_changes_rebuild_only_affected_product(self, db, catalog):
+        """Testa atualização, falta de estoque e remoção de ofertas."""
+        offers = catalog['offers']
+        other = _summary(db, catalog['products'][1])
+        other_updated_at = other.updated_at
+        
+        offers[4].price = Decimal('5.00')
+        offers[1].in_stock = False
+        db.commit()
+        
+        summary = _summary(db, catalog['products'][0])
+        assert summary.min_price == Decimal('5.00')
+        assert summary.max_price == Decimal('12.00')
+        assert offers[1].id not in summary.top_by_price
+        assert _summary(db, catalog['products'][1]).updated_at == other_updated_at
+        
+        db.delete(offers[4])
+        db.commit()
+        
+        assert _summary(db, catalog['products'][0]).offers_count == 3
+    
+    def test_top_n_and_rollback(self, db, catalog):
+        """Testa o limite do ranking e que rollback não deixa produtos pendentes."""
+        ProductBestOffers.refresh(db, top_n=2)
+        db.commit()
+        
+        assert len(_summary(db, catalog['products'][0]).top_by_price) == 2
+        
+        catalog['offers'][0].price = Decimal('1.00')
+        db.flush()
+        db.rollback()
+        db.commit()
+        
+        assert _summary(db, catalog['products'][0]).min_price == Decimal('8.50')
+    
+    def test_commit_without_offer_changes_skips_refresh(self, db, catalog):
+        """Testa que commits sem ofertas alteradas não reconstroem resumos."""
+        catalog['products'][0].name = 'Arroz Integral'
+        
+        with count_queries() as statements:
+            db.commit()
+        
+        assert any('UPDATE products' in s for s in statements)
+        assert not any('product_best_offers' in s or 'FROM offers' in s for s in statements)
+    
+    def test_product_removal_drops_summary(self, db, catalog):
+        """Testa que remover o produto remove o resumo."""
+        product = catalog['products'][1]
+        db.delete(product)
+        db.commit()
+        
+        assert db.query(ProductBestOffers).count() == 1
+
+
+class TestReaders:
+    """Testes para os leitores do resumo materializado."""
+    
+    def test_calculate_total_uses_min_price(self, db, catalog):
+        """Testa o total da lista a partir do menor preço em estoque."""
+        user = User(email='best@example.com', name='Best')
+        user.password_hash = 'x'
+        db.add(user)
+        db.flush()
+        
+        shopping_list = ShoppingList(user_id=user.id, name='Lista')
+        db.add(shopping_list)
+        db.flush()
+        db.add(ListItem(list_id=shopping_list.id, product_id=catalog['products'][0].id, quantity=2))
+        db.add(ListItem(list_id=shopping_list.id, product_id=catalog['products'][1].id, quantity=1))
+        db.commit()
+        
+        assert shopping_list.calculate_total() == pytest.approx(8.50 * 2 + 6.00)
+    
+    def test_list_summaries_match_calculate_total(self, db, catalog):
+        """Testa o resumo agregado contra calculate_total, com e sem resumo materializado."""
+        user = _user(db)
+        arroz, feijao = catalog['products']
+        sem_ofertas = Product(name='Sal')
+        db.add(sem_ofertas)
+        db.flush()
+        
+        full = _list(db, user, [(arroz, 2), (feijao, 3)])
+        unpriced = _list(db, user, [(sem_ofertas, 1)])
+        empty = _list(db, user, [])
+        db.commit()
+        user_id, full_id, unpriced_id, empty_id = user.id, full.id, unpriced.id, empty.id
+        
+        # Produto sem resumo materializado: menor oferta em estoque
+        db.query(ProductBestOffers).filter(ProductBestOffers.product_id == feijao.id).delete()
+        db.commit()
+        db.expire_all()
+        
+        with count_queries() as statements:
+            summaries = load_list_summaries(db, user_id)
+        
+        assert len(statements) == 1
+        assert summaries[full_id] == ListSummary(2, pytest.approx(8.50 * 2 + 6.00 * 3))
+        assert summaries[full_id].estimated_total == full.calculate_total()
+        assert summaries[unpriced_id] == ListSummary(1, None)
+        assert summaries[empty_id] == ListSummary(0, None)
+    
+    def test_get_lists_query_count_is_constant(self, db, catalog):
+        """Testa GET /api/lists com o mesmo número de queries para qualquer quantidade de listas."""
+        user = _user(db)
+        for _ in range(3):
+            _list(db, user, [(catalog['products'][0], 1), (catalog['products'][1], 2)])
+        db.commit()
+        
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.register_blueprint(lists_bp, url_prefix='/api/lists')
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {generate_token(str(user.id), user.email)}'}
+        
+        with count_queries() as statements:
+            response = client.get('/api/lists', headers=headers)
+        few = len(statements)
+        
+        for _ in range(5):
+            _list(db, user, [(catalog['products'][0], 4)])
+        db.commit()
+        with count_queries() as statements:
+            response = client.get('/api/lists', headers=headers)
+        
+        lists = response.get_json()['data']['lists']
+        assert len(statements) == few
+        assert len(lists) == 8
+        assert sorted((lst['items_count'], lst['estimated_total']) for lst in lists)[-1] == (
+            2, pytest.approx(8.50 + 6.00 * 2)
+        )
+    
+    def test_list_and_detail_share_summary_fields(self, db, catalog):
+        """Testa que GET /api/lists e GET /api/lists/:id trazem o mesmo items_count e total."""
+        user = _user(db)
+        arroz, feijao = catalog['products']
+        full = _list(db, user, [(arroz, 3), (feijao, 7)])
+        empty = _list(db, user, [])
+        db.commit()
+        
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.register_blueprint(lists_bp, url_prefix='/api/lists')
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {generate_token(str(user.id), user.email)}'}
+        
+        lists = {lst['id']: lst for lst in client.get('/api/lists', headers=headers).get_json()['data']['lists']}
+        
+        for shopping_list in (full, empty):
+            detail = client.get(f'/api/lists/{shopping_list.id}', headers=headers).get_json()['data']['list']
+            summary = lists[str(shopping_list.id)]
+            
+            assert detail['items_count'] == summary['items_count']
+            assert detail.get('estimated_total') == summary.get('estimated_total')
+        
+        assert lists[str(full.id)]['estimated_total'] == round(8.50 * 3 + 6.00 * 7, 2)
+        assert lists[str(empty.id)]['items_count'] == 0
+    
+    def test_product_offers_endpoint_reads_top_n(self, db, catalog):
+        """Testa GET /api/products/:id/offers com sort=price_asc e sort=score."""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.register_blueprint(products_bp, url_prefix='/api/products')
+        client = app.test_client()
+        product = catalog['products'][0]
+        
+        response = client.get(f'/api/products/{product.id}/offers?sort=price_asc')
+        data = response.get_json()['data']
+        
+        assert response.status_code == 200
+        assert [o['price'] for o in data['offers']] == [8.5, 9.0, 10.0, 12.0, 15.0]
+        assert data['price_stats'] == {
+            'offers_count': 5,
+            'min_price': 8.5,
+            'median_price': 10.0,
+            'max_price': 15.0
+        }
+        assert 'store' in data['offers'][0]
+        
+        response = client.get(f'/api/products/{product.id}/offers?sort=score')
+        offers = response.get_json()['data']['offers']
+        assert [(o['price'], o.get('discount_percentage')) for o in offers] == [
+            (9.0, 50.0), (8.5, 15.0), (10.0, None), (12.0, None), (15.0, None)
+        ]
+    
+    def test_score_sort_without_discounts(self, db, catalog):
+        """Testa sort=score para um produto só com ofertas sem desconto."""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.register_blueprint(products_bp, url_prefix='/api/products')
+        client = app.test_client()
+        product = Product(name='Óleo')
+        db.add(product)
+        db.flush()
+        db.add_all([
+            Offer(product_id=product.id, store_id=catalog['stores'][1].id, price=Decimal('6.00')),
+            Offer(product_id=product.id, store_id=catalog['stores'][2].id, price=Decimal('5.00')),
+        ])
+        db.commit()
+        
+        by_price = client.get(f'/api/products/{product.id}/offers?sort=price_asc').get_json()['data']
+        by_score = client.get(f'/api/products/{product.id}/offers?sort=score').get_json()['data']
+        
+        assert [o['price'] for o in by_price['offers']] == [5.0, 6.0]
+        assert [o['price'] for o in by_score['offers']] == [5.0, 6.0]
+    
+    def test_product_offers_endpoint_caps_top_n(self, db, catalog):
+        """Testa que price_asc/score retornam no máximo BEST_OFFERS_TOP_N ofertas."""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.register_blueprint(products_bp, url_prefix='/api/products')
+        client = app.test_client()
+        product = catalog['products'][0]
+        ProductBestOffers.refresh(db, top_n=2)
+        db.commit()
+        
+        for sort in ('price_asc', 'score'):
+            data = client.get(f'/api/products/{product.id}/offers?sort={sort}').get_json()['data']
+            
+            assert data['count'] == 2
+            assert data['price_stats']['offers_count'] == 5
+        
+        data = client.get(f'/api/products/{product.id}/offers?sort=price_desc').get_json()['data']
+        assert [o['price'] for o in data['offers']] == [15.0, 12.0, 10.0, 9.0, 8.5]
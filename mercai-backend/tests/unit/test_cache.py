@@ -0,0 +1,556 @@
+"""
+Testes Unitários - Cache em Dois Níveis
+
+Testes do LRU em memória (L1), da leitura/escrita com Redis (L2), das
+políticas por prefixo, da invalidação entre workers via pub/sub, da
+invalidação por tags, do stale-while-revalidate com recálculo único, das
+leituras/escritas em lote e das métricas por prefixo.
+"""
+
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from src.api.cache import cache_bp
+from src.services import cache as cache_module
+from src.services import cache_codec
+from src.services import local_cache
+from src.services import cache_tags
+from src.services.cache import (
+    INVALIDATION_CHANNEL,
+    CacheEntry,
+    CacheItem,
+    CacheService,
+    LocalEntry,
+    Tagged,
+    cache,
+    cached,
+)
+from src.services.cache_metrics import CacheMetrics
+from src.services.local_cache import LocalCache
+from src.utils import jwt as jwt_utils
+from src.utils.jwt import generate_token
+
+
+class FakePipeline:
+    """Pipeline que enfileira os comandos e os aplica no execute."""
+    
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+    
+    def __getattr__(self, name):
+        def queue(*args):
+            self.commands.append((getattr(self.client, name), args))
+            return self
+        return queue
+    
+    def execute(self):
+        self.client.round_trips += 1
+        results = [command(*args) for command, args in self.commands]
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    """Cliente Redis em memória que registra leituras, publicações e round-trips."""
+    
+    def __init__(self):
+        self.data = {}
+        self.sets = {}
+        self.hashes = {}
+        self.expires = {}
+        self.ttls = {}
+        self.gets = 0
+        self.round_trips = 0
+        self.published = []
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+    
+    def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+    
+    def mget(self, keys):
+        self.round_trips += 1
+        return [self.data.get(key) for key in keys]
+    
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        self.ttls[key] = ttl
+        return True
+    
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+    
+    def exists(self, key):
+        return int(key in self.data)
+    
+    def keys(self, pattern):
+        raise AssertionError('KEYS não deve ser usado')
+    
+    def scan_iter(self, match, count=None):
+        prefix = match.rstrip('*')
+        return iter([key for key in self.data if key.startswith(prefix)])
+    
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+        return len(members)
+    
+    def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+        return len(members)
+    
+    def smembers(self, key):
+        return set(self.sets.get(key, ()))
+    
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+    
+    def eval(self, script, numkeys, key, token):
+        # Script de liberação do lock: remove apenas se o token confere
+        if self.data.get(key) == token:
+            return self.delete(key)
+        return 0
+    
+    def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+    
+    hincrbyfloat = hincrby
+    
+    def hgetall(self, key):
+        return {field: str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+    
+    def expire(self, key, ttl):
+        self.expires[key] = ttl
+        return True
+    
+    def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+        return 1
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """Fixture que habilita o Redis em memória no cache global."""
+    client = FakeRedis()
+    monkeypatch.setattr(cache, '_client', client)
+    return client
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    """Fixture com o cache sem Redis (apenas L1)."""
+    monkeypatch.setattr(cache, '_client', None)
+
+
+class TestLocalCache:
+    """Testes do LRU em memória."""
+    
+    def test_lru_eviction_and_ttl(self, monkeypatch):
+        """Testa o descarte da entrada menos usada e a expiração."""
+        now = [100.0]
+        monkeypatch.setattr(local_cache.time, 'monotonic', lambda: now[0])
+        l1 = LocalCache(max_entries=2)
+        
+        l1.set('a', 1, ttl=10)
+        l1.set('b', 2, ttl=10)
+        assert l1.get('a') == (True, 1)
+        l1.set('c', 3, ttl=10)
+        
+        assert l1.get('b') == (False, None)
+        assert l1.get('a') == (True, 1)
+        
+        now[0] = 110.0
+        assert l1.get('a') == (False, None)
+        assert l1.delete_pattern('c*') == 1
+        assert len(l1) == 0
+    
+    def test_tag_index(self):
+        """Testa a remoção por tag e a limpeza do índice no descarte pelo LRU."""
+        l1 = LocalCache(max_entries=2)
+        l1.set('a', 1, ttl=10, tags=['product:1'])
+        l1.set('b', 2, ttl=10, tags=['product:1', 'store:7'])
+        l1.set('c', 3, ttl=10, tags=['store:7'])
+        
+        assert l1.tag_members('product:1') == ['b']
+        assert l1.delete_tags(['store:7']) == 2
+        assert len(l1) == 0
+        assert l1.tag_members('product:1') == []
+
+
+class TestTwoTierCache:
+    """Testes do CacheService com L1 na frente do Redis."""
+    
+    def test_works_without_redis(self, no_redis):
+        """Testa que, sem Redis, o L1 mantém o cache funcionando."""
+        assert cache.set('products_categories', {'categories': ['A']}, ttl=60) is True
+        assert cache.get('products_categories') == {'categories': ['A']}
+        assert cache.exists('products_categories')
+        
+        cache.set('product:1', {'id': 1})
+        cache.set('product:2', {'id': 2})
+        assert cache.invalidate_pattern('product:*') == 2
+        assert cache.get('product:1') is None
+    
+    def test_redis_read_populates_l1(self, redis_client):
+        """Testa que uma leitura do Redis evita as próximas idas ao Redis."""
+        redis_client.data['store:7'] = cache_codec.encode({'id': 7})
+        
+        first = cache.get('store:7')
+        second = cache.get('store:7')
+        
+        assert first == second == {'id': 7}
+        assert redis_client.gets == 1
+    
+    def test_legacy_json_entry_is_read(self, redis_client):
+        """Testa que entradas em JSON puro (sem cabeçalho do codec) continuam válidas."""
+        redis_client.data['store:7'] = json.dumps({'id': 7}).encode()
+        
+        assert cache.get_entry('store:7') == CacheEntry({'id': 7}, False)
+    
+    def test_l1_keeps_decoded_value(self, redis_client, monkeypatch):
+        """Testa que o L1 deserializa cada entrada uma única vez."""
+        loads = []
+        original_loads = cache_codec.loads
+        monkeypatch.setattr(cache_codec, 'loads', lambda data: loads.append(data) or original_loads(data))
+        cache.set('ranking:list', {'items': []})
+        
+        first = cache.get('ranking:list')
+        second = cache.get_many(['ranking:list'])['ranking:list']
+        payload = cache.get_entry('ranking:list', payload=True).value
+        
+        assert first is second
+        assert payload.value() == {'items': []}
+        assert len(loads) == 2
+        assert redis_client.gets == 0
+        
+        cache.set('ranking:list', {'items': ['x']})
+        assert cache.get('ranking:list') == {'items': ['x']}
+    
+    def test_l1_ttl_is_bounded_with_redis(self, redis_client, monkeypatch):
+        """Testa que, com Redis, o L1 guarda cópias curtas."""
+        monkeypatch.setattr(cache_module.settings, 'CACHE_L1_TTL', 5)
+        policy = cache._l1_policy('ranking:abc')
+        
+        assert cache._l1_ttl(policy, 3600) == 5
+        assert cache._l1_ttl(cache._l1_policy('products_categories'), 3600) == 300
+        assert cache._l1_ttl(policy, 2) == 2
+    
+    def test_disabled_l1(self, redis_client, monkeypatch):
+        """Testa que, desligado, toda leitura vai ao Redis."""
+        monkeypatch.setattr(cache_module.settings, 'CACHE_L1_ENABLED', False)
+        cache.set('product:1', {'id': 1})
+        
+        cache.get('product:1')
+        cache.get('product:1')
+        
+        assert redis_client.gets == 2
+        assert redis_client.published == []
+
+
+class TestInvalidationBroadcast:
+    """Testes da invalidação do L1 entre workers."""
+    
+    def test_writes_are_broadcast(self, redis_client):
+        """Testa a publicação de escritas, remoções e padrões."""
+        cache.set('product:1', {'id': 1})
+        cache.delete('product:1')
+        cache.invalidate_pattern('ranking:*')
+        
+        messages = [message for channel, message in redis_client.published]
+        assert all(channel == INVALIDATION_CHANNEL for channel, _ in redis_client.published)
+        assert [m.get('keys') for m in messages] == [['product:1'], ['product:1'], None]
+        assert messages[2]['pattern'] == 'ranking:*'
+    
+    def test_messages_from_other_workers_evict_l1(self, redis_client):
+        """Testa que invalidações de outro worker removem as entradas locais."""
+        cache.set('product:1', {'id': 1})
+        cache.set('ranking:a', {'items': []})
+        cache.set('store:7', {'id': 7})
+        
+        cache._apply_invalidation(json.dumps({'origin': cache._origin, 'keys': ['store:7']}))
+        assert cache.local.get('store:7')[0]
+        
+        cache._apply_invalidation(json.dumps({'origin': 'outro', 'keys': ['product:1']}))
+        cache._apply_invalidation(json.dumps({'origin': 'outro', 'pattern': 'ranking:*'}))
+        
+        assert not cache.local.get('product:1')[0]
+        assert not cache.local.get('ranking:a')[0]
+        assert cache.local.get('store:7')[0]
+    
+    def test_singleton_keeps_single_l1(self):
+        """Testa que o singleton compartilha o mesmo L1."""
+        assert CacheService().local is cache.local
+
+
+class TestTagInvalidation:
+    """Testes da invalidação por tags."""
+    
+    def test_set_registers_tags_in_one_round_trip(self, redis_client, monkeypatch):
+        """Testa o SETEX e os SADD/EXPIRE das tags no mesmo pipeline."""
+        monkeypatch.setattr(cache_module.settings, 'CACHE_TAG_TTL', 100)
+        
+        cache.set('product:1', {'id': 1}, ttl=1800, tags=['product:1', 'store:7'])
+        
+        assert redis_client.round_trips == 1
+        assert redis_client.sets == {'tag:product:1': {'product:1'}, 'tag:store:7': {'product:1'}}
+        assert redis_client.expires['tag:store:7'] == 1800
+    
+    def test_invalidate_removes_only_dependent_keys(self, redis_client):
+        """Testa que apenas as chaves das tags são removidas, em dois round-trips."""
+        cache.set('product:1', {'id': 1}, tags=['product:1', 'store:7'])
+        cache.set('product:2', {'id': 2}, tags=['product:2'])
+        cache.set('store:7', {'id': 7}, tags=['store:7'])
+        redis_client.round_trips = 0
+        
+        assert cache.invalidate_tags(['store:7', 'product:404']) == 2
+        
+        assert redis_client.round_trips == 2
+        assert sorted(redis_client.data) == ['product:2']
+        assert redis_client.sets['tag:store:7'] == set()
+        assert cache.get('product:1') is None
+        assert cache.get('product:2') == {'id': 2}
+        assert redis_client.published[-1][1]['tags'] == ['store:7', 'product:404']
+    
+    def test_invalidate_evicts_entries_read_from_redis(self, redis_client):
+        """Testa que o worker que invalida não continua servindo a cópia do L1."""
+        redis_client.data['product:1'] = cache_codec.encode({'price': 10})
+        redis_client.sets['tag:product:1'] = {b'product:1'}
+        
+        assert cache.get('product:1') == {'price': 10}
+        assert cache.invalidate_tags(['product:1']) == 1
+        assert cache.get('product:1') is None
+    
+    def test_works_without_redis(self, no_redis):
+        """Testa as tags no L1 quando não há Redis."""
+        cache.set('ranking:a', {'items': []}, tags=['list:a', 'product:1'])
+        cache.set('ranking:b', {'items': []}, tags=['list:b', 'product:1'])
+        
+        assert cache.tag_members('list:a') == ['ranking:a']
+        assert cache.invalidate_tags(['list:a']) == 1
+        assert cache.get('ranking:b') == {'items': []}
+        assert cache.invalidate_tags(['product:1']) == 1
+    
+    def test_entity_invalidations(self, redis_client):
+        """Testa as tags invalidadas por produtos, ofertas e lojas."""
+        cache.set('products_categories', {}, tags=[cache_tags.PRODUCTS_TAG])
+        cache.set('products_popular:10', {}, tags=[cache_tags.PRODUCTS_TAG, cache_tags.OFFERS_TAG])
+        cache.set('product:1', {}, tags=[cache_tags.product_tag(1), cache_tags.store_tag(7)])
+        cache.set('store:7', {}, tags=[cache_tags.store_tag(7), cache_tags.store_offers_tag(7)])
+        cache.set('stores_list:1:20', {}, tags=[cache_tags.STORES_TAG])
+        
+        assert cache_tags.invalidate_offers([1], [7]) == 3
+        assert sorted(redis_client.data) == ['products_categories', 'stores_list:1:20']
+        
+        assert cache_tags.invalidate_stores([7]) == 1
+        assert cache_tags.invalidate_products([]) == 1
+        assert redis_client.data == {}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fixture que controla o relógio usado no TTL "soft"."""
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now[0])
+    return now
+
+
+class TestStaleWhileRevalidate:
+    """Testes do TTL "soft" e do recálculo por um único chamador."""
+    
+    def test_fresh_hit_and_stale_refresh(self, no_redis, clock):
+        """Testa que, após o TTL, quem obtém o lock recalcula."""
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            return {'version': len(calls)}
+        
+        assert cache.fetch('product:1', compute, ttl=60).source == 'miss'
+        assert cache.fetch('product:1', compute, ttl=60) == ({'version': 1}, 'hit')
+        
+        clock[0] += 61
+        assert cache.get_entry('product:1').stale
+        assert cache.fetch('product:1', compute, ttl=60) == ({'version': 2}, 'miss')
+        assert cache.metrics.snapshot()['prefixes']['product']['refreshes'] == 2
+    
+    def test_stale_served_while_other_caller_refreshes(self, redis_client, clock):
+        """Testa que, com o lock de outro worker, o valor antigo é servido sem recalcular."""
+        cache.set('products_popular:10', ['antigo'], ttl=60, stale_ttl=300)
+        clock[0] += 61
+        redis_client.data['lock:products_popular:10'] = 'outro-worker'
+        
+        fetched = cache.fetch('products_popular:10', lambda: pytest.fail('recalculou'), ttl=60)
+        
+        assert fetched == (['antigo'], 'stale')
+        assert cache.metrics.snapshot()['prefixes']['products_popular']['stale_served'] == 1
+    
+    def test_stale_served_on_error(self, redis_client, clock):
+        """Testa que uma falha no recálculo serve o valor antigo e libera o lock."""
+        cache.set('store:7', {'id': 7}, ttl=60, stale_ttl=300)
+        clock[0] += 61
+        
+        def failing():
+            raise RuntimeError('banco fora do ar')
+        
+        assert cache.fetch('store:7', failing, ttl=60) == ({'id': 7}, 'stale')
+        assert cache.metrics.snapshot()['prefixes']['store']['stale_on_error'] == 1
+        assert 'lock:store:7' not in redis_client.data
+        
+        with pytest.raises(RuntimeError):
+            cache.fetch('store:8', failing, ttl=60)
+    
+    def test_single_flight_on_cold_key(self, no_redis):
+        """Testa que chamadas concorrentes em chave vazia calculam uma única vez."""
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return Tagged({'id': 1}, ['product:1'])
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.fetch('product:1', compute, ttl=60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(calls) == 1
+        assert [result.value for result in results] == [{'id': 1}] * 5
+        assert cache.tag_members('product:1') == ['product:1']
+    
+    def test_cached_decorator(self, no_redis):
+        """Testa o decorator com resultados None não cacheados."""
+        calls = []
+        
+        @cached(ttl=60, key_prefix='lookup')
+        def lookup(value):
+            calls.append(value)
+            return None if value == 'x' else value.upper()
+        
+        assert lookup('a') == 'A'
+        assert lookup('a') == 'A'
+        assert lookup('x') is None
+        assert lookup('x') is None
+        assert calls == ['a', 'x', 'x']
+
+
+class TestBatchedCache:
+    """Testes de get_many/set_many e do decorator em lote."""
+    
+    def test_get_many_in_one_round_trip(self, redis_client):
+        """Testa o MGET das chaves fora do L1 e o L1 populado pela leitura."""
+        redis_client.data['product:1'] = cache_codec.encode({'id': 1})
+        redis_client.data['product:2'] = cache_codec.encode({'id': 2})
+        cache.local.set('store:7', LocalEntry(cache_codec.encode({'id': 7})), ttl=60)
+        
+        keys = ['product:1', 'store:7', 'product:2', 'product:3']
+        
+        assert cache.get_many(keys) == {'product:1': {'id': 1}, 'store:7': {'id': 7}, 'product:2': {'id': 2}}
+        assert cache.get_many(keys[:3]) == cache.get_many(keys[:3])
+        assert redis_client.round_trips == 1
+        assert redis_client.gets == 0
+    
+    def test_set_many_with_per_key_ttls(self, redis_client):
+        """Testa as escritas em um único pipeline, com TTLs e tags por chave."""
+        assert cache.set_many([
+            CacheItem('product:1', {'id': 1}, ttl=60, tags=['product:1']),
+            CacheItem('store:7', {'id': 7}, ttl=600, stale_ttl=30),
+        ]) is True
+        
+        assert redis_client.round_trips == 1
+        assert redis_client.ttls == {'product:1': 60, 'store:7': 630}
+        assert redis_client.sets == {'tag:product:1': {'product:1'}}
+        assert redis_client.published == [
+            (INVALIDATION_CHANNEL, {'origin': cache._origin, 'keys': ['product:1', 'store:7']})
+        ]
+        assert cache.get('store:7') == {'id': 7}
+
+
+class TestCacheMetrics:
+    """Testes dos contadores por prefixo e da agregação entre workers."""
+    
+    def test_counts_by_prefix(self, no_redis):
+        """Testa hits, misses, escritas e bytes no escopo do processo."""
+        cache.set('product:1', {'id': 1})
+        cache.get('product:1')
+        cache.get('product:2')
+        cache.get_many(['product:1', 'store:7'])
+        cache.fetch('store:7', lambda: {'id': 7}, ttl=60)
+        
+        data = cache.metrics.snapshot()
+        product = data['prefixes']['product']
+        
+        assert data['scope'] == 'process'
+        assert (product['hits'], product['misses'], product['sets']) == (2, 1, 1)
+        assert product['hit_rate'] == pytest.approx(2 / 3, abs=1e-4)
+        assert product['bytes_written'] > 0
+        assert data['prefixes']['store']['misses'] == 2
+        assert data['prefixes']['store']['refreshes'] == 1
+    
+    def test_counters_flushed_in_batches(self, redis_client, monkeypatch):
+        """Testa que os contadores vão ao Redis só no flush, somados entre workers."""
+        monkeypatch.setattr(cache_module.settings, 'CACHE_METRICS_FLUSH_INTERVAL', 3600)
+        cache.set('ranking:a', {'items': []})
+        for _ in range(50):
+            cache.get('ranking:a')
+        cache.get('ranking:b')
+        
+        assert redis_client.hashes == {}
+        
+        other_worker = CacheMetrics(lambda: redis_client)
+        other_worker.incr('ranking:x', 'hits', 10)
+        other_worker.flush()
+        
+        ranking = cache.metrics.snapshot()['prefixes']['ranking']
+        
+        assert (ranking['hits'], ranking['misses'], ranking['sets']) == (60, 1, 1)
+        assert ranking['redis_calls'] == 2
+        assert ranking['avg_redis_ms'] is not None
+        assert redis_client.sets['metrics:cache:prefixes'] == {'ranking'}
+    
+    def test_metrics_endpoint(self, no_redis, monkeypatch):
+        """Testa GET /api/cache/metrics."""
+        monkeypatch.setattr(jwt_utils.settings, 'ADMIN_USER_IDS', ['admin-1'])
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.register_blueprint(cache_bp, url_prefix='/api/cache')
+        client = app.test_client()
+        cache.get('products_search:arroz')
+        
+        assert client.get('/api/cache/metrics').status_code == 401
+        
+        response = client.get('/api/cache/metrics', headers={
+            'Authorization': f"Bearer {generate_token('admin-1', 'admin@example.com')}"
+        })
+        
+        assert response.status_code == 200
+        assert response.get_json()['data']['prefixes']['products_search']['misses'] == 1
+    
+    def test_metrics_endpoint_requires_admin(self, no_redis, monkeypatch):
+        """Testa que GET /api/cache/metrics retorna 403 para quem não é administrador."""
+        monkeypatch.setattr(jwt_utils.settings, 'ADMIN_USER_IDS', ['admin-1'])
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.register_blueprint(cache_bp, url_prefix='/api/cache')
+        
+        response = app.test_client().get('/api/cache/metrics', headers={
+            'Authorization': f"Bearer {generate_token('user-1', 'user@example.com')}"
+        })
+        
+        assert response.status_code == 403
+        assert response.get_json()['success'] is False
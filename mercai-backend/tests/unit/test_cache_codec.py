@@ -0,0 +1,161 @@
+"""
+Testes Unitários - Codec do Cache
+
+Testes do formato binário das entradas (cabeçalho, compressão acima do
+limite, entradas antigas em JSON) e do envio do corpo cacheado sem
+deserializar.
+"""
+
+import json
+import time
+import zlib
+
+import pytest
+from flask import Flask
+
+from src.services import cache_codec
+from src.services.cache import cache
+from src.services.cache_codec import Payload
+from src.utils.http import payload_response
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    """Fixture com o cache sem Redis (apenas L1)."""
+    monkeypatch.setattr(cache, '_client', None)
+
+
+class TestCacheCodec:
+    """Testes da serialização das entradas."""
+    
+    def test_round_trip(self):
+        """Testa valor e TTL "soft" preservados."""
+        value = {'success': True, 'data': {'id': 1, 'preco': 9.9, 'nome': 'Açúcar'}}
+        
+        assert cache_codec.decode(cache_codec.encode(value)) == (value, None)
+        assert cache_codec.decode(cache_codec.encode(value, 123.5)) == (value, 123.5)
+    
+    def test_compression_threshold(self, monkeypatch):
+        """Testa que só corpos acima do limite são comprimidos."""
+        monkeypatch.setattr(cache_codec.settings, 'CACHE_COMPRESS_MIN_BYTES', 1024)
+        small = {'data': 'x' * 100}
+        large = {'data': [{'id': i, 'name': 'Produto'} for i in range(200)]}
+        
+        small_payload, _ = cache_codec.decode_payload(cache_codec.encode(small))
+        large_payload, _ = cache_codec.decode_payload(cache_codec.encode(large))
+        
+        assert small_payload.encoding is None
+        assert large_payload.encoding in ('zstd', 'deflate')
+        assert len(large_payload.body) < len(cache_codec.dumps(large))
+        assert large_payload.value() == large
+    
+    def test_deflate_fallback(self, monkeypatch):
+        """Testa a compressão com zlib quando o zstandard não está instalado."""
+        monkeypatch.setattr(cache_codec, 'zstandard', None)
+        monkeypatch.setattr(cache_codec.settings, 'CACHE_COMPRESS_MIN_BYTES', 10)
+        value = {'data': ['Produto'] * 50}
+        
+        payload, _ = cache_codec.decode_payload(cache_codec.encode(value))
+        
+        assert payload.encoding == 'deflate'
+        assert json.loads(zlib.decompress(payload.body)) == value
+    
+    def test_digest_and_modified_at(self, monkeypatch):
+        """Testa o hash do conteúdo (independe da compressão) e o momento da gravação."""
+        value = {'data': ['Produto'] * 200}
+        monkeypatch.setattr(cache_codec.settings, 'CACHE_COMPRESS_MIN_BYTES', 10)
+        compressed, _ = cache_codec.decode_payload(cache_codec.encode(value, 99.0))
+        monkeypatch.setattr(cache_codec.settings, 'CACHE_COMPRESS_MIN_BYTES', 10 ** 9)
+        plain, _ = cache_codec.decode_payload(cache_codec.encode(value))
+        
+        assert compressed.encoding is not None and plain.encoding is None
+        assert compressed.etag() == plain.etag()
+        assert compressed.etag() != cache_codec.decode_payload(cache_codec.encode({'data': []}))[0].etag()
+        assert compressed.modified_at == pytest.approx(time.time(), abs=5)
+    
+    def test_legacy_entry(self):
+        """Testa que JSON sem cabeçalho é lido como corpo sem compressão."""
+        payload, fresh_until = cache_codec.decode_payload('{"id": 7}')
+        
+        assert payload == Payload(b'{"id": 7}', None)
+        assert fresh_until is None
+
+
+class TestPayloadResponse:
+    """Testes do envio do corpo cacheado."""
+    
+    @pytest.fixture
+    def app(self):
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        
+        app.computed = 0
+        
+        def compute(size):
+            app.computed += 1
+            return {'data': ['Produto'] * size}
+        
+        @app.route('/payload/<int:size>')
+        def payload(size):
+            entry = cache.fetch(f'bench:{size}', lambda: compute(size), payload=True)
+            return payload_response(entry.value, cache_control='public, max-age=60')
+        
+        return app
+    
+    def test_compressed_body_sent_as_is(self, app, no_redis, monkeypatch):
+        """Testa Content-Encoding quando o cliente aceita a compressão do corpo."""
+        monkeypatch.setattr(cache_codec.settings, 'CACHE_COMPRESS_MIN_BYTES', 100)
+        client = app.test_client()
+        encoding = 'zstd' if cache_codec.zstandard is not None else 'deflate'
+        
+        response = client.get('/payload/500', headers={'Accept-Encoding': f'gzip, {encoding}'})
+        
+        assert response.headers['Content-Encoding'] == encoding
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert Payload(response.data, encoding).value() == {'data': ['Produto'] * 500}
+    
+    def test_decompressed_without_accept_encoding(self, app, no_redis, monkeypatch):
+        """Testa o JSON descomprimido para clientes sem suporte à compressão."""
+        monkeypatch.setattr(cache_codec.settings, 'CACHE_COMPRESS_MIN_BYTES', 100)
+        client = app.test_client()
+        
+        first = client.get('/payload/500', headers={'Accept-Encoding': 'gzip'})
+        second = client.get('/payload/5')
+        
+        assert 'Content-Encoding' not in first.headers
+        assert first.get_json() == {'data': ['Produto'] * 500}
+        assert second.mimetype == 'application/json'
+        assert second.get_json() == {'data': ['Produto'] * 5}
+    
+    def test_not_modified_with_etag(self, app, no_redis):
+        """Testa o 304 sem corpo para o conteúdo que o cliente já tem."""
+        client = app.test_client()
+        
+        first = client.get('/payload/5')
+        second = client.get('/payload/5', headers={'If-None-Match': first.headers['ETag']})
+        third = client.get('/payload/5', headers={'If-Modified-Since': first.headers['Last-Modified']})
+        
+        assert first.headers['Cache-Control'] == 'public, max-age=60'
+        assert first.headers['Last-Modified']
+        assert second.status_code == 304
+        assert second.data == b''
+        assert second.headers['ETag'] == first.headers['ETag']
+        assert third.status_code == 304
+        assert app.computed == 1
+    
+    def test_etag_per_content_encoding(self, app, no_redis, monkeypatch):
+        """Testa ETags diferentes para o corpo comprimido e o descomprimido."""
+        monkeypatch.setattr(cache_codec.settings, 'CACHE_COMPRESS_MIN_BYTES', 100)
+        client = app.test_client()
+        encoding = 'zstd' if cache_codec.zstandard is not None else 'deflate'
+        
+        plain = client.get('/payload/500')
+        compressed = client.get('/payload/500', headers={'Accept-Encoding': encoding})
+        revalidated = client.get(
+            '/payload/500',
+            headers={'Accept-Encoding': encoding, 'If-None-Match': plain.headers['ETag']}
+        )
+        
+        assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + f'-{encoding}"'
+        assert revalidated.status_code == 200
+        assert revalidated.headers['Content-Encoding'] == encoding
@@ -0,0 +1,124 @@
+"""
+Testes Unitários - Aquecimento do Cache
+
+Testes das chaves quentes declaradas pelos endpoints, do recálculo das
+entradas com limite de concorrência e da reserva do ciclo entre workers.
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.api import products as products_api
+from src.api import stores as stores_api
+from src.services import cache_warmup
+from src.services.cache import Tagged, cache
+from src.services.cache_warmup import CacheWarmer, WarmupEntry, cache_warmer
+from src.services.location import quantize_location
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    """Fixture com o cache sem Redis (apenas L1)."""
+    monkeypatch.setattr(cache, '_client', None)
+
+
+class TestCacheWarmer:
+    """Testes do aquecimento das entradas declaradas."""
+    
+    def test_warm_refreshes_declared_entries(self, no_redis):
+        """Testa o recálculo das entradas, inclusive as ainda válidas."""
+        warmer = CacheWarmer()
+        calls = []
+        
+        @warmer.hot_keys('test')
+        def hot_keys():
+            return [
+                WarmupEntry('warm:a', lambda: calls.append('a') or Tagged({'id': 'a'}, ['tag:a']), 60),
+                WarmupEntry('warm:b', lambda: calls.append('b') or {'id': 'b'}, 60),
+                WarmupEntry('warm:a', lambda: calls.append('dup') or {'id': 'dup'}, 60),
+                WarmupEntry('warm:none', lambda: None, 60),
+            ]
+        
+        cache.set('warm:b', {'id': 'old'}, ttl=60)
+        
+        assert warmer.warm() == {'refreshed': 2, 'skipped': 1, 'failed': 0}
+        assert sorted(calls) == ['a', 'b']
+        assert cache.get('warm:a') == {'id': 'a'}
+        assert cache.get('warm:b') == {'id': 'b'}
+        assert cache.local.tag_members('tag:a') == ['warm:a']
+    
+    def test_concurrency_cap(self, no_redis, monkeypatch):
+        """Testa que no máximo CACHE_WARMUP_CONCURRENCY entradas são recalculadas ao mesmo tempo."""
+        monkeypatch.setattr(cache_warmup.settings, 'CACHE_WARMUP_CONCURRENCY', 2)
+        warmer = CacheWarmer()
+        lock = threading.Lock()
+        active = {'now': 0, 'max': 0}
+        
+        def compute():
+            with lock:
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+            time.sleep(0.02)
+            with lock:
+                active['now'] -= 1
+            return {'ok': True}
+        
+        warmer.hot_keys('test')(lambda: [WarmupEntry(f'warm:{i}', compute, 60) for i in range(8)])
+        
+        assert warmer.warm()['refreshed'] == 8
+        assert active['max'] == 2
+    
+    def test_errors_are_isolated(self, no_redis):
+        """Testa que geradores e cálculos com erro não interrompem o ciclo."""
+        warmer = CacheWarmer()
+        
+        def failing():
+            raise RuntimeError('banco indisponível')
+        
+        warmer.hot_keys('broken')(lambda: 1 / 0)
+        warmer.hot_keys('test')(lambda: [WarmupEntry('warm:fail', failing, 60), WarmupEntry('warm:ok', lambda: 1, 60)])
+        
+        assert warmer.warm() == {'refreshed': 1, 'skipped': 0, 'failed': 1}
+        assert cache.get('warm:ok') == 1
+    
+    def test_one_worker_per_cycle(self, monkeypatch):
+        """Testa que apenas o worker que reserva o ciclo aquece o cache."""
+        class CycleRedis:
+            def __init__(self):
+                self.keys = {}
+            
+            def set(self, key, value, nx=False, px=None):
+                if nx and key in self.keys:
+                    return None
+                self.keys[key] = (value, px)
+                return True
+        
+        client = CycleRedis()
+        monkeypatch.setattr(cache, '_client', client)
+        monkeypatch.setattr(cache_warmup.settings, 'CACHE_WARMUP_INTERVAL', 300)
+        warmer = CacheWarmer()
+        
+        assert warmer._claim_cycle() is True
+        assert warmer._claim_cycle() is False
+        assert warmer.warm() == {}
+        assert client.keys[cache_warmup.CYCLE_KEY][1] == 270000
+
+
+class TestHotKeys:
+    """Testes das chaves quentes declaradas pelos endpoints."""
+    
+    def test_endpoint_keys(self, monkeypatch):
+        """Testa que as chaves aquecidas são as mesmas lidas pelos endpoints."""
+        monkeypatch.setattr(products_api.settings, 'CACHE_WARMUP_POPULAR_LIMITS', [10, 50])
+        monkeypatch.setattr(stores_api.settings, 'CACHE_WARMUP_STORE_PAGES', 2)
+        monkeypatch.setattr(stores_api.settings, 'CACHE_WARMUP_LOCATIONS', '-15.7939,-47.8828; -15.8229,-48.0844')
+        
+        keys = [entry.key for entry in cache_warmer.entries()]
+        cell = quantize_location({'lat': -15.7939, 'lon': -47.8828})['cell']
+        
+        assert {'products_categories', 'products_popular:10', 'products_popular:50'} <= set(keys)
+        assert {'stores_list:1:20', 'stores_list:2:20'} <= set(keys)
+        assert f'stores_nearby:{cell}:5.0:10' in keys
+        assert len([key for key in keys if key.startswith('stores_nearby:')]) == 2
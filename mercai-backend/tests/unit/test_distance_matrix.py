@@ -0,0 +1,177 @@
+"""
+Testes Unitários - Matriz de Distâncias
+
+Testes do LRU por célula, da invalidação por alterações em lojas e do uso da
+matriz no score de proximidade do ranking.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from src.config.database import Base, engine, SessionLocal
+from src.models.store import Store
+from src.services import distance_matrix as distance_matrix_module
+from src.services.cache import cache
+from src.services.distance_matrix import DistanceMatrix
+from src.services.location import quantize_location
+from src.services.scoring import build_offer_columns, haversine_distances, score_offer_columns
+from src.services.store_index import SharedStoreIndex
+
+
+class VersionRedis:
+    """Cliente mínimo com o contador de versão do índice de lojas."""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+
+@pytest.fixture
+def db():
+    """Fixture que cria as tabelas e fornece uma sessão de teste."""
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    
+    yield session
+    
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def matrix(monkeypatch):
+    """Fixture com matriz e índice de lojas novos."""
+    index = SharedStoreIndex()
+    monkeypatch.setattr('src.services.store_index.store_index', index)
+    monkeypatch.setattr(distance_matrix_module, 'store_index', index)
+    return DistanceMatrix(max_cells=2)
+
+
+@pytest.fixture
+def stores(db):
+    """Fixture com 4 lojas próximas e uma a mais de 50 km."""
+    rows = [
+        Store(
+            name=f'Loja {i}',
+            latitude=Decimal('-15.79') - Decimal(i) / 100,
+            longitude=Decimal('-47.88') - Decimal(i) / 100
+        )
+        for i in range(4)
+    ]
+    rows.append(Store(name='Longe', latitude=Decimal('-23.55'), longitude=Decimal('-46.63')))
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
+class TestDistanceMatrix:
+    """Testes do LRU por célula."""
+    
+    def test_distances_match_scoring_kernel(self, stores, matrix):
+        """Testa que as distâncias da matriz são as do kernel de scoring."""
+        location = quantize_location({'lat': -15.80, 'lon': -47.89})
+        store_ids = [store.id for store in stores]
+        
+        distances = matrix.store_distances(location, store_ids)
+        expected = haversine_distances(
+            location['lat'],
+            location['lon'],
+            np.array([float(store.latitude) for store in stores]),
+            np.array([float(store.longitude) for store in stores])
+        )
+        
+        assert distances[:4].tolist() == expected[:4].tolist()
+        assert np.isnan(distances[4])
+    
+    def test_lru_hits_and_eviction(self, stores, matrix):
+        """Testa o reuso da linha por célula e o descarte da menos usada."""
+        first = quantize_location({'lat': -15.80, 'lon': -47.89})
+        second = quantize_location({'lat': -15.90, 'lon': -47.99})
+        third = quantize_location({'lat': -16.00, 'lon': -48.09})
+        
+        row = matrix.row(first)
+        assert matrix.row(first) is row
+        matrix.row(second)
+        matrix.row(third)
+        
+        snapshot = matrix.snapshot()
+        assert snapshot['cells'] == 2
+        assert snapshot['hits'] == 1
+        assert snapshot['misses'] == 3
+        assert matrix.row(first) is not row
+    
+    def test_store_changes_invalidate_rows(self, db, stores, matrix):
+        """Testa que o commit de uma loja recalcula a linha da célula."""
+        location = quantize_location({'lat': -15.80, 'lon': -47.89})
+        row = matrix.row(location)
+        
+        db.add(Store(name='Nova', latitude=Decimal('-15.80'), longitude=Decimal('-47.89')))
+        db.commit()
+        
+        new_row = matrix.row(location)
+        assert new_row is not row
+        assert len(new_row.stores) == len(row.stores) + 1
+    
+    def test_store_changes_in_other_worker_invalidate_rows(self, db, stores, matrix, monkeypatch):
+        """Testa que linhas de outro worker são recalculadas após o commit de uma loja."""
+        monkeypatch.setattr(cache, '_client', VersionRedis())
+        other_index = SharedStoreIndex()
+        monkeypatch.setattr(distance_matrix_module, 'store_index', other_index)
+        other_matrix = DistanceMatrix(max_cells=2)
+        location = quantize_location({'lat': -15.80, 'lon': -47.89})
+        row = other_matrix.row(location)
+        
+        # O after_commit invalida apenas o índice deste processo
+        db.add(Store(name='Nova', latitude=Decimal('-15.80'), longitude=Decimal('-47.89')))
+        db.commit()
+        
+        assert len(other_matrix.row(location).stores) == len(row.stores) + 1
+    
+    def test_nearby_filters_radius_and_limit(self, stores, matrix):
+        """Testa o recorte da linha pelo raio e limite pedidos."""
+        location = quantize_location({'lat': -15.80, 'lon': -47.89})
+        
+        nearby = matrix.nearby(location, 3, limit=2)
+        far = matrix.nearby(location, 2000)
+        
+        assert len(nearby) == 2
+        assert [distance for _, distance in nearby] == sorted(d for _, d in nearby)
+        assert all(distance <= 3 for _, distance in nearby)
+        assert {store['name'] for store, _ in far} >= {'Longe'}
+        assert matrix.snapshot()['misses'] == 1
+
+
+class TestScoringWithMatrix:
+    """Testes do score de proximidade a partir da matriz."""
+    
+    def test_scores_match_haversine_path(self, db, stores, matrix):
+        """Testa que a coluna de distâncias da matriz produz os mesmos scores."""
+        from src.models.offer import Offer
+        from src.models.product import Product
+        
+        product = Product(name='Arroz', category='Alimentos')
+        db.add(product)
+        db.flush()
+        for i, store in enumerate(stores):
+            db.add(Offer(product_id=product.id, store_id=store.id, price=Decimal('10') + i))
+        db.commit()
+        
+        offers = db.query(Offer).all()
+        location = quantize_location({'lat': -15.80, 'lon': -47.89})
+        
+        columns = build_offer_columns(offers)
+        expected = score_offer_columns(columns, location)
+        columns['store_distance'] = matrix.store_distances(
+            location,
+            [offer.store_id for offer in offers]
+        )
+        
+        assert score_offer_columns(columns, location).tolist() == expected.tolist()
@@ -0,0 +1,207 @@
+"""
+Testes Unitários - Geocoding
+
+Testes do geocode_cache persistente, do token bucket, da fila em background e
+do geocoding em lote, usando um servidor local compatível com o Nominatim.
+"""
+
+import json
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.config.database import Base, engine, SessionLocal
+from src.models.geocode_cache import GeocodeCache
+from src.models.store import Store
+from src.services import geocoding
+from src.services.geo import geocode_address
+from src.services.geocoding import (
+    Geocoder,
+    GeocodingQueue,
+    NominatimProvider,
+    TokenBucket,
+    geocode_missing_stores,
+    normalize_address,
+)
+
+# Endereços conhecidos pelo servidor local
+KNOWN_ADDRESSES = {
+    'av central 123 brasilia': [{'lat': '-15.7942', 'lon': '-47.8822'}],
+    'rua das flores 10 brasilia': [{'lat': '-15.8000', 'lon': '-47.8900'}],
+}
+
+
+class FakeNominatimHandler(BaseHTTPRequestHandler):
+    """Servidor local que responde como o /search do Nominatim."""
+    
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)['q'][0]
+        self.server.requests.append(query)
+        
+        if 'erro' in query.lower():
+            self.send_response(500)
+            self.end_headers()
+            return
+        
+        body = json.dumps(KNOWN_ADDRESSES.get(normalize_address(query), [])).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def nominatim():
+    """Fixture com o servidor local; `requests` lista as consultas recebidas."""
+    server = HTTPServer(('127.0.0.1', 0), FakeNominatimHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    yield server
+    
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db():
+    """Fixture que cria as tabelas e fornece uma sessão de teste."""
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    
+    yield session
+    
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def geocoder(nominatim, monkeypatch):
+    """Fixture com um geocoder apontando para o servidor local (sem limite efetivo)."""
+    url = f"http://127.0.0.1:{nominatim.server_port}"
+    instance = Geocoder(NominatimProvider(base_url=url), TokenBucket(rate=1000, capacity=1000))
+    monkeypatch.setattr(geocoding, 'default_geocoder', instance)
+    monkeypatch.setattr('src.services.geo.default_geocoder', instance)
+    return instance
+
+
+class FakeClock:
+    """Relógio manual para o token bucket."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket:
+    """Testes do limite local de requisições."""
+    
+    def test_one_request_per_second(self):
+        """Testa o consumo e a recarga dos tokens."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, clock=clock, sleep=clock.sleep)
+        
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == pytest.approx(1.0)
+        
+        clock.now = 0.5
+        assert bucket.try_acquire() == pytest.approx(0.5)
+        
+        assert bucket.acquire() is True
+        assert clock.now == pytest.approx(1.0)
+        assert bucket.acquire(timeout=0.5) is False
+
+
+class TestGeocoder:
+    """Testes do geocoding com cache persistente."""
+    
+    def test_normalize_address(self):
+        """Testa que variações de escrita compartilham a chave."""
+        assert normalize_address('Av. Central, 123 - Brasília') == 'av central 123 brasilia'
+        assert normalize_address('  av  central 123 brasilia ') == 'av central 123 brasilia'
+        assert normalize_address(None) == ''
+    
+    def test_results_are_persisted(self, db, nominatim, geocoder):
+        """Testa que o provedor é consultado uma vez por endereço normalizado."""
+        first = geocode_address('Av. Central, 123 - Brasília')
+        second = geocode_address('av central 123 brasilia')
+        
+        assert first == second == {'lat': -15.7942, 'lon': -47.8822}
+        assert len(nominatim.requests) == 1
+        
+        entry = db.get(GeocodeCache, 'av central 123 brasilia')
+        assert entry.found and entry.provider == 'nominatim'
+    
+    def test_not_found_is_cached_and_errors_are_not(self, db, nominatim, geocoder):
+        """Testa o resultado negativo persistido e a falha de rede não persistida."""
+        assert geocode_address('Endereço inexistente') is None
+        assert geocode_address('Endereço inexistente') is None
+        assert geocode_address('Erro no servidor') is None
+        assert geocode_address('Erro no servidor') is None
+        
+        assert len(nominatim.requests) == 3
+        assert db.get(GeocodeCache, 'endereco inexistente').found is False
+        assert db.get(GeocodeCache, 'erro no servidor') is None
+    
+    def test_rate_limit_defers_lookup(self, db, nominatim, geocoder):
+        """Testa que, sem token no prazo, o provedor não é consultado."""
+        geocoder.bucket = TokenBucket(rate=0.01)
+        geocoder.bucket.try_acquire()
+        
+        assert geocode_address('Av. Central, 123 - Brasília', timeout=0) is None
+        assert nominatim.requests == []
+
+
+class TestStoreGeocoding:
+    """Testes da fila em background e do geocoding em lote."""
+    
+    def test_new_store_is_geocoded_in_background(self, db, geocoder, monkeypatch):
+        """Testa que lojas salvas sem coordenadas entram na fila após o commit."""
+        queue = GeocodingQueue()
+        monkeypatch.setattr(geocoding, 'geocoding_queue', queue)
+        
+        store = Store(name='Central', address='Av. Central, 123 - Brasília')
+        db.add(store)
+        db.flush()
+        db.rollback()
+        assert queue._pending == set()
+        
+        store = Store(name='Central', address='Av. Central, 123 - Brasília')
+        db.add(store)
+        db.commit()
+        queue.join()
+        
+        db.refresh(store)
+        assert float(store.latitude) == pytest.approx(-15.7942)
+        assert float(store.longitude) == pytest.approx(-47.8822)
+    
+    def test_geocode_missing_stores(self, db, nominatim, geocoder, monkeypatch):
+        """Testa o comando em lote apenas para lojas sem coordenadas."""
+        monkeypatch.setattr(geocoding.settings, 'GEOCODING_QUEUE_ENABLED', False)
+        db.add_all([
+            Store(name='A', address='Rua das Flores, 10 - Brasília'),
+            Store(name='B', address='Endereço inexistente'),
+            Store(name='C', address='Av. Central 123 Brasília',
+                  latitude=Decimal('-15.1'), longitude=Decimal('-47.1')),
+            Store(name='D'),
+        ])
+        db.commit()
+        
+        stats = geocode_missing_stores(db)
+        
+        assert stats == {'total': 2, 'geocoded': 1, 'not_found': 1}
+        assert len(nominatim.requests) == 2
+        store = db.query(Store).filter_by(name='A').one()
+        assert float(store.latitude) == pytest.approx(-15.8)
@@ -0,0 +1,87 @@
+"""
+Testes Unitários - Quantização de Localização
+
+Testes para geohash, centróide das células e contadores de cache.
+"""
+
+import pytest
+
+from src.services.geo import calculate_distance
+from src.services.location import (
+    LocationCacheStats,
+    geohash_bounds,
+    geohash_decode,
+    geohash_encode,
+    quantize_location,
+)
+
+
+class TestGeohash:
+    """Testes para codificação e decodificação de geohash."""
+    
+    def test_encode_known_value(self):
+        """Testa o geohash de uma coordenada de referência."""
+        assert geohash_encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+        assert geohash_encode(-15.7939, -47.8828, 5) == '6vjyn'
+    
+    def test_decode_returns_centroid_inside_cell(self):
+        """Testa que o centróide pertence à própria célula."""
+        cell = geohash_encode(-15.7939, -47.8828, 7)
+        lat, lon = geohash_decode(cell)
+        lat_min, lat_max, lon_min, lon_max = geohash_bounds(cell)
+        
+        assert lat_min <= -15.7939 <= lat_max
+        assert lon_min <= -47.8828 <= lon_max
+        assert lat == pytest.approx((lat_min + lat_max) / 2)
+        assert geohash_encode(lat, lon, 7) == cell
+    
+    def test_invalid_input(self):
+        """Testa precisão, coordenadas e caracteres inválidos."""
+        with pytest.raises(ValueError):
+            geohash_encode(0, 0, 0)
+        with pytest.raises(ValueError):
+            geohash_encode(91, 0, 7)
+        with pytest.raises(ValueError):
+            geohash_decode('abc')
+
+
+class TestQuantizeLocation:
+    """Testes para quantize_location."""
+    
+    def test_gps_jitter_maps_to_same_cell(self):
+        """Testa que pequenas variações de GPS caem na mesma célula."""
+        first = quantize_location({'lat': -15.793900, 'lon': -47.882800}, precision=7)
+        second = quantize_location({'lat': -15.793950, 'lon': -47.882760}, precision=7)
+        
+        assert first == second
+        assert calculate_distance(-15.7939, -47.8828, first['lat'], first['lon']) < 0.15
+    
+    def test_missing_or_invalid_location(self):
+        """Testa que localização ausente ou inválida retorna None."""
+        assert quantize_location(None) is None
+        assert quantize_location({'lat': 'abc', 'lon': 1}) is None
+        assert quantize_location({'lat': 100, 'lon': 1}) is None
+
+
+class TestLocationCacheStats:
+    """Testes para os contadores de hit/miss."""
+    
+    def test_records_hits_misses_and_displacement(self):
+        """Testa a taxa de acerto e o deslocamento até o centróide."""
+        stats = LocationCacheStats()
+        user_location = {'lat': -15.7939, 'lon': -47.8828}
+        location = quantize_location(user_location, precision=6)
+        
+        stats.record('ranking', False, user_location, location)
+        stats.record('ranking', True, user_location, location)
+        stats.record('ranking', True)
+        
+        snapshot = stats.snapshot()['namespaces']['ranking']
+        assert snapshot['hits'] == 2
+        assert snapshot['misses'] == 1
+        assert snapshot['hit_rate'] == pytest.approx(0.6667)
+        assert 0 < snapshot['max_displacement_km'] < 1
+        assert snapshot['avg_displacement_km'] == pytest.approx(snapshot['max_displacement_km'], abs=1e-4)
+        
+        stats.reset()
+        assert stats.snapshot()['namespaces'] == {}
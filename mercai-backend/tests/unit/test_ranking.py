@@ -0,0 +1,981 @@
+"""
+Testes Unitários - Ranking
+
+Testes para o carregamento em lote e a geração de ranking de ofertas.
+"""
+
+import json
+import time
+import pytest
+import uuid
+from decimal import Decimal
+from contextlib import contextmanager
+
+from flask import Flask
+from sqlalchemy import event
+
+from src.config.database import Base, engine, SessionLocal
+from src.models.user import User
+from src.models.store import Store
+from src.models.product import Product
+from src.models.offer import Offer
+from src.models.shopping_list import ShoppingList
+from src.models.list_item import ListItem
+from src.api import ranking as ranking_api
+from src.api.ranking import ranking_bp
+from src.services import ranking as ranking_service
+from src.services import timing
+from src.services.cache import cache
+from src.services.cache_tags import (
+    OFFERS_TAG,
+    PRODUCTS_TAG,
+    STORES_TAG,
+    invalidate_offers,
+    product_tag,
+    store_offers_tag,
+    store_tag,
+)
+from src.services.location import quantize_location
+from src.services.ranking import (
+    generate_ranking,
+    generate_rankings_batch,
+    calculate_offer_score,
+    invalidate_list_rankings,
+    ranking_item_added,
+    ranking_item_removed,
+    ranking_item_updated,
+)
+from src.utils import jwt as jwt_utils
+from src.utils.jwt import generate_token
+from src.services.ranking_loader import (
+    load_offers_for_products,
+    load_top_offers_for_products,
+)
+
+
+@contextmanager
+def count_queries():
+    """Conta as queries executadas no engine dentro do bloco."""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+class InMemoryPipeline:
+    """Pipeline que enfileira os comandos e os aplica no execute."""
+    
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+    
+    def __getattr__(self, name):
+        def queue(*args):
+            self.commands.append((getattr(self.client, name), args))
+            return self
+        return queue
+    
+    def execute(self):
+        results = [command(*args) for command, args in self.commands]
+        self.commands = []
+        return results
+
+
+class InMemoryRedis:
+    """Cliente mínimo com a interface do Redis usada pelo CacheService."""
+    
+    def __init__(self):
+        self.data = {}
+        self.sets = {}
+        self.hashes = {}
+    
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+    
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        return True
+    
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+    
+    def exists(self, key):
+        return int(key in self.data)
+    
+    def publish(self, channel, message):
+        return 0
+    
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+        return len(members)
+    
+    def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+        return len(members)
+    
+    def smembers(self, key):
+        return set(self.sets.get(key, ()))
+    
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+    
+    def eval(self, script, numkeys, key, token):
+        # Script de liberação do lock: remove apenas se o token confere
+        if self.data.get(key) == token:
+            return self.delete(key)
+        return 0
+    
+    def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+    
+    hincrbyfloat = hincrby
+    
+    def hgetall(self, key):
+        return {field: str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+    
+    def expire(self, key, ttl):
+        return True
+
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    """Fixture que habilita o cache com um cliente em memória."""
+    client = InMemoryRedis()
+    monkeypatch.setattr(cache, '_client', client)
+    return client
+
+
+@pytest.fixture
+def db():
+    """Fixture que cria as tabelas e fornece uma sessão de teste."""
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    
+    yield session
+    
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def catalog(db):
+    """Fixture com 4 lojas, 15 produtos e ofertas em todas as lojas."""
+    stores = [
+        Store(
+            name=f'Loja {i}',
+            latitude=Decimal('-15.79') - Decimal(i) / 100,
+            longitude=Decimal('-47.88') - Decimal(i) / 100
+        )
+        for i in range(4)
+    ]
+    db.add_all(stores)
+    
+    products = [Product(name=f'Produto {i}', category='Alimentos') for i in range(15)]
+    db.add_all(products)
+    db.flush()
+    
+    for p_index, product in enumerate(products):
+        for s_index, store in enumerate(stores):
+            price = Decimal('5.00') + Decimal(p_index) + Decimal(s_index * 37 % 11) / 10
+            db.add(Offer(
+                product_id=product.id,
+                store_id=store.id,
+                price=price,
+                original_price=price + Decimal('1.50') if s_index % 2 == 0 else None,
+                in_stock=(s_index != 3 or p_index % 2 == 0)
+            ))
+    
+    user = User(email='ranking@example.com', name='Ranking')
+    user.password_hash = 'x'
+    db.add(user)
+    db.commit()
+    
+    return {"stores": stores, "products": products, "user": user}
+
+
+@pytest.fixture
+def client(db):
+    """Fixture com app Flask de teste e o blueprint de ranking."""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.register_blueprint(ranking_bp, url_prefix='/api/ranking')
+    return app.test_client()
+
+
+def _auth_headers(user):
+    """Cabeçalho de autenticação do usuário."""
+    return {'Authorization': f'Bearer {generate_token(str(user.id), user.email)}'}
+
+
+def _create_list(db, user, products, quantity=2):
+    """Cria uma lista com um item por produto."""
+    shopping_list = ShoppingList(user_id=user.id, name='Lista')
+    db.add(shopping_list)
+    db.flush()
+    
+    for product in products:
+        db.add(ListItem(list_id=shopping_list.id, product_id=product.id, quantity=quantity))
+    
+    db.commit()
+    return str(shopping_list.id)
+
+
+class TestRankingLoader:
+    """Testes para o carregamento em lote de ofertas."""
+    
+    def test_load_offers_groups_by_product(self, db, catalog):
+        """Testa que todas as ofertas em estoque são agrupadas por produto."""
+        product_ids = [p.id for p in catalog['products'][:3]]
+        
+        offers = load_offers_for_products(db, product_ids)
+        
+        assert set(offers.keys()) == set(product_ids)
+        assert len(offers[product_ids[0]]) == 4
+        assert len(offers[product_ids[1]]) == 3
+        assert all(offer.in_stock for group in offers.values() for offer in group)
+    
+    def test_load_top_offers_uses_price_order(self, db, catalog):
+        """Testa a variante com window function (top-N por preço)."""
+        product_ids = [p.id for p in catalog['products'][:5]]
+        
+        top_offers = load_top_offers_for_products(db, product_ids, limit=2)
+        all_offers = load_offers_for_products(db, product_ids)
+        
+        for product_id in product_ids:
+            expected = sorted(all_offers[product_id], key=lambda o: (o.price, o.id))[:2]
+            assert [o.id for o in top_offers[product_id]] == [o.id for o in expected]
+    
+    def test_stores_are_loaded_eagerly(self, db, catalog):
+        """Testa que acessar offer.store não dispara novas queries."""
+        offers = load_offers_for_products(db, [p.id for p in catalog['products']])
+        
+        with count_queries() as statements:
+            names = [offer.store.name for group in offers.values() for offer in group]
+        
+        assert names
+        assert statements == []
+
+
+class TestGenerateRanking:
+    """Testes para generate_ranking."""
+    
+    def test_query_count_does_not_grow_with_list_size(self, db, catalog):
+        """Testa que o número de queries é fixo para listas pequenas e grandes."""
+        small_list = _create_list(db, catalog['user'], catalog['products'][:2])
+        large_list = _create_list(db, catalog['user'], catalog['products'])
+        
+        with count_queries() as small_statements:
+            small_ranking = generate_ranking(small_list)
+        
+        with count_queries() as large_statements:
+            large_ranking = generate_ranking(large_list)
+        
+        assert len(small_ranking['items']) == 2
+        assert len(large_ranking['items']) == 15
+        assert len(large_statements) == len(small_statements)
+        assert len(large_statements) <= 5
+    
+    def test_ranking_output_matches_scalar_scores(self, db, catalog):
+        """Testa que o ranking segue os scores de calculate_offer_score (pelo centróide)."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:5])
+        location = {'lat': -15.80, 'lon': -47.89}
+        
+        ranking = generate_ranking(list_id, location)
+        
+        # A proximidade é calculada a partir do centróide da célula geohash
+        centroid = quantize_location(location)
+        
+        for item in ranking['items']:
+            offers = db.query(Offer).filter(
+                Offer.product_id == item['product']['id'],
+                Offer.in_stock == True
+            ).all()
+            max_price = max(float(o.price) for o in offers)
+            expected = sorted(
+                (
+                    calculate_offer_score(o.to_dict(include_store=True), centroid, max_price)
+                    for o in offers
+                ),
+                reverse=True
+            )
+            
+            assert [o['score'] for o in item['all_offers']] == expected[:5]
+            assert item['best_offer']['score'] == expected[0]
+            assert 'store' in item['best_offer']
+        
+        assert ranking['best_combination']['estimated_total'] > 0
+        assert ranking['optimized_combination']['optimal'] is True
+        assert len(ranking['optimized_combination']['assignment']) == 5
+    
+    def test_nearby_store_outside_top_n_matches_full_scan(self, db, catalog):
+        """Testa que a proximidade traz ao ranking ofertas fora do top-N por preço e desconto."""
+        location = {'lat': -15.70, 'lon': -47.70}
+        centroid = quantize_location(location)
+        far_stores = [Store(name=f'Loja Distante {i}') for i in range(20)]
+        near_store = Store(
+            name='Loja Vizinha',
+            latitude=Decimal(str(centroid['lat'])),
+            longitude=Decimal(str(centroid['lon']))
+        )
+        product = Product(name='Produto Disputado', category='Alimentos')
+        db.add_all(far_stores + [near_store, product])
+        db.flush()
+        
+        # A loja vizinha é a 13ª mais barata, mas ganha 10 pontos de proximidade
+        for index, store in enumerate(far_stores):
+            db.add(Offer(product_id=product.id, store_id=store.id, price=Decimal('5.00') + Decimal(index) / 20))
+        db.add(Offer(product_id=product.id, store_id=near_store.id, price=Decimal('5.62')))
+        db.commit()
+        
+        list_id = _create_list(db, catalog['user'], [product], quantity=1)
+        
+        item = generate_ranking(list_id, location)['items'][0]
+        
+        offers = db.query(Offer).filter(Offer.product_id == product.id).order_by(Offer.id).all()
+        max_price = max(float(o.price) for o in offers)
+        expected = sorted(
+            (
+                (calculate_offer_score(o.to_dict(include_store=True), centroid, max_price), o.store_id)
+                for o in offers
+            ),
+            key=lambda scored: scored[0],
+            reverse=True
+        )[:5]
+        
+        assert [(o['score'], o['store']['id']) for o in item['all_offers']] == expected
+        assert item['best_offer']['store']['id'] == near_store.id
+    
+    def test_optimizer_sees_stores_outside_top_offers(self, db, catalog):
+        """Testa que a cesta otimizada considera lojas fora do top-N de cada produto."""
+        stores = [Store(name=f'Loja Extra {i}') for i in range(21)]
+        products = [Product(name=f'Produto Extra {i}', category='Alimentos') for i in range(2)]
+        db.add_all(stores + products)
+        db.flush()
+        
+        # Cada produto é mais barato em 10 lojas; apenas a última vende os dois
+        # e fica fora do top-10 de ambos
+        for index, store in enumerate(stores[:20]):
+            db.add(Offer(product_id=products[index // 10].id, store_id=store.id, price=Decimal('5.00')))
+        for product in products:
+            db.add(Offer(product_id=product.id, store_id=stores[20].id, price=Decimal('6.00')))
+        db.commit()
+        
+        list_id = _create_list(db, catalog['user'], products, quantity=1)
+        
+        optimized = generate_ranking(list_id, max_stores=1)['optimized_combination']
+        
+        assert optimized['store_ids'] == [stores[20].id]
+        assert optimized['estimated_total'] == 12.0
+        assert optimized['uncovered_product_ids'] == []
+    
+    def test_ranking_unknown_list(self, db, catalog):
+        """Testa ranking de lista inexistente."""
+        ranking = generate_ranking(str(uuid.uuid4()))
+        
+        assert ranking['items'] == []
+        assert 'error' in ranking
+
+
+def _comparable(ranking):
+    """Remove do ranking os campos que variam entre execuções do otimizador."""
+    optimized = dict(ranking['optimized_combination'])
+    for field in ('nodes_explored', 'elapsed_ms'):
+        optimized.pop(field, None)
+    return {**ranking, 'optimized_combination': optimized}
+
+
+def _fresh_ranking(list_id, location=None):
+    """Gera o ranking do zero, ignorando o cache."""
+    invalidate_list_rankings(list_id)
+    return generate_ranking(list_id, location)
+
+
+class TestIncrementalRanking:
+    """Testes para a atualização incremental dos rankings cacheados."""
+    
+    def test_add_item_scores_only_new_product(self, db, catalog, redis_cache):
+        """Testa que incluir um item atualiza o ranking com uma única query de ofertas."""
+        location = {'lat': -15.80, 'lon': -47.89}
+        list_id = _create_list(db, catalog['user'], catalog['products'][:4])
+        generate_ranking(list_id, location)
+        generate_ranking(list_id)
+        
+        new_item = ListItem(
+            list_id=uuid.UUID(list_id),
+            product_id=catalog['products'][10].id,
+            quantity=3
+        )
+        db.add(new_item)
+        db.commit()
+        db.refresh(new_item)
+        
+        with count_queries() as statements:
+            updated = ranking_item_added(db, new_item)
+        
+        assert updated == 2
+        assert len([s for s in statements if 'FROM offers' in s]) == 1
+        assert not any('FROM list_items' in s for s in statements)
+        
+        cached = generate_ranking(list_id, location)
+        assert len(cached['items']) == 5
+        assert _comparable(cached) == _comparable(_fresh_ranking(list_id, location))
+    
+    def test_update_quantity_reuses_scored_offers(self, db, catalog, redis_cache):
+        """Testa que mudar a quantidade só refaz a combinação de lojas."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:6])
+        generate_ranking(list_id)
+        
+        item = db.query(ListItem).filter(ListItem.list_id == uuid.UUID(list_id)).first()
+        item_id = item.id
+        item.quantity = 7
+        db.commit()
+        
+        with count_queries() as statements:
+            updated = ranking_item_updated(list_id, item_id, 7)
+        
+        assert updated == 1
+        assert statements == []
+        
+        cached = generate_ranking(list_id)
+        assert _comparable(cached) == _comparable(_fresh_ranking(list_id))
+    
+    def test_remove_item_updates_totals(self, db, catalog, redis_cache):
+        """Testa a remoção de um item do ranking cacheado."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:3])
+        before = generate_ranking(list_id)
+        
+        item = db.query(ListItem).filter(ListItem.list_id == uuid.UUID(list_id)).first()
+        db.delete(item)
+        db.commit()
+        
+        assert ranking_item_removed(list_id, item.id) == 1
+        
+        cached = generate_ranking(list_id)
+        assert len(cached['items']) == 2
+        assert cached['best_combination']['estimated_total'] < before['best_combination']['estimated_total']
+        assert _comparable(cached) == _comparable(_fresh_ranking(list_id))
+    
+    def test_removing_last_item_drops_cached_ranking(self, db, catalog, redis_cache):
+        """Testa que a lista vazia não mantém ranking cacheado."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:1])
+        generate_ranking(list_id)
+        
+        item = db.query(ListItem).filter(ListItem.list_id == uuid.UUID(list_id)).first()
+        db.delete(item)
+        db.commit()
+        
+        assert ranking_item_removed(list_id, item.id) == 0
+        assert generate_ranking(list_id)['items'] == []
+    
+    def test_offer_change_drops_rankings_by_tag(self, db, catalog, redis_cache):
+        """Testa que invalidar as ofertas de um produto remove só os rankings que o contêm."""
+        with_product = _create_list(db, catalog['user'], catalog['products'][:2])
+        without_product = _create_list(db, catalog['user'], catalog['products'][2:4])
+        generate_ranking(with_product)
+        generate_ranking(without_product)
+        
+        invalidate_offers([catalog['products'][0].id], [])
+        
+        remaining = [key for key in redis_cache.data if key.startswith('ranking:')]
+        assert [key.split(':')[1] for key in remaining] == [without_product]
+
+
+class TestEventInvalidation:
+    """Testes da invalidação do cache disparada pelos commits da sessão."""
+    
+    def test_committed_price_change_drops_dependent_keys(self, db, catalog, redis_cache):
+        """Testa que alterar uma oferta remove o produto e os rankings que o contêm."""
+        product = catalog['products'][0]
+        with_product = _create_list(db, catalog['user'], catalog['products'][:2])
+        without_product = _create_list(db, catalog['user'], catalog['products'][2:4])
+        generate_ranking(with_product)
+        generate_ranking(without_product)
+        cache.set(f'product:{product.id}', {'id': product.id}, tags=[product_tag(product.id)])
+        
+        offer = db.query(Offer).filter(Offer.product_id == product.id).first()
+        offer.price = offer.price - Decimal('1.00')
+        db.commit()
+        
+        remaining = [key for key in redis_cache.data if key.startswith(('ranking:', 'product:'))]
+        assert [key.split(':')[1] for key in remaining] == [without_product]
+    
+    def test_rollback_keeps_cache(self, db, catalog, redis_cache):
+        """Testa que alterações desfeitas não invalidam o cache."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:2])
+        generate_ranking(list_id)
+        
+        offer = db.query(Offer).filter(Offer.product_id == catalog['products'][0].id).first()
+        offer.price = Decimal('0.01')
+        db.flush()
+        db.rollback()
+        db.commit()
+        
+        assert any(key.startswith(f'ranking:{list_id}') for key in redis_cache.data)
+    
+    def test_transaction_invalidated_in_one_batch(self, db, catalog, redis_cache, monkeypatch):
+        """Testa uma única invalidação por commit com todas as entidades alteradas."""
+        calls = []
+        invalidate_tags = cache.invalidate_tags
+        monkeypatch.setattr(cache, 'invalidate_tags', lambda tags: calls.append(tags) or invalidate_tags(tags))
+        store = catalog['stores'][1]
+        products = catalog['products'][:2]
+        
+        products[0].name = 'Produto renomeado'
+        db.flush()
+        store.name = 'Loja renomeada'
+        offer = db.query(Offer).filter(Offer.product_id == products[1].id, Offer.store_id == store.id).first()
+        offer.in_stock = False
+        db.commit()
+        
+        assert len(calls) == 1
+        assert set(calls[0]) == {
+            product_tag(products[0].id), product_tag(products[1].id), store_tag(store.id),
+            store_offers_tag(store.id), PRODUCTS_TAG, STORES_TAG, OFFERS_TAG
+        }
+    
+    def test_list_deletion_drops_rankings(self, db, catalog, redis_cache):
+        """Testa que remover a lista remove os seus rankings."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:2])
+        generate_ranking(list_id)
+        
+        db.delete(db.get(ShoppingList, uuid.UUID(list_id)))
+        db.commit()
+        
+        assert not any(key.startswith('ranking:') for key in redis_cache.data)
+
+
+class TestRankingCacheKey:
+    """Testes para a chave de cache do ranking (célula geohash + conteúdo da lista)."""
+    
+    def test_nearby_locations_share_cached_ranking(self, db, catalog, redis_cache):
+        """Testa que variações de GPS dentro da mesma célula reutilizam o ranking."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:3])
+        
+        first = generate_ranking(list_id, {'lat': -15.793900, 'lon': -47.882800})
+        ranking_keys = [key for key in redis_cache.data if key.startswith('ranking:')]
+        
+        with count_queries() as statements:
+            second = generate_ranking(list_id, {'lat': -15.793950, 'lon': -47.882760})
+        
+        assert second == first
+        assert len(statements) == 1
+        assert [key for key in redis_cache.data if key.startswith('ranking:')] == ranking_keys
+    
+    def test_list_changes_change_cache_key(self, db, catalog, redis_cache):
+        """Testa que alterar a lista no banco não reaproveita o ranking antigo."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:3])
+        generate_ranking(list_id)
+        
+        db.add(ListItem(list_id=uuid.UUID(list_id), product_id=catalog['products'][5].id, quantity=1))
+        db.commit()
+        
+        assert len(generate_ranking(list_id)['items']) == 4
+    
+    def test_expired_ranking_served_when_rebuild_fails(self, db, catalog, redis_cache, monkeypatch):
+        """Testa que, após o TTL, uma falha no banco serve o ranking antigo."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:3])
+        first = generate_ranking(list_id)
+        
+        expired = time.time() + ranking_service.RANKING_CACHE_TTL + 1
+        monkeypatch.setattr('src.services.cache.time.time', lambda: expired)
+        
+        def failing(*args, **kwargs):
+            raise RuntimeError('banco fora do ar')
+        
+        monkeypatch.setattr(ranking_service, 'load_best_offers_for_products', failing)
+        
+        assert generate_ranking(list_id) == first
+        assert cache.metrics.snapshot()['prefixes']['ranking']['stale_on_error'] >= 1
+
+
+class TestBatchRanking:
+    """Testes para o ranking em lote de várias listas."""
+    
+    def test_batch_matches_individual_rankings(self, db, catalog, monkeypatch):
+        """Testa que o lote produz os mesmos rankings das chamadas individuais."""
+        monkeypatch.setattr(ranking_service.settings, 'RANKING_BATCH_WORKERS', 1)
+        location = {'lat': -15.80, 'lon': -47.89}
+        products = catalog['products']
+        list_ids = [
+            _create_list(db, catalog['user'], products[:5]),
+            _create_list(db, catalog['user'], products[3:9], quantity=3),
+            _create_list(db, catalog['user'], products[::2]),
+        ]
+        
+        batch = generate_rankings_batch(list_ids, user_location=location)
+        
+        assert [ranking['list_id'] for ranking in batch] == list_ids
+        for list_id, ranking in zip(list_ids, batch):
+            assert _comparable(ranking) == _comparable(generate_ranking(list_id, location))
+    
+    def test_query_count_does_not_grow_with_number_of_lists(self, db, catalog, monkeypatch):
+        """Testa que o número de queries é fixo para 1 ou 6 listas."""
+        monkeypatch.setattr(ranking_service.settings, 'RANKING_BATCH_WORKERS', 1)
+        list_ids = [_create_list(db, catalog['user'], catalog['products'][i:i + 4]) for i in range(6)]
+        
+        with count_queries() as single:
+            generate_rankings_batch(list_ids[:1])
+        with count_queries() as several:
+            generate_rankings_batch(list_ids)
+        
+        assert len(several) == len(single)
+    
+    def test_process_pool_and_ad_hoc_baskets(self, db, catalog, monkeypatch):
+        """Testa o cálculo no pool de processos com listas e cestas avulsas."""
+        monkeypatch.setattr(ranking_service.settings, 'RANKING_BATCH_WORKERS', 2)
+        products = catalog['products']
+        list_id = _create_list(db, catalog['user'], products[:4])
+        basket = {
+            'name': 'Churrasco',
+            'items': [
+                {'product_id': products[1].id, 'quantity': 2},
+                {'product_id': products[6].id, 'quantity': 1},
+                {'product_id': 999999, 'quantity': 1},
+            ]
+        }
+        
+        try:
+            batch = generate_rankings_batch([list_id], [basket])
+        finally:
+            ranking_service._reset_process_pool()
+        
+        assert len(batch) == 2
+        assert _comparable(batch[0]) == _comparable(generate_ranking(list_id))
+        assert batch[1]['basket'] == 'Churrasco'
+        assert [item['product']['id'] for item in batch[1]['items']] == [products[1].id, products[6].id]
+        assert batch[1]['optimized_combination']['optimal'] is True
+
+
+class TestBatchRankingEndpoint:
+    """Testes para POST /api/ranking/batch."""
+    
+    def test_batch_endpoint_returns_rankings_with_summary(self, db, catalog, client, monkeypatch):
+        """Testa o ranking em lote pela API."""
+        monkeypatch.setattr(ranking_service.settings, 'RANKING_BATCH_WORKERS', 1)
+        list_ids = [
+            _create_list(db, catalog['user'], catalog['products'][:2]),
+            _create_list(db, catalog['user'], catalog['products'][2:5]),
+        ]
+        
+        response = client.post(
+            '/api/ranking/batch',
+            json={'list_ids': list_ids, 'latitude': -15.8, 'longitude': -47.89},
+            headers=_auth_headers(catalog['user'])
+        )
+        
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['count'] == 2
+        assert [r['summary']['items_count'] for r in data['rankings']] == [2, 3]
+    
+    def test_batch_endpoint_rejects_lists_of_other_users(self, db, catalog, client):
+        """Testa que listas de outro usuário retornam 404 com os IDs recusados."""
+        other = User(email='other@example.com', name='Outro')
+        other.password_hash = 'x'
+        db.add(other)
+        db.commit()
+        
+        own_list = _create_list(db, catalog['user'], catalog['products'][:2])
+        other_list = _create_list(db, other, catalog['products'][:2])
+        
+        response = client.post(
+            '/api/ranking/batch',
+            json={'list_ids': [own_list, other_list]},
+            headers=_auth_headers(catalog['user'])
+        )
+        
+        assert response.status_code == 404
+        assert response.get_json()['data']['list_ids'] == [other_list]
+    
+    def test_batch_endpoint_validates_size(self, db, catalog, client):
+        """Testa o limite de listas por requisição."""
+        response = client.post(
+            '/api/ranking/batch',
+            json={'list_ids': [str(uuid.uuid4()) for _ in range(21)]},
+            headers=_auth_headers(catalog['user'])
+        )
+        
+        assert response.status_code == 400
+
+
+class TestStreamingRanking:
+    """Testes para o ranking detalhado em streaming (NDJSON)."""
+    
+    def test_stream_matches_detailed_ranking(self, db, catalog, client, monkeypatch):
+        """Testa que as linhas NDJSON reproduzem o ranking detalhado."""
+        monkeypatch.setattr(ranking_service, 'STREAM_CHUNK_SIZE', 4)
+        list_id = _create_list(db, catalog['user'], catalog['products'][:10])
+        url = f'/api/ranking/{list_id}/detailed?latitude=-15.8&longitude=-47.89'
+        headers = _auth_headers(catalog['user'])
+        
+        detailed = client.get(url, headers=headers).get_json()['data']
+        response = client.get(url, headers={**headers, 'Accept': 'application/x-ndjson'})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert [line['type'] for line in lines] == ['item'] * 10 + ['summary']
+        assert [line['item'] for line in lines[:-1]] == detailed['items']
+        assert lines[-1]['summary'] == detailed['summary']
+        assert lines[-1]['best_combination'] == detailed['best_combination']
+        assert lines[-1]['optimized_combination']['store_ids'] == detailed['optimized_combination']['store_ids']
+    
+    def test_stream_scores_in_chunks_and_caches(self, db, catalog, redis_cache):
+        """Testa a pontuação em blocos e o cache do ranking gerado em streaming."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:7])
+        
+        with count_queries() as statements:
+            events = list(ranking_service.stream_ranking(list_id, chunk_size=3))
+        
+        assert [kind for kind, _ in events] == ['item'] * 7 + ['done']
+        assert len([s for s in statements if 'FROM product_best_offers' in s]) == 3
+        
+        cached = generate_ranking(list_id)
+        assert cached['items'] == [payload for kind, payload in events if kind == 'item']
+    
+    def test_stream_unknown_list_returns_error_line(self, db, catalog):
+        """Testa o evento final de erro para lista inexistente."""
+        list_id = str(uuid.uuid4())
+        
+        events = list(ranking_service.stream_ranking(list_id))
+        
+        assert events == [('done', {'list_id': list_id, 'error': 'Lista não encontrada'})]
+
+
+def _signature_queries(statements):
+    """Filtra as consultas da assinatura da lista (itens sem produtos)."""
+    return [s for s in statements if 'FROM list_items' in s and 'products' not in s]
+
+
+class TestConditionalRanking:
+    """Testes das requisições condicionais do ranking."""
+    
+    def test_unchanged_ranking_returns_304(self, db, catalog, client, redis_cache):
+        """Testa o 304 com If-None-Match e a nova ETag após mudança de preço."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:2])
+        headers = _auth_headers(catalog['user'])
+        
+        first = client.get(f'/api/ranking?list_id={list_id}', headers=headers)
+        etag = first.headers['ETag']
+        second = client.get(f'/api/ranking?list_id={list_id}', headers={**headers, 'If-None-Match': etag})
+        
+        assert first.headers['Cache-Control'] == ranking_api.RANKING_CACHE_CONTROL
+        assert second.status_code == 304
+        assert second.data == b''
+        
+        offer = db.query(Offer).filter(Offer.product_id == catalog['products'][0].id).first()
+        offer.price = Decimal('0.50')
+        db.commit()
+        third = client.get(f'/api/ranking?list_id={list_id}', headers={**headers, 'If-None-Match': etag})
+        
+        assert third.status_code == 200
+        assert third.headers['ETag'] != etag
+    
+    def test_not_modified_skips_ranking(self, db, catalog, client, redis_cache, monkeypatch):
+        """Testa que o 304 usa o hash da entrada, sem gerar nem serializar o ranking."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:2])
+        headers = _auth_headers(catalog['user'])
+        url = f'/api/ranking/{list_id}/detailed?max_stores=2'
+        
+        with count_queries() as miss_statements:
+            first = client.get(url, headers=headers)
+        second = client.get(url, headers=headers)
+        etag = first.headers['ETag']
+        
+        assert second.headers['ETag'] == etag
+        assert len(_signature_queries(miss_statements)) == 1
+        assert client.get(f'/api/ranking?list_id={list_id}', headers=headers).headers['ETag'] != etag
+        
+        def failing(*args, **kwargs):
+            raise AssertionError('ranking gerado em um 304')
+        
+        monkeypatch.setattr(ranking_api, 'generate_ranking', failing)
+        with count_queries() as statements:
+            not_modified = client.get(url, headers={**headers, 'If-None-Match': etag})
+        
+        assert not_modified.status_code == 304
+        assert len(_signature_queries(statements)) == 1
+        assert not_modified.headers['ETag'] == etag
+        assert not_modified.headers['Cache-Control'] == ranking_api.RANKING_CACHE_CONTROL
+
+
+class TestRankingTimings:
+    """Testes para a instrumentação das etapas do ranking."""
+    
+    def test_server_timing_header_and_metrics(self, db, catalog, client, monkeypatch):
+        """Testa o header Server-Timing e os histogramas do endpoint de métricas."""
+        histograms = timing.StageHistograms()
+        monkeypatch.setattr(timing, 'stage_histograms', histograms)
+        monkeypatch.setattr(ranking_api, 'stage_histograms', histograms)
+        list_id = _create_list(db, catalog['user'], catalog['products'][:3])
+        headers = _auth_headers(catalog['user'])
+        
+        response = client.get(f'/api/ranking/{list_id}/detailed', headers=headers)
+        
+        stages = [entry.split(';')[0] for entry in response.headers['Server-Timing'].split(', ')]
+        assert {'ownership', 'cache_lookup', 'load_offers', 'scoring', 'basket_optimizer', 'total'} <= set(stages)
+        assert 'offers_scored;desc="11"' in response.headers['Server-Timing']
+        assert '_timings' not in response.get_json()['data']
+        
+        assert client.get('/api/ranking/metrics', headers=headers).status_code == 403
+        assert client.get('/api/ranking/cache-stats', headers=headers).status_code == 403
+        
+        monkeypatch.setattr(jwt_utils.settings, 'ADMIN_USER_IDS', [str(catalog['user'].id)])
+        assert client.get('/api/ranking/cache-stats', headers=headers).status_code == 200
+        metrics = client.get('/api/ranking/metrics', headers=headers).get_json()['data']
+        assert metrics['requests'] == 1
+        assert metrics['stages']['scoring']['count'] == 1
+        assert metrics['counters']['offers_scored']['sum'] == 11
+    
+    def test_timings_in_body_when_debug(self, db, catalog, client, monkeypatch):
+        """Testa o campo _timings com a flag de debug."""
+        monkeypatch.setattr(ranking_api.settings, 'RANKING_TIMINGS_DEBUG', True)
+        list_id = _create_list(db, catalog['user'], catalog['products'][:2])
+        
+        response = client.get(f'/api/ranking?list_id={list_id}', headers=_auth_headers(catalog['user']))
+        
+        timings = response.get_json()['data']['_timings']
+        assert 'total' in timings['stages']
+        assert timings['counters']['offers_scored'] == 7
+    
+    def test_disabled_timings_skip_header(self, db, catalog, client, monkeypatch):
+        """Testa que, desabilitada, a instrumentação não adiciona o header."""
+        monkeypatch.setattr(timing.settings, 'RANKING_TIMINGS_ENABLED', False)
+        list_id = _create_list(db, catalog['user'], catalog['products'][:2])
+        
+        response = client.get(f'/api/ranking?list_id={list_id}', headers=_auth_headers(catalog['user']))
+        
+        assert response.status_code == 200
+        assert 'Server-Timing' not in response.headers
+
+
+class TestBasketRanking:
+    """Testes para POST /api/ranking/basket (cesta avulsa, sem lista)."""
+    
+    def test_basket_matches_list_ranking(self, db, catalog, client):
+        """Testa que a cesta avulsa reproduz o ranking de uma lista equivalente."""
+        products = catalog['products'][:4]
+        list_id = _create_list(db, catalog['user'], products, quantity=3)
+        expected = generate_ranking(list_id, {'lat': -15.8, 'lon': -47.89})
+        
+        response = client.post('/api/ranking/basket', json={
+            'items': [{'product_id': p.id, 'quantity': 3} for p in products],
+            'latitude': -15.8,
+            'longitude': -47.89
+        })
+        
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        strip = lambda items: [{k: v for k, v in item.items() if k != 'item_id'} for item in items]
+        assert strip(data['items']) == strip(expected['items'])
+        assert data['optimized_combination']['store_ids'] == expected['optimized_combination']['store_ids']
+        assert data['summary']['items_count'] == 4
+        assert data['unknown_product_ids'] == []
+        assert db.query(ShoppingList).count() == 1
+    
+    def test_same_contents_share_cache_entry(self, db, catalog, redis_cache):
+        """Testa a chave por conteúdo: ordem e itens repetidos não mudam o hash."""
+        a, b = catalog['products'][:2]
+        
+        first = ranking_service.generate_basket_ranking(
+            [{'product_id': a.id, 'quantity': 2}, {'product_id': b.id, 'quantity': 1}]
+        )
+        with count_queries() as statements:
+            second = ranking_service.generate_basket_ranking([
+                {'product_id': b.id, 'quantity': 1},
+                {'product_id': a.id, 'quantity': 1},
+                {'product_id': a.id, 'quantity': 1},
+            ])
+        
+        assert statements == []
+        assert second == first
+        assert [key for key in redis_cache.data if key.startswith('ranking:basket:')] == [
+            f"ranking:basket:{first['basket_hash']}"
+        ]
+    
+    def test_unknown_products_are_reported(self, db, catalog):
+        """Testa que produtos inexistentes são ignorados e reportados."""
+        ranking = ranking_service.generate_basket_ranking([
+            {'product_id': catalog['products'][0].id, 'quantity': 1},
+            {'product_id': 9999, 'quantity': 1},
+        ])
+        
+        assert [item['product']['id'] for item in ranking['items']] == [catalog['products'][0].id]
+        assert ranking['unknown_product_ids'] == [9999]
+    
+    def test_basket_endpoint_validation(self, db, catalog, client):
+        """Testa a validação do corpo da requisição."""
+        invalid_bodies = [
+            {'items': []},
+            {'items': [{'product_id': 'x'}]},
+            {'items': [{'product_id': 1, 'quantity': 0}]},
+            {'items': [{'product_id': 1, 'quantity': True}]},
+            {'items': [{'product_id': True}]},
+            {'items': [{'product_id': 1}], 'max_stores': 50},
+        ]
+        
+        for body in invalid_bodies:
+            assert client.post('/api/ranking/basket', json=body).status_code == 400
+
+
+class TestShoppingRoute:
+    """Testes para GET /api/ranking/:list_id/route."""
+    
+    def test_route_for_optimized_basket(self, db, catalog, client):
+        """Testa o roteiro da cesta otimizada e a comparação com uma única loja."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:6])
+        ranking = generate_ranking(list_id, {'lat': -15.8, 'lon': -47.89}, max_stores=3)
+        
+        response = client.get(
+            f'/api/ranking/{list_id}/route?latitude=-15.8&longitude=-47.89&max_stores=3&cost_per_km=0',
+            headers=_auth_headers(catalog['user'])
+        )
+        
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert sorted(stop['id'] for stop in data['stops']) == sorted(
+            ranking['optimized_combination']['store_ids']
+        )
+        assert [stop['order'] for stop in data['stops']] == list(range(1, len(data['stops']) + 1))
+        assert data['goods_total'] == ranking['optimized_combination']['estimated_total']
+        assert data['travel_cost'] == 0
+        assert len(data['baseline']['stops']) == 1
+        assert data['net_savings'] == data['goods_savings'] >= 0
+    
+    def test_travel_cost_reduces_net_savings(self, db, catalog, client):
+        """Testa que o custo por km entra na economia líquida."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:6])
+        url = f'/api/ranking/{list_id}/route?latitude=-15.8&longitude=-47.89'
+        headers = _auth_headers(catalog['user'])
+        
+        free = client.get(url + '&cost_per_km=0', headers=headers).get_json()['data']
+        paid = client.get(url + '&cost_per_km=5', headers=headers).get_json()['data']
+        
+        expected = free['net_savings'] - free['extra_km'] * 5
+        assert paid['net_savings'] == pytest.approx(expected, abs=0.05)
+        assert paid['worth_it'] == (paid['net_savings'] > 0)
+    
+    def test_route_validation(self, db, catalog, client):
+        """Testa parâmetros inválidos e listas de outros usuários."""
+        list_id = _create_list(db, catalog['user'], catalog['products'][:2])
+        headers = _auth_headers(catalog['user'])
+        
+        assert client.get(f'/api/ranking/{list_id}/route?cost_per_km=-1', headers=headers).status_code == 400
+        assert client.get(f'/api/ranking/{uuid.uuid4()}/route', headers=headers).status_code == 404
@@ -0,0 +1,124 @@
+"""
+Testes Unitários - Roteiro de Compras
+
+Testes dos algoritmos de ordenação das lojas (Held-Karp e 2-opt), da matriz
+de distâncias memoizada e do custo de deslocamento do roteiro.
+"""
+
+import random
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from src.services import route_planner
+from src.services.route_planner import (
+    held_karp,
+    plan_route,
+    solve_route,
+    store_distance_matrix,
+    two_opt,
+)
+
+
+def _random_matrix(rng, n):
+    """Distâncias euclidianas entre n pontos aleatórios."""
+    points = np.array([[rng.uniform(0, 10), rng.uniform(0, 10)] for _ in range(n)])
+    return np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+
+
+def _brute_force(dist):
+    """Menor ciclo a partir do nó 0 testando todas as permutações."""
+    n = dist.shape[0]
+    best = float('inf')
+    for order in permutations(range(1, n)):
+        tour = (0,) + order
+        best = min(best, sum(dist[tour[i], tour[(i + 1) % n]] for i in range(n)))
+    return best
+
+
+def _tour_cost(dist, order):
+    """Custo do ciclo 0 -> order -> 0."""
+    tour = [0] + list(order)
+    return sum(dist[tour[i], tour[(i + 1) % len(tour)]] for i in range(len(tour)))
+
+
+class TestSolvers:
+    """Testes dos algoritmos de roteiro."""
+    
+    @pytest.mark.parametrize('n', [2, 4, 6, 8])
+    def test_held_karp_is_optimal(self, n):
+        """Testa o Held-Karp contra a busca exaustiva."""
+        rng = random.Random(n)
+        for _ in range(5):
+            dist = _random_matrix(rng, n)
+            order, total = held_karp(dist)
+            
+            assert sorted(order) == list(range(1, n))
+            assert total == pytest.approx(_brute_force(dist))
+            assert total == pytest.approx(_tour_cost(dist, order))
+    
+    def test_two_opt_returns_valid_tour(self):
+        """Testa que o 2-opt visita todos os nós e fica próximo do ótimo."""
+        rng = random.Random(11)
+        for _ in range(5):
+            dist = _random_matrix(rng, 9)
+            order, total = two_opt(dist)
+            _, optimum = held_karp(dist)
+            
+            assert sorted(order) == list(range(1, 9))
+            assert total == pytest.approx(_tour_cost(dist, order))
+            assert optimum <= total + 1e-9
+            assert total <= optimum * 1.25
+    
+    def test_solver_selection(self, monkeypatch):
+        """Testa a troca para o 2-opt acima do limite de paradas."""
+        dist = _random_matrix(random.Random(3), 6)
+        
+        assert solve_route(dist)[2] == 'held_karp'
+        assert solve_route(dist[:2, :2])[2] == 'trivial'
+        
+        monkeypatch.setattr(route_planner.settings, 'ROUTE_EXACT_MAX_STOPS', 3)
+        assert solve_route(dist)[2] == 'two_opt'
+
+
+class TestPlanRoute:
+    """Testes do roteiro de uma combinação de lojas."""
+    
+    STORES = [
+        {'id': 1, 'name': 'A', 'latitude': -15.80, 'longitude': -47.80, 'estimated_total': 10.0},
+        {'id': 2, 'name': 'B', 'latitude': -15.80, 'longitude': -47.90, 'estimated_total': 20.0},
+        {'id': 3, 'name': 'C', 'latitude': -15.80, 'longitude': -47.85, 'estimated_total': 5.0},
+        {'id': 4, 'name': 'Sem coordenadas', 'estimated_total': 1.0},
+    ]
+    
+    def test_round_trip_from_origin(self):
+        """Testa a ordem, os trechos e o custo de deslocamento com origem."""
+        route = plan_route(self.STORES, {'lat': -15.80, 'lon': -47.75}, cost_per_km=2.0)
+        
+        assert [stop['name'] for stop in route['stops']] in (['A', 'C', 'B'], ['B', 'C', 'A'])
+        assert [store['id'] for store in route['unrouted_stores']] == [4]
+        legs = sum(stop['leg_km'] for stop in route['stops']) + route['return_km']
+        assert route['total_km'] == pytest.approx(legs, abs=0.02)
+        assert route['travel_cost'] == pytest.approx(route['total_km'] * 2.0, abs=0.02)
+        assert route['goods_total'] == 36.0
+        assert route['round_trip'] is True
+    
+    def test_open_path_without_origin(self):
+        """Testa o caminho aberto (sem volta) quando não há origem."""
+        route = plan_route(self.STORES[:3])
+        
+        assert [stop['name'] for stop in route['stops']] in (['A', 'C', 'B'], ['B', 'C', 'A'])
+        assert route['stops'][0]['leg_km'] == 0.0
+        assert route['return_km'] == 0.0
+        assert route['total_km'] == pytest.approx(sum(s['leg_km'] for s in route['stops']), abs=0.02)
+    
+    def test_distance_matrix_is_memoized(self):
+        """Testa que o mesmo conjunto de lojas reutiliza a matriz."""
+        store_distance_matrix.cache_clear()
+        
+        plan_route(self.STORES[:3])
+        plan_route(list(reversed(self.STORES[:3])), {'lat': -15.8, 'lon': -47.7})
+        
+        info = store_distance_matrix.cache_info()
+        assert (info.hits, info.misses) == (1, 1)
@@ -0,0 +1,105 @@
+"""
+Testes Unitários - Scoring Vetorizado
+
+Testes de equivalência entre o kernel NumPy e calculate_offer_score.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from src.services.ranking import calculate_offer_score
+from src.services.scoring import (
+    score_offer_columns,
+    rank_offer_columns,
+    top_k_per_group,
+)
+
+
+def _random_offer(rng):
+    """Gera uma oferta aleatória no formato de Offer.to_dict(include_store=True)."""
+    price = round(rng.choice([rng.uniform(0.5, 150), 0.0, rng.uniform(1, 10)]), 2)
+    offer = {'price': price, 'in_stock': rng.random() > 0.2, 'store': {}}
+    
+    if rng.random() < 0.5:
+        offer['original_price'] = round(price * rng.uniform(0.8, 2.5), 2)
+    if rng.random() < 0.3:
+        offer['discount_percentage'] = round(rng.choice([rng.uniform(-5, 80), 0.0]), 2)
+    if rng.random() < 0.8:
+        offer['store'] = {
+            'latitude': round(rng.uniform(-16.2, -15.4), 8),
+            'longitude': round(rng.uniform(-48.3, -47.5), 8),
+        }
+    
+    return offer
+
+
+def _columns(offers):
+    """Converte ofertas em dicionário para as colunas do kernel."""
+    def column(values):
+        return np.array([np.nan if v is None else float(v) for v in values])
+    
+    return {
+        'price': column([o['price'] for o in offers]),
+        'original_price': column([o.get('original_price') for o in offers]),
+        'discount_percentage': column([o.get('discount_percentage') for o in offers]),
+        'in_stock': np.array([o['in_stock'] for o in offers], dtype=bool),
+        'store_lat': column([o['store'].get('latitude') for o in offers]),
+        'store_lon': column([o['store'].get('longitude') for o in offers]),
+    }
+
+
+@pytest.mark.parametrize('user_location', [None, {'lat': -15.80, 'lon': -47.89}])
+def test_scores_match_scalar_function(user_location):
+    """Testa que o kernel reproduz exatamente o score escalar."""
+    rng = random.Random(42)
+    offers = [_random_offer(rng) for _ in range(3000)]
+    group_index = np.array([i // 7 for i in range(len(offers))])
+    
+    max_prices = {}
+    for offer, group in zip(offers, group_index):
+        max_prices[group] = max(max_prices.get(group, 0.0), offer['price'])
+    
+    expected = [
+        calculate_offer_score(offer, user_location, max_prices[group])
+        for offer, group in zip(offers, group_index)
+    ]
+    scores = score_offer_columns(_columns(offers), user_location, group_index=group_index)
+    
+    assert scores.tolist() == expected
+
+
+def test_scores_without_max_price_match_scalar_function():
+    """Testa a normalização padrão (sem max_price)."""
+    rng = random.Random(7)
+    offers = [_random_offer(rng) for _ in range(500)]
+    
+    expected = [calculate_offer_score(offer) for offer in offers]
+    scores = score_offer_columns(_columns(offers))
+    
+    assert scores.tolist() == expected
+
+
+def test_top_k_per_group_keeps_stable_order():
+    """Testa que o top-k segue score decrescente e preserva empates na ordem original."""
+    scores = np.array([10.0, 30.0, 30.0, 5.0, 50.0, 50.0, 1.0])
+    groups = np.array([0, 0, 0, 0, 1, 1, 1])
+    
+    top = top_k_per_group(scores, groups, 2)
+    
+    assert top[0].tolist() == [1, 2]
+    assert top[1].tolist() == [4, 5]
+
+
+def test_rank_offer_columns_returns_best_per_product():
+    """Testa a seleção do top-k por produto sobre todas as ofertas."""
+    rng = random.Random(3)
+    offers = [_random_offer(rng) for _ in range(60)]
+    groups = np.array([i % 4 for i in range(60)])
+    
+    scores, top = rank_offer_columns(_columns(offers), groups, k=3)
+    
+    for group, indices in top.items():
+        group_scores = sorted(scores[groups == group].tolist(), reverse=True)
+        assert scores[indices].tolist() == group_scores[:3]
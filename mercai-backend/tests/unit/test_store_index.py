@@ -0,0 +1,275 @@
+"""
+Testes Unitários - Índice Espacial de Lojas
+
+Testes da KD-tree contra busca exaustiva, da invalidação por alterações em
+lojas e do uso do índice em /api/stores/nearby e find_nearest_stores.
+"""
+
+import random
+from contextlib import contextmanager
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from src.config.database import Base, engine, SessionLocal
+from src.api.stores import stores_bp
+from src.models.store import Store
+from src.services.cache import cache
+from src.services.distance_matrix import DistanceMatrix
+from src.services.geo import bounding_box, calculate_distance, find_nearest_stores, haversine_km
+from src.services.location import quantize_location
+from src.services.store_index import StoreIndex, SharedStoreIndex
+from src.services import store_index as store_index_module
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    """Distância de referência (mesma fórmula de geo.calculate_distance, sem arredondar)."""
+    from math import radians, sin, cos, asin, sqrt
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * asin(sqrt(a))
+
+
+@contextmanager
+def count_queries():
+    """Conta as queries executadas no engine dentro do bloco."""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+class VersionRedis:
+    """Cliente mínimo com o contador de versão do índice."""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+
+def _random_stores(rng, n):
+    """Lojas espalhadas pelo Brasil."""
+    return [
+        {'id': i, 'latitude': rng.uniform(-33, 5), 'longitude': rng.uniform(-73, -35)}
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def db():
+    """Fixture que cria as tabelas e fornece uma sessão de teste."""
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    
+    yield session
+    
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def shared_index(monkeypatch):
+    """Fixture com um índice compartilhado novo nos módulos que o usam."""
+    index = SharedStoreIndex()
+    monkeypatch.setattr(store_index_module, 'store_index', index)
+    monkeypatch.setattr('src.services.geo.store_index', index)
+    monkeypatch.setattr('src.services.distance_matrix.store_index', index)
+    monkeypatch.setattr('src.api.stores.distance_matrix', DistanceMatrix())
+    return index
+
+
+class TestStoreIndex:
+    """Testes da KD-tree contra busca exaustiva."""
+    
+    @pytest.mark.parametrize('seed', range(3))
+    def test_matches_exhaustive_search(self, seed):
+        """Testa raio e k vizinhos contra o cálculo de todas as distâncias."""
+        rng = random.Random(seed)
+        stores = _random_stores(rng, 3000)
+        index = StoreIndex(stores)
+        
+        for _ in range(50):
+            lat, lon = rng.uniform(-33, 5), rng.uniform(-73, -35)
+            radius = rng.choice([5, 50, 300])
+            limit = rng.choice([None, 1, 10])
+            
+            expected = sorted(
+                (_haversine(lat, lon, s['latitude'], s['longitude']), s['id']) for s in stores
+            )
+            expected = [(d, i) for d, i in expected if d <= radius][:limit]
+            result = index.within_radius(lat, lon, radius, limit)
+            
+            assert [store['id'] for store, _ in result] == [i for _, i in expected]
+            for (_, distance), (expected_distance, _) in zip(result, expected):
+                assert distance == pytest.approx(expected_distance, abs=1e-6)
+    
+    def test_nearest_without_radius(self):
+        """Testa que nearest encontra lojas distantes quando não há raio."""
+        index = StoreIndex([
+            {'id': 1, 'latitude': -15.79, 'longitude': -47.88},
+            {'id': 2, 'latitude': -23.55, 'longitude': -46.63},
+            {'id': 3, 'latitude': None, 'longitude': None},
+        ])
+        
+        result = index.nearest(-22.9, -43.2, k=5)
+        
+        assert len(index) == 2
+        assert [store['id'] for store, _ in result] == [2, 1]
+        assert StoreIndex([]).nearest(0, 0, k=3) == []
+
+
+class TestSharedStoreIndex:
+    """Testes da construção e invalidação do índice compartilhado."""
+    
+    def test_index_is_rebuilt_after_store_changes(self, db, shared_index):
+        """Testa que o commit de uma loja invalida o índice."""
+        db.add(Store(name='A', latitude=Decimal('-15.79'), longitude=Decimal('-47.88')))
+        db.commit()
+        assert len(shared_index.get()) == 1
+        
+        db.add(Store(name='B', latitude=Decimal('-15.80'), longitude=Decimal('-47.89')))
+        db.add(Store(name='Sem coordenadas'))
+        db.commit()
+        
+        assert len(shared_index.get()) == 2
+    
+    def test_index_is_reused_without_changes(self, db, shared_index, monkeypatch):
+        """Testa que o índice não é reconstruído a cada consulta."""
+        db.add(Store(name='A', latitude=Decimal('-15.79'), longitude=Decimal('-47.88')))
+        db.commit()
+        
+        first = shared_index.get()
+        assert shared_index.get() is first
+        
+        monkeypatch.setattr(store_index_module.settings, 'STORE_INDEX_TTL', -1)
+        assert shared_index.get() is not first
+
+
+    def test_other_workers_rebuild_after_store_changes(self, db, shared_index, monkeypatch):
+        """Testa que a alteração de lojas em um worker desatualiza o índice dos demais."""
+        monkeypatch.setattr(cache, '_client', VersionRedis())
+        other_worker = SharedStoreIndex()
+        db.add(Store(name='A', latitude=Decimal('-15.79'), longitude=Decimal('-47.88')))
+        db.commit()
+        
+        first = other_worker.get()
+        version = other_worker.current_version()
+        assert other_worker.get() is first
+        
+        # Commit neste processo: só o índice local recebe o after_commit
+        db.add(Store(name='B', latitude=Decimal('-15.80'), longitude=Decimal('-47.89')))
+        db.commit()
+        
+        assert len(other_worker.get()) == 2
+        assert other_worker.current_version() == version + 1
+
+
+class TestNearbyStores:
+    """Testes de /api/stores/nearby e find_nearest_stores com o índice."""
+    
+    def test_nearby_endpoint_uses_index(self, db, shared_index):
+        """Testa o raio, a ordenação e o limite do endpoint."""
+        for i in range(5):
+            db.add(Store(
+                name=f'Loja {i}',
+                latitude=Decimal('-15.79') - Decimal(i) / 100,
+                longitude=Decimal('-47.88')
+            ))
+        db.add(Store(name='Longe', latitude=Decimal('-23.55'), longitude=Decimal('-46.63')))
+        db.commit()
+        
+        app = Flask(__name__)
+        app.register_blueprint(stores_bp, url_prefix='/api/stores')
+        client = app.test_client()
+        
+        response = client.get('/api/stores/nearby?lat=-15.79&lon=-47.88&radius=5&limit=3')
+        data = response.get_json()['data']
+        stores = data['stores']
+        
+        assert response.status_code == 200
+        assert data['location'] == {'latitude': -15.79, 'longitude': -47.88}
+        assert data['cell'] == quantize_location({'lat': -15.79, 'lon': -47.88})['cell']
+        assert [store['name'] for store in stores] == ['Loja 0', 'Loja 1', 'Loja 2']
+        assert stores == sorted(stores, key=lambda store: store['distance'])
+        assert 'distance' not in shared_index.get().nearest(-15.79, -47.88, 1)[0][0]
+    
+    def test_find_nearest_stores_uses_shared_index(self, db, shared_index):
+        """Testa que, sem lista de lojas, find_nearest_stores consulta o índice."""
+        db.add(Store(name='Perto', latitude=Decimal('-15.79'), longitude=Decimal('-47.88')))
+        db.add(Store(name='Longe', latitude=Decimal('-23.55'), longitude=Decimal('-46.63')))
+        db.commit()
+        
+        from_index = find_nearest_stores({'lat': -15.8, 'lon': -47.89}, max_distance=20)
+        from_list = find_nearest_stores(
+            {'lat': -15.8, 'lon': -47.89},
+            [{'name': 'Perto', 'latitude': -15.79, 'longitude': -47.88}],
+            max_distance=20
+        )
+        
+        assert [store['name'] for store in from_index] == ['Perto']
+        assert from_index[0]['distance_km'] == from_list[0]['distance_km']
+
+
+class TestBoundingBoxPrefilter:
+    """Testes do pré-filtro por bounding box e do kernel de Haversine."""
+    
+    def test_bounding_box_contains_radius(self):
+        """Testa que pontos no raio caem dentro do retângulo."""
+        rng = random.Random(7)
+        lat_min, lat_max, lon_min, lon_max = bounding_box(-15.8, -47.9, 10)
+        
+        for _ in range(500):
+            lat, lon = rng.uniform(-16.0, -15.6), rng.uniform(-48.1, -47.7)
+            if _haversine(-15.8, -47.9, lat, lon) <= 10:
+                assert lat_min <= lat <= lat_max
+                assert lon_min <= lon <= lon_max
+        
+        assert bounding_box(89.99, 0, 50)[2:] == (-180.0, 180.0)
+        assert bounding_box(0, 179.99, 50)[2:] == (-180.0, 180.0)
+    
+    def test_scalar_wrapper_matches_kernel(self):
+        """Testa que calculate_distance é o kernel vetorizado arredondado."""
+        lats = np.array([-15.79, -23.55, 0.0])
+        lons = np.array([-47.88, -46.63, 0.0])
+        
+        distances = haversine_km(-15.8, -47.89, lats, lons)
+        
+        for lat, lon, distance in zip(lats, lons, distances):
+            assert calculate_distance(-15.8, -47.89, lat, lon) == round(float(distance), 2)
+            assert distance == pytest.approx(_haversine(-15.8, -47.89, lat, lon))
+    
+    def test_sql_path_matches_index(self, db, shared_index, monkeypatch):
+        """Testa a busca no banco (sem índice em memória) contra a KD-tree."""
+        rng = random.Random(3)
+        for i in range(60):
+            db.add(Store(
+                name=f'Loja {i}',
+                latitude=Decimal(str(round(rng.uniform(-16.0, -15.6), 6))),
+                longitude=Decimal(str(round(rng.uniform(-48.1, -47.7), 6)))
+            ))
+        db.commit()
+        
+        from_index = shared_index.within_radius(-15.8, -47.9, 8, 10)
+        
+        monkeypatch.setattr(store_index_module.settings, 'STORE_INDEX_ENABLED', False)
+        with count_queries() as statements:
+            from_sql = shared_index.within_radius(-15.8, -47.9, 8, 10)
+        
+        assert [s['id'] for s, _ in from_sql] == [s['id'] for s, _ in from_index]
+        assert [d for _, d in from_sql] == pytest.approx([d for _, d in from_index])
+        assert len(statements) == 1 and 'BETWEEN' in statements[0]
@@ -0,0 +1,107 @@
+"""
+Testes Unitários - Instrumentação do Ranking
+
+Testes para spans, contadores, header Server-Timing e histogramas por etapa.
+"""
+
+from src.services import timing
+from src.services.timing import (
+    HISTOGRAM_BUCKETS_MS,
+    RequestTrace,
+    StageHistograms,
+    count,
+    span,
+    trace_request,
+)
+
+
+class TestRequestTrace:
+    """Testes para o trace de uma requisição."""
+    
+    def test_spans_with_same_name_are_summed(self):
+        """Testa a soma de spans repetidos e os contadores."""
+        trace = RequestTrace()
+        
+        with trace.span('scoring'):
+            pass
+        first = trace.spans['scoring']
+        with trace.span('scoring'):
+            pass
+        trace.count('offers_scored', 3)
+        trace.count('offers_scored', 4)
+        
+        assert trace.spans['scoring'] >= first
+        assert trace.counters == {'offers_scored': 7}
+    
+    def test_server_timing_header(self):
+        """Testa o formato do header Server-Timing."""
+        trace = RequestTrace()
+        trace.spans = {'cache_lookup': 0.4123, 'scoring': 2.1}
+        trace.counters = {'offers_scored': 42}
+        
+        assert trace.server_timing() == (
+            'cache_lookup;dur=0.41, scoring;dur=2.10, offers_scored;desc="42"'
+        )
+
+
+class TestTraceRequest:
+    """Testes para a ativação do trace e os spans de módulo."""
+    
+    def test_spans_outside_trace_are_noop(self):
+        """Testa que sem trace ativo os spans não medem nada."""
+        with span('scoring'):
+            count('offers_scored', 10)
+        
+        assert timing._current_trace.get() is None
+    
+    def test_trace_records_into_histograms(self, monkeypatch):
+        """Testa que o trace finalizado alimenta os histogramas."""
+        histograms = StageHistograms()
+        monkeypatch.setattr(timing, 'stage_histograms', histograms)
+        
+        with trace_request(enabled=True) as trace:
+            with span('scoring'):
+                count('offers_scored', 5)
+        
+        snapshot = histograms.snapshot()
+        assert set(trace.spans) == {'scoring', 'total'}
+        assert snapshot['requests'] == 1
+        assert snapshot['stages']['scoring']['count'] == 1
+        assert snapshot['counters']['offers_scored'] == {'sum': 5, 'max': 5}
+        assert timing._current_trace.get() is None
+    
+    def test_disabled_trace(self, monkeypatch):
+        """Testa que, desabilitado, nenhum trace é criado."""
+        histograms = StageHistograms()
+        monkeypatch.setattr(timing, 'stage_histograms', histograms)
+        
+        with trace_request(enabled=False) as trace:
+            with span('scoring'):
+                pass
+        
+        assert trace is None
+        assert histograms.snapshot()['requests'] == 0
+
+
+class TestStageHistograms:
+    """Testes para os histogramas agregados."""
+    
+    def test_buckets_and_quantiles(self):
+        """Testa a distribuição por bucket e os quantis estimados."""
+        histograms = StageHistograms()
+        for duration in [0.5] * 9 + [7000.0]:
+            trace = RequestTrace()
+            trace.spans = {'scoring': duration}
+            histograms.observe(trace)
+        
+        stage = histograms.snapshot()['stages']['scoring']
+        
+        assert stage['count'] == 10
+        assert stage['buckets'][0] == 9
+        assert stage['buckets'][len(HISTOGRAM_BUCKETS_MS)] == 1
+        assert stage['p50_ms'] == 1.0
+        assert stage['p95_ms'] == 7000.0
+        assert stage['max_ms'] == 7000.0
+        
+        histograms.reset()
+        assert histograms.snapshot()['stages'] == {}